@@ -0,0 +1,248 @@
+"""
+High-frequency analog input sampling with NumPy ring buffers.
+
+The Automation HAT analog inputs carry a door position potentiometer and a
+motor current clamp.  Like the other hardware access, the reads happen in a
+script (``analogSample.py``); it runs for as long as the sampler does and
+streams fixed-size binary records (a monotonic timestamp plus one float64 per
+channel) in batches, one batch per tick.
+
+``AnalogSampler`` reads each batch with ``readinto`` into a preallocated
+buffer that is viewed as a NumPy array, appends it to an ``AnalogRing`` and
+recomputes the rolling mean, min, max and slope over the configured window.
+The ring writes every record twice, ``capacity`` apart, so the latest
+``capacity`` records are always contiguous and a window is a view, never a
+copy.  Statistics are written into preallocated arrays, so nothing is
+allocated per sample; only the metrics dict is built once per tick.
+
+NumPy is optional (the ``analog`` extra); without it the sampler cannot be
+created and the app runs without analog metrics.
+"""
+import logging
+import os
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is the optional 'analog' extra
+    np = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ANALOG_CHANNELS = ('one', 'two', 'three', 'four')
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError('Analog sampling requires numpy (install the "analog" extra)')
+
+
+class AnalogRing:
+    """Fixed-size ring of [timestamp, reading...] records with rolling statistics over the latest ones."""
+
+    def __init__(self, channels: int, capacity: int, window: int):
+        _require_numpy()
+        if channels < 1 or capacity < 2:
+            raise ValueError('an analog ring needs at least one channel and two records')
+        self.channels = channels
+        self.capacity = capacity
+        self.window = max(2, min(window, capacity))
+        # Each record is stored at slot and slot + capacity (see module docstring)
+        self._data = np.zeros((2 * capacity, 1 + channels))
+        self._next = 0
+        self.count = 0
+        self.total = 0
+        # Preallocated statistics outputs and scratch space
+        self.mean = np.zeros(channels)
+        self.min = np.zeros(channels)
+        self.max = np.zeros(channels)
+        self.slope = np.zeros(channels)
+        self._dt = np.zeros(self.window)
+        self._sum_dt_v = np.zeros(channels)
+
+    def extend(self, records):
+        """Append a (k, 1 + channels) block of records, oldest first."""
+        self.total += len(records)
+        if len(records) > self.capacity:
+            records = records[-self.capacity:]
+        k = len(records)
+        start = self._next
+        head = min(k, self.capacity - start)
+        self._data[start:start + head] = records[:head]
+        self._data[start + self.capacity:start + self.capacity + head] = records[:head]
+        if k > head:
+            self._data[:k - head] = records[head:]
+            self._data[self.capacity:self.capacity + k - head] = records[head:]
+        self._next = (start + k) % self.capacity
+        self.count = min(self.capacity, self.count + k)
+
+    def latest(self, n: int):
+        """View of the latest n records, oldest first."""
+        n = min(n, self.count)
+        end = self._next + self.capacity
+        return self._data[end - n:end]
+
+    def compute(self) -> int:
+        """Update mean, min, max and slope (units per second) over the window; returns the records used."""
+        records = self.latest(self.window)
+        n = len(records)
+        if n == 0:
+            return 0
+        t = records[:, 0]
+        values = records[:, 1:]
+        np.mean(values, axis=0, out=self.mean)
+        np.min(values, axis=0, out=self.min)
+        np.max(values, axis=0, out=self.max)
+
+        # Least-squares slope: sum(dt * v) / sum(dt * dt) with dt centred on the mean time
+        dt = self._dt[:n]
+        np.subtract(t, t.mean(), out=dt)
+        spread = np.dot(dt, dt)
+        if n < 2 or spread == 0:
+            self.slope.fill(0.0)
+        else:
+            np.dot(dt, values, out=self._sum_dt_v)
+            np.divide(self._sum_dt_v, spread, out=self.slope)
+        return n
+
+
+class AnalogSampler:
+    """Streams analogSample.py readings into a ring and derives door position and motor current per tick."""
+
+    def __init__(self, channels: Iterable[str], rate: float = 50.0, tick: float = 0.25, window: float = 2.0,
+                 buffer_seconds: float = 60.0, position_channel: Optional[str] = None,
+                 position_closed_volts: float = 0.5, position_open_volts: float = 4.5,
+                 current_channel: Optional[str] = None, current_amps_per_volt: float = 10.0,
+                 on_tick: Optional[Callable[[Dict[str, Any]], None]] = None):
+        _require_numpy()
+        self.channels = list(dict.fromkeys(channels))
+        unknown = [channel for channel in self.channels if channel not in ANALOG_CHANNELS]
+        if not self.channels or unknown:
+            raise ValueError(f"Invalid analog channel(s): {', '.join(unknown) or 'none given'}")
+        for channel in (position_channel, current_channel):
+            if channel and channel not in self.channels:
+                raise ValueError(f"Analog channel '{channel}' is not sampled")
+        if rate <= 0 or tick <= 0:
+            raise ValueError('analog sample rate and tick must be positive')
+        if position_open_volts == position_closed_volts:
+            raise ValueError('door position calibration needs distinct open and closed voltages')
+
+        self.rate = rate
+        self.tick = tick
+        self.position_channel = position_channel
+        self.position_closed_volts = position_closed_volts
+        self.position_open_volts = position_open_volts
+        self.current_channel = current_channel
+        self.current_amps_per_volt = current_amps_per_volt
+        self.on_tick = on_tick
+        self.ring = AnalogRing(len(self.channels), capacity=max(2, int(rate * buffer_seconds)),
+                               window=int(rate * window))
+
+        # One tick's batch, read in place and viewed as records without copying
+        self._per_tick = max(1, round(rate * tick))
+        self._batch = bytearray(8 * (1 + len(self.channels)) * self._per_tick)
+        self._records = np.frombuffer(self._batch, dtype='<f8').reshape(self._per_tick, 1 + len(self.channels))
+
+        self._lock = threading.Lock()
+        self._metrics: Optional[Dict[str, Any]] = None
+        self._process = None
+        self._thread = None
+
+    def start(self):
+        """Start analogSample.py and the thread reading its batches."""
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        script_path = os.path.join(script_dir, 'analogSample.py')
+        # stderr goes to the server log
+        self._process = subprocess.Popen(['python', script_path, str(self.rate), str(self.tick), *self.channels],
+                                         stdout=subprocess.PIPE)
+        self._thread = threading.Thread(target=self._run, args=(self._process,),
+                                        name='analog-sampler', daemon=True)
+        self._thread.start()
+        logger.info(f"Analog sampler started on {', '.join(self.channels)} at {self.rate:g} Hz")
+
+    def stop(self):
+        """Stop the sampling script and wait for the reader thread."""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        logger.info("Analog sampler stopped")
+
+    def _run(self, process):
+        stream = process.stdout
+        buffer = memoryview(self._batch)
+        try:
+            while True:
+                filled = 0
+                while filled < len(buffer):
+                    read = stream.readinto(buffer[filled:])
+                    if not read:
+                        if self._process is process:
+                            logger.error(f"Analog sampling script exited with code {process.poll()}")
+                        return
+                    filled += read
+                self.feed(self._records)
+        except Exception as e:
+            logger.error(f"Error reading analog samples: {str(e)}")
+        finally:
+            stream.close()
+
+    def feed(self, records):
+        """Append a batch of records, recompute the statistics and hand the metrics to on_tick."""
+        with self._lock:
+            self.ring.extend(records)
+            self.ring.compute()
+            self._metrics = metrics = self._build_metrics()
+        if self.on_tick:
+            self.on_tick(metrics)
+
+    def metrics(self) -> Optional[Dict[str, Any]]:
+        """The metrics of the latest tick, or None before the first batch."""
+        with self._lock:
+            return self._metrics
+
+    def _build_metrics(self) -> Dict[str, Any]:
+        ring = self.ring
+        metrics = {
+            'updated_at': time.time(),
+            'sample_rate': self.rate,
+            'samples': ring.total,
+            'channels': {
+                channel: {
+                    'mean': float(ring.mean[i]),
+                    'min': float(ring.min[i]),
+                    'max': float(ring.max[i]),
+                    'slope': float(ring.slope[i]),
+                }
+                for i, channel in enumerate(self.channels)
+            },
+            'position': None,
+            'motor_current': None,
+        }
+        if self.position_channel:
+            i = self.channels.index(self.position_channel)
+            span = self.position_open_volts - self.position_closed_volts
+            percent = (ring.mean[i] - self.position_closed_volts) / span * 100
+            metrics['position'] = {
+                'percent': float(min(100.0, max(0.0, percent))),
+                'percent_per_second': float(ring.slope[i] / span * 100),
+            }
+        if self.current_channel:
+            i = self.channels.index(self.current_channel)
+            metrics['motor_current'] = {
+                'amps': float(ring.mean[i] * self.current_amps_per_volt),
+                'peak_amps': float(ring.max[i] * self.current_amps_per_volt),
+            }
+        return metrics
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Usage: analogSample.py RATE TICK CHANNEL [CHANNEL ...]
+# Reads the given Automation HAT analog channels (one, two, three, four) RATE
+# times per second until killed, and writes every TICK seconds a batch of
+# little-endian float64 records to stdout: a monotonic timestamp followed by
+# one reading (volts) per channel.
+import os
+import struct
+import sys
+import time
+
+if os.name == 'nt':
+    print('Automation HAT is not supported on Windows.', file=sys.stderr)
+    sys.exit(0)
+
+import automationhat
+
+ANALOG_CHANNELS = ('one', 'two', 'three', 'four')
+
+try:
+    rate = float(sys.argv[1])
+    tick = float(sys.argv[2])
+except (IndexError, ValueError):
+    print('Usage: analogSample.py RATE TICK CHANNEL [CHANNEL ...]', file=sys.stderr)
+    sys.exit(2)
+
+channels = sys.argv[3:]
+unknown = [channel for channel in channels if channel not in ANALOG_CHANNELS]
+if not channels or unknown or rate <= 0 or tick <= 0:
+    print(f'Invalid analog channel(s): {", ".join(unknown) or "none given"}', file=sys.stderr)
+    sys.exit(2)
+
+if not automationhat.is_automation_hat():
+    print('Automation HAT not found.', file=sys.stderr)
+    sys.exit(1)
+
+inputs = [getattr(automationhat.analog, channel) for channel in channels]
+record = struct.Struct(f'<{1 + len(channels)}d')
+per_tick = max(1, round(rate * tick))
+batch = bytearray(record.size * per_tick)
+out = sys.stdout.buffer
+
+interval = 1.0 / rate
+next_sample = time.monotonic()
+try:
+    while True:
+        for i in range(per_tick):
+            record.pack_into(batch, i * record.size, time.monotonic(), *(analog.read() for analog in inputs))
+            next_sample += interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (slow ADC read); don't try to catch up in a burst
+                next_sample = time.monotonic()
+        out.write(batch)
+        out.flush()
+except (BrokenPipeError, KeyboardInterrupt):
+    pass
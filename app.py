@@ -1,13 +1,36 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, g
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, g, send_from_directory
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 from functools import wraps
 import subprocess
 import os
+import json
 import logging
+import mimetypes
+import signal
+import socket
+import sys
+import secrets
+import time
 from dotenv import load_dotenv
+from analog import AnalogSampler
+from backpressure import SendQueueMonitor
+from compression import Compressor, compression
+from build_assets import DIST_DIR, load_manifest, manifest_version, source_version
 from database import DatabaseManager
+from door_events import DoorEventLog, ACTUATION, SNAPSHOT, TRANSITION
+from door_state import DoorStateMachine
+from edge import EdgeAgent, EventSpool, SiteRegistry, create_ingest_blueprint, snapshot_payload
+from leader import LeaderElector
+from lifecycle import AppLifecycle
+from message_queue import socketio_queue_options
+from render_cache import RenderCache
+from mqtt_bridge import MqttBridge
+from notifications import (HttpSmsProvider, NotificationDispatcher, NotificationThrottle, OpenDoorAlerts,
+                           RecipientIndex, TwilioSmsProvider, door_event_message)
+from shared_state import SharedDoorState
 from user_roles import UserRole
+from webhooks import WebhookDispatcher, event_payload, parse_allowlist, validate_url
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 import atexit
@@ -22,6 +45,44 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-pr
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fingerprinted assets written by build_assets.py; without a build the
+# manifest is empty and static URLs keep their plain names
+asset_manifest = load_manifest(app.static_folder)
+# Names the service worker's caches, so a deploy changing any asset replaces them
+asset_version = manifest_version(app.static_folder) or source_version(app.static_folder)
+# Hashed names never change content, so browsers may keep them for a year
+ASSET_MAX_AGE = 365 * 24 * 3600
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    """Point url_for('static', filename=...) at the hashed build of the file."""
+    if endpoint == 'static' and values.get('filename') in asset_manifest:
+        values['filename'] = asset_manifest[values['filename']]
+
+
+def static_asset(filename):
+    """Serve a static file, preferring a precompressed build variant the client accepts."""
+    if not filename.startswith(DIST_DIR + '/'):
+        return app.send_static_file(filename)
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype,
+                                           max_age=ASSET_MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=ASSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+app.view_functions['static'] = static_asset
+
 # Initialize SocketIO with configurable CORS
 # Read allowed origins from environment variable (comma-separated)
 cors_allowed_origins_env = os.getenv('CORS_ALLOWED_ORIGINS')
@@ -31,7 +92,23 @@ else:
     # Default to "*" for development; set CORS_ALLOWED_ORIGINS in .env for production
     cors_allowed_origins = "*"
     logger.warning("CORS_ALLOWED_ORIGINS not set - using '*' (all origins). Set specific origins in production.")
-socketio = SocketIO(app, cors_allowed_origins=cors_allowed_origins, path='/socket.io/')
+# SERVER_ASYNC_MODE is set by server.py after it has applied the matching monkey
+# patching; when unset Flask-SocketIO picks the best available mode itself.
+# SOCKETIO_MESSAGE_QUEUE (redis:// or local://) relays emits between workers so
+# clients connected to any worker receive every door update.
+socketio = SocketIO(app, cors_allowed_origins=cors_allowed_origins, path='/socket.io/',
+                    async_mode=os.getenv('SERVER_ASYNC_MODE') or None,
+                    **socketio_queue_options(os.getenv('SOCKETIO_MESSAGE_QUEUE')))
+
+# Cap each client's outbound queue so a client that stops reading cannot grow
+# memory without bound: door updates coalesce to the latest state, and clients
+# that stay over the cap are disconnected (they resume on reconnect)
+send_queues = SendQueueMonitor(
+    max_messages=int(os.getenv('SOCKETIO_SEND_QUEUE_MAX_MESSAGES', '100')),
+    max_bytes=int(os.getenv('SOCKETIO_SEND_QUEUE_MAX_BYTES', str(256 * 1024))),
+    grace=float(os.getenv('SOCKETIO_SLOW_CLIENT_GRACE', '30'))
+)
+send_queues.install(socketio.server.eio)
 
 # Initialize database manager
 try:
@@ -40,6 +117,42 @@ except Exception as e:
     logger.error(f"Failed to initialize database: {str(e)}")
     raise
 
+# Rendered pages that are the same for every visitor (legal pages, login form)
+render_cache = None
+if os.getenv('RENDER_CACHE_ENABLED', 'True').lower() == 'true':
+    render_cache = RenderCache([os.path.join(app.root_path, app.template_folder)],
+                               check_interval=float(os.getenv('RENDER_CACHE_CHECK_INTERVAL', '2')))
+
+# Compress the HTML and JSON Flask produces for clients that accept it; nginx
+# only compresses the static files it serves itself
+compressor = None
+if os.getenv('COMPRESSION_ENABLED', 'False').lower() == 'true':
+    compressor = Compressor(
+        min_size=int(os.getenv('COMPRESSION_MIN_SIZE', '1024')),
+        mimetypes=[mimetype.strip() for mimetype in os.getenv(
+            'COMPRESSION_MIMETYPES', 'text/html,text/css,text/plain,application/json,application/javascript'
+        ).split(',') if mimetype.strip()],
+        gzip_level=int(os.getenv('COMPRESSION_GZIP_LEVEL', '6')),
+        brotli_quality=int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+    )
+
+@app.after_request
+def compress_response(response):
+    """Gzip/Brotli-encode eligible responses when compression is enabled."""
+    return compressor.after_request(response) if compressor else response
+
+# Door state shared by all workers; the poller writes it, every worker reads it
+door_state_segment = SharedDoorState.open()
+
+# Central mode: hold the door state that edge agents at other sites push here
+central_sites = None
+if os.getenv('CENTRAL_ENABLED', 'False').lower() == 'true':
+    central_sites = SiteRegistry(
+        offline_after=float(os.getenv('CENTRAL_SITE_OFFLINE_AFTER', '180')),
+        on_update=lambda site: socketio.emit('site_update', site, namespace='/', to=central_room())
+    )
+    app.register_blueprint(create_ingest_blueprint(central_sites, os.getenv('EDGE_TOKEN', '')))
+
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -72,13 +185,43 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def render_cached(f):
+    """Decorator to serve a GET page from render_cache, with ETag revalidation.
+    
+    Only for pages whose output depends on nothing but whether the visitor is
+    logged in; pages with flashed messages are always rendered.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if render_cache is None or request.method not in ('GET', 'HEAD'):
+            return f(*args, **kwargs)
+        if session.get('_flashes'):
+            render_cache.bypass()
+            return f(*args, **kwargs)
+        
+        key = (request.endpoint, current_user.is_authenticated)
+        page = render_cache.get(key)
+        if page is None:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            page = render_cache.put(key, response.get_data(), response.mimetype)
+        response = Response(page.body, mimetype=page.mimetype)
+        response.set_etag(page.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    return decorated_function
+
 @app.route('/')
 def home():
     if current_user.is_authenticated:
-        return render_template('dashboard.html')
+        initial_state = _initial_door_state()
+        door_states = {snapshot['door_id']: snapshot for snapshot in initial_state['doors']}
+        return render_template('dashboard.html', doors=doors, door_states=door_states, initial_state=initial_state)
     return redirect(url_for('login'))
 
 @app.route('/login', methods=['GET', 'POST'])
+@render_cached
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -118,6 +261,12 @@ def profile():
             email = request.form.get('email', '').strip()
             phone = request.form.get('phone', '').strip()
             sms_notifications_enabled = request.form.get('sms_notifications_enabled') == 'on'
+            try:
+                open_alert_minutes = _alert_minutes(request.form.get('open_alert_minutes', ''))
+                open_alert_repeat_minutes = _alert_minutes(request.form.get('open_alert_repeat_minutes', ''))
+            except ValueError:
+                flash(f'Open door alert times must be whole minutes from 1 to {MAX_ALERT_MINUTES}', 'error')
+                return redirect(url_for('profile'))
             
             # Update profile
             if db_manager.update_user_profile(
@@ -129,6 +278,7 @@ def profile():
                 sms_notifications_enabled
             ):
                 flash('Profile updated successfully', 'success')
+                db_manager.update_open_alerts(current_user.id, open_alert_minutes, open_alert_repeat_minutes)
                 
                 # Handle password change if provided
                 current_password = request.form.get('current_password', '').strip()
@@ -161,6 +311,19 @@ def profile():
     new_api_key = session.pop('new_api_key', None)
     return render_template('profile.html', user=user_data, new_api_key=new_api_key)
 
+# Longest open door alert delay or repeat interval a user can choose (a day)
+MAX_ALERT_MINUTES = 1440
+
+def _alert_minutes(value):
+    """Parse an optional open door alert time in minutes; blank means off."""
+    value = value.strip()
+    if not value:
+        return None
+    minutes = int(value)
+    if not 1 <= minutes <= MAX_ALERT_MINUTES:
+        raise ValueError(value)
+    return minutes
+
 def api_key_required(f):
     """Decorator to require a valid API key for a route."""
     @wraps(f)
@@ -173,8 +336,8 @@ def api_key_required(f):
         if not user_data:
             return jsonify({'error': 'Invalid API key'}), 401
         
-        # You can optionally load the user into the context if needed
-        # g.current_user = User(user_data['username'], user_data['id'], user_data.get('role'))
+        # The key's owner, for routes acting on the user's own data
+        g.api_user = user_data
         
         return f(*args, **kwargs)
     return decorated_function
@@ -182,9 +345,195 @@ def api_key_required(f):
 @app.route('/api/door_status', methods=['GET'])
 @api_key_required
 def api_door_status():
-    """API endpoint to get the current door status."""
-    status_data = _get_door_status()
-    return jsonify(status_data)
+    """API endpoint to get the current status of a door (?door_id=, default the first door)."""
+    return _door_status_response()
+
+@app.route('/api/doors', methods=['GET'])
+@api_key_required
+def api_doors():
+    """API endpoint listing the configured doors with their channels and current state."""
+    shared = {snapshot.door_id: snapshot for snapshot in door_state_segment.read_all()} if door_state_segment else {}
+    return jsonify({'doors': [
+        {
+            'id': door['id'],
+            'name': door['name'],
+            'input_channel': door['input_channel'],
+            'relay_channel': door['relay_channel'],
+            'state': shared[door['id']].to_dict() if door['id'] in shared else None
+        }
+        for door in doors
+    ]})
+
+@app.route('/api/analog', methods=['GET'])
+@api_key_required
+def api_analog():
+    """API endpoint with the latest analog metrics: door position, motor current and per-channel statistics."""
+    metrics = door_state_segment.read_analog() if door_state_segment else None
+    if metrics is None and analog_sampler is not None:
+        metrics = analog_sampler.metrics()
+    # Metrics older than a few poll intervals mean the sampler (or the leader running it) stopped
+    max_age = 3 * int(os.getenv('DOOR_STATUS_REFRESH_INTERVAL', '10'))
+    if metrics is None or time.time() - metrics['updated_at'] > max_age:
+        return jsonify({
+            'success': False,
+            'error': 'No current analog readings'
+        }), 503
+    return jsonify({'success': True, **metrics})
+
+@app.route('/api/sites', methods=['GET'])
+@api_key_required
+def api_sites():
+    """API endpoint with every site's door state (central mode)."""
+    if central_sites is None:
+        return jsonify({
+            'success': False,
+            'error': 'Central mode is not enabled'
+        }), 404
+    return jsonify({'sites': central_sites.sites()})
+
+@app.route('/api/webhooks', methods=['GET'])
+@api_key_required
+def api_webhooks():
+    """API endpoint listing the key owner's webhooks (every user's for an admin key)."""
+    return jsonify({'webhooks': db_manager.get_webhooks(_webhook_owner())})
+
+@app.route('/api/webhooks', methods=['POST'])
+@api_key_required
+def api_create_webhook():
+    """API endpoint registering a webhook for the key owner; the signing secret is only returned here."""
+    data = request.get_json(silent=True) or {}
+    try:
+        url = validate_url(data.get('url'), parse_allowlist(os.getenv('WEBHOOK_ALLOWED_HOSTS')))
+        max_concurrency = int(data.get('max_concurrency', os.getenv('WEBHOOK_MAX_CONCURRENCY', '2')))
+        if not 1 <= max_concurrency <= 16:
+            raise ValueError('max_concurrency must be from 1 to 16')
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    secret = secrets.token_hex(32)
+    webhook_id = db_manager.create_webhook(g.api_user['username'], url, secret, max_concurrency)
+    if webhook_id is None:
+        return jsonify({
+            'success': False,
+            'error': 'Failed to create webhook'
+        }), 500
+    return jsonify({
+        'success': True,
+        'webhook': {'id': webhook_id, 'url': url, 'max_concurrency': max_concurrency},
+        'secret': secret
+    }), 201
+
+@app.route('/api/webhooks/<int:webhook_id>', methods=['DELETE'])
+@api_key_required
+def api_delete_webhook(webhook_id):
+    """API endpoint deleting one of the key owner's webhooks (any webhook for an admin key)."""
+    if not db_manager.delete_webhook(webhook_id, _webhook_owner()):
+        return jsonify({
+            'success': False,
+            'error': 'Webhook not found'
+        }), 404
+    return jsonify({'success': True})
+
+@app.route('/api/webhooks/<int:webhook_id>/enable', methods=['POST'])
+@api_key_required
+def api_enable_webhook(webhook_id):
+    """API endpoint re-enabling a webhook that was disabled after repeated failures."""
+    if not db_manager.set_webhook_enabled(webhook_id, True, username=_webhook_owner()):
+        return jsonify({
+            'success': False,
+            'error': 'Webhook not found'
+        }), 404
+    return jsonify({'success': True})
+
+def _webhook_owner():
+    """The username whose webhooks the API key may manage, or None for an admin key (all of them)."""
+    user = g.api_user
+    return None if user.get('role') == UserRole.ADMIN.value else user['username']
+
+@app.route('/central')
+@login_required
+def central_dashboard():
+    """Combined dashboard of every site pushing to this central instance."""
+    if central_sites is None:
+        flash('Central mode is not enabled.', 'error')
+        return redirect(url_for('home'))
+    return render_template('central.html', sites=central_sites.sites(), offline_after=central_sites.offline_after)
+
+@app.route('/api/leader', methods=['GET'])
+@api_key_required
+def api_leader():
+    """API endpoint describing which process currently runs the door poller."""
+    if leader_elector is None:
+        return jsonify({
+            'enabled': False,
+            'identity': None,
+            'is_leader': scheduler is not None
+        })
+    return jsonify({'enabled': True, **leader_elector.status()})
+
+@app.route('/api/door_status/stream', methods=['GET'])
+@compression(enabled=False)
+@api_key_required
+def api_door_status_stream():
+    """Server-Sent Events stream of door transitions and actuation results, resumable with Last-Event-ID."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    heartbeat = float(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))
+    return Response(_door_event_stream(last_event_id, heartbeat), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _format_sse(event):
+    """Encode a door event as an SSE message; the id lets clients resume with Last-Event-ID."""
+    lines = []
+    if event.get('epoch'):
+        lines.append(f"id: {event['epoch']}:{event['seq']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event)}")
+    return '\n'.join(lines) + '\n\n'
+
+def _parse_last_event_id(value):
+    """Split an 'epoch:seq' event id into (seq, epoch), or (None, None) if it is missing or malformed."""
+    epoch, _, seq = (value or '').rpartition(':')
+    if not epoch or not seq.isdigit():
+        return None, None
+    return int(seq), epoch
+
+def _door_event_stream(last_event_id, heartbeat):
+    """Yield missed events (or a snapshot), then live door events, with comment heartbeats when idle."""
+    yield 'retry: 5000\n\n'
+    last_seq, epoch = _parse_last_event_id(last_event_id)
+    events = door_events.since(last_seq, epoch)
+    shared_seqs = {}
+    last_sent = time.monotonic()
+    while True:
+        if events is None:
+            # Fresh client, too far behind or from an earlier server run: start from snapshots
+            last_seq = door_events.last_seq
+            events = _current_door_snapshots()
+        for event in events:
+            if event['epoch'] == door_events.epoch:
+                last_seq = max(last_seq, event['seq'])
+            else:
+                shared_seqs[event['door_id']] = event['seq']
+            yield _format_sse(event)
+            last_sent = time.monotonic()
+        
+        idle = time.monotonic() - last_sent
+        if idle >= heartbeat:
+            yield ': heartbeat\n\n'
+            last_sent, idle = time.monotonic(), 0
+        
+        if not door_events.snapshots() and door_state_segment:
+            # Standby worker: the poller runs elsewhere, so follow the shared segment
+            time.sleep(min(1.0, heartbeat - idle))
+            events = door_events.since(last_seq, door_events.epoch)
+            if events is not None:
+                events += [shared for shared in _shared_door_snapshots()
+                           if shared_seqs.get(shared['door_id']) != shared['seq']]
+        else:
+            events = door_events.wait_for_events(last_seq, heartbeat - idle)
 
 @app.route('/generate_api_key', methods=['POST'])
 @login_required
@@ -207,48 +556,146 @@ def generate_api_key():
 @app.route('/run_script', methods=['POST'])
 @login_required
 def run_script():
+    # The door to actuate comes from the JSON body or form; defaults to the first door
+    data = request.get_json(silent=True) or request.form
+    door = _get_door(data.get('door_id', DEFAULT_DOOR_ID))
+    if door is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown door'
+        }), 404
+    
+    return jsonify(_actuate_door(door))
+
+def _actuate_door(door):
+    """Press a door's relay with relay.py and record the result. Returns the run_script response body."""
     try:
         # Run the sample Python script using an absolute, whitelisted path    
         script_dir = os.path.dirname(os.path.abspath(__file__))
         script_path = os.path.join(script_dir, 'relay.py')
-        result = subprocess.run(['python', script_path],
+        result = subprocess.run(['python', script_path, door['relay_channel']],
                               capture_output=True, text=True, timeout=30)
-        return jsonify({
+        _record_actuation(result.returncode == 0, door['id'])
+        return {
             'success': True,
             'output': result.stdout,
             'error': result.stderr
-        })
+        }
     except subprocess.TimeoutExpired:
-        return jsonify({
+        _record_actuation(False, door['id'])
+        return {
             'success': False,
             'error': 'Script execution timed out'
-        })
+        }
     except Exception as e:
-        return jsonify({
+        _record_actuation(False, door['id'])
+        return {
             'success': False,
             'error': str(e)
-        })
+        }
+
+def _record_actuation(success, door_id=None):
+    """Publish the result of a relay actuation to the event stream and the shared door state."""
+    door_id = door_id or DEFAULT_DOOR_ID
+    timestamp = time.time()
+    # Before it reaches the segment, so the leader never relays its own actuation again
+    logged_actuations[door_id] = timestamp
+    door_events.append(ACTUATION, {
+        'door_id': door_id,
+        'result': 'success' if success else 'failure'
+    }, timestamp=timestamp)
+    if door_state_segment:
+        door_state_segment.publish_actuation(success, timestamp=timestamp, door_id=door_id)
+    
+    if success and door_id in door_machines:
+        # This process runs the poller: start the motion now and sample at the motion interval
+        door_machines[door_id].actuate(timestamp)
+        _set_poll_interval(float(os.getenv('DOOR_MOTION_POLL_INTERVAL', '1')))
+
+def _read_door_status(door):
+    """Get a door's status from the shared segment published by the poller, falling back to a live read."""
+    snapshot = door_state_segment.read(door['id']) if door_state_segment else None
+    # A snapshot older than a few poll intervals means no poller is publishing
+    max_age = 3 * int(os.getenv('DOOR_STATUS_REFRESH_INTERVAL', '10'))
+    if snapshot is None or time.time() - snapshot.updated_at > max_age:
+        return {**_get_door_status(door['input_channel']), 'door_id': door['id']}
+    return {'success': True, **snapshot.to_dict()}
+
+def _door_status_etag(status_data):
+    """Weak ETag for a door status body, or None for a failed read.
+    
+    Snapshots from the shared segment carry the poller's sequence number. A live
+    read (no segment: a single process polling the doors itself) is tagged with
+    this process's position in the door event log instead, which every
+    transition and actuation advances.
+    """
+    if 'sequence' in status_data:
+        sequence = status_data['sequence']
+    elif status_data.get('success'):
+        sequence = f"{door_events.epoch}.{door_events.last_seq}"
+    else:
+        return None
+    actuation = status_data.get('last_actuation') or {}
+    actuated_ms = int((actuation.get('timestamp') or 0) * 1000)
+    # The state is part of the tag so a restarted poller reusing a sequence number cannot match stale state
+    state = status_data.get('state') or status_data['status']
+    return f"{sequence}-{state}-{actuated_ms}"
 
-def _get_door_status():
-    """Check the door status by running the doorStatus.py script."""
+def _door_status_response():
+    """Serve a door's status with an ETag, honouring If-None-Match and the optional ?wait=N long-poll."""
+    door = _get_door(request.args.get('door_id', DEFAULT_DOOR_ID))
+    if door is None:
+        return jsonify({'success': False, 'error': 'Unknown door'}), 404
+    
+    status_data = _read_door_status(door)
+    etag = _door_status_etag(status_data)
+    wait = min(request.args.get('wait', 0, type=float), float(os.getenv('LONG_POLL_MAX_WAIT', '55')))
+    
+    if etag and wait > 0:
+        # Hold the request until the state differs from the client's copy (or the current one)
+        client_etag = request.if_none_match
+        unchanged = (lambda tag: client_etag.contains_weak(tag)) if client_etag else etag.__eq__
+        deadline = time.monotonic() + wait
+        while etag and unchanged(etag) and time.monotonic() < deadline:
+            # Wakes at once for this process's events; other workers' changes arrive via the segment
+            last_seq = door_events.last_seq
+            door_events.wait_for_events(last_seq, min(deadline - time.monotonic(), 0.25))
+            if ('sequence' not in status_data and door_events.last_seq == last_seq
+                    and time.monotonic() < deadline):
+                # A live read runs doorStatus.py: only repeat it once the poller has seen a change
+                continue
+            status_data = _read_door_status(door)
+            etag = _door_status_etag(status_data)
+    
+    response = jsonify(status_data)
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def _parse_door_reading(output):
+    """Map doorStatus.py output for one door to 'closed', 'open' or 'unknown'."""
+    if 'Door Closed' in output:
+        return 'closed'
+    elif 'Door Opened' in output:
+        return 'open'
+    # Default to unknown if we can't determine status
+    return 'unknown'
+
+def _get_door_status(input_channel=None):
+    """Check the door status by running the doorStatus.py script, for input one or the given channel."""
     try:
         # Run the doorStatus.py script to get current door status
         script_dir = os.path.dirname(os.path.abspath(__file__))
         script_path = os.path.join(script_dir, 'doorStatus.py')
-        result = subprocess.run(['python', script_path],
+        channels = [input_channel] if input_channel else []
+        result = subprocess.run(['python', script_path, *channels],
                               capture_output=True, text=True, timeout=10)
         
         # Parse the output to determine door status
         output = result.stdout.strip()
         error_output = result.stderr.strip()
-        
-        if 'Door Closed' in output:
-            status = 'closed'
-        elif 'Door Opened' in output:
-            status = 'open'
-        else:
-            # Default to unknown if we can't determine status
-            status = 'unknown'
+        status = _parse_door_reading(output)
         
         return {
             'success': True,
@@ -272,47 +719,126 @@ def _get_door_status():
 @login_required
 def door_status():
     """Endpoint for the web UI to get the current door status."""
-    status_data = _get_door_status()
-    return jsonify(status_data)
+    return _door_status_response()
 
-# Global variable to track last known door status
-last_door_status = None
+# Last known sensor status of each door, by door id
+last_door_states = {}
 
-def check_door_status_and_notify():
-    """Check door status and notify connected clients via WebSocket if it changed."""
-    global last_door_status
+# State machines inferring opening/closing/stuck, by door id; only the poller feeds them
+door_machines = {}
+
+# Sequenced door events; reconnecting clients replay what they missed from here
+door_events = DoorEventLog(capacity=int(os.getenv('DOOR_EVENT_BUFFER_SIZE', '256')))
+
+# Time of the latest actuation of each door in door_events, by door id; the
+# leader relays newer ones recorded by other workers from the shared segment
+logged_actuations = {}
+
+def _sample_doors(channels):
+    """Read all the given input channels in one doorStatus.py run. Returns {channel: status}."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    script_path = os.path.join(script_dir, 'doorStatus.py')
+    result = subprocess.run(['python', script_path, *channels],
+                          capture_output=True, text=True, timeout=10)
     
-    try:
-        # Run the doorStatus.py script to get current door status
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        script_path = os.path.join(script_dir, 'doorStatus.py')
-        result = subprocess.run(['python', script_path],
-                              capture_output=True, text=True, timeout=10)
+    # One "<channel>: Door Closed|Door Opened" line per channel that could be read
+    statuses = {channel: 'unknown' for channel in channels}
+    for line in result.stdout.splitlines():
+        channel, _, reading = line.partition(':')
+        if channel.strip() in statuses:
+            statuses[channel.strip()] = _parse_door_reading(reading)
+    return statuses
+
+def _door_machine(door_id):
+    """Get the state machine of a door, creating it with the configured travel time on first use."""
+    machine = door_machines.get(door_id)
+    if machine is None:
+        machine = door_machines[door_id] = DoorStateMachine(
+            travel_time=float(os.getenv('DOOR_TRAVEL_TIME', '15')),
+            margin=float(os.getenv('DOOR_TRAVEL_MARGIN', '5')),
+        )
+    return machine
+
+def _update_door_state(door_id, status, timestamp=None):
+    """Record a door reading: emit a sequenced transition if it changed, and publish it to the shared segment."""
+    machine = _door_machine(door_id)
+    old_status = last_door_states.get(door_id)
+    if old_status is None:
+        # First reading since start-up or re-election: infer nothing from earlier readings
+        machine.reset()
+        old_state = None
+    else:
+        # The state last announced; an actuation may have moved the machine since
+        old_state = (door_events.snapshot(door_id) or {}).get('state')
+    state = machine.observe(status, timestamp or time.time())
+    if old_status != status or old_state != state:
+        last_door_states[door_id] = status
         
-        # Parse the output to determine door status
-        output = result.stdout.strip()
+        # Sequence and timestamp the change, then emit it to the door's room
+        event = door_events.append(TRANSITION, {
+            'door_id': door_id,
+            'status': status,
+            'oldStatus': old_status,
+            'state': state,
+            'oldState': old_state,
+            'stuck_reason': machine.stuck_reason
+        })
+        socketio.emit('door_status_update', event, namespace='/', to=door_room(door_id))
         
-        if 'Door Closed' in output:
-            status = 'closed'
-        elif 'Door Opened' in output:
-            status = 'open'
-        else:
-            status = 'unknown'
+        if old_status is not None:
+            logger.info(f"Door {door_id} is now {state} (sensor {status}, was {old_state})")
+    
+    if door_state_segment:
+        door_state_segment.publish_status(status, sequence=door_events.snapshot(door_id)['seq'], door_id=door_id,
+                                          door_state=state, stuck_reason=machine.stuck_reason)
+
+def _apply_shared_actuations():
+    """Log and start door motions for the actuations other workers recorded in the shared segment.
+    
+    Webhooks, MQTT, the edge spool and SSE follow the leader's event log, so an
+    actuation made through a standby worker reaches them here, within one poll
+    interval. The segment keeps only the latest actuation of each door.
+    """
+    if not door_state_segment:
+        return
+    for shared in door_state_segment.read_all():
+        if shared.last_actuation_at and shared.last_actuation_at > logged_actuations.get(shared.door_id, 0.0):
+            logged_actuations[shared.door_id] = shared.last_actuation_at
+            door_events.append(ACTUATION, {
+                'door_id': shared.door_id,
+                'result': shared.last_actuation_result
+            }, timestamp=shared.last_actuation_at)
+        if shared.last_actuation_result == 'success':
+            # Actuations already applied (same timestamp) are ignored by the machine
+            _door_machine(shared.door_id).actuate(shared.last_actuation_at)
+
+# Current interval of the door poller, which speeds up while a door is moving
+poll_interval = None
+
+def _set_poll_interval(seconds):
+    """Reschedule the door poller, if this process runs it, to the given interval."""
+    global poll_interval
+    if seconds == poll_interval or scheduler is None or not scheduler.get_job('door_status_check'):
+        return
+    scheduler.reschedule_job('door_status_check', trigger=IntervalTrigger(seconds=seconds))
+    poll_interval = seconds
+
+def check_door_status_and_notify():
+    """Sample every door in one pass and notify connected clients via WebSocket of any changes."""
+    # A delayed renewal may have let the lease lapse; never poll without it
+    if leader_elector is not None and not leader_elector.holds_lease():
+        return
+    
+    try:
+        _apply_shared_actuations()
+        statuses = _sample_doors([door['input_channel'] for door in doors])
+        for door in doors:
+            _update_door_state(door['id'], statuses[door['input_channel']])
         
-        # Check if status changed
-        if last_door_status != status:
-            old_status = last_door_status
-            last_door_status = status
-            
-            # Emit the status change to all connected clients
-            socketio.emit('door_status_update', {
-                'status': status,
-                'oldStatus': old_status,
-                'timestamp': None  # Will be set on client side
-            }, namespace='/')
-            
-            if old_status is not None:
-                logger.info(f"Door status changed from {old_status} to {status}")
+        # Sample often while a door travels, so arrival, stuck timeouts and travel times are timely
+        moving = any(door_machines[door['id']].moving for door in doors)
+        _set_poll_interval(float(os.getenv('DOOR_MOTION_POLL_INTERVAL', '1')) if moving
+                           else int(os.getenv('DOOR_STATUS_REFRESH_INTERVAL', '10')))
         
     except subprocess.TimeoutExpired:
         logger.error("Door status check timed out")
@@ -322,17 +848,262 @@ def check_door_status_and_notify():
 # Scheduler instance (initialized later to avoid duplicate instances with Flask reloader)
 scheduler = None
 
-def initialize_scheduler():
-    """Initialize and start the scheduler. Only runs once per process."""
-    global scheduler
+# Leader elector, set when LEADER_ELECTION_ENABLED is true (multiple workers or hosts)
+leader_elector = None
+
+# Analog input sampler (door position, motor current); runs with the poller when ANALOG_SAMPLING_ENABLED
+analog_sampler = None
+
+def start_analog_sampler():
+    """Start sampling the analog inputs if enabled. Like the poller it runs in one process, the ADC's only reader."""
+    global analog_sampler
+    if analog_sampler is not None or os.getenv('ANALOG_SAMPLING_ENABLED', 'False').lower() != 'true':
+        return
     
-    # Prevent duplicate initialization
-    if scheduler is not None:
-        logger.warning("Scheduler already initialized, skipping duplicate initialization")
+    position_channel = os.getenv('ANALOG_POSITION_CHANNEL', 'one') or None
+    current_channel = os.getenv('ANALOG_CURRENT_CHANNEL', 'two') or None
+    try:
+        sampler = AnalogSampler(
+            [channel for channel in (position_channel, current_channel) if channel],
+            rate=float(os.getenv('ANALOG_SAMPLE_RATE', '50')),
+            tick=float(os.getenv('ANALOG_TICK_INTERVAL', '0.25')),
+            window=float(os.getenv('ANALOG_WINDOW', '2')),
+            buffer_seconds=float(os.getenv('ANALOG_BUFFER_SECONDS', '60')),
+            position_channel=position_channel,
+            position_closed_volts=float(os.getenv('ANALOG_POSITION_CLOSED_VOLTS', '0.5')),
+            position_open_volts=float(os.getenv('ANALOG_POSITION_OPEN_VOLTS', '4.5')),
+            current_channel=current_channel,
+            current_amps_per_volt=float(os.getenv('ANALOG_CURRENT_AMPS_PER_VOLT', '10')),
+            on_tick=door_state_segment.publish_analog if door_state_segment else None,
+        )
+        sampler.start()
+    except (RuntimeError, ValueError, OSError) as e:
+        logger.error(f"Analog sampling not started: {str(e)}")
+        return
+    analog_sampler = sampler
+
+def stop_analog_sampler():
+    """Stop the analog sampler if it runs in this process."""
+    global analog_sampler
+    if analog_sampler is not None:
+        analog_sampler.stop()
+        analog_sampler = None
+
+# Edge agent mode: push this site's door events to a central instance (EDGE_CENTRAL_URL)
+edge_agent = None
+
+def start_edge_agent():
+    """Create the edge agent and feed it door events; the leader runs the sender and spools its events."""
+    global edge_agent
+    central_url = os.getenv('EDGE_CENTRAL_URL')
+    if not central_url or edge_agent is not None:
         return
     
-    scheduler = BackgroundScheduler()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    spool = EventSpool(os.getenv('EDGE_SPOOL_PATH', os.path.join(script_dir, 'edge-spool.db')),
+                       max_events=int(os.getenv('EDGE_SPOOL_MAX_EVENTS', '100000')))
+    edge_agent = EdgeAgent(
+        central_url,
+        site_id=os.getenv('EDGE_SITE_ID') or socket.gethostname(),
+        site_name=os.getenv('EDGE_SITE_NAME'),
+        token=os.getenv('EDGE_TOKEN', ''),
+        spool=spool,
+        batch_size=int(os.getenv('EDGE_BATCH_SIZE', '100')),
+        linger=float(os.getenv('EDGE_BATCH_LINGER', '1')),
+        snapshot_interval=float(os.getenv('EDGE_SNAPSHOT_INTERVAL', '60')),
+        snapshots=lambda: snapshot_payload(_current_door_snapshots(), doors),
+    )
+    door_events.subscribe(edge_agent.enqueue)
+
+def stop_edge_agent():
+    """Stop pushing to the central instance; undelivered events stay spooled on disk."""
+    global edge_agent
+    if edge_agent is not None:
+        edge_agent.stop()
+        edge_agent.spool.close()
+        edge_agent = None
+
+# MQTT bridge for home automation (MQTT_BROKER_HOST); the leader publishes and takes commands
+mqtt_bridge = None
+
+def create_mqtt_bridge():
+    """Create the MQTT bridge if a broker is configured and feed it this process's door events."""
+    global mqtt_bridge
+    host = os.getenv('MQTT_BROKER_HOST')
+    if not host or mqtt_bridge is not None:
+        return
+    
+    commands_enabled = os.getenv('MQTT_COMMANDS_ENABLED', 'False').lower() == 'true'
+    try:
+        bridge = MqttBridge(
+            host,
+            port=int(os.getenv('MQTT_BROKER_PORT', '1883')),
+            prefix=os.getenv('MQTT_TOPIC_PREFIX', 'garage'),
+            client_id=os.getenv('MQTT_CLIENT_ID') or f"garage-{socket.gethostname()}",
+            username=os.getenv('MQTT_USERNAME'),
+            password=os.getenv('MQTT_PASSWORD'),
+            tls=os.getenv('MQTT_TLS', 'False').lower() == 'true',
+            max_backoff=int(os.getenv('MQTT_MAX_BACKOFF', '60')),
+            on_command=_handle_mqtt_command if commands_enabled else None,
+            snapshots=_current_door_snapshots,
+        )
+    except RuntimeError as e:
+        logger.error(f"MQTT bridge not started: {str(e)}")
+        return
+    door_events.subscribe(bridge.publish_event)
+    mqtt_bridge = bridge
+
+def stop_mqtt_bridge():
+    """Disconnect from the MQTT broker."""
+    global mqtt_bridge
+    if mqtt_bridge is not None:
+        mqtt_bridge.stop()
+        mqtt_bridge = None
+
+def _handle_mqtt_command(door_id, command):
+    """Run a door command from the MQTT command topic. open and close only press the relay when it moves the door that way."""
+    door = _get_door(door_id)
+    if door is None:
+        logger.warning(f"Ignoring MQTT command for unknown door {door_id}")
+        return
+    
+    if command != 'toggle':
+        snapshot = next((snapshot for snapshot in _current_door_snapshots() if snapshot['door_id'] == door['id']), {})
+        state = snapshot.get('state') or snapshot.get('status')
+        # The relay toggles: only a closed door opens and only an open door closes
+        if state != ('closed' if command == 'open' else 'open'):
+            logger.info(f"Ignoring MQTT command {command} for door {door['id']} while it is {state}")
+            return
+    
+    logger.info(f"MQTT command {command} for door {door['id']}")
+    _actuate_door(door)
+
+# Door event notifications (SMS_PROVIDER); the leader sends them
+notifier = None
+
+# Who gets notified, by door and channel; kept current as users change
+recipient_index = None
+
+# "Door left open" reminders at each user's threshold; tick in the leader
+open_door_alerts = None
+
+def create_notifier():
+    """Create the notification dispatcher for the configured SMS provider and feed it this process's door events."""
+    global notifier, recipient_index, open_door_alerts
+    provider_name = os.getenv('SMS_PROVIDER', '').lower()
+    if not provider_name or notifier is not None:
+        return
+    
+    try:
+        if provider_name == 'http':
+            provider = HttpSmsProvider(os.getenv('SMS_HTTP_URL'), token=os.getenv('SMS_HTTP_TOKEN'))
+        elif provider_name == 'twilio':
+            provider = TwilioSmsProvider(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'),
+                                         os.getenv('TWILIO_FROM_NUMBER'))
+        else:
+            raise ValueError(f"Unknown SMS_PROVIDER '{provider_name}'")
+        index = RecipientIndex(
+            load_all=db_manager.get_sms_recipients,
+            load_user=lambda username: next(iter(db_manager.get_sms_recipients(username)), None),
+            door_ids=lambda: [door['id'] for door in doors],
+            changes=door_state_segment,
+        )
+        dispatcher = NotificationDispatcher(
+            provider,
+            recipients=index.recipients,
+            message=_door_notification,
+            workers=int(os.getenv('SMS_WORKERS', '2')),
+            queue_size=int(os.getenv('SMS_QUEUE_SIZE', '1000')),
+            max_attempts=int(os.getenv('SMS_MAX_ATTEMPTS', '5')),
+            rate_limit=float(os.getenv('SMS_RATE_LIMIT', '1')),
+            burst=int(os.getenv('SMS_RATE_BURST', '5')),
+            dead_letter=db_manager.add_dead_letter,
+            throttle=NotificationThrottle(
+                window=float(os.getenv('SMS_DIGEST_WINDOW', '60')),
+                recipient_budget=int(os.getenv('SMS_RECIPIENT_BUDGET', '20')),
+                global_budget=int(os.getenv('SMS_GLOBAL_BUDGET', '200')),
+                period=float(os.getenv('SMS_BUDGET_PERIOD', '3600')),
+            ),
+        )
+    except ValueError as e:
+        logger.error(f"SMS notifications not started: {str(e)}")
+        return
+    alerts = OpenDoorAlerts(recipients=index.lookup, sync=index.sync, send=dispatcher.notify_recipient,
+                            door_name=_door_name)
+    index.build()
+    db_manager.subscribe_user_changes(_user_changed)
+    door_events.subscribe(dispatcher.notify)
+    door_events.subscribe(alerts.on_event)
+    recipient_index = index
+    open_door_alerts = alerts
+    notifier = dispatcher
+
+def stop_notifier():
+    """Stop sending notifications."""
+    global notifier, recipient_index, open_door_alerts
+    if notifier is not None:
+        open_door_alerts.stop()
+        notifier.stop()
+        notifier = None
+        recipient_index = None
+        open_door_alerts = None
+
+def _user_changed(username):
+    """Reload a changed user into the recipient index: through the shared segment, which reaches every worker, if there is one."""
+    if door_state_segment:
+        door_state_segment.publish_user_change(username)
+    elif recipient_index is not None:
+        recipient_index.invalidate(username)
+
+# Signed outbound webhooks (WEBHOOKS_ENABLED); the leader delivers them
+webhook_dispatcher = None
+
+def create_webhooks():
+    """Create the webhook dispatcher if enabled and feed it this process's door events."""
+    global webhook_dispatcher
+    if os.getenv('WEBHOOKS_ENABLED', 'False').lower() != 'true' or webhook_dispatcher is not None:
+        return
+    
+    try:
+        dispatcher = WebhookDispatcher(
+            db_manager,
+            payload=lambda event: event_payload(event, _door_name(event.get('door_id'))),
+            workers=int(os.getenv('WEBHOOK_WORKERS', '4')),
+            max_attempts=int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '8')),
+            max_backoff=float(os.getenv('WEBHOOK_MAX_BACKOFF', '3600')),
+            disable_after=int(os.getenv('WEBHOOK_DISABLE_AFTER', '20')),
+            timeout=float(os.getenv('WEBHOOK_TIMEOUT', '10')),
+            allowed=parse_allowlist(os.getenv('WEBHOOK_ALLOWED_HOSTS')),
+        )
+    except ValueError as e:
+        logger.error(f"Webhooks not started: {str(e)}")
+        return
+    door_events.subscribe(dispatcher.notify)
+    webhook_dispatcher = dispatcher
+
+def stop_webhooks():
+    """Stop delivering webhooks."""
+    global webhook_dispatcher
+    if webhook_dispatcher is not None:
+        webhook_dispatcher.stop()
+        webhook_dispatcher = None
+
+def _door_name(door_id):
+    door = _get_door(door_id)
+    return door['name'] if door else f"Door {door_id}"
+
+def _door_notification(event):
+    """Notification text for a door event, or None."""
+    return door_event_message(event, _door_name(event.get('door_id')))
+
+def start_leader_jobs():
+    """Start the jobs that must run in exactly one process: the door poller and event writers."""
+    global poll_interval
     refresh_interval = int(os.getenv('DOOR_STATUS_REFRESH_INTERVAL', '10'))
+    if door_state_segment:
+        # Actuations from before this election were relayed by the previous leader
+        for shared in door_state_segment.read_all():
+            logged_actuations[shared.door_id] = shared.last_actuation_at or 0.0
     scheduler.add_job(
         func=check_door_status_and_notify,
         trigger=IntervalTrigger(seconds=refresh_interval),
@@ -340,27 +1111,214 @@ def initialize_scheduler():
         name='Check door status and notify clients',
         replace_existing=True
     )
+    poll_interval = refresh_interval
+    logger.info(f"Door status poller started with {refresh_interval} second interval")
+    start_analog_sampler()
+    if edge_agent is not None:
+        edge_agent.start()
+    if mqtt_bridge is not None:
+        mqtt_bridge.start()
+    if notifier is not None:
+        notifier.start()
+        open_door_alerts.start()
+    if webhook_dispatcher is not None:
+        webhook_dispatcher.start()
+
+def stop_leader_jobs():
+    """Stop the leader-only jobs after this process loses leadership."""
+    if scheduler.get_job('door_status_check'):
+        scheduler.remove_job('door_status_check')
+    stop_analog_sampler()
+    if edge_agent is not None:
+        edge_agent.stop()
+    if mqtt_bridge is not None:
+        mqtt_bridge.stop()
+    if notifier is not None:
+        open_door_alerts.stop()
+        notifier.stop()
+    if webhook_dispatcher is not None:
+        webhook_dispatcher.stop()
+    # Forget the cached state so a later re-election announces a fresh reading,
+    # and so the dashboard and the SSE stream follow the new leader through the
+    # shared segment instead of serving this process's last readings
+    last_door_states.clear()
+    door_events.clear_states()
+    logger.info("Door status poller stopped")
+
+def initialize_scheduler():
+    """Initialize and start the scheduler. Only runs once per process."""
+    global scheduler, leader_elector
+    
+    # Prevent duplicate initialization
+    if scheduler is not None:
+        logger.warning("Scheduler already initialized, skipping duplicate initialization")
+        return
+    
+    scheduler = BackgroundScheduler()
     scheduler.start()
-    logger.info(f"Door status scheduler started with {refresh_interval} second interval")
     
-    # Shut down the scheduler when exiting the app
-    atexit.register(lambda: scheduler.shutdown() if scheduler else None)
+    if os.getenv('LEADER_ELECTION_ENABLED', 'False').lower() == 'true':
+        leader_elector = LeaderElector(
+            db_manager,
+            ttl=float(os.getenv('LEADER_LEASE_TTL', '15')),
+            renew_interval=float(os.getenv('LEADER_RENEW_INTERVAL', '5')),
+            on_elected=start_leader_jobs,
+            on_revoked=stop_leader_jobs,
+        )
+        leader_elector.start(scheduler)
+    else:
+        start_leader_jobs()
+
+def shutdown_scheduler():
+    """Hand over leadership and stop the scheduler and its jobs."""
+    global scheduler, leader_elector
+    
+    if leader_elector:
+        leader_elector.stop()
+        leader_elector = None
+    stop_analog_sampler()
+    if scheduler:
+        scheduler.shutdown()
+        scheduler = None
+
+def warm_door_snapshot():
+    """Take a door reading before serving traffic so the first requests and sockets see real state."""
+    if leader_elector is None or leader_elector.holds_lease():
+        check_door_status_and_notify()
+    # Standby workers serve the state the leader publishes to the shared segment
+
+def _current_door_snapshots():
+    """Get the latest state of every door known to this process, from its own poller or the shared segment."""
+    shared = {snapshot['door_id']: snapshot for snapshot in _shared_door_snapshots()}
+    snapshots = [door_events.snapshot(door['id']) or shared.get(door['id']) for door in doors]
+    return sorted((snapshot for snapshot in snapshots if snapshot is not None), key=lambda snapshot: snapshot['seq'])
+
+def _initial_door_state():
+    """Door snapshots to render into the dashboard, with the position its socket resumes from."""
+    # Read the position first: an event landing in between is replayed, never missed
+    last_seq = door_events.last_seq
+    snapshots = _current_door_snapshots()
+    # State from the shared segment carries the leader's sequence numbers, which
+    # this worker cannot replay, so its clients start with a full snapshot
+    own = all(snapshot['epoch'] == door_events.epoch for snapshot in snapshots)
+    return {
+        'epoch': door_events.epoch if own else None,
+        'last_seq': last_seq if own else None,
+        'doors': snapshots
+    }
+
+def _shared_door_snapshots():
+    """Build snapshot events from the shared segment, as published by the poller in another worker."""
+    if not door_state_segment:
+        return []
+    # Standby worker: the sequence is the leader's, so no epoch of ours applies
+    return [
+        {
+            'type': SNAPSHOT,
+            'seq': shared.sequence,
+            'epoch': None,
+            'timestamp': shared.updated_at,
+            'door_id': shared.door_id,
+            'status': shared.status,
+            'oldStatus': None,
+            'state': shared.state,
+            'oldState': None,
+            'stuck_reason': shared.stuck_reason
+        }
+        for shared in door_state_segment.read_all()
+    ]
+
+def _send_door_state(resume):
+    """Send a (re)connecting client the events it missed, or a full snapshot if they cannot be replayed."""
+    resume = resume if isinstance(resume, dict) else {}
+    last_seq = resume.get('last_seq')
+    if not isinstance(last_seq, int) or isinstance(last_seq, bool):
+        last_seq = None
+    
+    missed = door_events.since(last_seq, resume.get('epoch'))
+    if missed is None:
+        for snapshot in _current_door_snapshots():
+            emit('door_status_update', snapshot)
+        return
+    for event in missed:
+        if event['type'] == TRANSITION:
+            emit('door_status_update', event)
+
+# Doors and their Automation HAT channels; replaced from the doors table at start-up
+DEFAULT_DOOR_ID = 1
+# Automation HAT inputs and relays a door can be wired to (doorStatus.py and relay.py refuse any other)
+DOOR_CHANNELS = ('one', 'two', 'three')
+DEFAULT_DOORS = [{'id': DEFAULT_DOOR_ID, 'name': 'Garage Door', 'input_channel': 'one', 'relay_channel': 'one'}]
+doors = list(DEFAULT_DOORS)
+
+def load_doors():
+    """Load the active doors from the database, keeping the single default door if none are configured."""
+    global doors
+    
+    doors = db_manager.get_doors() or list(DEFAULT_DOORS)
+    logger.info(f"Monitoring {len(doors)} door(s): {', '.join(door['name'] for door in doors)}")
+
+def _get_door(door_id):
+    """Return the configured door with the given id (int or numeric string), or None."""
+    try:
+        door_id = int(door_id)
+    except (TypeError, ValueError):
+        return None
+    return next((door for door in doors if door['id'] == door_id), None)
+
+# Background services, started in order by the entry point (server.py, or
+# __main__ below) before any traffic is accepted and stopped in reverse order.
+lifecycle = AppLifecycle()
+lifecycle.register('doors', load_doors)
+lifecycle.register('edge agent', start_edge_agent, stop_edge_agent)
+lifecycle.register('mqtt bridge', create_mqtt_bridge, stop_mqtt_bridge)
+lifecycle.register('notifications', create_notifier, stop_notifier)
+lifecycle.register('webhooks', create_webhooks, stop_webhooks)
+lifecycle.register('scheduler', initialize_scheduler, shutdown_scheduler)
+lifecycle.register('door snapshot', warm_door_snapshot)
+atexit.register(lifecycle.stop)
+
+# Socket.IO rooms: clients only receive broadcasts for the doors they watch
+
+def door_room(door_id):
+    """Room joined by every client watching a door."""
+    return f'door:{door_id}'
+
+def central_room():
+    """Room receiving site updates in central mode."""
+    return 'central'
+
+def _authenticate_socket(auth):
+    """Return the username for a socket handshake with a login session or API key, else None."""
+    if current_user.is_authenticated:
+        return current_user.id
+    
+    api_key = (auth or {}).get('api_key') if isinstance(auth, dict) else None
+    api_key = api_key or request.headers.get('X-API-Key')
+    if api_key:
+        user_data = db_manager.get_user_by_api_key(api_key)
+        if user_data:
+            return user_data['username']
+    return None
 
 # SocketIO event handlers
 @socketio.on('connect')
-def handle_connect():
-    """Handle client connection - send current door status and initialize scheduler."""
-    # Initialize scheduler on first connection (ensures it only runs once per process)
-    initialize_scheduler()
-    
-    logger.info(f"Client connected")
-    # Send current status to the newly connected client
-    if last_door_status is not None:
-        emit('door_status_update', {
-            'status': last_door_status,
-            'oldStatus': None,
-            'timestamp': None
-        })
+def handle_connect(auth=None):
+    """Handle client connection - authenticate, join rooms and send current door status."""
+    # Reject before joining rooms or sending anything so anonymous sockets cost nothing more
+    username = _authenticate_socket(auth)
+    if username is None:
+        logger.warning("Rejected unauthenticated socket connection")
+        return False
+    
+    for door in doors:
+        join_room(door_room(door['id']))
+    if central_sites is not None:
+        join_room(central_room())
+    send_queues.label(socketio.server.manager.eio_sid_from_sid(request.sid, '/'), username)
+    logger.info(f"Client connected for user '{username}'")
+    # Reconnecting clients pass the last sequence they saw to resume from it
+    _send_door_state(auth)
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -368,14 +1326,9 @@ def handle_disconnect():
     logger.info(f"Client disconnected")
 
 @socketio.on('request_status')
-def handle_request_status():
-    """Handle explicit status request from client."""
-    if last_door_status is not None:
-        emit('door_status_update', {
-            'status': last_door_status,
-            'oldStatus': None,
-            'timestamp': None
-        })
+def handle_request_status(data=None):
+    """Handle explicit status request from client, optionally resuming from {'last_seq', 'epoch'}."""
+    _send_door_state(data)
 
 @app.route('/admin')
 @login_required
@@ -385,6 +1338,128 @@ def admin():
     users = db_manager.get_all_users()
     return render_template('admin.html', users=users)
 
+@app.route('/admin/compression')
+@login_required
+@admin_required
+def admin_compression():
+    """Response compression counters on this worker."""
+    if compressor is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **compressor.stats()})
+
+@app.route('/admin/render_cache')
+@login_required
+@admin_required
+def admin_render_cache():
+    """Hit and size counters of the rendered page cache on this worker."""
+    if render_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **render_cache.stats()})
+
+@app.route('/admin/socket_queues')
+@login_required
+@admin_required
+def admin_socket_queues():
+    """Per-client outbound Socket.IO queue depths on this worker."""
+    return jsonify({
+        'max_messages': send_queues.max_messages,
+        'max_bytes': send_queues.max_bytes,
+        'grace_seconds': send_queues.grace,
+        'clients': send_queues.stats()
+    })
+
+@app.route('/admin/edge')
+@login_required
+@admin_required
+def admin_edge():
+    """Delivery state of the edge agent pushing this site to the central instance."""
+    if edge_agent is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **edge_agent.stats()})
+
+@app.route('/admin/mqtt')
+@login_required
+@admin_required
+def admin_mqtt():
+    """Connection state of the MQTT bridge."""
+    if mqtt_bridge is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **mqtt_bridge.stats()})
+
+@app.route('/admin/notifications')
+@login_required
+@admin_required
+def admin_notifications():
+    """Notification delivery counters and the latest undelivered notifications."""
+    if notifier is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **notifier.stats(), 'recipients': recipient_index.stats(),
+                    'open_door_alerts': open_door_alerts.stats(),
+                    'dead_letters': db_manager.get_dead_letters()})
+
+@app.route('/admin/webhooks')
+@login_required
+@admin_required
+def admin_webhooks():
+    """Webhook endpoints with their delivery statistics and the latest deliveries that gave up."""
+    if webhook_dispatcher is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **webhook_dispatcher.stats(), 'webhooks': db_manager.get_webhooks(),
+                    'failed_deliveries': db_manager.get_failed_webhook_deliveries()})
+
+@app.route('/admin/doors', methods=['GET'])
+@login_required
+@admin_required
+def admin_doors():
+    """Active doors in the database and the channels a door can use."""
+    return jsonify({'doors': db_manager.get_doors(), 'channels': list(DOOR_CHANNELS)})
+
+@app.route('/admin/doors', methods=['POST'])
+@login_required
+@admin_required
+def admin_create_door():
+    """Add a door on an Automation HAT input and relay; it is polled after the app restarts."""
+    data = request.get_json(silent=True) or {}
+    name = str(data.get('name') or '').strip()
+    input_channel = data.get('input_channel')
+    relay_channel = data.get('relay_channel')
+    if not name:
+        error = 'Door name is required'
+    elif input_channel not in DOOR_CHANNELS:
+        error = f"input_channel must be one of {', '.join(DOOR_CHANNELS)}"
+    elif relay_channel not in DOOR_CHANNELS:
+        error = f"relay_channel must be one of {', '.join(DOOR_CHANNELS)}"
+    else:
+        error = None
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    
+    door_id = db_manager.create_door(name, input_channel, relay_channel)
+    if door_id is None:
+        return jsonify({
+            'success': False,
+            'error': f'Failed to create door. Input {input_channel} may already be assigned to a door.'
+        }), 500
+    return jsonify({
+        'success': True,
+        'door': {'id': door_id, 'name': name, 'input_channel': input_channel, 'relay_channel': relay_channel}
+    }), 201
+
+@app.route('/admin/doors/<int:door_id>/deactivate', methods=['POST'])
+@login_required
+@admin_required
+def admin_deactivate_door(door_id):
+    """Stop polling and controlling a door (after the app restarts) without deleting it."""
+    if not db_manager.deactivate_door(door_id):
+        return jsonify({
+            'success': False,
+            'error': 'Door not found'
+        }), 404
+    return jsonify({'success': True})
+
 @app.route('/admin/create_user', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -452,22 +1527,72 @@ def admin_change_password(username):
     
     return render_template('change_password.html', user=user_data)
 
+# Offline app shell: the service worker caches these along with the dashboard
+PWA_ENABLED = os.getenv('PWA_ENABLED', 'True').lower() == 'true'
+SHELL_STATIC_ASSETS = ['css/style.css', 'js/app.js', 'icons/icon.svg', 'manifest.webmanifest']
+# The CDN files base.html loads
+SHELL_CDN_ASSETS = [
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+    'https://cdn.socket.io/4.5.4/socket.io.min.js'
+]
+
+@app.context_processor
+def inject_pwa():
+    return {'pwa_enabled': PWA_ENABLED}
+
+@app.route('/service-worker.js')
+def service_worker():
+    """Service worker caching the app shell; served from the root so its scope covers every page."""
+    body = render_template(
+        'service_worker.js',
+        enabled=PWA_ENABLED,
+        version=asset_version,
+        assets=[url_for('static', filename=name) for name in SHELL_STATIC_ASSETS] + SHELL_CDN_ASSETS,
+        dashboard=url_for('home'),
+        offline=url_for('offline')
+    )
+    response = Response(body, mimetype='application/javascript')
+    # Browsers compare the worker on every navigation; it must never come from a stale cache
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/offline')
+@render_cached
+def offline():
+    """Page the service worker shows in place of the dashboard without a network; the same for every user."""
+    return render_template('offline.html')
+
 @app.route('/privacy-policy')
+@render_cached
 def privacy_policy():
     """Display privacy policy page."""
     return render_template('privacy_policy.html')
 
 @app.route('/terms-and-conditions')
+@render_cached
 def terms_and_conditions():
     """Display terms and conditions page."""
     return render_template('terms_and_conditions.html')
 
 if __name__ == '__main__':
+    # Development server only - production deployments start server.py instead
+    from server import is_production, resolve_debug
+
     host = os.getenv('APP_HOST', '0.0.0.0')
     port = int(os.getenv('APP_PORT', 5000))
-    debug = os.getenv('FLASK_DEBUG', 'True').lower() == 'true'
+    debug = resolve_debug()
     
     logger.info(f"Starting Garage Web App on {host}:{port} (debug={debug})")
     
-    # Only allow unsafe werkzeug in debug/development mode
-    socketio.run(app, debug=debug, host=host, port=port, allow_unsafe_werkzeug=True)
+    # With the reloader the parent process only watches files; services run
+    # in the reloaded child, which Werkzeug marks with WERKZEUG_RUN_MAIN.
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        lifecycle.start()
+        # Exit through SystemExit on SIGTERM so atexit stops the services in order
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Only allow unsafe werkzeug outside production; Flask-SocketIO refuses to
+    # start a non-interactive Werkzeug server otherwise.
+    socketio.run(app, debug=debug, host=host, port=port, allow_unsafe_werkzeug=not is_production())
@@ -0,0 +1,265 @@
+"""
+Bounded per-socket send queues for Socket.IO clients.
+
+Engine.IO gives every connection an unbounded outbound queue: if a client
+stops reading (a phone on a bad cellular link), each broadcast piles up in
+it and a long door-flap storm grows memory on the Pi without limit.
+
+``SendQueueMonitor.install`` replaces the queue factory of the Engine.IO
+server so every new socket gets a ``SendQueue`` instead.  The queue caps the
+number and bytes of pending messages per connection:
+
+* events listed in ``coalesce_events`` (``door_status_update``) replace the
+  pending, not yet sent copy for the same event, so a slow client receives
+  only the latest door state instead of every intermediate flap.  The
+  replaced copy keeps its slot in the queue until it is skipped, so it still
+  counts toward the message cap;
+* other messages over the cap are dropped, and a client that stays over the
+  cap for longer than ``grace`` seconds is disconnected.  It reconnects and
+  resumes from its last sequence number (see door_events.py).
+
+Control packets (pings, close, the queue sentinel) are never capped.
+"""
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from engineio import packet as eio_packet
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _event_name(data: Any) -> Optional[str]:
+    """Return the event name of an encoded Socket.IO EVENT packet, e.g. '2/ns,12["name",...]'."""
+    if not isinstance(data, str) or not data.startswith('2'):
+        return None
+    body = data[1:]
+    if body.startswith('/'):
+        body = body.partition(',')[2]
+    body = body.lstrip('0123456789')
+    if not body.startswith('["'):
+        return None
+    end = body.find('"', 2)
+    return body[2:end] if end > 0 else None
+
+
+def _event_door_id(data: str) -> Any:
+    """Return the door_id of an encoded event's payload, or None if it has none."""
+    try:
+        args = json.loads(data[data.index('['):])
+    except ValueError:
+        return None
+    payload = args[1] if len(args) > 1 else None
+    return payload.get('door_id') if isinstance(payload, dict) else None
+
+
+def _packet_size(pkt) -> int:
+    data = pkt.data
+    return len(data) if isinstance(data, (str, bytes)) else 0
+
+
+class _Entry:
+    """A queued message; a coalesced entry loses its packet and is skipped by get()."""
+    __slots__ = ('packet', 'size', 'key')
+
+    def __init__(self, packet, size: int, key: Optional[str]):
+        self.packet = packet
+        self.size = size
+        self.key = key
+
+
+class SendQueue:
+    """Outbound queue of one Engine.IO socket with message and byte caps."""
+
+    def __init__(self, inner, max_messages: int, max_bytes: int, grace: float,
+                 coalesce_events: Iterable[str] = (),
+                 on_overflow: Optional[Callable[['SendQueue'], None]] = None):
+        self._inner = inner
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.coalesce_events = frozenset(coalesce_events)
+        self.on_overflow = on_overflow
+        self.label: Optional[str] = None
+        self.messages = 0
+        self.bytes = 0
+        self.peak_messages = 0
+        self.coalesced = 0
+        # Coalesced entries still in the inner queue, waiting for get() to skip them
+        self.superseded = 0
+        self.dropped = 0
+        self.over_cap_since: Optional[float] = None
+        self._pending: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._overflowed = False
+
+    # Engine.IO queue interface -------------------------------------------
+
+    def put(self, pkt, *args, **kwargs):
+        if pkt is None or pkt.packet_type != eio_packet.MESSAGE:
+            self._inner.put(pkt, *args, **kwargs)
+            self._check_grace()
+            return
+
+        size = _packet_size(pkt)
+        event = _event_name(pkt.data)
+        # Every client watches every door, so updates only replace those for the same door
+        key = (event, _event_door_id(pkt.data)) if event in self.coalesce_events else None
+        with self._lock:
+            pending = self._pending.get(key) if key else None
+            if pending is not None:
+                # Re-queue at the tail rather than swapping in place: the newer
+                # sequence number must not overtake other doors' pending updates,
+                # or the client would discard those as stale.  Never dropped:
+                # the client would keep a stale state for the door
+                pending.packet = None
+                entry = _Entry(pkt, size, key)
+                self._pending[key] = entry
+                self.bytes += size - pending.size
+                self.coalesced += 1
+                self.superseded += 1
+                self._inner.put(entry, *args, **kwargs)
+                if self._slots() > self.max_messages:
+                    self._mark_over_cap()
+            elif self._slots() + 1 > self.max_messages or self.bytes + size > self.max_bytes:
+                self.dropped += 1
+                self._mark_over_cap()
+            else:
+                entry = _Entry(pkt, size, key)
+                if key:
+                    self._pending[key] = entry
+                self.messages += 1
+                self.bytes += size
+                self.peak_messages = max(self.peak_messages, self.messages)
+                self._inner.put(entry, *args, **kwargs)
+        self._check_grace()
+
+    def get(self, *args, **kwargs):
+        while True:
+            item = self._inner.get(*args, **kwargs)
+            if not isinstance(item, _Entry):
+                return item
+            with self._lock:
+                if item.packet is not None:
+                    if item.key and self._pending.get(item.key) is item:
+                        del self._pending[item.key]
+                    self.messages -= 1
+                    self.bytes -= item.size
+                    if self._slots() < self.max_messages and self.bytes < self.max_bytes:
+                        self.over_cap_since = None
+                    return item.packet
+                # Superseded by a newer update for the same door, which is further back
+                self.superseded -= 1
+            self._inner.task_done()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def task_done(self):
+        self._inner.task_done()
+
+    def join(self):
+        self._inner.join()
+
+    def qsize(self) -> int:
+        return self._inner.qsize()
+
+    def empty(self) -> bool:
+        return self._inner.empty()
+
+    # Backpressure --------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            over_cap_for = time.monotonic() - self.over_cap_since if self.over_cap_since is not None else None
+            return {
+                'label': self.label,
+                'messages': self.messages,
+                'bytes': self.bytes,
+                'peak_messages': self.peak_messages,
+                'coalesced': self.coalesced,
+                'superseded': self.superseded,
+                'dropped': self.dropped,
+                'over_cap_seconds': round(over_cap_for, 3) if over_cap_for is not None else None,
+            }
+
+    def _slots(self) -> int:
+        """Entries taking up the inner queue, superseded ones included (call with the lock held)."""
+        return self.messages + self.superseded
+
+    def _mark_over_cap(self):
+        if self.over_cap_since is None:
+            self.over_cap_since = time.monotonic()
+            logger.warning(f"Socket send queue {self._describe()} is over its cap, dropping messages")
+
+    def _check_grace(self):
+        """Hand the queue to on_overflow once, after it has stayed over the cap for the grace period."""
+        with self._lock:
+            if self._overflowed or self.over_cap_since is None:
+                return
+            if time.monotonic() - self.over_cap_since < self.grace:
+                return
+            self._overflowed = True
+        logger.warning(f"Disconnecting slow client {self._describe()}: "
+                       f"over its send queue cap for {self.grace}s")
+        if self.on_overflow:
+            self.on_overflow(self)
+
+    def _describe(self) -> str:
+        return f"for '{self.label}'" if self.label else "(unauthenticated)"
+
+
+class SendQueueMonitor:
+    """Installs bounded send queues on an Engine.IO server and reports their depths."""
+
+    def __init__(self, max_messages: int = 100, max_bytes: int = 256 * 1024, grace: float = 30.0,
+                 coalesce_events: Iterable[str] = ('door_status_update',)):
+        if max_messages < 1 or max_bytes < 1:
+            raise ValueError('send queue caps must be positive')
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.coalesce_events = tuple(coalesce_events)
+        self.eio = None
+
+    def install(self, eio_server):
+        """Make every socket the Engine.IO server creates from now on use a SendQueue."""
+        create_queue = eio_server.create_queue
+
+        def create_send_queue(*args, **kwargs):
+            return SendQueue(create_queue(*args, **kwargs), self.max_messages, self.max_bytes,
+                             self.grace, self.coalesce_events, on_overflow=self._disconnect)
+
+        eio_server.create_queue = create_send_queue
+        self.eio = eio_server
+
+    def label(self, eio_sid: str, label: str):
+        """Attach a name (the username) to a socket's queue for reporting."""
+        queue = self._queue_of(eio_sid)
+        if queue is not None:
+            queue.label = label
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-socket queue depths, deepest first."""
+        if self.eio is None:
+            return []
+        depths = [{'sid': sid, **socket.queue.stats()}
+                  for sid, socket in list(self.eio.sockets.items())
+                  if isinstance(socket.queue, SendQueue)]
+        return sorted(depths, key=lambda d: (d['messages'], d['bytes']), reverse=True)
+
+    def _queue_of(self, eio_sid: str) -> Optional[SendQueue]:
+        socket = self.eio.sockets.get(eio_sid) if self.eio is not None else None
+        queue = getattr(socket, 'queue', None)
+        return queue if isinstance(queue, SendQueue) else None
+
+    def _disconnect(self, queue: SendQueue):
+        for socket in list(self.eio.sockets.values()):
+            if socket.queue is queue:
+                # abort: a client that is not reading would never drain a CLOSE packet
+                socket.close(wait=False, abort=True)
+                return
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Fingerprint and precompress the static assets.
+
+Copies every file under static/ to static/dist/ with a content hash in its
+name (css/style.css -> dist/css/style.3f2a9c1b0e7d.css), writes .gz and, when
+the brotli package is installed, .br variants of the text assets next to each
+copy, and records the mapping in static/dist/manifest.json.  The app reads the
+manifest at start-up and rewrites url_for('static', ...) to the hashed names,
+so nginx can serve /static/dist with immutable caching and pick the
+precompressed variants itself.
+
+Run it on every deploy, before restarting the service:
+
+    python build_assets.py
+
+Files from the previous build are kept so pages rendered before a restart
+still load; anything older is removed.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz variants are written without it
+    brotli = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+
+# Only text formats gain from compression; images and fonts are compressed already
+COMPRESSIBLE = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.webmanifest')
+# Below this size the encoding headers outweigh the savings
+MIN_COMPRESS_SIZE = 256
+
+
+def load_manifest(static_dir: str) -> Dict[str, str]:
+    """Return the {source path: hashed path} map of the last build, or {} when there is none."""
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)['assets']
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Ignoring unreadable asset manifest {path}: {str(e)}")
+        return {}
+
+
+def manifest_version(static_dir: str) -> Optional[str]:
+    """Hash identifying the current build (changes whenever any asset does)."""
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f).get('version')
+    except (OSError, ValueError):
+        return None
+
+
+def source_version(static_dir: str) -> str:
+    """The version a build of the current static/ would get, computed without writing anything."""
+    return _version({relpath: f"{DIST_DIR}/{hashed_name(relpath, content)}"
+                     for relpath, content in _sources(static_dir)})
+
+
+def hashed_name(relpath: str, content: bytes) -> str:
+    base, ext = os.path.splitext(relpath)
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    return f"{base}.{digest}{ext}".replace(os.sep, '/')
+
+
+def compressed_variants(content: bytes) -> Dict[str, bytes]:
+    """The .gz/.br encodings of content that are smaller than the original."""
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return {suffix: data for suffix, data in variants.items() if len(data) < len(content)}
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _sources(static_dir: str) -> Iterator[Tuple[str, bytes]]:
+    """Yield (path relative to static_dir, content) for every source asset, skipping the build output."""
+    for root, dirs, files in os.walk(static_dir):
+        if os.path.abspath(root) == os.path.abspath(static_dir) and DIST_DIR in dirs:
+            dirs.remove(DIST_DIR)
+        dirs.sort()
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            source = os.path.join(root, name)
+            with open(source, 'rb') as f:
+                yield os.path.relpath(source, static_dir).replace(os.sep, '/'), f.read()
+
+
+def _version(assets: Dict[str, str]) -> str:
+    return hashlib.sha256(json.dumps(assets, sort_keys=True).encode()).hexdigest()[:HASH_LENGTH]
+
+
+def build(static_dir: str) -> Dict[str, str]:
+    """Build static/dist from static/ and return the new manifest's asset map."""
+    dist = os.path.join(static_dir, DIST_DIR)
+    assets: Dict[str, str] = {}
+    written = set()
+
+    for relpath, content in _sources(static_dir):
+        target = hashed_name(relpath, content)
+        outputs = {target: content}
+        if relpath.endswith(COMPRESSIBLE) and len(content) >= MIN_COMPRESS_SIZE:
+            for suffix, data in compressed_variants(content).items():
+                outputs[target + suffix] = data
+        for out, data in outputs.items():
+            path = os.path.join(dist, out)
+            # Unchanged assets keep their name, so there is nothing to rewrite
+            if not os.path.exists(path):
+                _write(path, data)
+            written.add(out)
+        assets[relpath] = f"{DIST_DIR}/{target}"
+
+    previous = load_manifest(static_dir)
+    _prune(dist, written, {path[len(DIST_DIR) + 1:] for path in previous.values()})
+
+    version = _version(assets)
+    manifest = json.dumps({'version': version, 'assets': assets}, indent=2, sort_keys=True)
+    _write(os.path.join(dist, MANIFEST_NAME), manifest.encode())
+    logger.info(f"Built {len(assets)} assets ({len(written)} files) into {dist}, version {version}")
+    return assets
+
+
+def _prune(dist: str, current: set, previous: set):
+    # Keep the previous build's files (and their .gz/.br) for pages rendered before the restart
+    keep = set(current)
+    for path in previous:
+        keep.update((path, path + '.gz', path + '.br'))
+    for root, _, files in os.walk(dist):
+        for name in files:
+            relpath = os.path.relpath(os.path.join(root, name), dist).replace(os.sep, '/')
+            if relpath != MANIFEST_NAME and relpath not in keep:
+                os.remove(os.path.join(root, name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fingerprint and precompress static assets')
+    parser.add_argument('--static-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='static directory to build (default: ./static)')
+    args = parser.parse_args()
+    if not os.path.isdir(args.static_dir):
+        print(f"ERROR: {args.static_dir} is not a directory")
+        sys.exit(1)
+    if brotli is None:
+        logger.warning("brotli is not installed; writing .gz variants only")
+    build(args.static_dir)
+
+
+if __name__ == "__main__":
+    main()
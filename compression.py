@@ -0,0 +1,150 @@
+"""
+Gzip/Brotli compression of dynamic responses.
+
+nginx only compresses what it serves itself, so the HTML and JSON that Flask
+renders reach phones on a cellular link uncompressed.  ``Compressor.after_request``
+encodes a response when:
+
+* the client accepts ``br`` (with the optional brotli package) or ``gzip``,
+* the mimetype is in the allowlist and the body at least ``min_size`` bytes,
+* the response is a complete 2xx body - streamed responses (the SSE stream),
+  files sent with ``send_file`` and responses already carrying a
+  ``Content-Encoding`` (the precompressed static build) are left alone.
+
+Routes can override the defaults with the ``compression`` decorator.
+
+Encoding the same page over and over would cost the CPU the render cache
+saves, so the encoded bodies of responses with a strong ETag (the cached
+pages) are kept by ETag and encoding, and reused.  A compressed response's
+ETag becomes weak, which still matches the client's copy in If-None-Match.
+"""
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/javascript',
+                     'application/json', 'application/javascript', 'image/svg+xml')
+
+
+def compression(enabled: bool = True, min_size: Optional[int] = None) -> Callable:
+    """Decorator overriding the compression settings of one route."""
+    def decorator(f):
+        f.compression = {'enabled': enabled, 'min_size': min_size}
+        return f
+    return decorator
+
+
+class Compressor:
+    """Compresses eligible Flask responses for clients that accept it."""
+
+    def __init__(self, min_size: int = 1024, mimetypes: Iterable[str] = DEFAULT_MIMETYPES,
+                 gzip_level: int = 6, brotli_quality: int = 4, variant_cache_size: int = 64):
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        self.variant_cache_size = variant_cache_size
+        self._variants: 'OrderedDict[Tuple[str, str], bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.variant_hits = 0
+
+    def after_request(self, response):
+        """Compress response if it is eligible; register with app.after_request."""
+        options = self._route_options()
+        if not options.get('enabled', True) or not self._eligible(response):
+            return response
+        min_size = options.get('min_size')
+        body = response.get_data()
+        if len(body) < (self.min_size if min_size is None else min_size):
+            return response
+        # Caches must keep the encodings apart even for clients that get the plain body
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, encoding) if etag and not weak else None
+        encoded = self._cached_variant(key)
+        if encoded is None:
+            encoded = self.encode(body, encoding)
+            if len(encoded) >= len(body):
+                return response
+            self._store_variant(key, encoded)
+
+        response.set_data(encoded)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            # Same content, different bytes: only a weak validator still fits both encodings
+            response.set_etag(etag, weak=True)
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += len(body)
+            self.bytes_out += len(encoded)
+        return response
+
+    def encode(self, body: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'encodings': list(self.encodings),
+                'min_size': self.min_size,
+                'compressed': self.compressed,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+                'cached_variants': len(self._variants),
+                'variant_hits': self.variant_hits
+            }
+
+    def _route_options(self) -> Dict[str, Any]:
+        view = current_app.view_functions.get(request.endpoint) if request.endpoint else None
+        return getattr(view, 'compression', {})
+
+    def _eligible(self, response) -> bool:
+        if response.direct_passthrough or response.is_streamed:
+            return False
+        if not 200 <= response.status_code < 300 or response.status_code in (204, 206):
+            return False
+        if 'Content-Encoding' in response.headers or response.mimetype not in self.mimetypes:
+            return False
+        return 'no-transform' not in response.headers.get('Cache-Control', '')
+
+    def _cached_variant(self, key) -> Optional[bytes]:
+        if key is None:
+            return None
+        with self._lock:
+            encoded = self._variants.get(key)
+            if encoded is not None:
+                self._variants.move_to_end(key)
+                self.variant_hits += 1
+            return encoded
+
+    def _store_variant(self, key, encoded: bytes):
+        if key is None or self.variant_cache_size <= 0:
+            return
+        with self._lock:
+            self._variants[key] = encoded
+            if len(self._variants) > self.variant_cache_size:
+                self._variants.popitem(last=False)
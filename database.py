@@ -2,7 +2,9 @@
 Database module for secure MySQL connectivity and user management.
 """
 import hashlib
+import json
 import os
+import time
 import pymysql
 import logging
 from typing import Optional, Dict, Any
@@ -18,6 +20,9 @@ logger = logging.getLogger(__name__)
 class DatabaseManager:
     """Manages secure MySQL database connections and user operations."""
     
+    # Called with the username once a user was created, updated, deactivated or deleted
+    _user_listeners = ()
+    
     def __init__(self):
         """Initialize database manager with secure connection parameters."""
         self.connection_params = self._get_connection_params()
@@ -84,6 +89,8 @@ class DatabaseManager:
                             email VARCHAR(255),
                             phone VARCHAR(50),
                             sms_notifications_enabled BOOLEAN DEFAULT FALSE,
+                            open_alert_minutes INT NULL,
+                            open_alert_repeat_minutes INT NULL,
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                             is_active BOOLEAN DEFAULT TRUE,
@@ -94,6 +101,83 @@ class DatabaseManager:
                     # Bring existing tables up to the latest schema
                     self._apply_schema_migrations(cursor)
 
+                    # Leadership leases shared by all app processes (see leader.py)
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS leader_leases (
+                            name VARCHAR(64) PRIMARY KEY,
+                            holder VARCHAR(255) NOT NULL,
+                            acquired_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+                            renewed_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+                            expires_at TIMESTAMP(6) NOT NULL
+                        )
+                    """)
+
+                    # Doors and the Automation HAT channels they are wired to
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS doors (
+                            id INT AUTO_INCREMENT PRIMARY KEY,
+                            name VARCHAR(100) NOT NULL,
+                            input_channel VARCHAR(10) NOT NULL UNIQUE,
+                            relay_channel VARCHAR(10) NOT NULL,
+                            is_active BOOLEAN DEFAULT TRUE,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
+                    # Single-door installs are wired to input one and relay one
+                    cursor.execute(
+                        "INSERT IGNORE INTO doors (id, name, input_channel, relay_channel) VALUES (1, %s, 'one', 'one')",
+                        ('Garage Door',)
+                    )
+
+                    # Notifications that could not be delivered after all retries (see notifications.py)
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS notification_dead_letters (
+                            id INT AUTO_INCREMENT PRIMARY KEY,
+                            channel VARCHAR(20) NOT NULL,
+                            provider VARCHAR(50) NOT NULL,
+                            username VARCHAR(255),
+                            recipient VARCHAR(255) NOT NULL,
+                            body TEXT NOT NULL,
+                            attempts INT NOT NULL,
+                            last_error TEXT,
+                            event JSON,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    """)
+
+                    # Outbound webhooks and their durable delivery queue (see webhooks.py)
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS webhooks (
+                            id INT AUTO_INCREMENT PRIMARY KEY,
+                            username VARCHAR(255) NOT NULL,
+                            url VARCHAR(2048) NOT NULL,
+                            secret VARCHAR(255) NOT NULL,
+                            max_concurrency INT NOT NULL DEFAULT 2,
+                            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+                            disabled_reason TEXT,
+                            consecutive_failures INT NOT NULL DEFAULT 0,
+                            last_status INT,
+                            last_delivery_at TIMESTAMP NULL,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            INDEX idx_webhooks_username (username)
+                        )
+                    """)
+                    cursor.execute("""
+                        CREATE TABLE IF NOT EXISTS webhook_deliveries (
+                            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                            webhook_id INT NOT NULL,
+                            event_type VARCHAR(50) NOT NULL,
+                            payload JSON NOT NULL,
+                            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                            attempts INT NOT NULL DEFAULT 0,
+                            next_attempt_at DOUBLE NOT NULL,
+                            last_error TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                            INDEX idx_webhook_deliveries_due (status, next_attempt_at),
+                            FOREIGN KEY (webhook_id) REFERENCES webhooks(id) ON DELETE CASCADE
+                        )
+                    """)
+
                     # Check if admin user exists
                     default_username = os.getenv('ADMIN_USERNAME', 'admin')
                     cursor.execute("SELECT COUNT(*) as count FROM users WHERE username = %s", (default_username,))
@@ -124,6 +208,8 @@ class DatabaseManager:
             ('email', "ALTER TABLE users ADD COLUMN email VARCHAR(255) AFTER last_name"),
             ('phone', "ALTER TABLE users ADD COLUMN phone VARCHAR(50) AFTER email"),
             ('sms_notifications_enabled', "ALTER TABLE users ADD COLUMN sms_notifications_enabled BOOLEAN DEFAULT FALSE AFTER phone"),
+            ('open_alert_minutes', "ALTER TABLE users ADD COLUMN open_alert_minutes INT NULL AFTER sms_notifications_enabled"),
+            ('open_alert_repeat_minutes', "ALTER TABLE users ADD COLUMN open_alert_repeat_minutes INT NULL AFTER open_alert_minutes"),
             ('created_at', "ALTER TABLE users ADD COLUMN created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
             ('updated_at', "ALTER TABLE users ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
             ('is_active', "ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT TRUE"),
@@ -180,7 +266,7 @@ class DatabaseManager:
             with self.get_connection() as connection:
                 with connection.cursor() as cursor:
                     cursor.execute(
-                        "SELECT id, username, password_hash, role, first_name, last_name, email, phone, sms_notifications_enabled, is_active, api_key_hash FROM users WHERE username = %s AND is_active = TRUE",
+                        "SELECT id, username, password_hash, role, first_name, last_name, email, phone, sms_notifications_enabled, open_alert_minutes, open_alert_repeat_minutes, is_active, api_key_hash FROM users WHERE username = %s AND is_active = TRUE",
                         (username,)
                     )
                     return cursor.fetchone()
@@ -210,7 +296,8 @@ class DatabaseManager:
                         (username, password_hash, role)
                     )
                     logger.info(f"User '{username}' created successfully with role '{role}'")
-                    return True
+            self._user_changed(username)
+            return True
         except pymysql.IntegrityError:
             logger.warning(f"User '{username}' already exists")
             return False
@@ -255,16 +342,38 @@ class DatabaseManager:
                            WHERE username = %s AND is_active = TRUE""",
                         (first_name, last_name, email, phone, sms_notifications_enabled, username)
                     )
-                    if cursor.rowcount > 0:
-                        logger.info(f"Profile updated for user '{username}'")
-                        return True
-                    else:
-                        logger.warning(f"User '{username}' not found or inactive")
-                        return False
+                    updated = cursor.rowcount > 0
+            if not updated:
+                logger.warning(f"User '{username}' not found or inactive")
+                return False
+            logger.info(f"Profile updated for user '{username}'")
+            self._user_changed(username)
+            return True
         except Exception as e:
             logger.error(f"Failed to update profile for user {username}: {str(e)}")
             return False
     
+    def update_open_alerts(self, username: str, minutes: Optional[int] = None,
+                           repeat_minutes: Optional[int] = None) -> bool:
+        """Set after how many minutes (and how often after that) the user is told a door was left open; None turns it off."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """UPDATE users SET open_alert_minutes = %s, open_alert_repeat_minutes = %s,
+                           updated_at = CURRENT_TIMESTAMP WHERE username = %s AND is_active = TRUE""",
+                        (minutes, repeat_minutes, username)
+                    )
+                    updated = cursor.rowcount > 0
+            if not updated:
+                logger.warning(f"User '{username}' not found or inactive")
+                return False
+            self._user_changed(username)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to update open door alerts for user {username}: {str(e)}")
+            return False
+
     def deactivate_user(self, username: str) -> bool:
         """Deactivate a user account."""
         try:
@@ -274,12 +383,13 @@ class DatabaseManager:
                         "UPDATE users SET is_active = FALSE, updated_at = CURRENT_TIMESTAMP WHERE username = %s",
                         (username,)
                     )
-                    if cursor.rowcount > 0:
-                        logger.info(f"User '{username}' deactivated")
-                        return True
-                    else:
-                        logger.warning(f"User '{username}' not found")
-                        return False
+                    deactivated = cursor.rowcount > 0
+            if not deactivated:
+                logger.warning(f"User '{username}' not found")
+                return False
+            logger.info(f"User '{username}' deactivated")
+            self._user_changed(username)
+            return True
         except Exception as e:
             logger.error(f"Failed to deactivate user {username}: {str(e)}")
             return False
@@ -317,12 +427,13 @@ class DatabaseManager:
                         "DELETE FROM users WHERE username = %s",
                         (username,)
                     )
-                    if cursor.rowcount > 0:
-                        logger.info(f"User '{username}' deleted")
-                        return True
-                    else:
-                        logger.warning(f"User '{username}' not found")
-                        return False
+                    deleted = cursor.rowcount > 0
+            if not deleted:
+                logger.warning(f"User '{username}' not found")
+                return False
+            logger.info(f"User '{username}' deleted")
+            self._user_changed(username)
+            return True
         except Exception as e:
             logger.error(f"Failed to delete user {username}: {str(e)}")
             return False
@@ -345,4 +456,344 @@ class DatabaseManager:
                         return False
         except Exception as e:
             logger.error(f"Failed to update password for user {username}: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def acquire_lease(self, name: str, holder: str, ttl_seconds: float) -> Optional[bool]:
+        """Acquire or renew a named lease. Returns None if the database could not be reached."""
+        ttl_us = int(ttl_seconds * 1_000_000)
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    # Renew our own lease or take over an expired one.  All times
+                    # come from the database clock so hosts never compare clocks.
+                    # acquired_at is assigned before holder because MySQL evaluates
+                    # SET clauses left to right.
+                    cursor.execute(
+                        """UPDATE leader_leases SET
+                           acquired_at = IF(holder = %s, acquired_at, NOW(6)),
+                           holder = %s,
+                           renewed_at = NOW(6),
+                           expires_at = NOW(6) + INTERVAL %s MICROSECOND
+                           WHERE name = %s AND (holder = %s OR expires_at < NOW(6))""",
+                        (holder, holder, ttl_us, name, holder)
+                    )
+                    if cursor.rowcount > 0:
+                        return True
+
+                    # No row yet: the first process to insert it wins
+                    cursor.execute(
+                        """INSERT IGNORE INTO leader_leases (name, holder, acquired_at, renewed_at, expires_at)
+                           VALUES (%s, %s, NOW(6), NOW(6), NOW(6) + INTERVAL %s MICROSECOND)""",
+                        (name, holder, ttl_us)
+                    )
+                    return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Failed to acquire lease '{name}': {str(e)}")
+            return None
+
+    def release_lease(self, name: str, holder: str) -> bool:
+        """Release a named lease if it is held by the given holder."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "DELETE FROM leader_leases WHERE name = %s AND holder = %s",
+                        (name, holder)
+                    )
+                    if cursor.rowcount > 0:
+                        logger.info(f"Lease '{name}' released by '{holder}'")
+                        return True
+                    return False
+        except Exception as e:
+            logger.error(f"Failed to release lease '{name}': {str(e)}")
+            return False
+
+    def get_lease(self, name: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the current holder of a named lease, with ages measured on the database clock."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """SELECT name, holder, acquired_at, renewed_at, expires_at,
+                           TIMESTAMPDIFF(MICROSECOND, acquired_at, NOW(6)) / 1000000 AS lease_age_seconds,
+                           TIMESTAMPDIFF(MICROSECOND, NOW(6), expires_at) / 1000000 AS expires_in_seconds
+                           FROM leader_leases WHERE name = %s""",
+                        (name,)
+                    )
+                    return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Failed to retrieve lease '{name}': {str(e)}")
+            return None
+
+    def get_doors(self) -> list:
+        """Retrieve all active doors with their input and relay channels, ordered by id."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """SELECT id, name, input_channel, relay_channel FROM doors
+                           WHERE is_active = TRUE ORDER BY id"""
+                    )
+                    return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to retrieve doors: {str(e)}")
+            return []
+
+    def create_door(self, name: str, input_channel: str, relay_channel: str) -> Optional[int]:
+        """Create a door wired to the given channels. Returns the new door id."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO doors (name, input_channel, relay_channel) VALUES (%s, %s, %s)",
+                        (name, input_channel, relay_channel)
+                    )
+                    logger.info(f"Door '{name}' created on input {input_channel}, relay {relay_channel}")
+                    return cursor.lastrowid
+        except pymysql.IntegrityError:
+            logger.warning(f"Input channel '{input_channel}' is already assigned to a door")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to create door '{name}': {str(e)}")
+            return None
+
+    def deactivate_door(self, door_id: int) -> bool:
+        """Stop polling and controlling a door without deleting it."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("UPDATE doors SET is_active = FALSE WHERE id = %s", (door_id,))
+                    if cursor.rowcount > 0:
+                        logger.info(f"Door {door_id} deactivated")
+                        return True
+                    return False
+        except Exception as e:
+            logger.error(f"Failed to deactivate door {door_id}: {str(e)}")
+            return False
+
+    def subscribe_user_changes(self, listener):
+        """Call listener(username) after a user is created, updated, deactivated or deleted."""
+        self._user_listeners = (*self._user_listeners, listener)
+
+    def _user_changed(self, username: str):
+        for listener in self._user_listeners:
+            try:
+                listener(username)
+            except Exception as e:
+                logger.error(f"User change listener failed for '{username}': {str(e)}")
+
+    def get_sms_recipients(self, username: str = None) -> list:
+        """Retrieve the active users who opted in to SMS notifications and have a phone number (optionally one user).
+
+        Database errors are raised rather than returned as an empty list, so the recipient index keeps its entries.
+        """
+        query = """SELECT username, phone, open_alert_minutes, open_alert_repeat_minutes FROM users
+                   WHERE sms_notifications_enabled = TRUE AND is_active = TRUE
+                   AND phone IS NOT NULL AND phone != ''"""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    if username is None:
+                        cursor.execute(query)
+                    else:
+                        cursor.execute(query + " AND username = %s", (username,))
+                    return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to retrieve SMS recipients: {str(e)}")
+            raise
+
+    def add_dead_letter(self, channel: str, provider: str, username: Optional[str], recipient: str, body: str,
+                        attempts: int, last_error: Optional[str], event: Optional[Dict[str, Any]] = None) -> bool:
+        """Record a notification that could not be delivered."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """INSERT INTO notification_dead_letters
+                           (channel, provider, username, recipient, body, attempts, last_error, event)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                        (channel, provider, username, recipient, body, attempts, last_error,
+                         json.dumps(event) if event is not None else None)
+                    )
+                    return True
+        except Exception as e:
+            logger.error(f"Failed to record undelivered notification for {recipient}: {str(e)}")
+            return False
+
+    def get_dead_letters(self, limit: int = 50) -> list:
+        """Retrieve the most recent undelivered notifications (admin function)."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """SELECT id, channel, provider, username, recipient, body, attempts, last_error, created_at
+                           FROM notification_dead_letters ORDER BY id DESC LIMIT %s""",
+                        (limit,)
+                    )
+                    return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to retrieve undelivered notifications: {str(e)}")
+            return []
+
+    def create_webhook(self, username: str, url: str, secret: str, max_concurrency: int = 2) -> Optional[int]:
+        """Register a webhook endpoint for a user; returns its id."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO webhooks (username, url, secret, max_concurrency) VALUES (%s, %s, %s, %s)",
+                        (username, url, secret, max_concurrency)
+                    )
+                    logger.info(f"Webhook {cursor.lastrowid} created for user '{username}'")
+                    return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"Failed to create webhook for user {username}: {str(e)}")
+            return None
+
+    def get_webhooks(self, username: str = None) -> list:
+        """Retrieve the webhooks of one user, or of everyone (admin function); secrets are not included."""
+        query = """SELECT id, username, url, max_concurrency, enabled, disabled_reason, consecutive_failures,
+                          last_status, last_delivery_at, created_at FROM webhooks"""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    if username is None:
+                        cursor.execute(query + " ORDER BY id")
+                    else:
+                        cursor.execute(query + " WHERE username = %s ORDER BY id", (username,))
+                    return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to retrieve webhooks: {str(e)}")
+            return []
+
+    def delete_webhook(self, webhook_id: int, username: str = None) -> bool:
+        """Delete a webhook and its queued deliveries (only if owned by username, when given)."""
+        query = "DELETE FROM webhooks WHERE id = %s"
+        params = (webhook_id,)
+        if username is not None:
+            query += " AND username = %s"
+            params += (username,)
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(query, params)
+                    return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Failed to delete webhook {webhook_id}: {str(e)}")
+            return False
+
+    def set_webhook_enabled(self, webhook_id: int, enabled: bool, reason: str = None, username: str = None) -> bool:
+        """Enable (resetting its failure count) or disable a webhook (only if owned by username, when given)."""
+        query = """UPDATE webhooks SET enabled = %s, disabled_reason = %s,
+                   consecutive_failures = IF(%s, 0, consecutive_failures) WHERE id = %s"""
+        params = (enabled, None if enabled else reason, enabled, webhook_id)
+        if username is not None:
+            query += " AND username = %s"
+            params += (username,)
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(query, params)
+                    return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Failed to update webhook {webhook_id}: {str(e)}")
+            return False
+
+    def enqueue_webhook_deliveries(self, event_type: str, payload: Dict[str, Any]) -> int:
+        """Queue a delivery of an event to every enabled webhook of an active user; returns how many."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """INSERT INTO webhook_deliveries (webhook_id, event_type, payload, next_attempt_at)
+                           SELECT w.id, %s, %s, %s FROM webhooks w
+                           JOIN users u ON u.username = w.username AND u.is_active = TRUE
+                           WHERE w.enabled = TRUE""",
+                        (event_type, json.dumps(payload), time.time())
+                    )
+                    return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Failed to queue webhook deliveries: {str(e)}")
+            return 0
+
+    def get_due_webhook_deliveries(self, limit: int = 100, exclude_webhooks: Optional[list] = None) -> list:
+        """Retrieve the oldest pending deliveries whose next attempt is due, with their endpoint.
+
+        Deliveries to the endpoints in exclude_webhooks (those with no free slot) are left out.
+        """
+        try:
+            exclude = list(exclude_webhooks or [])
+            excluded = f"AND d.webhook_id NOT IN ({', '.join(['%s'] * len(exclude))})" if exclude else ""
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"""SELECT d.id, d.webhook_id, d.event_type, d.payload, d.attempts,
+                                  w.url, w.secret, w.max_concurrency
+                           FROM webhook_deliveries d JOIN webhooks w ON w.id = d.webhook_id
+                           WHERE d.status = 'pending' AND d.next_attempt_at <= %s AND w.enabled = TRUE
+                           {excluded}
+                           ORDER BY d.id LIMIT %s""",
+                        (time.time(), *exclude, limit)
+                    )
+                    return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to retrieve due webhook deliveries: {str(e)}")
+            return []
+
+    def complete_webhook_delivery(self, delivery_id: int, webhook_id: int, status: int) -> bool:
+        """Remove a delivered event from the queue and reset its endpoint's failure count."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute("DELETE FROM webhook_deliveries WHERE id = %s", (delivery_id,))
+                    cursor.execute(
+                        """UPDATE webhooks SET consecutive_failures = 0, last_status = %s,
+                           last_delivery_at = CURRENT_TIMESTAMP WHERE id = %s""",
+                        (status, webhook_id)
+                    )
+                    return True
+        except Exception as e:
+            logger.error(f"Failed to complete webhook delivery {delivery_id}: {str(e)}")
+            return False
+
+    def fail_webhook_delivery(self, delivery_id: int, webhook_id: int, attempts: int,
+                              next_attempt_at: Optional[float], error: str, status: Optional[int] = None) -> int:
+        """Record a failed attempt: retry at next_attempt_at, or give up if it is None.
+
+        Returns the endpoint's consecutive failures (0 if they could not be recorded).
+        """
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """UPDATE webhook_deliveries SET attempts = %s, status = %s,
+                           next_attempt_at = COALESCE(%s, next_attempt_at), last_error = %s WHERE id = %s""",
+                        (attempts, 'pending' if next_attempt_at is not None else 'failed', next_attempt_at,
+                         error[:1000], delivery_id)
+                    )
+                    cursor.execute(
+                        """UPDATE webhooks SET consecutive_failures = consecutive_failures + 1, last_status = %s,
+                           last_delivery_at = CURRENT_TIMESTAMP WHERE id = %s""",
+                        (status, webhook_id)
+                    )
+                    cursor.execute("SELECT consecutive_failures FROM webhooks WHERE id = %s", (webhook_id,))
+                    row = cursor.fetchone()
+                    return row['consecutive_failures'] if row else 0
+        except Exception as e:
+            logger.error(f"Failed to record webhook delivery failure {delivery_id}: {str(e)}")
+            return 0
+
+    def get_failed_webhook_deliveries(self, limit: int = 50) -> list:
+        """Retrieve the most recent deliveries that ran out of attempts (admin function)."""
+        try:
+            with self.get_connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """SELECT id, webhook_id, event_type, attempts, last_error, created_at
+                           FROM webhook_deliveries WHERE status = 'failed' ORDER BY id DESC LIMIT %s""",
+                        (limit,)
+                    )
+                    return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to retrieve failed webhook deliveries: {str(e)}")
+            return []
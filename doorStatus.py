@@ -1,4 +1,8 @@
 #!/usr/bin/env python3
+# Usage: doorStatus.py [CHANNEL ...]
+# Without arguments reads input one and prints "Door Closed" or "Door Opened".
+# With input channel names (one, two, three) reads all of them in one pass and
+# prints one "<channel>: Door Closed|Door Opened" line per channel.
 import sys
 import os
 if os.name == 'nt':
@@ -7,17 +11,31 @@ if os.name == 'nt':
     
 import automationhat
 
+INPUT_CHANNELS = ('one', 'two', 'three')
+
+def read_door(channel):
+    """Return the door state text for an input channel."""
+    return "Door Closed" if getattr(automationhat.input, channel).read() > 0 else "Door Opened"
+
+channels = sys.argv[1:]
+unknown = [channel for channel in channels if channel not in INPUT_CHANNELS]
+if unknown:
+    print(f'Unknown input channel(s): {", ".join(unknown)}', file=sys.stderr)
+    sys.exit(2)
+
 # First, check if the Automation HAT is connected to the Raspberry Pi.
 try:
     if automationhat.is_automation_hat():
-        try:
-            input_one_state = automationhat.input.one.read()
-            if input_one_state > 0:
-                print("Door Closed")
-            else:
-                print("Door Opened")
-        except Exception as e:
-            print(f'Failed to read door sensor input: {e}', file=sys.stderr)
+        if not channels:
+            try:
+                print(read_door('one'))
+            except Exception as e:
+                print(f'Failed to read door sensor input: {e}', file=sys.stderr)
+        for channel in channels:
+            try:
+                print(f"{channel}: {read_door(channel)}")
+            except Exception as e:
+                print(f'Failed to read door sensor input {channel}: {e}', file=sys.stderr)
     else:
         print('Automation HAT not found.', file=sys.stderr)
 except Exception as e:
@@ -0,0 +1,113 @@
+"""
+Sequenced door event log with a bounded replay buffer.
+
+Every door update gets a server-assigned, monotonically increasing sequence
+number and a server timestamp.  The most recent events are kept in a ring
+buffer so a client that reconnects after a network blip can send the last
+sequence number it saw and receive just the events it missed.  When the gap
+is larger than the buffer, or the client's sequence belongs to an earlier
+run of the server (a different ``epoch``), it gets a full snapshot instead.
+
+Besides door ``transition`` events the log carries relay ``actuation``
+results, which the Server-Sent Events stream forwards; Socket.IO clients only
+receive transitions.
+"""
+import logging
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRANSITION = 'transition'
+ACTUATION = 'actuation'
+SNAPSHOT = 'snapshot'
+
+
+class DoorEventLog:
+    """Assigns sequence numbers to door events and retains the latest ones for replay."""
+
+    def __init__(self, capacity: int = 256):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        # Identifies this run of the server; sequence numbers restart with it
+        self.epoch = secrets.token_hex(4)
+        self._events = deque(maxlen=capacity)
+        self._seq = 0
+        self._states: Dict[Any, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def append(self, event_type: str, data: Dict[str, Any], timestamp: Optional[float] = None) -> Dict[str, Any]:
+        """Record an event and return it with its sequence number, epoch and server timestamp."""
+        with self._condition:
+            self._seq += 1
+            event = {
+                'type': event_type,
+                'seq': self._seq,
+                'epoch': self.epoch,
+                'timestamp': timestamp or time.time(),
+                **data,
+            }
+            self._events.append(event)
+            if event_type == TRANSITION:
+                self._states[event.get('door_id')] = event
+            self._condition.notify_all()
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Door event listener failed for event {event['seq']}: {str(e)}")
+        return event
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        """Call listener(event) after every append, outside the log's lock. Its errors are logged, not raised."""
+        self._listeners.append(listener)
+
+    def snapshot(self, door_id: Any) -> Optional[Dict[str, Any]]:
+        """Return the current state of a door as a snapshot event, or None before its first reading."""
+        with self._condition:
+            state = self._states.get(door_id)
+            return {**state, 'type': SNAPSHOT, 'oldStatus': None, 'oldState': None} if state else None
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Return snapshot events for every door with a reading, in order of their last change."""
+        with self._condition:
+            states = sorted(self._states.values(), key=lambda event: event['seq'])
+            return [{**state, 'type': SNAPSHOT, 'oldStatus': None, 'oldState': None} for state in states]
+
+    def clear_states(self):
+        """Forget every door's state, keeping the sequence and the replay buffer.
+
+        For a process that stops polling the doors: its last readings would go
+        stale, and without them readers fall back to the shared segment.
+        """
+        with self._condition:
+            self._states.clear()
+
+    def since(self, last_seq: Optional[int], epoch: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Return the events after last_seq, or None if they cannot be replayed and a snapshot is needed."""
+        with self._condition:
+            return self._since(last_seq, epoch)
+
+    def wait_for_events(self, last_seq: int, timeout: float) -> Optional[List[Dict[str, Any]]]:
+        """Block until there are events after last_seq (of this epoch) or the timeout passes, then return them."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > last_seq, timeout)
+            return self._since(last_seq, self.epoch)
+
+    def _since(self, last_seq, epoch):
+        if last_seq is None or epoch != self.epoch or last_seq > self._seq:
+            return None
+        if last_seq == self._seq:
+            return []
+        # The buffer must still hold the event right after last_seq
+        if not self._events or self._events[0]['seq'] > last_seq + 1:
+            return None
+        return [event for event in self._events if event['seq'] > last_seq]
@@ -0,0 +1,181 @@
+"""
+Per-door state machine inferring door motion from sensor readings and relay
+actuations.
+
+Each door has a single reed switch at the closed position, so the sensor only
+tells ``closed`` from "not closed".  The machine combines it with relay
+actuations and the learned travel time of the door to add the states in
+between:
+
+    closed --actuation--> opening --travel time--> open
+    open   --actuation--> closing --sensor closed--> closed
+
+A door that is opened by a wall button or remote (the sensor leaves
+``closed`` without an actuation) goes through ``opening`` as well.  A door
+that does not leave ``closed`` after an opening actuation, or does not reach
+``closed`` after a closing one, within the expected travel time plus a
+margin becomes ``stuck``, with a ``stuck_reason``.
+
+Travel times are learned from actuation-to-closed intervals with an
+exponentially weighted mean and variance.  Without a sensor at the open
+position the opening time is assumed to equal the closing time.
+"""
+import math
+import threading
+from typing import Any, Dict, Optional
+
+UNKNOWN = 'unknown'
+CLOSED = 'closed'
+OPEN = 'open'
+OPENING = 'opening'
+CLOSING = 'closing'
+STUCK = 'stuck'
+
+STATES = (UNKNOWN, CLOSED, OPEN, OPENING, CLOSING, STUCK)
+MOVING_STATES = (OPENING, CLOSING)
+
+DID_NOT_OPEN = 'did_not_open'
+DID_NOT_CLOSE = 'did_not_close'
+
+
+class TravelTimeStats:
+    """Exponentially weighted mean and variance of a door's observed travel times."""
+
+    def __init__(self, initial: float, alpha: float = 0.2):
+        self.alpha = alpha
+        self.mean = initial
+        # Until there are samples, allow a quarter of the default either way
+        self.variance = (initial / 4) ** 2
+        self.samples = 0
+
+    @property
+    def stddev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def add(self, seconds: float):
+        """Fold an observed travel time into the statistics."""
+        if self.samples == 0:
+            self.mean = seconds
+        else:
+            delta = seconds - self.mean
+            increment = self.alpha * delta
+            self.mean += increment
+            self.variance = (1 - self.alpha) * (self.variance + delta * increment)
+        self.samples += 1
+
+    def timeout(self, margin: float) -> float:
+        """Seconds after which a door still travelling is considered stuck."""
+        return self.mean + 3 * self.stddev + margin
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'mean_seconds': round(self.mean, 2),
+            'stddev_seconds': round(self.stddev, 2),
+            'samples': self.samples,
+        }
+
+
+class DoorStateMachine:
+    """Tracks one door's state from its sensor readings and relay actuations."""
+
+    def __init__(self, travel_time: float = 15.0, margin: float = 5.0):
+        self.travel = TravelTimeStats(travel_time)
+        self.margin = margin
+        # Actuations arrive from request threads, readings from the poller
+        self._lock = threading.RLock()
+        # Timestamp of the latest actuation applied, kept across resets so none is applied twice
+        self.last_actuation: Optional[float] = None
+        self.reset()
+
+    def reset(self):
+        """Forget the current state (keeping the learned travel times)."""
+        with self._lock:
+            self.state = UNKNOWN
+            self.sensor: Optional[str] = None
+            self.stuck_reason: Optional[str] = None
+            self.observed_at: Optional[float] = None
+            # When the current motion started: the actuation, or the earliest time the sensor could have left closed
+            self.motion_started_at: Optional[float] = None
+            self.actuated_at: Optional[float] = None
+
+    @property
+    def moving(self) -> bool:
+        return self.state in MOVING_STATES
+
+    def actuate(self, timestamp: float) -> str:
+        """Apply a successful relay pulse; actuations already seen (by timestamp) are ignored."""
+        with self._lock:
+            if self.last_actuation is not None and timestamp <= self.last_actuation:
+                return self.state
+            self.last_actuation = timestamp
+
+            if self.moving:
+                # Openers stop on a press while travelling: the door rests wherever it is
+                self._enter(CLOSED if self.sensor == CLOSED else OPEN)
+            elif self.sensor == CLOSED:
+                self._enter(OPENING, motion_started_at=timestamp)
+                self.actuated_at = timestamp
+            elif self.sensor == OPEN:
+                self._enter(CLOSING, motion_started_at=timestamp)
+                self.actuated_at = timestamp
+            return self.state
+
+    def observe(self, sensor: str, timestamp: float) -> str:
+        """Apply a sensor reading ('closed', 'open' or 'unknown') taken at timestamp and return the state."""
+        with self._lock:
+            previous_sensor, previous_observation = self.sensor, self.observed_at
+            self.sensor, self.observed_at = sensor, timestamp
+
+            if sensor not in (CLOSED, OPEN):
+                self._enter(UNKNOWN)
+            elif sensor == CLOSED:
+                self._observe_closed(timestamp)
+            elif previous_sensor == CLOSED and self.state != OPENING:
+                # Opened without an actuation we know of (wall button, remote): it left closed since the last reading
+                self._enter(OPENING, motion_started_at=previous_observation or timestamp)
+                self._observe_open(timestamp)
+            else:
+                self._observe_open(timestamp)
+            return self.state
+
+    def _observe_closed(self, timestamp: float):
+        if self.state == OPENING and self.actuated_at is not None:
+            # Still waiting for the door to leave closed after an opening actuation
+            if timestamp - self.actuated_at > self.travel.timeout(self.margin):
+                self._enter(STUCK, reason=DID_NOT_OPEN)
+            return
+        if self.state == STUCK and self.stuck_reason == DID_NOT_OPEN:
+            return
+        if self.state == CLOSING and self.actuated_at is not None:
+            elapsed = timestamp - self.actuated_at
+            if elapsed <= self.travel.timeout(self.margin):
+                self.travel.add(elapsed)
+        self._enter(CLOSED)
+
+    def _observe_open(self, timestamp: float):
+        if self.state == OPENING:
+            if timestamp - self.motion_started_at >= self.travel.mean:
+                self._enter(OPEN)
+        elif self.state == CLOSING:
+            if timestamp - self.motion_started_at > self.travel.timeout(self.margin):
+                self._enter(STUCK, reason=DID_NOT_CLOSE)
+        elif self.state == STUCK and self.stuck_reason == DID_NOT_CLOSE:
+            pass
+        else:
+            self._enter(OPEN)
+
+    def _enter(self, state: str, motion_started_at: Optional[float] = None, reason: Optional[str] = None):
+        self.state = state
+        self.stuck_reason = reason
+        self.motion_started_at = motion_started_at
+        if state not in MOVING_STATES:
+            self.actuated_at = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'sensor': self.sensor,
+                'stuck_reason': self.stuck_reason,
+                'travel_time': self.travel.to_dict(),
+            }
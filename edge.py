@@ -0,0 +1,416 @@
+"""
+Edge agent and central aggregation for multi-site deployments.
+
+Each site's app (the edge) pushes its sequenced door events (door_events.py)
+to one central instance, which holds the state of every site and serves a
+combined dashboard.
+
+Edge side:
+
+* ``EventSpool`` is a durable FIFO in a local SQLite file.  The process
+  running the sender (the leader) appends its door events, so nothing is
+  lost while the central instance or the uplink is down, and the spool
+  survives restarts.  Actuations handled by other workers reach the leader's
+  event log through the shared door state, so each event is spooled once.
+  It is capped at ``max_events``; the oldest events are dropped beyond that.
+* ``EdgeAgent`` runs in the leader.  It drains the spool in batches over one
+  persistent (keep-alive) outbound HTTP connection, gzip-compressing each
+  batch, and deletes events only once the central instance acknowledged
+  them.  Failures back off exponentially with jitter.  Every
+  ``snapshot_interval`` it also sends the current door snapshots, so a
+  restarted central instance recovers every site's state without waiting
+  for the next transition.
+
+Central side:
+
+* ``create_ingest_blueprint`` serves ``POST /api/edge/ingest``, authenticated
+  with a shared bearer token, and feeds a ``SiteRegistry``.
+* ``SiteRegistry`` keeps each site's doors and recent events in memory.
+  Delivery is at-least-once, so events at or below the highest sequence
+  already applied for their ``epoch`` are ignored.
+"""
+import gzip
+import hmac
+import http.client
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from flask import Blueprint, jsonify, request
+
+from door_events import SNAPSHOT, TRANSITION
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INGEST_PATH = '/api/edge/ingest'
+
+
+class EventSpool:
+    """Durable FIFO of events awaiting delivery, in a local SQLite file shared by the app's processes."""
+
+    def __init__(self, path: str, max_events: int = 100000):
+        if max_events < 1:
+            raise ValueError('max_events must be at least 1')
+        self.path = path
+        self.max_events = max_events
+        self.dropped = 0
+        self._lock = threading.Lock()
+        # Autocommit; writers from other worker processes wait on SQLite's lock
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                body TEXT NOT NULL
+            )
+        ''')
+
+    def put(self, event: Dict[str, Any]):
+        """Append an event, dropping the oldest ones beyond max_events."""
+        with self._lock:
+            cursor = self._conn.execute('INSERT INTO events (body) VALUES (?)', (json.dumps(event),))
+            trimmed = self._conn.execute('DELETE FROM events WHERE id <= ?',
+                                         (cursor.lastrowid - self.max_events,)).rowcount
+        if trimmed:
+            self.dropped += trimmed
+            logger.warning(f"Edge spool full ({self.max_events} events); dropped the oldest {trimmed}")
+
+    def peek(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return up to limit of the oldest (id, event) pairs without removing them."""
+        with self._lock:
+            rows = self._conn.execute('SELECT id, body FROM events ORDER BY id LIMIT ?', (limit,)).fetchall()
+        return [(row_id, json.loads(body)) for row_id, body in rows]
+
+    def ack(self, last_id: int):
+        """Remove the events up to and including last_id after they were delivered."""
+        with self._lock:
+            self._conn.execute('DELETE FROM events WHERE id <= ?', (last_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EdgeAgent:
+    """Pushes spooled door events, batched and gzip-compressed, to the central instance."""
+
+    def __init__(self, central_url: str, site_id: str, token: str, spool: EventSpool,
+                 site_name: Optional[str] = None, batch_size: int = 100, linger: float = 1.0,
+                 snapshot_interval: float = 60.0, max_backoff: float = 60.0, timeout: float = 10.0,
+                 snapshots: Optional[Callable[[], List[Dict[str, Any]]]] = None):
+        url = urlsplit(central_url)
+        if url.scheme not in ('http', 'https') or not url.hostname:
+            raise ValueError(f"Invalid central URL: {central_url}")
+        self.central_url = central_url
+        self._scheme, self._host, self._port = url.scheme, url.hostname, url.port
+        self._path = url.path.rstrip('/') + INGEST_PATH
+        self.site = {'id': site_id, 'name': site_name or site_id}
+        self.token = token
+        self.spool = spool
+        self.batch_size = batch_size
+        self.linger = linger
+        self.snapshot_interval = snapshot_interval
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.snapshots = snapshots
+        self.sent_events = 0
+        self.sent_batches = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.last_delivery: Optional[float] = None
+        self._connection = None
+        self._next_snapshot = 0.0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def enqueue(self, event: Dict[str, Any]):
+        """Spool an event for delivery and wake the sender (door_events listener). Ignored unless the sender runs here."""
+        if not self.running:
+            return
+        try:
+            self.spool.put(event)
+        except sqlite3.Error as e:
+            logger.error(f"Error spooling door event for the central instance: {str(e)}")
+            return
+        self._wake.set()
+
+    def start(self):
+        """Start the sender thread; only one process per site should run it."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._next_snapshot = 0.0
+        self._thread = threading.Thread(target=self._run, name='edge-agent', daemon=True)
+        self._thread.start()
+        logger.info(f"Edge agent pushing site '{self.site['id']}' to {self.central_url}")
+
+    def stop(self):
+        """Stop the sender thread; undelivered events stay in the spool."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout=self.timeout + 5)
+        self._thread = None
+        self._close_connection()
+        logger.info("Edge agent stopped")
+
+    def flush(self) -> bool:
+        """Deliver one batch (events and, when due, snapshots). Returns False if delivery failed."""
+        batch = self.spool.peek(self.batch_size)
+        payload = {'site': self.site, 'sent_at': time.time(), 'events': [event for _, event in batch]}
+        snapshot_due = self.snapshots is not None and time.monotonic() >= self._next_snapshot
+        if snapshot_due:
+            payload['snapshots'] = self.snapshots()
+        if not batch and not snapshot_due:
+            return True
+
+        try:
+            self._post(gzip.compress(json.dumps(payload).encode('utf-8')))
+        except PermissionError as e:
+            # Rejected token: keep everything and retry with backoff until it is fixed
+            return self._failed(str(e))
+        except ValueError as e:
+            # The central instance cannot accept this batch; retrying would block the spool forever
+            logger.error(f"Central instance rejected a batch of {len(batch)} events, dropping it: {str(e)}")
+        except (OSError, http.client.HTTPException) as e:
+            return self._failed(str(e))
+
+        if batch:
+            self.spool.ack(batch[-1][0])
+        if snapshot_due:
+            self._next_snapshot = time.monotonic() + self.snapshot_interval
+        self.sent_events += len(batch)
+        self.sent_batches += 1
+        self.last_delivery = time.time()
+        self.last_error = None
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'central_url': self.central_url,
+            'site': self.site,
+            'running': self.running,
+            'spooled': len(self.spool),
+            'dropped': self.spool.dropped,
+            'sent_events': self.sent_events,
+            'sent_batches': self.sent_batches,
+            'failures': self.failures,
+            'last_delivery': self.last_delivery,
+            'last_error': self.last_error,
+        }
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stopping.is_set():
+            timeout = max(0.0, self._next_snapshot - time.monotonic()) if self.snapshots else None
+            self._wake.wait(timeout)
+            self._wake.clear()
+            # Let a burst of events collect into one batch
+            self._stopping.wait(self.linger)
+            while not self._stopping.is_set():
+                if not self.flush():
+                    self._stopping.wait(backoff * random.uniform(0.5, 1.5))
+                    backoff = min(backoff * 2, self.max_backoff)
+                    self._wake.set()
+                    break
+                backoff = 1.0
+                if len(self.spool) == 0:
+                    break
+
+    def _post(self, body: bytes):
+        connection = self._connection
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self._scheme == 'https' else http.client.HTTPConnection
+            connection = self._connection = connection_class(self._host, self._port, timeout=self.timeout)
+        try:
+            connection.request('POST', self._path, body=body, headers={
+                'Content-Type': 'application/json',
+                'Content-Encoding': 'gzip',
+                'Authorization': f'Bearer {self.token}',
+            })
+            response = connection.getresponse()
+            # Read the whole body so the connection can be reused
+            detail = response.read().decode('utf-8', errors='replace')[:200]
+        except Exception:
+            self._close_connection()
+            raise
+        if response.status in (401, 403):
+            raise PermissionError(f"HTTP {response.status} from central instance (check EDGE_TOKEN)")
+        if response.status in (400, 413):
+            raise ValueError(f"HTTP {response.status}: {detail}")
+        if response.status != 200:
+            raise http.client.HTTPException(f"HTTP {response.status} from central instance")
+
+    def _failed(self, error: str) -> bool:
+        self.failures += 1
+        if self.last_error != error:
+            logger.warning(f"Edge delivery to {self.central_url} failed, will retry: {error}")
+        self.last_error = error
+        return False
+
+    def _close_connection(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class SiteRegistry:
+    """Latest door state and recent events of every site pushing to this central instance."""
+
+    def __init__(self, history: int = 50, offline_after: float = 180.0,
+                 on_update: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.history = history
+        self.offline_after = offline_after
+        self.on_update = on_update
+        self._sites: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def ingest(self, payload: Dict[str, Any]) -> int:
+        """Apply a batch from an edge agent; returns the number of new events. Raises ValueError if malformed."""
+        site_info = payload.get('site') if isinstance(payload, dict) else None
+        site_id = site_info.get('id') if isinstance(site_info, dict) else None
+        if not isinstance(site_id, str) or not site_id or len(site_id) > 64:
+            raise ValueError('site id missing or invalid')
+        events = payload.get('events') or []
+        snapshots = payload.get('snapshots') or []
+        if not isinstance(events, list) or not isinstance(snapshots, list):
+            raise ValueError('events and snapshots must be lists')
+
+        with self._lock:
+            site = self._sites.get(site_id)
+            if site is None:
+                site = self._sites[site_id] = {
+                    'id': site_id,
+                    'doors': {},
+                    'events': deque(maxlen=self.history),
+                    # Highest sequence applied per event log epoch, for de-duplication
+                    'applied': OrderedDict(),
+                    'received': 0,
+                }
+            site['name'] = str(site_info.get('name') or site_id)[:100]
+            site['last_seen'] = time.time()
+
+            for snapshot in snapshots:
+                if isinstance(snapshot, dict):
+                    self._apply_state(site, snapshot)
+            applied = 0
+            for event in events:
+                if not isinstance(event, dict) or not self._is_new(site, event):
+                    continue
+                applied += 1
+                site['events'].append(event)
+                if event.get('type') == TRANSITION:
+                    self._apply_state(site, event)
+            site['received'] += applied
+            summary = self._describe(site)
+
+        if self.on_update:
+            self.on_update(summary)
+        return applied
+
+    def sites(self) -> List[Dict[str, Any]]:
+        """Every site's doors and recent events, ordered by name."""
+        with self._lock:
+            return sorted((self._describe(site) for site in self._sites.values()), key=lambda s: s['name'])
+
+    @staticmethod
+    def _is_new(site, event) -> bool:
+        epoch, seq = event.get('epoch'), event.get('seq')
+        if not isinstance(seq, int):
+            return True
+        applied = site['applied']
+        if seq <= applied.get(epoch, 0):
+            return False
+        applied[epoch] = seq
+        applied.move_to_end(epoch)
+        # Each edge restart starts a new epoch; only recent ones can still be redelivered
+        while len(applied) > 16:
+            applied.popitem(last=False)
+        return True
+
+    @staticmethod
+    def _apply_state(site, event):
+        door_id = event.get('door_id')
+        current = site['doors'].get(door_id)
+        if current is not None:
+            same_epoch = current.get('epoch') == event.get('epoch')
+            if same_epoch and (event.get('seq') or 0) < (current.get('seq') or 0):
+                return
+            if not same_epoch and (event.get('timestamp') or 0) < (current.get('timestamp') or 0):
+                return
+        state = {key: event.get(key) for key in ('door_id', 'status', 'state', 'stuck_reason',
+                                                 'seq', 'epoch', 'timestamp')}
+        state['name'] = event.get('door_name') or (current or {}).get('name') or f"Door {door_id}"
+        site['doors'][door_id] = state
+
+    def _describe(self, site) -> Dict[str, Any]:
+        return {
+            'id': site['id'],
+            'name': site['name'],
+            'last_seen': site['last_seen'],
+            'online': time.time() - site['last_seen'] < self.offline_after,
+            'received': site['received'],
+            'doors': sorted(site['doors'].values(), key=lambda door: str(door['door_id'])),
+            'events': list(site['events'])[-10:],
+        }
+
+
+def create_ingest_blueprint(registry: SiteRegistry, token: str, max_body: int = 1024 * 1024) -> Blueprint:
+    """Blueprint serving POST /api/edge/ingest for edge agents authenticated with the shared token."""
+    blueprint = Blueprint('edge_ingest', __name__)
+
+    @blueprint.route(INGEST_PATH, methods=['POST'])
+    def ingest():
+        """Accept a (gzip-compressed) batch of door events and snapshots from an edge agent."""
+        authorization = request.headers.get('Authorization', '')
+        if not token or not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+            logger.warning(f"Rejected edge ingest from {request.remote_addr}: invalid token")
+            return jsonify({'success': False, 'error': 'Invalid token'}), 401
+
+        if request.content_length is not None and request.content_length > max_body:
+            return jsonify({'success': False, 'error': 'Batch too large'}), 413
+        body = request.get_data(cache=False)
+        if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+            # Bound the decompressed size too, so a small body cannot expand without limit
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = decompressor.decompress(body, max_body)
+            except zlib.error:
+                return jsonify({'success': False, 'error': 'Invalid gzip body'}), 400
+            if decompressor.unconsumed_tail:
+                return jsonify({'success': False, 'error': 'Batch too large'}), 413
+
+        try:
+            applied = registry.ingest(json.loads(body))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        return jsonify({'success': True, 'applied': applied})
+
+    return blueprint
+
+
+def snapshot_payload(snapshots: List[Dict[str, Any]], doors: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Label door snapshots with the door names so the central dashboard can show them."""
+    names = {door['id']: door['name'] for door in doors}
+    return [{**snapshot, 'type': SNAPSHOT, 'door_name': names.get(snapshot.get('door_id'))}
+            for snapshot in snapshots]
@@ -129,6 +129,7 @@ chown -R garage:garage /opt/garage/app
 # Create Python virtual environment
 print_info "Creating Python virtual environment..."
 su - garage -c "cd /opt/garage/app && python3 -m venv venv"
+# requirements.txt pins the runtime dependencies and gevent, which garage.service runs server.py with
 su - garage -c "cd /opt/garage/app && source venv/bin/activate && pip install --upgrade pip && pip install -r requirements.txt"
 
 # Setup MySQL
@@ -197,6 +198,10 @@ chown garage:garage /opt/garage/app/.env
 print_info "Initializing database..."
 su - garage -c "cd /opt/garage/app && source venv/bin/activate && python init_db.py"
 
+# Build fingerprinted, precompressed static assets
+print_info "Building static assets..."
+su - garage -c "cd /opt/garage/app && source venv/bin/activate && python build_assets.py"
+
 # Setup systemd service
 print_info "Setting up systemd service..."
 cp /opt/garage/app/garage.service /etc/systemd/system/garage.service
@@ -0,0 +1,138 @@
+"""
+Leader election for the door poller.
+
+Every app process starts a scheduler, but only one of them may poll the
+door sensor and run the event writers; otherwise each worker (or each host
+sharing the database) would emit duplicate updates.  Processes compete for
+a lease row in the ``leader_leases`` table.  The holder renews it every
+``renew_interval`` seconds; if it dies, the lease expires after ``ttl``
+seconds and the next standby to retry takes over, so failover never takes
+longer than ``ttl + renew_interval``.
+
+A lease row is used rather than MySQL GET_LOCK because a named lock is only
+released when the holder's session ends, which for a host that drops off
+the network can take until the server's wait_timeout.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_NAME = 'door_poller'
+
+
+def default_identity() -> str:
+    """Identify this process as host:pid unless LEADER_ID overrides it."""
+    return os.getenv('LEADER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaderElector:
+    """Acquires and renews a database lease, running callbacks on leadership changes."""
+
+    def __init__(self, db_manager, name: str = DEFAULT_LEASE_NAME, identity: Optional[str] = None,
+                 ttl: float = 15.0, renew_interval: float = 5.0,
+                 on_elected: Optional[Callable[[], None]] = None,
+                 on_revoked: Optional[Callable[[], None]] = None):
+        if renew_interval >= ttl:
+            raise ValueError('renew_interval must be shorter than the lease ttl')
+        self.db_manager = db_manager
+        self.name = name
+        self.identity = identity or default_identity()
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.on_elected = on_elected
+        self.on_revoked = on_revoked
+        self._is_leader = False
+        self._lease_deadline = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def holds_lease(self) -> bool:
+        """Return True only while this process leads and its lease has not run out locally."""
+        return self._is_leader and time.monotonic() < self._lease_deadline
+
+    def run_once(self) -> bool:
+        """Try to acquire or renew the lease once and return whether this process leads."""
+        with self._lock:
+            started = time.monotonic()
+            acquired = self.db_manager.acquire_lease(self.name, self.identity, self.ttl)
+
+            if acquired:
+                # Measure the deadline from before the round trip so the local
+                # view of the lease never outlives the one in the database.
+                self._lease_deadline = started + self.ttl
+                if not self._is_leader:
+                    self._become_leader()
+            elif acquired is None and self._is_leader and time.monotonic() < self._lease_deadline:
+                # Database unreachable: keep leading until our lease would have
+                # expired, since no other process can take it over before then.
+                logger.warning(f"Could not renew lease '{self.name}', keeping leadership until it expires")
+            elif self._is_leader:
+                self._step_down()
+
+            return self._is_leader
+
+    def start(self, scheduler):
+        """Contend for leadership now and then every renew_interval seconds on the given scheduler."""
+        from apscheduler.triggers.interval import IntervalTrigger
+
+        self.run_once()
+        scheduler.add_job(
+            func=self.run_once,
+            trigger=IntervalTrigger(seconds=self.renew_interval),
+            id=f'leader_election_{self.name}',
+            name=f'Renew {self.name} leadership lease',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True,
+        )
+        logger.info(f"Leader election for '{self.name}' started as '{self.identity}' (ttl={self.ttl}s)")
+
+    def stop(self):
+        """Give up leadership and release the lease so a standby can take over immediately."""
+        with self._lock:
+            if self._is_leader:
+                self._step_down()
+                self.db_manager.release_lease(self.name, self.identity)
+
+    def status(self) -> Dict[str, Any]:
+        """Describe the current leader as recorded in the database and this process's role."""
+        lease = self.db_manager.get_lease(self.name)
+        return {
+            'lease': self.name,
+            'identity': self.identity,
+            'is_leader': self._is_leader,
+            'leader': lease['holder'] if lease else None,
+            'lease_age_seconds': float(lease['lease_age_seconds']) if lease else None,
+            'expires_in_seconds': float(lease['expires_in_seconds']) if lease else None,
+            'ttl_seconds': self.ttl,
+            'renew_interval_seconds': self.renew_interval,
+            'failover_bound_seconds': self.ttl + self.renew_interval,
+        }
+
+    def _become_leader(self):
+        self._is_leader = True
+        logger.info(f"'{self.identity}' is now the leader for '{self.name}'")
+        if self.on_elected:
+            try:
+                self.on_elected()
+            except Exception as e:
+                logger.error(f"Error starting leader services for '{self.name}': {str(e)}")
+
+    def _step_down(self):
+        self._is_leader = False
+        logger.info(f"'{self.identity}' is no longer the leader for '{self.name}'")
+        if self.on_revoked:
+            try:
+                self.on_revoked()
+            except Exception as e:
+                logger.error(f"Error stopping leader services for '{self.name}': {str(e)}")
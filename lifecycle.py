@@ -0,0 +1,68 @@
+"""
+Application lifecycle management for background services.
+
+Background services (the scheduler and door poller, leader election, later
+writers and caches) are registered once in app.py and started eagerly by the
+entry point before the server accepts traffic, instead of lazily on the first
+Socket.IO connection.  Shutdown runs the stop hooks in reverse start order,
+so consumers stop before the services they depend on.
+"""
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AppLifecycle:
+    """Ordered start-up and reverse-order shutdown of background services."""
+
+    def __init__(self):
+        self._services: List[Tuple[str, Callable[[], None], Optional[Callable[[], None]]]] = []
+        self._started: List[Tuple[str, Optional[Callable[[], None]]]] = []
+        self._lock = threading.RLock()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def register(self, name: str, start: Callable[[], None], stop: Optional[Callable[[], None]] = None):
+        """Register a service; services start in registration order."""
+        with self._lock:
+            if self._running:
+                raise RuntimeError(f"Cannot register service '{name}' after the lifecycle has started")
+            self._services.append((name, start, stop))
+
+    def start(self):
+        """Start every registered service. A failing service stops the ones already started."""
+        with self._lock:
+            if self._running:
+                logger.warning("Application services already started, skipping duplicate start")
+                return
+            self._running = True
+            for name, start, stop in self._services:
+                try:
+                    start()
+                except Exception as e:
+                    logger.error(f"Failed to start service '{name}': {str(e)}")
+                    self.stop()
+                    raise
+                self._started.append((name, stop))
+                logger.info(f"Service '{name}' started")
+
+    def stop(self):
+        """Stop started services in reverse order. Safe to call more than once."""
+        with self._lock:
+            while self._started:
+                name, stop = self._started.pop()
+                if stop is None:
+                    continue
+                try:
+                    stop()
+                    logger.info(f"Service '{name}' stopped")
+                except Exception as e:
+                    logger.error(f"Error stopping service '{name}': {str(e)}")
+            self._running = False
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Cross-process Socket.IO fan-out for multi-worker deployments.
+
+With several app workers behind nginx each worker only knows about its own
+Socket.IO clients, so an emit from the door poller has to travel through a
+message queue to reach everyone.  SOCKETIO_MESSAGE_QUEUE selects the queue:
+
+  redis://host:port/0   Flask-SocketIO's Redis manager (requires `redis`)
+  local://host:port     the small TCP fan-out broker in this module, a
+                        stand-in for Redis on a single Pi
+
+Run the local broker with:
+    python message_queue.py
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from socketio import PubSubManager
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LOCAL_SCHEME = 'local'
+DEFAULT_CHANNEL = 'flask-socketio'
+
+# Role handshake sent as the first line of every broker connection
+ROLE_PUBLISH = b'PUB'
+ROLE_SUBSCRIBE = b'SUB'
+
+
+def parse_local_url(url: str) -> Tuple[str, int]:
+    """Return the (host, port) of a local:// broker URL."""
+    parsed = urlparse(url)
+    if parsed.scheme != LOCAL_SCHEME or not parsed.port:
+        raise ValueError(f"Invalid local message queue URL '{url}'. Expected local://host:port")
+    return parsed.hostname or '127.0.0.1', parsed.port
+
+
+def socketio_queue_options(url: Optional[str], channel: str = DEFAULT_CHANNEL) -> Dict[str, Any]:
+    """Get the SocketIO keyword arguments that attach the configured message queue."""
+    if not url:
+        return {}
+    if url.startswith(f'{LOCAL_SCHEME}://'):
+        return {'client_manager': LocalBrokerManager(url, channel=channel)}
+    return {'message_queue': url, 'channel': channel}
+
+
+class LocalBrokerManager(PubSubManager):
+    """Socket.IO client manager that publishes through the local fan-out broker."""
+    name = 'local'
+
+    def __init__(self, url: str, channel: str = DEFAULT_CHANNEL, write_only: bool = False,
+                 logger=None, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.address = parse_local_url(url)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._publish_sock = None
+        self._publish_lock = threading.Lock()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _connect(self, role: bytes) -> socket.socket:
+        sock = socket.create_connection(self.address, timeout=5)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(role + b' ' + self.channel.encode() + b'\n')
+        return sock
+
+    def _publish(self, data):
+        frame = json.dumps(data, separators=(',', ':')).encode() + b'\n'
+        with self._publish_lock:
+            # One retry on a fresh connection covers a restarted broker
+            for attempt in range(2):
+                try:
+                    if self._publish_sock is None:
+                        self._publish_sock = self._connect(ROLE_PUBLISH)
+                    self._publish_sock.sendall(frame)
+                    return
+                except OSError as e:
+                    if self._publish_sock is not None:
+                        self._publish_sock.close()
+                    self._publish_sock = None
+                    if attempt:
+                        logger.error(f"Failed to publish to message queue broker: {str(e)}")
+
+    def _listen(self):
+        delay = self.reconnect_delay
+        while True:
+            try:
+                sock = self._connect(ROLE_SUBSCRIBE)
+            except OSError as e:
+                logger.warning(f"Message queue broker unavailable, retrying in {delay:.0f}s: {str(e)}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            delay = self.reconnect_delay
+            try:
+                with sock, sock.makefile('rb') as stream:
+                    for line in stream:
+                        yield line.decode()
+            except OSError as e:
+                logger.warning(f"Lost connection to message queue broker: {str(e)}")
+            time.sleep(self.reconnect_delay)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    """Serve one broker connection: register a subscriber or relay a publisher's frames."""
+
+    def handle(self):
+        try:
+            role, _, channel = self.rfile.readline().strip().partition(b' ')
+        except OSError:
+            return
+
+        broker = self.server
+        if role == ROLE_SUBSCRIBE:
+            broker.add_subscriber(channel, self.connection)
+            # Block until the subscriber hangs up; it never sends anything else
+            try:
+                while self.connection.recv(1024):
+                    pass
+            except OSError:
+                pass
+            finally:
+                broker.remove_subscriber(channel, self.connection)
+        elif role == ROLE_PUBLISH:
+            for frame in self.rfile:
+                broker.fan_out(channel, frame)
+
+
+class LocalBroker(socketserver.ThreadingTCPServer):
+    """Minimal TCP pub/sub broker relaying newline-delimited frames per channel."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int]):
+        self._subscribers: Dict[bytes, set] = {}
+        self._lock = threading.Lock()
+        super().__init__(address, _BrokerHandler)
+
+    def add_subscriber(self, channel: bytes, conn: socket.socket):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(conn)
+
+    def remove_subscriber(self, channel: bytes, conn: socket.socket):
+        with self._lock:
+            self._subscribers.get(channel, set()).discard(conn)
+
+    def fan_out(self, channel: bytes, frame: bytes):
+        """Send a frame to every subscriber of a channel, dropping dead connections."""
+        # Sending under the lock keeps frames from concurrent publishers from
+        # interleaving; there is one subscriber per app worker, so this is cheap.
+        with self._lock:
+            subscribers = self._subscribers.get(channel, set())
+            for conn in list(subscribers):
+                try:
+                    conn.sendall(frame)
+                except OSError:
+                    subscribers.discard(conn)
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    url = os.getenv('SOCKETIO_MESSAGE_QUEUE', f'{LOCAL_SCHEME}://127.0.0.1:6390')
+    address = parse_local_url(url)
+    with LocalBroker(address) as broker:
+        logger.info(f"Local message queue broker listening on {address[0]}:{address[1]}")
+        broker.serve_forever()
@@ -0,0 +1,190 @@
+"""
+MQTT bridge for home automation integrations.
+
+Publishes every door's state and the result of each relay actuation as
+retained QoS 1 messages, so a subscriber gets the current state as soon as it
+subscribes instead of polling ``/api/door_status``:
+
+* ``<prefix>/status``: ``online`` / ``offline`` (the broker publishes
+  ``offline`` as the will when the app drops off)
+* ``<prefix>/door/<door_id>/state``: JSON with ``status``, ``state``,
+  ``stuck_reason``, ``seq`` and ``timestamp``
+* ``<prefix>/door/<door_id>/actuation``: JSON with ``result`` and ``timestamp``
+
+Commands arrive on ``<prefix>/door/<door_id>/command`` (``toggle``, ``open``
+or ``close``).  They are queued and handed to ``on_command`` one at a time on
+a worker thread, so the relay is never pressed concurrently and the MQTT
+network loop is not blocked while it runs.
+
+The bridge runs in the leader, next to the poller.  paho-mqtt reconnects with
+exponential backoff; on every (re)connect the bridge subscribes again and
+republishes the current snapshots, so a broker that lost its retained
+messages is brought up to date.  paho-mqtt is optional (the ``mqtt`` extra).
+"""
+import json
+import logging
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:  # pragma: no cover - paho-mqtt is the optional 'mqtt' extra
+    mqtt = None
+
+from door_events import ACTUATION
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COMMANDS = ('toggle', 'open', 'close')
+
+
+class MqttBridge:
+    """Publishes door events to an MQTT broker and queues commands from its command topic."""
+
+    def __init__(self, host: str, port: int = 1883, prefix: str = 'garage', client_id: Optional[str] = None,
+                 username: Optional[str] = None, password: Optional[str] = None, tls: bool = False,
+                 keepalive: int = 60, min_backoff: int = 1, max_backoff: int = 60,
+                 on_command: Optional[Callable[[int, str], None]] = None,
+                 snapshots: Optional[Callable[[], List[Dict[str, Any]]]] = None):
+        if mqtt is None:
+            raise RuntimeError('The MQTT bridge requires paho-mqtt (install the "mqtt" extra)')
+        self.host = host
+        self.port = port
+        self.prefix = prefix.strip('/')
+        self.keepalive = keepalive
+        self.on_command = on_command
+        self.snapshots = snapshots
+        self.availability_topic = f"{self.prefix}/status"
+        self.command_topic = f"{self.prefix}/door/+/command"
+        self.published = 0
+        self.commands = 0
+
+        self._client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id or '')
+        if username:
+            self._client.username_pw_set(username, password)
+        if tls:
+            self._client.tls_set()
+        self._client.will_set(self.availability_topic, 'offline', qos=1, retain=True)
+        self._client.reconnect_delay_set(min_delay=min_backoff, max_delay=max_backoff)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.on_message = self._on_message
+
+        self._running = False
+        self._connected = threading.Event()
+        self._commands: queue.Queue = queue.Queue()
+        self._worker = None
+
+    def start(self):
+        """Connect in the background (retrying until the broker is reachable) and start the command worker."""
+        if self._running:
+            return
+        self._running = True
+        self._worker = threading.Thread(target=self._run_commands, name='mqtt-commands', daemon=True)
+        self._worker.start()
+        self._client.connect_async(self.host, self.port, keepalive=self.keepalive)
+        self._client.loop_start()
+        logger.info(f"MQTT bridge connecting to {self.host}:{self.port} under '{self.prefix}/'")
+
+    def stop(self):
+        """Announce offline, disconnect and stop the command worker; queued commands are discarded."""
+        if not self._running:
+            return
+        self._running = False
+        if self._connected.is_set():
+            self._client.publish(self.availability_topic, 'offline', qos=1, retain=True).wait_for_publish(timeout=5)
+        self._client.disconnect()
+        self._client.loop_stop()
+        self._connected.clear()
+        self._commands.put(None)
+        self._worker.join(timeout=35)
+        self._worker = None
+        logger.info("MQTT bridge stopped")
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def wait_until_connected(self, timeout: float) -> bool:
+        return self._connected.wait(timeout)
+
+    def publish_event(self, event: Dict[str, Any]):
+        """Publish a door event (door_events listener); ignored unless the bridge runs in this process."""
+        if not self._running:
+            return
+        door_id = event.get('door_id')
+        if event['type'] == ACTUATION:
+            self._publish(f"{self.prefix}/door/{door_id}/actuation", {
+                'door_id': door_id,
+                'result': event['result'],
+                'timestamp': event['timestamp'],
+            })
+        else:
+            self._publish(f"{self.prefix}/door/{door_id}/state", {
+                'door_id': door_id,
+                'status': event['status'],
+                'state': event.get('state'),
+                'stuck_reason': event.get('stuck_reason'),
+                'seq': event['seq'],
+                'timestamp': event['timestamp'],
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'broker': f"{self.host}:{self.port}",
+            'prefix': self.prefix,
+            'connected': self.connected,
+            'published': self.published,
+            'commands': self.commands,
+            'queued_commands': self._commands.qsize(),
+        }
+
+    def _publish(self, topic: str, payload: Dict[str, Any]):
+        # While disconnected paho keeps QoS 1 messages and sends them after reconnecting
+        self._client.publish(topic, json.dumps(payload), qos=1, retain=True)
+        self.published += 1
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.error(f"MQTT broker refused the connection: {reason_code}")
+            return
+        if self.on_command:
+            client.subscribe(self.command_topic, qos=1)
+        client.publish(self.availability_topic, 'online', qos=1, retain=True)
+        if self.snapshots:
+            for snapshot in self.snapshots():
+                self.publish_event(snapshot)
+        self._connected.set()
+        logger.info(f"MQTT bridge connected to {self.host}:{self.port}")
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self._connected.clear()
+        if self._running:
+            logger.warning(f"MQTT bridge lost the broker ({reason_code}); reconnecting")
+
+    def _on_message(self, client, userdata, message):
+        # A retained command is redelivered on every (re)subscribe and would move the door each time
+        if message.retain:
+            logger.warning(f"Ignoring retained MQTT command on {message.topic}")
+            return
+        # <prefix>/door/<door_id>/command
+        door_id = message.topic[len(self.prefix) + 1:].split('/')[1]
+        command = message.payload.decode('utf-8', errors='replace').strip().lower()
+        if not door_id.isdigit() or command not in COMMANDS:
+            logger.warning(f"Ignoring MQTT command '{command}' on {message.topic}")
+            return
+        self._commands.put((int(door_id), command))
+
+    def _run_commands(self):
+        while True:
+            item = self._commands.get()
+            if item is None or not self._running:
+                return
+            self.commands += 1
+            try:
+                self.on_command(*item)
+            except Exception as e:
+                logger.error(f"Error running MQTT command {item[1]} for door {item[0]}: {str(e)}")
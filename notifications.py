@@ -0,0 +1,697 @@
+"""
+Asynchronous notifications for door events.
+
+``NotificationDispatcher`` is a door_events listener.  ``notify`` only puts
+the event on a bounded queue (dropping it if the queue is full), so the
+poller and request threads never wait on recipients or providers.  A small
+pool of worker threads turns each event into one message per recipient,
+also queued, and delivers them through a ``NotificationProvider``:
+
+* an optional ``NotificationThrottle`` merges the messages each recipient
+  gets within an aggregation window into one digest, so a door cycling
+  while a car backs out sends one follow-up instead of a burst, and caps
+  messages per recipient and overall per period
+* a token bucket enforces the provider's rate limit across all workers
+* transient failures (network errors, 429, 5xx) are retried with
+  exponential backoff and jitter, up to ``max_attempts``
+* messages that fail permanently or run out of attempts go to the
+  dead-letter callback (the ``notification_dead_letters`` table)
+
+Recipients come from a ``RecipientIndex``: every (door, channel) pair maps
+to a prebuilt tuple, so fanning out is a dictionary lookup.  The index is
+loaded once at start-up and then reloads single users as they change, either
+in this process or (through the shared door state segment) in another worker.
+
+``OpenDoorAlerts`` sends "left open" reminders at each recipient's own
+threshold, timed on a ``TimerWheel`` and delivered through the dispatcher.
+
+Providers are pluggable: ``HttpSmsProvider`` posts JSON to any SMS gateway
+webhook (and to the local stub in the tests), ``TwilioSmsProvider`` uses
+Twilio's REST API.
+"""
+import base64
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from door_events import TRANSITION
+from timer_wheel import Timer, TimerWheel
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Door states worth a message; opening and closing are followed by one of these
+NOTIFY_STATES = ('open', 'closed', 'stuck')
+
+STUCK_MESSAGES = {
+    'did_not_open': 'did not finish opening',
+    'did_not_close': 'did not finish closing',
+}
+
+
+class NotificationError(Exception):
+    """A provider failed to send a message; retryable unless the request itself was rejected."""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class NotificationProvider:
+    """Sends a message body to one recipient address over a channel."""
+
+    name = 'provider'
+    # Recipient field holding the address for this channel
+    channel = 'sms'
+    address_field = 'phone'
+
+    def send(self, recipient: str, body: str):
+        """Send synchronously; raise NotificationError on failure."""
+        raise NotImplementedError
+
+    def _post(self, url: str, data: bytes, headers: Dict[str, str], timeout: float):
+        request = urllib.request.Request(url, data=data, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            detail = e.read(500).decode('utf-8', errors='replace')
+            # Throttling and server errors may pass; any other rejection will not
+            retryable = e.code == 429 or e.code >= 500
+            raise NotificationError(f"{self.name} answered {e.code}: {detail}", retryable=retryable)
+        except (urllib.error.URLError, OSError) as e:
+            raise NotificationError(f"{self.name} unreachable: {e}")
+
+
+class HttpSmsProvider(NotificationProvider):
+    """Posts {"to", "body"} as JSON to an SMS gateway webhook, with an optional bearer token."""
+
+    name = 'http'
+
+    def __init__(self, url: str, token: Optional[str] = None, timeout: float = 10.0):
+        if not url:
+            raise ValueError('SMS_HTTP_URL is required for the http SMS provider')
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, recipient: str, body: str):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        self._post(self.url, json.dumps({'to': recipient, 'body': body}).encode('utf-8'), headers, self.timeout)
+
+
+class TwilioSmsProvider(NotificationProvider):
+    """Sends through Twilio's Messages API."""
+
+    name = 'twilio'
+    API_URL = 'https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json'
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, timeout: float = 10.0):
+        if not (account_sid and auth_token and from_number):
+            raise ValueError('TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER are required')
+        self.url = self.API_URL.format(sid=account_sid)
+        credentials = base64.b64encode(f"{account_sid}:{auth_token}".encode()).decode()
+        self._authorization = f"Basic {credentials}"
+        self.from_number = from_number
+        self.timeout = timeout
+
+    def send(self, recipient: str, body: str):
+        data = urllib.parse.urlencode({'From': self.from_number, 'To': recipient, 'Body': body}).encode()
+        self._post(self.url, data, {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Authorization': self._authorization,
+        }, self.timeout)
+
+
+class TokenBucket:
+    """Allows rate operations per second on average, in bursts of up to burst."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0 or burst < 1:
+            raise ValueError('rate limit and burst must be positive')
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stopping: threading.Event) -> bool:
+        """Wait for a token; returns False if stopping was set first."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stopping.wait(wait):
+                return False
+
+
+def door_event_message(event: Dict[str, Any], door_name: str) -> Optional[str]:
+    """Text of the notification for a door event, or None if it does not warrant one."""
+    if event['type'] != TRANSITION or event.get('oldStatus') is None:
+        # Not a change, or the first reading after start-up
+        return None
+    state = event.get('state') or event['status']
+    if state not in NOTIFY_STATES or state == event.get('oldState'):
+        return None
+    at = time.strftime('%H:%M', time.localtime(event['timestamp']))
+    if state == 'stuck':
+        reason = STUCK_MESSAGES.get(event.get('stuck_reason'), 'is stuck')
+        return f"{door_name} {reason} ({at}). Check the door."
+    return f"{door_name} is {state} ({at})."
+
+
+class RecipientIndex:
+    """Notification recipients by (door id, channel), kept current one user at a time."""
+
+    # Channels and the user field holding each one's address
+    CHANNELS = {'sms': 'phone'}
+
+    def __init__(self, load_all: Callable[[], List[Dict[str, Any]]],
+                 load_user: Callable[[str], Optional[Dict[str, Any]]],
+                 door_ids: Callable[[], Iterable[Any]], changes=None):
+        self.load_all = load_all
+        self.load_user = load_user
+        self.door_ids = door_ids
+        # Cross-process change feed (SharedDoorState), if any
+        self.changes = changes
+        self.builds = 0
+        self.reloads = 0
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._by_key: Dict[Tuple[Any, str], Tuple[Dict[str, Any], ...]] = {}
+        self._stale: Set[str] = set()
+        self._rebuild = False
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def build(self):
+        """Load every recipient from the database. On failure the current entries are kept and sync() retries."""
+        with self._lock:
+            # Changes published from here on are applied by sync()
+            generation = self.changes.user_generation() if self.changes is not None else 0
+            try:
+                rows = self.load_all()
+            except Exception as e:
+                logger.error(f"Error loading notification recipients: {str(e)}")
+                self._rebuild = True
+                return
+            self._rebuild = False
+            self._stale.clear()
+            self._generation = generation
+            self._users = {row['username']: row for row in rows}
+            self._reindex()
+            self.builds += 1
+        logger.info(f"Recipient index built with {len(self._users)} user(s)")
+
+    def invalidate(self, username: str):
+        """Mark a user for reloading before the next lookup."""
+        with self._lock:
+            self._stale.add(username)
+
+    def recipients(self, door_id: Any, channel: str) -> Tuple[Dict[str, Any], ...]:
+        """The recipients of a door's notifications on a channel."""
+        self.sync()
+        return self.lookup(door_id, channel)
+
+    def lookup(self, door_id: Any, channel: str) -> Tuple[Dict[str, Any], ...]:
+        """The recipients as of the last sync(), without touching the database."""
+        return self._by_key.get((door_id, channel), ())
+
+    def sync(self):
+        """Apply pending user changes. Costs a set check and a shared memory read when there are none."""
+        if self._rebuild:
+            self.build()
+            return
+        if self.changes is not None:
+            generation, changed = self.changes.user_changes_since(self._generation)
+            if changed is None:
+                # Missed changes (or unreadable names): reload everyone
+                self.build()
+                return
+            if changed:
+                with self._lock:
+                    self._stale.update(changed)
+                    self._generation = generation
+        if not self._stale:
+            return
+        with self._lock:
+            stale, self._stale = self._stale, set()
+            reloaded = 0
+            for username in stale:
+                try:
+                    row = self.load_user(username)
+                except Exception as e:
+                    # Keep the user's current entry until a later sync() reloads it
+                    logger.error(f"Error reloading notification recipient {username}: {str(e)}")
+                    self._stale.add(username)
+                    continue
+                if row is None:
+                    self._users.pop(username, None)
+                else:
+                    self._users[username] = row
+                reloaded += 1
+            if reloaded:
+                self._reindex()
+                self.reloads += reloaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'users': len(self._users),
+            'builds': self.builds,
+            'reloads': self.reloads,
+        }
+
+    def _reindex(self):
+        # Opt-in is per user for now, so every door shares the channel's recipients
+        doors = list(self.door_ids())
+        by_key = {}
+        for channel, field in self.CHANNELS.items():
+            users = tuple(user for _, user in sorted(self._users.items()) if user.get(field))
+            for door_id in doors:
+                by_key[(door_id, channel)] = users
+        self._by_key = by_key
+
+
+class NotificationThrottle:
+    """Merges each recipient's messages into digests and enforces send budgets.
+
+    The first message to a recipient is sent at once and opens an aggregation
+    window; messages arriving while it is open are held and sent as one digest
+    when it closes, which opens the next window.  A door cycling several times
+    therefore costs a recipient at most one message per window.  Every send,
+    digest or not, also spends from the recipient's and the global budget of
+    messages per period; messages over budget are suppressed and counted.
+    """
+
+    # Held messages quoted in a digest; older ones are only counted
+    DIGEST_LINES = 3
+
+    def __init__(self, window: float = 60.0, recipient_budget: int = 0, global_budget: int = 0,
+                 period: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        if window < 0 or recipient_budget < 0 or global_budget < 0 or period <= 0:
+            raise ValueError('digest window and budgets must not be negative')
+        self.window = window
+        # 0 means unlimited
+        self.recipient_budget = recipient_budget
+        self.global_budget = global_budget
+        self.period = period
+        self.clock = clock
+        self.digests = 0
+        self.merged = 0
+        self.suppressed = 0
+        self.suppressed_by_recipient: Dict[str, int] = {}
+        # Recipient key -> [window close time, held (recipient, body, event) tuples]
+        self._windows: Dict[str, List[Any]] = {}
+        self._sends: Dict[str, deque] = {}
+        self._global_sends: deque = deque()
+        self._lock = threading.Lock()
+
+    def offer(self, key: str, recipient: Dict[str, Any], body: str,
+              event: Dict[str, Any]) -> Optional[str]:
+        """The body to send now, or None if the message was held for a digest or is over budget."""
+        with self._lock:
+            now = self.clock()
+            if self.window:
+                pending = self._windows.get(key)
+                if pending is not None and now < pending[0]:
+                    pending[1].append((recipient, body, event))
+                    self.merged += 1
+                    return None
+                if pending is not None and pending[1]:
+                    # Closed with held messages nobody has flushed yet: they go out first
+                    pending[1].append((recipient, body, event))
+                    self.merged += 1
+                    return None
+                self._windows[key] = [now + self.window, []]
+            return body if self._spend(key, now) else None
+
+    def due(self) -> List[Tuple[Dict[str, Any], str, Dict[str, Any]]]:
+        """(recipient, digest body, latest event) for every window that closed with held messages."""
+        digests = []
+        with self._lock:
+            now = self.clock()
+            for key, (closes, held) in list(self._windows.items()):
+                if now < closes:
+                    continue
+                if not held:
+                    del self._windows[key]
+                    continue
+                # Another window opens behind the digest, so a door that keeps cycling stays throttled
+                self._windows[key] = [now + self.window, []]
+                if self._spend(key, now):
+                    recipient, _, event = held[-1]
+                    digests.append((recipient, self._digest([body for _, body, _ in held]), event))
+                    self.digests += 1
+        return digests
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'window': self.window,
+                'open_windows': len(self._windows),
+                'held': sum(len(held) for _, held in self._windows.values()),
+                'merged': self.merged,
+                'digests': self.digests,
+                'suppressed': self.suppressed,
+                'suppressed_by_recipient': dict(self.suppressed_by_recipient),
+            }
+
+    def _spend(self, key: str, now: float) -> bool:
+        sends = self._sends.setdefault(key, deque())
+        for log in (sends, self._global_sends):
+            while log and log[0] <= now - self.period:
+                log.popleft()
+        if ((self.recipient_budget and len(sends) >= self.recipient_budget)
+                or (self.global_budget and len(self._global_sends) >= self.global_budget)):
+            self.suppressed += 1
+            self.suppressed_by_recipient[key] = self.suppressed_by_recipient.get(key, 0) + 1
+            return False
+        sends.append(now)
+        self._global_sends.append(now)
+        return True
+
+    def _digest(self, bodies: List[str]) -> str:
+        if len(bodies) == 1:
+            return bodies[0]
+        quoted = bodies[-self.DIGEST_LINES:]
+        text = f"{len(bodies)} door updates: " + ' '.join(quoted)
+        if len(bodies) > len(quoted):
+            text += f" (+{len(bodies) - len(quoted)} earlier)"
+        return text
+
+
+class NotificationDispatcher:
+    """Delivers door event notifications to every recipient through a provider, off the caller's thread."""
+
+    def __init__(self, provider: NotificationProvider,
+                 recipients: Callable[[Any, str], Iterable[Dict[str, Any]]],
+                 message: Callable[[Dict[str, Any]], Optional[str]],
+                 workers: int = 2, queue_size: int = 1000, max_attempts: int = 5,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 rate_limit: float = 1.0, burst: int = 5,
+                 dead_letter: Optional[Callable[..., Any]] = None,
+                 throttle: Optional[NotificationThrottle] = None):
+        if workers < 1 or queue_size < 1 or max_attempts < 1:
+            raise ValueError('workers, queue_size and max_attempts must be at least 1')
+        self.provider = provider
+        self.recipients = recipients
+        self.message = message
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.dead_letter = dead_letter
+        self.throttle = throttle
+        self.rate_limiter = TokenBucket(rate_limit, burst)
+        self.sent = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+        # Door events and per-recipient messages share the queue and its bound
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def notify(self, event: Dict[str, Any]):
+        """Queue a door event (door_events listener). Never blocks; ignored unless the workers run here."""
+        if self.running:
+            self._enqueue(('event', event))
+
+    def notify_recipient(self, recipient: Dict[str, Any], body: str, event: Dict[str, Any]):
+        """Queue a message for one recipient, through the same throttle as the door event messages."""
+        if self.running:
+            self._queue_message(recipient, body, event)
+
+    def start(self):
+        """Start the worker pool."""
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._threads = [threading.Thread(target=self._run, name=f"notifications-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Notifications via {self.provider.name} started with {self.workers} worker(s)")
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the workers; queued notifications are discarded."""
+        if not self._threads:
+            return
+        self._stopping.set()
+        for _ in self._threads:
+            # Wake idle workers; a full queue means none of them is idle
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        with self._queue.mutex:
+            self._queue.queue.clear()
+        logger.info("Notifications stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            'provider': self.provider.name,
+            'running': self.running,
+            'queued': self._queue.qsize(),
+            'sent': self.sent,
+            'retries': self.retries,
+            'failed': self.failed,
+            'dropped': self.dropped,
+        }
+        if self.throttle is not None:
+            stats['throttle'] = self.throttle.stats()
+        return stats
+
+    def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning(f"Notification queue full; dropped a {item[0]}")
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            if self.throttle is not None:
+                try:
+                    self._flush_digests()
+                except Exception as e:
+                    logger.error(f"Error flushing notification digests: {str(e)}")
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is None:
+                continue
+            try:
+                if item[0] == 'event':
+                    self._fan_out(item[1])
+                else:
+                    self._deliver(*item[1:])
+            except Exception as e:
+                logger.error(f"Error processing notification: {str(e)}")
+
+    def _fan_out(self, event: Dict[str, Any]):
+        body = self.message(event)
+        if body is None:
+            return
+        for recipient in self.recipients(event.get('door_id'), self.provider.channel):
+            self._queue_message(recipient, body, event)
+
+    def _queue_message(self, recipient: Dict[str, Any], body: str, event: Dict[str, Any]):
+        address = recipient.get(self.provider.address_field)
+        if not address:
+            return
+        username = recipient.get('username')
+        if self.throttle is not None:
+            if self.throttle.offer(username or address, recipient, body, event) is None:
+                return
+        self._enqueue(('message', username, address, body, event))
+
+    def _flush_digests(self):
+        for recipient, body, event in self.throttle.due():
+            username = recipient.get('username')
+            # Held messages only go to users who are still opted in
+            current = next((r for r in self.recipients(event.get('door_id'), self.provider.channel)
+                            if r.get('username') == username), None)
+            address = current and current.get(self.provider.address_field)
+            if address:
+                self._enqueue(('message', username, address, body, event))
+
+    def _deliver(self, username: Optional[str], address: str, body: str, event: Dict[str, Any]):
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.rate_limiter.acquire(self._stopping):
+                return
+            try:
+                self.provider.send(address, body)
+            except NotificationError as e:
+                if not e.retryable or attempt == self.max_attempts:
+                    self._give_up(username, address, body, event, attempt, str(e))
+                    return
+                self._count('retries')
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+                logger.warning(f"Notification to {username or address} failed (attempt {attempt}), retrying: {e}")
+                if self._stopping.wait(delay * random.uniform(0.5, 1.5)):
+                    return
+            else:
+                self._count('sent')
+                return
+
+    def _give_up(self, username, address, body, event, attempts, error):
+        self._count('failed')
+        logger.error(f"Notification to {username or address} failed after {attempts} attempt(s): {error}")
+        if self.dead_letter:
+            self.dead_letter(self.provider.channel, self.provider.name, username, address, body,
+                             attempts, error, event)
+
+
+class OpenDoorAlerts:
+    """Reminds recipients of a door left open, after each one's own delay and then repeatedly if they asked.
+
+    Opening a door arms a timer per recipient with ``open_alert_minutes`` on a
+    TimerWheel; closing it cancels them.  A fired timer sends its message
+    through ``send`` (the dispatcher, so digests and budgets apply) and re-arms
+    itself after ``open_alert_repeat_minutes`` when that is set.
+
+    ``recipients`` must not query the database, since door events arrive on
+    the poller thread; ``sync`` brings it up to date on the ticker thread.
+    """
+
+    def __init__(self, recipients: Callable[[Any, str], Iterable[Dict[str, Any]]],
+                 send: Callable[[Dict[str, Any], str, Dict[str, Any]], None],
+                 door_name: Callable[[Any], str], channel: str = 'sms',
+                 wheel: Optional[TimerWheel] = None, sync: Optional[Callable[[], None]] = None):
+        self.recipients = recipients
+        self.sync = sync
+        self.send = send
+        self.door_name = door_name
+        self.channel = channel
+        self.wheel = wheel if wheel is not None else TimerWheel()
+        self.sent = 0
+        # Door id -> (event that opened it, {username: Timer}) while the door is open
+        self._open: Dict[Any, Tuple[Dict[str, Any], Dict[str, Timer]]] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """Start ticking the wheel."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='open-door-alerts', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop ticking and cancel every timer; doors open now are re-armed by the next leader's first reading."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        with self._lock:
+            for _, timers in self._open.values():
+                for timer in timers.values():
+                    self.wheel.cancel(timer)
+            self._open.clear()
+
+    def on_event(self, event: Dict[str, Any]):
+        """Arm or cancel the door's timers (door_events listener); ignored unless running here."""
+        if not self.running or event['type'] != TRANSITION:
+            return
+        state = event.get('state') or event['status']
+        if state == 'open':
+            self._arm(event)
+        elif state == 'closed':
+            self._disarm(event.get('door_id'))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'open_doors': len(self._open),
+            'armed': len(self.wheel),
+            'fired': self.wheel.fired,
+            'sent': self.sent,
+        }
+
+    def _arm(self, event: Dict[str, Any]):
+        door_id = event.get('door_id')
+        with self._lock:
+            if door_id in self._open:
+                # Still open since the first open event (e.g. a reversed close)
+                return
+            timers = {}
+            for recipient in self.recipients(door_id, self.channel):
+                minutes = recipient.get('open_alert_minutes')
+                if minutes:
+                    username = recipient['username']
+                    timers[username] = self.wheel.schedule(minutes * 60, self._fire, door_id, username, minutes)
+            self._open[door_id] = (event, timers)
+
+    def _disarm(self, door_id: Any):
+        with self._lock:
+            _, timers = self._open.pop(door_id, (None, {}))
+            for timer in timers.values():
+                self.wheel.cancel(timer)
+
+    def _fire(self, door_id: Any, username: str, minutes: int):
+        with self._lock:
+            opened, timers = self._open.get(door_id, (None, {}))
+            timer = timers.get(username)
+            if timer is None or timer.pending:
+                # Closed (and perhaps reopened) after this timer expired
+                return
+            recipient = next((r for r in self.recipients(door_id, self.channel)
+                              if r.get('username') == username), None)
+            if recipient is None or not recipient.get('open_alert_minutes'):
+                del timers[username]
+                return
+            repeat = recipient.get('open_alert_repeat_minutes')
+            if repeat:
+                timers[username] = self.wheel.schedule(repeat * 60, self._fire, door_id, username,
+                                                       minutes + repeat)
+            else:
+                del timers[username]
+        since = time.strftime('%H:%M', time.localtime(opened['timestamp']))
+        self.send(recipient, f"{self.door_name(door_id)} has been open for {minutes} minutes (since {since}).",
+                  opened)
+        self.sent += 1
+
+    def _run(self):
+        while not self._stopping.wait(self.wheel.resolution):
+            self._tick()
+
+    def _tick(self):
+        if self.sync is not None:
+            self.sync()
+        self.wheel.advance()
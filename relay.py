@@ -1,4 +1,7 @@
 #!/usr/bin/env python3
+# Usage: relay.py [CHANNEL]
+# Pulses a relay (one, two or three; default one) for 5 seconds.
+import sys
 import time
 import os
 
@@ -8,11 +11,19 @@ if os.name == 'nt':
 
 import automationhat
 
+RELAY_CHANNELS = ('one', 'two', 'three')
+
+channel = sys.argv[1] if len(sys.argv) > 1 else 'one'
+if channel not in RELAY_CHANNELS:
+    print(f"Unknown relay channel: {channel}", file=sys.stderr)
+    sys.exit(2)
+
 if automationhat.is_automation_hat():
+    relay = getattr(automationhat.relay, channel)
     try:
         automationhat.light.power.write(1)
-        automationhat.relay.one.on()
+        relay.on()
         time.sleep(5)
     finally:
-        automationhat.relay.one.off()
+        relay.off()
         automationhat.light.power.write(0)
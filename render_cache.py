@@ -0,0 +1,116 @@
+"""
+In-memory cache of rendered pages that are the same for every user.
+
+The privacy policy, the terms and the login form are crawled and hit by bots
+all day, and each hit re-renders a Jinja template on the Pi.  ``RenderCache``
+keeps the rendered bytes of such pages together with a strong ETag, so
+repeated requests are answered from memory and revalidations with a 304.
+
+Entries are dropped when any file under the template directories changes
+(the directories are checked at most every ``check_interval`` seconds) and,
+being in memory only, on every restart, which every deploy does.  Whether a
+page is cacheable at all - no flashed messages, the same output for every
+visitor of a kind - is up to the caller; see ``render_cached`` in app.py.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class CachedPage:
+    """A rendered page body and its ETag."""
+    __slots__ = ('body', 'etag', 'mimetype')
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.mimetype = mimetype
+
+
+class RenderCache:
+    """Rendered pages by key, invalidated when the templates change."""
+
+    def __init__(self, template_dirs: Iterable[str], check_interval: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.template_dirs = list(template_dirs)
+        self.check_interval = check_interval
+        self.clock = clock
+        self._pages: Dict[Hashable, CachedPage] = {}
+        self._lock = threading.Lock()
+        self._signature = self._template_signature()
+        self._checked_at = clock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        """Return the cached page for key, or None if it must be rendered."""
+        self._check_templates()
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return page
+
+    def put(self, key: Hashable, body: bytes, mimetype: str = 'text/html') -> CachedPage:
+        """Store a freshly rendered page and return it."""
+        page = CachedPage(body, mimetype)
+        with self._lock:
+            self._pages[key] = page
+        return page
+
+    def bypass(self):
+        """Count a request that had to be rendered because it was not cacheable."""
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._pages),
+                'bytes': sum(len(page.body) for page in self._pages.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'invalidations': self.invalidations
+            }
+
+    def _check_templates(self):
+        now = self.clock()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        signature = self._template_signature()
+        if signature != self._signature:
+            self._signature = signature
+            logger.info("Templates changed; dropping cached pages")
+            self.clear()
+
+    def _template_signature(self) -> Tuple[int, int]:
+        # The newest modification time and the number of files: an edit, an
+        # added or a removed template all change it
+        newest = count = 0
+        for template_dir in self.template_dirs:
+            for root, _, files in os.walk(template_dir):
+                for name in files:
+                    try:
+                        newest = max(newest, os.stat(os.path.join(root, name)).st_mtime_ns)
+                    except OSError:
+                        continue
+                    count += 1
+        return newest, count
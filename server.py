@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the Garage Web App.
+
+``python app.py`` runs Flask-SocketIO on the Werkzeug development server,
+which is fine on a workstation but not behind nginx on a live Pi.  This
+module reads the Socket.IO async mode from SERVER_ASYNC_MODE, applies the
+monkey patching that mode needs *before* the app is imported, and serves the
+app with a production WSGI server:
+
+  gevent     gevent.pywsgi with a bounded greenlet pool (recommended)
+  eventlet   eventlet.wsgi with a bounded green thread pool
+  threading  gunicorn's gthread worker, WebSockets via simple-websocket
+
+Usage:
+    APP_ENV=production SERVER_ASYNC_MODE=gevent python server.py
+"""
+import logging
+import os
+import signal
+import sys
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+ASYNC_MODES = ('gevent', 'eventlet', 'threading')
+
+logger = logging.getLogger(__name__)
+
+
+def is_production() -> bool:
+    """Return True when the app is configured to run as a production deployment."""
+    return os.getenv('APP_ENV', 'development').strip().lower() == 'production'
+
+
+def resolve_debug() -> bool:
+    """Return the requested debug flag, refusing debug mode in production."""
+    debug = os.getenv('FLASK_DEBUG', 'False').strip().lower() == 'true'
+    if debug and is_production():
+        raise RuntimeError('Refusing to start with FLASK_DEBUG enabled while APP_ENV=production')
+    return debug
+
+
+def get_server_config() -> Dict[str, Any]:
+    """Get the web server configuration from environment variables."""
+    async_mode = os.getenv('SERVER_ASYNC_MODE', 'gevent').strip().lower()
+    if async_mode not in ASYNC_MODES:
+        raise ValueError(f"Invalid SERVER_ASYNC_MODE '{async_mode}'. Expected one of: {', '.join(ASYNC_MODES)}")
+
+    return {
+        'async_mode': async_mode,
+        'debug': resolve_debug(),
+        'host': os.getenv('APP_HOST', '0.0.0.0'),
+        'port': int(os.getenv('APP_PORT', 5000)),
+        # Upper bound on concurrent connections (greenlets / green threads).
+        # Every open dashboard holds one long-lived WebSocket.
+        'max_connections': int(os.getenv('SERVER_MAX_CONNECTIONS', 1000)),
+        'backlog': int(os.getenv('SERVER_BACKLOG', 2048)),
+        # Worker threads for the threading mode; each WebSocket pins one thread
+        'threads': int(os.getenv('SERVER_THREADS', 100)),
+        'keepalive': int(os.getenv('SERVER_KEEPALIVE', 5)),
+        'access_log': os.getenv('SERVER_ACCESS_LOG', 'False').strip().lower() == 'true',
+        # Seconds to let in-flight requests finish on SIGTERM before services stop
+        'shutdown_timeout': int(os.getenv('SERVER_SHUTDOWN_TIMEOUT', 10)),
+    }
+
+
+def patch_for_async_mode(async_mode: str):
+    """Apply the monkey patching required by the async mode. Must run before importing app."""
+    if async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+    elif async_mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+
+
+def load_app(config: Dict[str, Any]):
+    """Import the Flask application and start its background services before serving."""
+    from app import app, lifecycle
+    app.debug = config['debug']
+    # Start the poller and warm the door snapshot before the first request
+    lifecycle.start()
+    return app
+
+
+def stop_app():
+    """Stop the application's background services in reverse start order."""
+    from app import lifecycle
+    lifecycle.stop()
+
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(0)
+
+
+def serve_gevent(config: Dict[str, Any]):
+    """Serve the app with gevent's WSGI server and a bounded greenlet pool."""
+    import gevent
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+
+    app = load_app(config)
+    server = WSGIServer(
+        (config['host'], config['port']),
+        app,
+        spawn=Pool(config['max_connections']),
+        backlog=config['backlog'],
+        log='default' if config['access_log'] else None,
+    )
+    # SIGTERM: stop accepting connections, give in-flight requests a moment,
+    # then stop the background services
+    gevent.signal_handler(signal.SIGTERM, server.stop, config['shutdown_timeout'])
+    try:
+        server.serve_forever()
+    finally:
+        stop_app()
+
+
+def serve_eventlet(config: Dict[str, Any]):
+    """Serve the app with eventlet's WSGI server and a bounded green thread pool."""
+    import eventlet
+    import eventlet.wsgi
+
+    app = load_app(config)
+    listener = eventlet.listen((config['host'], config['port']), backlog=config['backlog'])
+    # eventlet.wsgi.server returns on SystemExit, after which services are stopped
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    try:
+        eventlet.wsgi.server(
+            listener,
+            app,
+            max_size=config['max_connections'],
+            keepalive=config['keepalive'] > 0,
+            log_output=config['access_log'],
+        )
+    finally:
+        stop_app()
+
+
+def serve_threading(config: Dict[str, Any]):
+    """Serve the app with a single gunicorn gthread worker."""
+    from gunicorn.app.base import BaseApplication
+
+    # Socket.IO sessions and the door poller live in process memory, so one
+    # worker process with many threads is the supported model here.  Scale
+    # out by running more instances behind nginx instead of more workers.
+    options = {
+        'bind': f"{config['host']}:{config['port']}",
+        'workers': 1,
+        'worker_class': 'gthread',
+        'threads': config['threads'],
+        'backlog': config['backlog'],
+        'keepalive': config['keepalive'],
+        'accesslog': '-' if config['access_log'] else None,
+        'graceful_timeout': config['shutdown_timeout'],
+        # gunicorn owns SIGTERM in the worker; stop services as the worker exits
+        'worker_exit': lambda server, worker: stop_app(),
+    }
+
+    class GarageApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(config)
+
+    GarageApplication().run()
+
+
+SERVERS = {
+    'gevent': serve_gevent,
+    'eventlet': serve_eventlet,
+    'threading': serve_threading,
+}
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    config = get_server_config()
+
+    patch_for_async_mode(config['async_mode'])
+    # app.py reads this when constructing the SocketIO instance
+    os.environ['SERVER_ASYNC_MODE'] = config['async_mode']
+
+    logger.info(
+        f"Starting Garage Web App on {config['host']}:{config['port']} "
+        f"(async_mode={config['async_mode']}, env={'production' if is_production() else 'development'})"
+    )
+    SERVERS[config['async_mode']](config)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (RuntimeError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
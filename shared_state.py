@@ -0,0 +1,385 @@
+"""
+Shared-memory door state segment for multi-worker reads.
+
+The poller (the leader process) publishes the latest door snapshots into a
+small memory-mapped file.  Every web worker maps the same file and serves
+``/door_status``, ``/api/door_status`` and ``/api/doors`` straight from it:
+reads unpack the fields in place from the mapping, so after the initial
+``mmap`` there are no copies, no syscalls, no database and no network hops.
+
+Consistency uses a seqlock.  The writer bumps ``version`` to an odd value,
+writes the fields and bumps it to the next even value; readers retry while
+the version is odd or changed during their read.  Writers additionally hold
+an ``flock`` so actuations recorded by any worker cannot interleave with the
+poller's writes.
+
+Layout (little-endian, 16 + MAX_DOORS * 40 + 184 + 8 + USER_CHANGE_SLOTS * 64 bytes):
+
+    0   magic               4s   b'GDS1'
+    4   layout version      H
+    6   slot count          H
+    8   seqlock version     Q
+    16  door slots          MAX_DOORS slots of 40 bytes, claimed in order
+    336 analog metrics      184 bytes, see below
+    520 user changes        Q    generation, bumped per changed user
+    528 changed users       USER_CHANGE_SLOTS usernames of 64 bytes, generation % slots
+
+Door slot:
+
+    0   sensor state        B    index into STATES
+    1   door state          B    index into DOOR_STATES (door_state.py)
+    2   stuck reason        B    index into STUCK_REASONS
+    8   updated at          d    epoch seconds of the last reading
+    16  sequence            Q    event sequence of the last state change
+    24  last actuation at   d    epoch seconds, 0.0 if never
+    32  last actuation      B    index into ACTUATION_RESULTS
+    36  door id             I    0 for a free slot
+
+Analog metrics (the latest tick of analog.py's sampler; NaN where not sampled):
+
+    0   updated at          d    epoch seconds, 0.0 if never
+    8   sample rate         d    Hz
+    16  samples             Q    total samples taken
+    24  channels            16d  mean, min, max, slope for each of ANALOG_CHANNELS
+    152 position            2d   percent open, percent per second
+    168 motor current       2d   amps, peak amps
+
+The changed users ring lets every worker's recipient index (notifications.py)
+reload just the users another worker modified.  A reader that fell more than
+a ring behind, or finds a username too long for a slot, reloads everyone.
+"""
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from door_state import DID_NOT_CLOSE, DID_NOT_OPEN, STATES as DOOR_STATES
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAGIC = b'GDS1'
+LAYOUT_VERSION = 5
+
+# One Automation HAT has three inputs; leave room for a second board
+MAX_DOORS = 8
+DEFAULT_DOOR_ID = 1
+
+STATES = ('unknown', 'closed', 'open')
+ACTUATION_RESULTS = (None, 'success', 'failure')
+STUCK_REASONS = (None, DID_NOT_OPEN, DID_NOT_CLOSE)
+ANALOG_CHANNELS = ('one', 'two', 'three', 'four')
+ANALOG_STATS = ('mean', 'min', 'max', 'slope')
+USER_CHANGE_SLOTS = 16
+
+# A writer holds the odd version for a few microseconds; a reader that sees it
+# for longer than this assumes the writer died mid-update and gives up.
+MAX_READ_SPINS = 10000
+
+_HEADER = struct.Struct('<4sHH')
+_VERSION = struct.Struct('<Q')
+_FIELDS = struct.Struct('<BBB5xdQdB3xI')
+_ANALOG = struct.Struct(f'<ddQ{len(ANALOG_CHANNELS) * len(ANALOG_STATS)}d4d')
+VERSION_OFFSET = _HEADER.size
+FIELDS_OFFSET = VERSION_OFFSET + _VERSION.size
+ANALOG_OFFSET = FIELDS_OFFSET + MAX_DOORS * _FIELDS.size
+_USER_CHANGE = struct.Struct('<64s')
+USER_CHANGES_OFFSET = ANALOG_OFFSET + _ANALOG.size
+SEGMENT_SIZE = USER_CHANGES_OFFSET + _VERSION.size + USER_CHANGE_SLOTS * _USER_CHANGE.size
+
+
+def _slot_offset(slot: int) -> int:
+    return FIELDS_OFFSET + slot * _FIELDS.size
+
+
+def _user_change_offset(generation: int) -> int:
+    return USER_CHANGES_OFFSET + _VERSION.size + (generation % USER_CHANGE_SLOTS) * _USER_CHANGE.size
+
+
+class DoorSnapshot(NamedTuple):
+    """A consistent read of the shared door state."""
+    status: str
+    updated_at: float
+    sequence: int
+    last_actuation_at: Optional[float]
+    last_actuation_result: Optional[str]
+    door_id: int = DEFAULT_DOOR_ID
+    state: str = 'unknown'
+    stuck_reason: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            'door_id': self.door_id,
+            'status': self.status,
+            'state': self.state,
+            'stuck_reason': self.stuck_reason,
+            'timestamp': self.updated_at,
+            'sequence': self.sequence,
+            'last_actuation': {
+                'timestamp': self.last_actuation_at,
+                'result': self.last_actuation_result,
+            } if self.last_actuation_at else None,
+        }
+
+
+def default_segment_path() -> str:
+    """Get the segment path, preferring tmpfs so the mapping never touches the SD card."""
+    configured = os.getenv('DOOR_STATE_SHM_PATH')
+    if configured:
+        return configured
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'garage-door-state')
+
+
+class SharedDoorState:
+    """Memory-mapped, seqlock-protected door state shared by all app processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o640)
+        try:
+            with _FileLock(fd):
+                if os.fstat(fd).st_size < SEGMENT_SIZE:
+                    os.ftruncate(fd, SEGMENT_SIZE)
+                self._map = mmap.mmap(fd, SEGMENT_SIZE)
+                magic, layout, _ = _HEADER.unpack_from(self._map, 0)
+                if magic != MAGIC or layout != LAYOUT_VERSION:
+                    # Fresh (zero-filled) or outdated segment: start from scratch
+                    self._map[:] = bytes(SEGMENT_SIZE)
+                    _HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, MAX_DOORS)
+        except Exception:
+            os.close(fd)
+            raise
+        # Keep the descriptor for writer-side flock; readers never use it
+        self._fd = fd
+
+    @classmethod
+    def open(cls, path: Optional[str] = None) -> Optional['SharedDoorState']:
+        """Open (creating if needed) the segment, or return None if shared memory is unavailable."""
+        path = path or default_segment_path()
+        try:
+            return cls(path)
+        except OSError as e:
+            logger.warning(f"Shared door state segment unavailable at {path}: {str(e)}")
+            return None
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def read(self, door_id: int = DEFAULT_DOOR_ID) -> Optional[DoorSnapshot]:
+        """Return a consistent snapshot of one door, or None if nothing has been published for it yet."""
+        for snapshot in self.read_all():
+            if snapshot.door_id == door_id:
+                return snapshot
+        return None
+
+    def read_all(self) -> List[DoorSnapshot]:
+        """Return consistent snapshots of every published door, read in one pass."""
+        slots = self._read(lambda mapping: [_FIELDS.unpack_from(mapping, _slot_offset(slot))
+                                            for slot in range(MAX_DOORS)])
+        if slots is None:
+            return []
+
+        return [
+            DoorSnapshot(
+                status=STATES[state] if state < len(STATES) else 'unknown',
+                updated_at=updated_at,
+                sequence=sequence,
+                last_actuation_at=actuated_at or None,
+                last_actuation_result=ACTUATION_RESULTS[actuation] if actuation < len(ACTUATION_RESULTS) else None,
+                door_id=door_id,
+                state=DOOR_STATES[door_state] if door_state < len(DOOR_STATES) else 'unknown',
+                stuck_reason=STUCK_REASONS[reason] if reason < len(STUCK_REASONS) else None,
+            )
+            for state, door_state, reason, updated_at, sequence, actuated_at, actuation, door_id in slots
+            if door_id and updated_at != 0.0
+        ]
+
+    def read_analog(self) -> Optional[Dict[str, Any]]:
+        """Return the latest analog metrics, shaped like AnalogSampler.metrics(), or None if never published."""
+        fields = self._read(lambda mapping: _ANALOG.unpack_from(mapping, ANALOG_OFFSET))
+        if fields is None or fields[0] == 0.0:
+            return None
+        updated_at, sample_rate, samples = fields[:3]
+        stats = fields[3:-4]
+        position, position_rate, amps, peak_amps = fields[-4:]
+        channels = {}
+        for i, channel in enumerate(ANALOG_CHANNELS):
+            values = stats[i * len(ANALOG_STATS):(i + 1) * len(ANALOG_STATS)]
+            if not math.isnan(values[0]):
+                channels[channel] = dict(zip(ANALOG_STATS, values))
+        return {
+            'updated_at': updated_at,
+            'sample_rate': sample_rate,
+            'samples': samples,
+            'channels': channels,
+            'position': None if math.isnan(position) else {
+                'percent': position,
+                'percent_per_second': position_rate,
+            },
+            'motor_current': None if math.isnan(amps) else {
+                'amps': amps,
+                'peak_amps': peak_amps,
+            },
+        }
+
+    def publish_analog(self, metrics: Dict[str, Any]):
+        """Record the metrics of an analog sampler tick (see analog.py)."""
+        stats = []
+        for channel in ANALOG_CHANNELS:
+            values = metrics['channels'].get(channel) or {}
+            stats.extend(values.get(stat, math.nan) for stat in ANALOG_STATS)
+        position = metrics.get('position') or {}
+        current = metrics.get('motor_current') or {}
+        with self._write():
+            _ANALOG.pack_into(self._map, ANALOG_OFFSET, metrics['updated_at'], metrics['sample_rate'],
+                              metrics['samples'], *stats,
+                              position.get('percent', math.nan), position.get('percent_per_second', math.nan),
+                              current.get('amps', math.nan), current.get('peak_amps', math.nan))
+
+    def publish_status(self, status: str, sequence: Optional[int] = None, timestamp: Optional[float] = None,
+                       door_id: int = DEFAULT_DOOR_ID, door_state: Optional[str] = None,
+                       stuck_reason: Optional[str] = None) -> int:
+        """Record a door reading and return its sequence number.
+
+        Pass the poller's event sequence number to mirror it; without one the
+        segment bumps the door's own counter whenever its state changes.  The
+        door state defaults to the sensor status when no state machine runs.
+        """
+        state = STATES.index(status) if status in STATES else 0
+        door_state = door_state or status
+        inferred = DOOR_STATES.index(door_state) if door_state in DOOR_STATES else 0
+        reason = STUCK_REASONS.index(stuck_reason) if stuck_reason in STUCK_REASONS else 0
+        with self._write() as writer:
+            offset = writer.slot(door_id)
+            if offset is None:
+                return 0
+            old_state, old_inferred, _, _, current_sequence, actuated_at, actuation, _ = \
+                _FIELDS.unpack_from(self._map, offset)
+            if sequence is None:
+                sequence = current_sequence
+                if state != old_state or inferred != old_inferred or sequence == 0:
+                    sequence += 1
+            _FIELDS.pack_into(self._map, offset, state, inferred, reason, timestamp or time.time(),
+                              sequence, actuated_at, actuation, door_id)
+        return sequence
+
+    def publish_actuation(self, success: bool, timestamp: Optional[float] = None, door_id: int = DEFAULT_DOOR_ID):
+        """Record the time and result of the latest relay actuation of a door."""
+        result = ACTUATION_RESULTS.index('success' if success else 'failure')
+        with self._write() as writer:
+            offset = writer.slot(door_id)
+            if offset is None:
+                return
+            state, inferred, reason, updated_at, sequence, _, _, _ = _FIELDS.unpack_from(self._map, offset)
+            _FIELDS.pack_into(self._map, offset, state, inferred, reason, updated_at, sequence,
+                              timestamp or time.time(), result, door_id)
+
+    def publish_user_change(self, username: str):
+        """Record that a user's notification settings (or account) changed."""
+        name = username.encode('utf-8')
+        with self._write():
+            generation = _VERSION.unpack_from(self._map, USER_CHANGES_OFFSET)[0] + 1
+            # An empty slot tells readers to reload everyone
+            _USER_CHANGE.pack_into(self._map, _user_change_offset(generation),
+                                   name if len(name) <= _USER_CHANGE.size else b'')
+            _VERSION.pack_into(self._map, USER_CHANGES_OFFSET, generation)
+
+    def user_generation(self) -> int:
+        """The current user change generation."""
+        return _VERSION.unpack_from(self._map, USER_CHANGES_OFFSET)[0]
+
+    def user_changes_since(self, generation: int):
+        """Return (current generation, usernames changed after generation), or None for the names if they are lost."""
+        def unpack(mapping):
+            current = _VERSION.unpack_from(mapping, USER_CHANGES_OFFSET)[0]
+            if current < generation or current - generation > USER_CHANGE_SLOTS:
+                return current, None
+            return current, [_USER_CHANGE.unpack_from(mapping, _user_change_offset(changed))[0]
+                             for changed in range(generation + 1, current + 1)]
+
+        read = self._read(unpack)
+        if read is None:
+            return generation, None
+        current, names = read
+        if names is None or b'' in (name.rstrip(b'\0') for name in names):
+            return current, None
+        return current, [name.rstrip(b'\0').decode('utf-8', errors='replace') for name in names]
+
+    def _read(self, unpack):
+        """Run unpack(mapping) until it completes without a concurrent write; None if a writer seems dead."""
+        mapping = self._map
+        for _ in range(MAX_READ_SPINS):
+            before = _VERSION.unpack_from(mapping, VERSION_OFFSET)[0]
+            if before & 1:
+                # Writer in progress
+                continue
+            fields = unpack(mapping)
+            if _VERSION.unpack_from(mapping, VERSION_OFFSET)[0] == before:
+                return fields
+        logger.warning("Shared door state is stuck mid-update; ignoring it")
+        return None
+
+    def _write(self):
+        return _SeqlockWrite(self)
+
+
+class _FileLock:
+    """Exclusive flock on the segment file (no-op where fcntl is unavailable)."""
+
+    def __init__(self, fd: int):
+        self.fd = fd
+
+    def __enter__(self):
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+class _SeqlockWrite:
+    """Writer side of the seqlock: odd version while the fields are being rewritten."""
+
+    def __init__(self, segment: SharedDoorState):
+        self.segment = segment
+        self.lock = _FileLock(segment._fd)
+
+    def __enter__(self):
+        self.lock.__enter__()
+        mapping = self.segment._map
+        # An odd version left behind by a writer that died mid-update is reused
+        self.version = _VERSION.unpack_from(mapping, VERSION_OFFSET)[0] | 1
+        _VERSION.pack_into(mapping, VERSION_OFFSET, self.version)
+        return self
+
+    def slot(self, door_id: int) -> Optional[int]:
+        """Offset of the door's slot, claiming the first free slot for a new door."""
+        mapping = self.segment._map
+        free = None
+        for slot in range(MAX_DOORS):
+            offset = _slot_offset(slot)
+            slot_door = _FIELDS.unpack_from(mapping, offset)[7]
+            if slot_door == door_id:
+                return offset
+            if slot_door == 0 and free is None:
+                free = offset
+        if free is None:
+            logger.warning(f"No free shared door state slot for door {door_id} (max {MAX_DOORS})")
+        return free
+
+    def __exit__(self, *exc):
+        _VERSION.pack_into(self.segment._map, VERSION_OFFSET, self.version + 1)
+        self.lock.__exit__(*exc)
@@ -63,49 +63,111 @@ function toggleTheme() {
 // Initialize theme before DOMContentLoaded to prevent flash
 initTheme();
 
-// Global variable to track the current door status and WebSocket connection
-let currentDoorStatus = null;
+// Current status of each door by door id, and the WebSocket connection
+const currentDoorStatuses = {};
 let socket = null;
 
-// Function to update door status display
-function updateDoorStatusDisplay(status, previousStatus = null) {
-    const statusIndicator = document.querySelector('.status-indicator');
-    const statusIcon = document.querySelector('.status-icon');
-    const statusText = document.querySelector('.status-text');
+// Position in the server's door event stream, sent on reconnect to resume from it
+let lastDoorSeq = null;
+let doorEventEpoch = null;
+
+// Render a door status into a .status-indicator element; returns false if it is incomplete
+function renderStatusIndicator(statusIndicator, status) {
+    const statusIcon = statusIndicator && statusIndicator.querySelector('.status-icon');
+    const statusText = statusIndicator && statusIndicator.querySelector('.status-text');
+    if (!statusIcon || !statusText) {
+        return false;
+    }
     
-    if (statusIndicator && statusIcon && statusText) {
-        // Remove existing status classes
-        statusIndicator.classList.remove('closed', 'open');
-        
-        // Update based on door status
-        if (status === 'closed') {
-            statusIndicator.classList.add('closed');
-            statusIcon.textContent = '🏠';
-            statusText.textContent = 'CLOSED';
-        } else if (status === 'open') {
-            statusIndicator.classList.add('open');
-            statusIcon.textContent = '🚪';
-            statusText.textContent = 'OPEN';
-        } else {
-            // Unknown status
-            statusIndicator.classList.add('closed');
-            statusIcon.textContent = '❓';
-            statusText.textContent = 'UNKNOWN';
-        }
-        
+    // Remove existing status classes
+    statusIndicator.classList.remove('closed', 'open', 'moving', 'stuck');
+    
+    // Update based on door status
+    if (status === 'closed') {
+        statusIndicator.classList.add('closed');
+        statusIcon.textContent = '🏠';
+        statusText.textContent = 'CLOSED';
+    } else if (status === 'open') {
+        statusIndicator.classList.add('open');
+        statusIcon.textContent = '🚪';
+        statusText.textContent = 'OPEN';
+    } else if (status === 'opening' || status === 'closing') {
+        statusIndicator.classList.add('moving');
+        statusIcon.textContent = status === 'opening' ? '⬆️' : '⬇️';
+        statusText.textContent = status.toUpperCase();
+    } else if (status === 'stuck') {
+        statusIndicator.classList.add('stuck');
+        statusIcon.textContent = '⚠️';
+        statusText.textContent = 'STUCK';
+    } else {
+        // Unknown status
+        statusIndicator.classList.add('closed');
+        statusIcon.textContent = '❓';
+        statusText.textContent = 'UNKNOWN';
+    }
+    return true;
+}
+
+// Function to update a door's status display; status is the inferred door state
+// (closed, open, opening, closing, stuck) or, from older servers, the sensor status
+function updateDoorStatusDisplay(status, previousStatus = null, doorId = 1) {
+    const statusBox = document.querySelector('.garage-status-box[data-door-id="' + doorId + '"]');
+    if (!statusBox) {
+        return;
+    }
+    if (renderStatusIndicator(statusBox.querySelector('.status-indicator'), status)) {
         // Check if status changed and trigger event
-        if (previousStatus !== null && previousStatus !== status) {
-            onDoorStatusChanged(previousStatus, status);
+        if (previousStatus != null && previousStatus !== status) {
+            onDoorStatusChanged(previousStatus, status, doorId);
         }
         
         // Update current status
-        currentDoorStatus = status;
+        currentDoorStatuses[doorId] = status;
+    }
+}
+
+// Central mode: render a site card pushed by an edge agent (site_update) or from the page
+function updateSiteCard(site) {
+    const card = document.querySelector('.site-card[data-site-id="' + CSS.escape(site.id) + '"]');
+    if (!card) {
+        // A site reporting for the first time: the server renders its card
+        window.location.reload();
+        return;
     }
+    card.querySelector('.site-last-seen').dataset.timestamp = site.last_seen;
+    
+    for (const door of site.doors) {
+        const indicator = card.querySelector('[data-site-door-id="' + door.door_id + '"] .status-indicator');
+        if (!indicator) {
+            window.location.reload();
+            return;
+        }
+        indicator.dataset.status = door.state || door.status;
+    }
+    renderSiteCard(card);
+}
+
+function renderSiteCard(card) {
+    card.querySelectorAll('.status-indicator[data-status]').forEach(function(indicator) {
+        renderStatusIndicator(indicator, indicator.dataset.status);
+    });
+    const lastSeen = card.querySelector('.site-last-seen');
+    const timestamp = parseFloat(lastSeen.dataset.timestamp);
+    lastSeen.textContent = isNaN(timestamp) ? 'never' : new Date(timestamp * 1000).toLocaleString();
+    
+    // Sites push a snapshot at least every EDGE_SNAPSHOT_INTERVAL; silence beyond the limit means offline
+    const container = document.getElementById('centralSites');
+    const offlineAfter = parseFloat(container ? container.dataset.offlineAfter : NaN);
+    const online = !isNaN(timestamp) && !isNaN(offlineAfter) && Date.now() / 1000 - timestamp < offlineAfter;
+    const badge = card.querySelector('.site-online');
+    badge.textContent = online ? 'online' : 'offline';
+    badge.classList.toggle('bg-success', online);
+    badge.classList.toggle('bg-secondary', !online);
 }
 
 // Function to handle door status changes
 // This provides extensibility for future actions when door status changes
-function onDoorStatusChanged(oldStatus, newStatus) {
+function onDoorStatusChanged(oldStatus, newStatus, doorId) {
     // Future actions can be added here, such as:
     // - Sending notifications
     // - Logging to a server
@@ -116,6 +178,7 @@ function onDoorStatusChanged(oldStatus, newStatus) {
     // Dispatch custom event for other parts of the application
     const event = new CustomEvent('doorStatusChanged', {
         detail: {
+            doorId: doorId,
             oldStatus: oldStatus,
             newStatus: newStatus,
             timestamp: new Date()
@@ -124,6 +187,49 @@ function onDoorStatusChanged(oldStatus, newStatus) {
     document.dispatchEvent(event);
 }
 
+// Track the sequence of a door event; returns false for duplicates or stale events
+function applyDoorEvent(data) {
+    if (data.seq === undefined) {
+        return true;
+    }
+    // An event from a restarted server resets our position
+    if (data.epoch !== doorEventEpoch) {
+        doorEventEpoch = data.epoch;
+        lastDoorSeq = data.seq;
+        return true;
+    }
+    // Snapshots are always applied; one per door, so keep the furthest position
+    if (data.type === 'snapshot') {
+        lastDoorSeq = Math.max(lastDoorSeq || 0, data.seq);
+        return true;
+    }
+    if (lastDoorSeq !== null && data.seq <= lastDoorSeq) {
+        return false;
+    }
+    lastDoorSeq = data.seq;
+    return true;
+}
+
+// Start from the door state rendered into the page, so the socket only sends what changed since
+function loadInitialDoorState() {
+    const element = document.getElementById('initialDoorState');
+    if (!element) {
+        return;
+    }
+    let state;
+    try {
+        state = JSON.parse(element.textContent);
+    } catch (error) {
+        console.error('Invalid initial door state:', error);
+        return;
+    }
+    doorEventEpoch = state.epoch;
+    lastDoorSeq = state.last_seq;
+    for (const snapshot of state.doors) {
+        currentDoorStatuses[snapshot.door_id || 1] = snapshot.state || snapshot.status;
+    }
+}
+
 // Initialize WebSocket connection
 function initializeWebSocket() {
     // Connect to the WebSocket server
@@ -132,27 +238,37 @@ function initializeWebSocket() {
         reconnection: true,
         reconnectionDelay: 1000,
         reconnectionDelayMax: 5000,
-        reconnectionAttempts: Infinity
-    });
-    
-    socket.on('connect', function() {
-        // Request current status when connected
-        socket.emit('request_status');
+        reconnectionAttempts: Infinity,
+        // Evaluated on every (re)connect so the server can replay missed events
+        auth: function(cb) {
+            cb({ last_seq: lastDoorSeq, epoch: doorEventEpoch });
+        }
     });
     
     socket.on('door_status_update', function(data) {
-        const newStatus = data.status;
-        const oldStatus = data.oldStatus || currentDoorStatus;
+        if (!applyDoorEvent(data)) {
+            return;
+        }
+        const doorId = data.door_id || 1;
+        const newStatus = data.state || data.status;
+        const oldStatus = data.oldState || data.oldStatus || currentDoorStatuses[doorId];
         
-        updateDoorStatusDisplay(newStatus, oldStatus);
+        updateDoorStatusDisplay(newStatus, oldStatus, doorId);
     });
     
+    socket.on('site_update', updateSiteCard);
+    
     socket.on('disconnect', function() {
         // Handle disconnection if needed
     });
     
     socket.on('connect_error', function(error) {
         console.error('WebSocket connection error:', error);
+        // The session ended while the page was open
+        if (error && error.message === 'Connection rejected by server') {
+            window.location.href = '/login';
+            return;
+        }
         // Fallback to HTTP polling if WebSocket fails persistently
         // The socket.io client will automatically attempt to reconnect
     });
@@ -163,8 +279,8 @@ function initializeWebSocket() {
 }
 
 // Legacy function for backward compatibility - now fetches status via HTTP
-function updateDoorStatus() {
-    fetch('/door_status', {
+function updateDoorStatus(doorId = 1) {
+    fetch('/door_status?door_id=' + encodeURIComponent(doorId), {
         method: 'GET',
         headers: {
             'Content-Type': 'application/json',
@@ -173,7 +289,7 @@ function updateDoorStatus() {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            updateDoorStatusDisplay(data.status, currentDoorStatus);
+            updateDoorStatusDisplay(data.state || data.status, currentDoorStatuses[doorId], doorId);
         }
     })
     .catch(error => {
@@ -181,34 +297,69 @@ function updateDoorStatus() {
     });
 }
 
+// Install the service worker that serves the app shell offline, or remove it when disabled
+function initializeServiceWorker() {
+    if (!('serviceWorker' in navigator)) {
+        return;
+    }
+    const url = document.body.dataset.serviceWorker;
+    if (url) {
+        navigator.serviceWorker.register(url).catch(function(error) {
+            console.error('Service worker registration failed:', error);
+        });
+    } else {
+        navigator.serviceWorker.getRegistrations().then(function(registrations) {
+            registrations.forEach(function(registration) { registration.unregister(); });
+        });
+    }
+    
+    // The offline page stands in for the dashboard; load the real one once the network is back
+    const offline = document.getElementById('offlineNotice');
+    if (offline) {
+        window.addEventListener('online', function() {
+            window.location.href = offline.dataset.dashboard;
+        });
+    }
+}
+
 document.addEventListener('DOMContentLoaded', function() {
+    initializeServiceWorker();
+    
     // Setup theme toggle button
     const themeToggle = document.getElementById('themeToggle');
     if (themeToggle) {
         themeToggle.addEventListener('click', toggleTheme);
     }
     
-    // Initialize WebSocket connection for real-time door status updates
+    // Initialize WebSocket connection for real-time door status updates,
+    // resuming after the state the page was rendered with
+    loadInitialDoorState();
     initializeWebSocket();
     
-    // Add click handler to garage status box for manual refresh
-    const garageStatus = document.getElementById('garageStatus');
-    if (garageStatus) {
+    // Render the central dashboard's site cards (central mode)
+    document.querySelectorAll('.site-card').forEach(renderSiteCard);
+    setInterval(function() {
+        document.querySelectorAll('.site-card').forEach(renderSiteCard);
+    }, 30000);
+    
+    // Add click handler to each garage status box for manual refresh
+    document.querySelectorAll('.garage-status-box[data-door-id]').forEach(function(garageStatus) {
         garageStatus.addEventListener('click', function() {
-            updateDoorStatus();
+            updateDoorStatus(garageStatus.dataset.doorId);
         });
-    }
+    });
     
-    const runScriptBtn = document.getElementById('runScriptBtn');
-    const btnText = document.getElementById('btnText');
-    const initialBtnText = btnText.textContent;
-    const btnSpinner = document.getElementById('btnSpinner');
     const outputContainer = document.getElementById('outputContainer');
     const scriptOutput = document.getElementById('scriptOutput');
     const errorContainer = document.getElementById('errorContainer');
     const scriptError = document.getElementById('scriptError');
 
-    if (runScriptBtn) {
+    document.querySelectorAll('.run-script-btn').forEach(function(runScriptBtn) {
+        const doorId = runScriptBtn.dataset.doorId;
+        const btnText = runScriptBtn.querySelector('.btn-text');
+        const initialBtnText = btnText.textContent;
+        const btnSpinner = runScriptBtn.querySelector('.btn-spinner');
+
         runScriptBtn.addEventListener('click', function() {
             // Show loading state
             btnText.textContent = 'Running...';
@@ -219,12 +370,13 @@ document.addEventListener('DOMContentLoaded', function() {
             outputContainer.classList.add('d-none');
             errorContainer.classList.add('d-none');
 
-            // Make AJAX request to run the script
+            // Make AJAX request to run the script for this door
             fetch('/run_script', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
+                body: JSON.stringify({ door_id: doorId })
             })
             .then(response => response.json())
             .then(data => {
@@ -239,7 +391,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     outputContainer.classList.remove('d-none');
                     
                     // Update door status after running the script
-                    setTimeout(updateDoorStatus, 1000);
+                    setTimeout(function() { updateDoorStatus(doorId); }, 1000);
                     
                     // Also show errors if any (non-fatal)
                     if (data.error && data.error.trim()) {
@@ -263,7 +415,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 errorContainer.classList.remove('d-none');
             });
         });
-    }
+    });
 
     // Add some mobile-friendly enhancements
     if (window.innerWidth <= 576) {
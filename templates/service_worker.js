@@ -0,0 +1,91 @@
+// Service worker for the Garage App, rendered by app.py at /service-worker.js
+//
+// The app shell (stylesheets, scripts, icon and the offline page) is cached at
+// install under a name carrying the asset version, so a deploy that changes
+// any static file installs a fresh cache and drops the old one. Only what is
+// the same for every user is cached: the dashboard shows one user's session
+// and is always fetched from the network, with the offline page in its place
+// when there is none.
+{% if enabled %}
+const VERSION = {{ version | tojson }};
+const SHELL_CACHE = 'garage-shell-' + VERSION;
+const SHELL_ASSETS = {{ assets | tojson }};
+const DASHBOARD = {{ dashboard | tojson }};
+const OFFLINE = {{ offline | tojson }};
+
+const shellUrls = new Set(SHELL_ASSETS.map(url => new URL(url, self.location.href).href));
+// CDN URLs are version-pinned, so files they load in turn (icon fonts) are safe to keep too
+const cdnOrigins = new Set([...shellUrls].map(url => new URL(url).origin).filter(origin => origin !== self.location.origin));
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(SHELL_CACHE).then(cache => Promise.all([
+        // Without cookies: nothing of the installing user's session may end up in the cache
+        fetch(OFFLINE, { credentials: 'omit' })
+            .then(response => response.ok ? cache.put(OFFLINE, response) : null)
+            .catch(() => null),
+        ...SHELL_ASSETS.map(url =>
+            // One unreachable CDN file must not keep the rest of the shell from installing
+            fetch(url, { mode: 'cors' })
+                .then(response => response.ok ? cache.put(url, response) : null)
+                .catch(() => null)
+        )
+    ])).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys().then(keys => Promise.all(
+        keys.filter(key => key.startsWith('garage-') && key !== SHELL_CACHE)
+            .map(key => caches.delete(key))
+    )).then(() => self.clients.claim()));
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    const sameOrigin = url.origin === self.location.origin;
+    if (request.mode === 'navigate' && sameOrigin && url.pathname === DASHBOARD) {
+        event.respondWith(dashboard(request));
+    } else if (shellUrls.has(url.href) || cdnOrigins.has(url.origin) || (sameOrigin && url.pathname.startsWith('/static/'))) {
+        event.respondWith(cacheFirst(request));
+    }
+});
+
+async function cacheFirst(request) {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(request, { ignoreVary: true });
+    if (cached) {
+        return cached;
+    }
+    const response = await fetch(request);
+    // Cross-origin files loaded without CORS come back opaque; their status cannot be checked
+    if (response.ok || response.type === 'opaque') {
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+// Network only: the page is never stored, so no other user or session can be shown it
+async function dashboard(request) {
+    try {
+        return await fetch(request);
+    } catch (error) {
+        const offline = await caches.match(OFFLINE, { cacheName: SHELL_CACHE });
+        if (offline) {
+            return offline;
+        }
+        throw error;
+    }
+}
+{% else %}
+// The offline shell is disabled (PWA_ENABLED=False): remove this worker and its caches
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys()
+        .then(keys => Promise.all(keys.filter(key => key.startsWith('garage-')).map(key => caches.delete(key))))
+        .then(() => self.registration.unregister()));
+});
+{% endif %}
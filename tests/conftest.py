@@ -17,6 +17,7 @@ with a fresh MagicMock (restored automatically after each test).
 
 import os
 import sys
+import tempfile
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -33,6 +34,13 @@ os.environ.setdefault("DB_USER", "test_user")
 os.environ.setdefault("DB_PASSWORD", "test_password")
 os.environ.setdefault("DB_NAME", "test_db")
 
+# Keep the shared door state segment out of /dev/shm so tests never read (or
+# clobber) the state published by a running instance of the app.
+os.environ.setdefault(
+    "DOOR_STATE_SHM_PATH",
+    os.path.join(tempfile.mkdtemp(prefix="garage-tests-"), "door-state"),
+)
+
 # ---------------------------------------------------------------------------
 # Patch _ensure_database_setup before importing the app.  This prevents the
 # constructor from attempting a real MySQL connection while still leaving the
@@ -71,6 +79,13 @@ def client(app):
         yield c
 
 
+@pytest.fixture(autouse=True)
+def fresh_render_cache():
+    """Start every test with an empty page cache, so pages rendered by earlier tests are not served."""
+    if _app_module.render_cache is not None:
+        _app_module.render_cache.clear()
+
+
 @pytest.fixture
 def mock_db():
     """
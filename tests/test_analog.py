@@ -0,0 +1,211 @@
+"""
+Tests for the analog input sampler (analog.py), its metrics in the shared
+door state segment and the /api/analog endpoint.
+"""
+import io
+import secrets
+import struct
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import app as app_module
+from analog import AnalogRing, AnalogSampler
+from shared_state import SharedDoorState
+from user_roles import UserRole
+
+
+def _records(t, *channels):
+    return np.column_stack([t, *channels]).astype(float)
+
+
+def _sampler(**kwargs):
+    options = dict(rate=10.0, tick=0.5, window=1.0, buffer_seconds=3.0,
+                   position_channel="one", position_closed_volts=0.5, position_open_volts=4.5,
+                   current_channel="two", current_amps_per_volt=10.0)
+    options.update(kwargs)
+    return AnalogSampler(["one", "two"], **options)
+
+
+class TestAnalogRing:
+    def test_latest_records_survive_wrap_around_in_order(self):
+        ring = AnalogRing(channels=1, capacity=5, window=5)
+        for start in range(0, 12, 3):
+            t = np.arange(start, start + 3, dtype=float)
+            ring.extend(_records(t, t * 10))
+        assert ring.total == 12
+        assert ring.count == 5
+        assert ring.latest(5)[:, 0].tolist() == [7.0, 8.0, 9.0, 10.0, 11.0]
+        assert ring.latest(2)[:, 1].tolist() == [100.0, 110.0]
+
+    def test_window_is_a_view_not_a_copy(self):
+        ring = AnalogRing(channels=1, capacity=4, window=4)
+        ring.extend(_records(np.arange(6.0), np.arange(6.0)))
+        assert np.shares_memory(ring.latest(4), ring._data)
+
+    def test_block_larger_than_capacity_keeps_the_newest(self):
+        ring = AnalogRing(channels=1, capacity=3, window=3)
+        ring.extend(_records(np.arange(10.0), np.arange(10.0)))
+        assert ring.latest(3)[:, 0].tolist() == [7.0, 8.0, 9.0]
+        assert ring.total == 10
+
+    def test_statistics_over_the_window(self):
+        ring = AnalogRing(channels=2, capacity=50, window=10)
+        t = 1000.0 + np.arange(30) * 0.1
+        ring.extend(_records(t, 2.0 + 3.0 * (t - t[0]), np.full(30, 1.5)))
+        assert ring.compute() == 10
+        window = ring.latest(10)
+        assert ring.mean[0] == pytest.approx(window[:, 1].mean())
+        assert ring.min[0] == pytest.approx(window[:, 1].min())
+        assert ring.max[0] == pytest.approx(window[:, 1].max())
+        assert ring.slope[0] == pytest.approx(3.0)
+        assert ring.slope[1] == pytest.approx(0.0)
+
+    def test_statistics_reuse_their_arrays(self):
+        ring = AnalogRing(channels=1, capacity=10, window=5)
+        outputs = (ring.mean, ring.min, ring.max, ring.slope)
+        ring.extend(_records(np.arange(8.0), np.arange(8.0)))
+        ring.compute()
+        assert all(after is before for after, before in zip((ring.mean, ring.min, ring.max, ring.slope), outputs))
+
+    def test_single_record_has_zero_slope(self):
+        ring = AnalogRing(channels=1, capacity=4, window=4)
+        ring.extend(_records([1.0], [2.0]))
+        ring.compute()
+        assert ring.slope[0] == 0.0
+        assert ring.mean[0] == 2.0
+
+
+class TestAnalogSampler:
+    def test_metrics_derive_position_and_motor_current(self):
+        sampler = _sampler()
+        t = np.arange(10) * 0.1
+        # Potentiometer rising 1 V/s from 2.5 V (50 % open), clamp at 0.4 V
+        sampler.feed(_records(t, 2.5 + t, np.full(10, 0.4)))
+        metrics = sampler.metrics()
+        assert metrics["samples"] == 10
+        assert metrics["channels"]["one"]["slope"] == pytest.approx(1.0)
+        assert metrics["position"]["percent"] == pytest.approx((2.95 - 0.5) / 4.0 * 100)
+        assert metrics["position"]["percent_per_second"] == pytest.approx(25.0)
+        assert metrics["motor_current"]["amps"] == pytest.approx(4.0)
+        assert metrics["motor_current"]["peak_amps"] == pytest.approx(4.0)
+
+    def test_position_is_clamped_to_the_calibrated_range(self):
+        sampler = _sampler()
+        sampler.feed(_records([0.0, 0.1], [5.0, 5.0], [0.0, 0.0]))
+        assert sampler.metrics()["position"]["percent"] == 100.0
+
+    def test_on_tick_receives_each_ticks_metrics(self):
+        ticks = []
+        sampler = _sampler(on_tick=ticks.append)
+        sampler.feed(_records([0.0], [1.0], [0.1]))
+        sampler.feed(_records([0.1], [1.0], [0.1]))
+        assert [tick["samples"] for tick in ticks] == [1, 2]
+
+    def test_reads_batches_from_the_sampling_script_in_place(self):
+        sampler = _sampler()
+        record = struct.Struct("<3d")
+        # Two ticks of five records each (10 Hz, 0.5 s ticks)
+        stream = b"".join(record.pack(i * 0.1, 0.5, 0.2) for i in range(10))
+        process = MagicMock(stdout=io.BufferedReader(io.BytesIO(stream)))
+        with patch.object(sampler, "feed", wraps=sampler.feed) as feed:
+            sampler._run(process)
+        assert feed.call_count == 2
+        # Every batch is the same preallocated array
+        assert all(call.args[0] is sampler._records for call in feed.call_args_list)
+        assert sampler.metrics()["samples"] == 10
+        assert sampler.metrics()["position"]["percent"] == 0.0
+
+    def test_invalid_configuration(self):
+        with pytest.raises(ValueError):
+            AnalogSampler(["five"])
+        with pytest.raises(ValueError):
+            AnalogSampler(["one"], current_channel="two")
+        with pytest.raises(ValueError):
+            AnalogSampler(["one"], position_closed_volts=1.0, position_open_volts=1.0)
+
+    def test_start_runs_the_sampling_script(self):
+        sampler = _sampler()
+        with patch("subprocess.Popen") as mock_popen:
+            mock_popen.return_value.stdout = io.BufferedReader(io.BytesIO(b""))
+            sampler.start()
+            sampler.stop()
+        args = mock_popen.call_args.args[0]
+        assert args[1].endswith("analogSample.py")
+        assert args[2:] == ["10.0", "0.5", "one", "two"]
+
+
+@pytest.fixture
+def segment(tmp_path):
+    seg = SharedDoorState(str(tmp_path / "door-state"))
+    yield seg
+    seg.close()
+
+
+def _api_headers(mock_db):
+    mock_db.get_user_by_api_key.return_value = {
+        "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+    }
+    return {"X-API-Key": secrets.token_hex(32)}
+
+
+class TestAnalogMetricsEndpoint:
+    def test_segment_round_trip(self, segment):
+        assert segment.read_analog() is None
+        sampler = _sampler(on_tick=segment.publish_analog)
+        sampler.feed(_records([0.0, 0.1], [2.5, 2.5], [0.3, 0.5]))
+        metrics = sampler.metrics()
+        shared = segment.read_analog()
+        assert shared["samples"] == 2
+        assert set(shared["channels"]) == {"one", "two"}
+        assert shared["channels"]["two"]["max"] == pytest.approx(0.5)
+        assert shared["position"] == pytest.approx(metrics["position"])
+        assert shared["motor_current"] == pytest.approx(metrics["motor_current"])
+
+    def test_api_analog_serves_segment_metrics(self, client, mock_db, segment):
+        _sampler(on_tick=segment.publish_analog).feed(_records([0.0], [4.5], [0.2]))
+        with patch.object(app_module, "door_state_segment", segment):
+            response = client.get("/api/analog", headers=_api_headers(mock_db))
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data["success"] is True
+        assert data["position"]["percent"] == pytest.approx(100.0)
+        assert data["motor_current"]["amps"] == pytest.approx(2.0)
+
+    def test_api_analog_without_readings(self, client, mock_db, segment):
+        with patch.object(app_module, "door_state_segment", segment):
+            response = client.get("/api/analog", headers=_api_headers(mock_db))
+        assert response.status_code == 503
+
+    def test_api_analog_rejects_stale_metrics(self, client, mock_db, segment):
+        sampler = _sampler(on_tick=segment.publish_analog)
+        with patch("time.time", return_value=time.time() - 600):
+            sampler.feed(_records([0.0], [1.0], [0.1]))
+        with patch.object(app_module, "door_state_segment", segment):
+            response = client.get("/api/analog", headers=_api_headers(mock_db))
+        assert response.status_code == 503
+
+    def test_api_analog_requires_api_key(self, client):
+        assert client.get("/api/analog").status_code == 401
+
+
+class TestAnalogService:
+    def test_disabled_by_default(self, monkeypatch):
+        monkeypatch.delenv("ANALOG_SAMPLING_ENABLED", raising=False)
+        with patch.object(app_module, "AnalogSampler") as sampler_class:
+            app_module.start_analog_sampler()
+        sampler_class.assert_not_called()
+
+    def test_runs_with_the_leader_jobs(self, monkeypatch):
+        monkeypatch.setenv("ANALOG_SAMPLING_ENABLED", "true")
+        with patch.object(app_module, "AnalogSampler") as sampler_class, \
+                patch.object(app_module, "scheduler", MagicMock()):
+            app_module.start_leader_jobs()
+            assert app_module.analog_sampler is sampler_class.return_value
+            sampler_class.return_value.start.assert_called_once()
+            app_module.stop_leader_jobs()
+        sampler_class.return_value.stop.assert_called_once()
+        assert app_module.analog_sampler is None
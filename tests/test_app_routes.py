@@ -159,6 +159,18 @@ class TestProfile:
         assert response.status_code == 302
         assert mock_db.update_user_profile.called
 
+    def test_profile_post_saves_open_door_alerts(self, auth_client, mock_db):
+        mock_db.update_user_profile.return_value = True
+        auth_client.post("/profile", data={"open_alert_minutes": "15", "open_alert_repeat_minutes": ""})
+        mock_db.update_open_alerts.assert_called_once_with("testuser", 15, None)
+
+    @pytest.mark.parametrize("minutes", ["0", "abc", "1441"])
+    def test_profile_post_rejects_bad_alert_minutes(self, auth_client, mock_db, minutes):
+        response = auth_client.post("/profile", data={"open_alert_minutes": minutes}, follow_redirects=True)
+        assert b"whole minutes" in response.data
+        mock_db.update_user_profile.assert_not_called()
+        mock_db.update_open_alerts.assert_not_called()
+
     def test_profile_password_change_wrong_current_password(self, auth_client, mock_db):
         mock_db.update_user_profile.return_value = True
         mock_db.verify_password.return_value = False
@@ -0,0 +1,253 @@
+"""
+Tests for the bounded per-socket send queues (backpressure.py) and the
+admin endpoint reporting their depths.
+
+Queues are driven directly with Engine.IO packets; the overflow tests use a
+real Engine.IO server and socket without any network transport, so nothing
+drains the queue, just like a client that stopped reading.
+"""
+import json
+import queue
+from unittest.mock import MagicMock, patch
+
+import engineio
+import pytest
+from engineio import packet as eio_packet
+from engineio import socket as eio_socket
+
+import app as app_module
+from backpressure import SendQueue, SendQueueMonitor, _event_name
+
+
+def _event(name, payload, namespace=""):
+    prefix = f"{namespace}," if namespace else ""
+    return eio_packet.Packet(eio_packet.MESSAGE, "2" + prefix + json.dumps([name, payload]))
+
+
+def _door(status, seq):
+    return _event("door_status_update", {"status": status, "seq": seq})
+
+
+def _make_queue(**kwargs):
+    options = dict(max_messages=3, max_bytes=10_000, grace=30.0,
+                   coalesce_events=("door_status_update",))
+    options.update(kwargs)
+    return SendQueue(queue.Queue(), **options)
+
+
+def _drain(send_queue):
+    packets = []
+    while True:
+        try:
+            packets.append(send_queue.get(block=False))
+        except queue.Empty:
+            return packets
+
+
+class TestEventName:
+    @pytest.mark.parametrize("data,expected", [
+        ('2["door_status_update",{}]', "door_status_update"),
+        ('2/admin,["door_status_update",{}]', "door_status_update"),
+        ('217["ack_me",1]', "ack_me"),
+        ('0{"sid":"x"}', None),
+        (b"\x00binary", None),
+    ])
+    def test_parses_encoded_socketio_events(self, data, expected):
+        assert _event_name(data) == expected
+
+
+class TestSendQueue:
+    def test_messages_pass_through_in_order(self):
+        send_queue = _make_queue()
+        first, second = _event("a", 1), _event("b", 2)
+        send_queue.put(first)
+        send_queue.put(second)
+        assert send_queue.stats()["messages"] == 2
+        assert _drain(send_queue) == [first, second]
+        assert send_queue.stats()["messages"] == 0
+        assert send_queue.stats()["bytes"] == 0
+
+    def test_door_updates_coalesce_to_latest_state(self):
+        send_queue = _make_queue()
+        other = _event("other", 1)
+        send_queue.put(_door("open", 1))
+        send_queue.put(other)
+        for seq in range(2, 50):
+            send_queue.put(_door("closed" if seq % 2 else "open", seq))
+        stats = send_queue.stats()
+        assert stats["messages"] == 2
+        assert stats["coalesced"] == 48
+        assert stats["superseded"] == 48
+        assert stats["dropped"] == 0
+        delivered = _drain(send_queue)
+        # Only the newest state is delivered, after everything queued before it
+        assert len(delivered) == 2
+        assert delivered[0] is other
+        assert json.loads(delivered[1].data[1:])[1]["seq"] == 49
+        assert send_queue.stats()["superseded"] == 0
+
+    def test_updates_for_different_doors_are_all_kept_in_sequence_order(self):
+        send_queue = _make_queue()
+        send_queue.put(_event("door_status_update", {"door_id": 1, "status": "open", "seq": 5}))
+        send_queue.put(_event("door_status_update", {"door_id": 2, "status": "open", "seq": 6}))
+        send_queue.put(_event("door_status_update", {"door_id": 1, "status": "closed", "seq": 7}))
+        assert send_queue.stats()["messages"] == 2
+        assert send_queue.stats()["coalesced"] == 1
+        delivered = [json.loads(pkt.data[1:])[1] for pkt in _drain(send_queue)]
+        # Door 2's update survives, and sequence numbers never go backwards for the client
+        assert [(update["door_id"], update["seq"]) for update in delivered] == [(2, 6), (1, 7)]
+        assert send_queue.stats()["bytes"] == 0
+
+    def test_door_update_after_delivery_queues_again(self):
+        send_queue = _make_queue()
+        send_queue.put(_door("open", 1))
+        _drain(send_queue)
+        send_queue.put(_door("closed", 2))
+        assert send_queue.stats()["messages"] == 1
+        assert send_queue.stats()["coalesced"] == 0
+
+    def test_superseded_updates_count_toward_the_cap(self):
+        send_queue = _make_queue(max_messages=3)
+        send_queue.put(_door("open", 1))
+        send_queue.put(_door("closed", 2))
+        send_queue.put(_door("open", 3))
+        assert send_queue.stats()["over_cap_seconds"] is None
+        # A fourth slot: over the cap, but the latest door state is still kept
+        send_queue.put(_door("closed", 4))
+        stats = send_queue.stats()
+        assert stats["over_cap_seconds"] is not None
+        assert (stats["messages"], stats["superseded"], stats["dropped"]) == (1, 3, 0)
+        send_queue.put(_event("chat", 1))
+        assert send_queue.stats()["dropped"] == 1
+        assert [json.loads(pkt.data[1:])[1]["seq"] for pkt in _drain(send_queue)] == [4]
+        assert send_queue.stats()["over_cap_seconds"] is None
+
+    def test_messages_over_cap_are_dropped(self):
+        send_queue = _make_queue(max_messages=2)
+        for i in range(5):
+            send_queue.put(_event("chat", i))
+        stats = send_queue.stats()
+        assert stats["messages"] == 2
+        assert stats["dropped"] == 3
+        assert stats["over_cap_seconds"] is not None
+
+    def test_byte_cap(self):
+        send_queue = _make_queue(max_bytes=100)
+        send_queue.put(_event("big", "x" * 60))
+        send_queue.put(_event("big", "y" * 60))
+        assert send_queue.stats()["messages"] == 1
+        assert send_queue.stats()["dropped"] == 1
+
+    def test_control_packets_are_never_capped(self):
+        send_queue = _make_queue(max_messages=1)
+        send_queue.put(_event("chat", 1))
+        send_queue.put(eio_packet.Packet(eio_packet.PING))
+        send_queue.put(None)
+        delivered = _drain(send_queue)
+        assert delivered[1].packet_type == eio_packet.PING
+        assert delivered[2] is None
+
+    def test_draining_below_cap_clears_over_cap_state(self):
+        send_queue = _make_queue(max_messages=1)
+        send_queue.put(_event("chat", 1))
+        send_queue.put(_event("chat", 2))
+        _drain(send_queue)
+        assert send_queue.stats()["over_cap_seconds"] is None
+
+    def test_overflow_callback_after_grace_period(self):
+        on_overflow = MagicMock()
+        send_queue = _make_queue(max_messages=1, grace=10.0, on_overflow=on_overflow)
+        with patch("backpressure.time.monotonic", return_value=100.0):
+            send_queue.put(_event("chat", 1))
+            send_queue.put(_event("chat", 2))
+        with patch("backpressure.time.monotonic", return_value=105.0):
+            send_queue.put(eio_packet.Packet(eio_packet.PING))
+        on_overflow.assert_not_called()
+        with patch("backpressure.time.monotonic", return_value=111.0):
+            send_queue.put(eio_packet.Packet(eio_packet.PING))
+            send_queue.put(eio_packet.Packet(eio_packet.PING))
+        on_overflow.assert_called_once_with(send_queue)
+
+
+@pytest.fixture
+def eio_server():
+    server = engineio.Server(async_mode="threading")
+    monitor = SendQueueMonitor(max_messages=2, max_bytes=10_000, grace=0.0)
+    monitor.install(server)
+    return server, monitor
+
+
+def _connect(server, sid):
+    sock = eio_socket.Socket(server, sid)
+    server.sockets[sid] = sock
+    return sock
+
+
+class TestSendQueueMonitor:
+    def test_caps_must_be_positive(self):
+        with pytest.raises(ValueError):
+            SendQueueMonitor(max_messages=0)
+
+    def test_new_sockets_get_bounded_queues(self, eio_server):
+        server, _ = eio_server
+        assert isinstance(_connect(server, "s1").queue, SendQueue)
+
+    def test_stats_report_depth_per_socket(self, eio_server):
+        server, monitor = eio_server
+        busy, idle = _connect(server, "busy"), _connect(server, "idle")
+        monitor.label("busy", "alice")
+        busy.send(_event("chat", 1))
+        busy.send(_event("chat", 2))
+        stats = monitor.stats()
+        assert [entry["sid"] for entry in stats] == ["busy", "idle"]
+        assert stats[0]["label"] == "alice"
+        assert stats[0]["messages"] == 2
+
+    def test_client_that_stays_over_cap_is_disconnected(self, eio_server):
+        server, _ = eio_server
+        disconnected = []
+        server.on("disconnect", lambda sid, reason: disconnected.append(sid))
+        slow = _connect(server, "slow")
+        for i in range(3):
+            slow.send(_event("chat", i))
+        assert slow.closed is True
+        assert disconnected == ["slow"]
+
+    def test_stalled_client_receiving_one_door_is_disconnected(self, eio_server):
+        server, _ = eio_server
+        stalled = _connect(server, "stalled")
+        stalled.send(_door("open", 1))
+        stalled.send(_door("closed", 2))
+        assert stalled.closed is False
+        # Every update coalesces, but the superseded ones still fill the queue
+        stalled.send(_door("open", 3))
+        assert stalled.closed is True
+
+    def test_slow_client_does_not_affect_others(self, eio_server):
+        server, _ = eio_server
+        slow, fast = _connect(server, "slow"), _connect(server, "fast")
+        for i in range(3):
+            slow.send(_event("chat", i))
+            fast.send(_event("chat", i))
+            fast.queue.get(block=False)
+        assert slow.closed is True
+        assert fast.closed is False
+        assert fast.queue.stats()["dropped"] == 0
+
+
+class TestAdminSocketQueues:
+    def test_requires_admin(self, auth_client):
+        response = auth_client.get("/admin/socket_queues")
+        assert response.status_code == 302
+
+    def test_reports_caps_and_clients(self, admin_client):
+        monitor = MagicMock(max_messages=100, max_bytes=262144, grace=30.0)
+        monitor.stats.return_value = [{"sid": "abc", "label": "alice", "messages": 4}]
+        with patch.object(app_module, "send_queues", monitor):
+            response = admin_client.get("/admin/socket_queues")
+        data = response.get_json()
+        assert data["max_messages"] == 100
+        assert data["clients"][0]["label"] == "alice"
+
+    def test_app_installs_bounded_queues(self):
+        assert app_module.send_queues.eio is app_module.socketio.server.eio
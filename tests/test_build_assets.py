@@ -0,0 +1,113 @@
+"""Tests for build_assets.py and the fingerprinted static URLs in app.py."""
+import gzip
+import json
+import os
+
+import pytest
+
+import app as app_module
+import build_assets
+from build_assets import build, load_manifest, manifest_version
+
+CSS = b"body { color: #333; }\n" * 40
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    _write(tmp_path / "css" / "style.css", CSS)
+    _write(tmp_path / "js" / "app.js", b"console.log('garage');\n" * 40)
+    _write(tmp_path / "img" / "tiny.png", b"\x89PNG tiny")
+    return tmp_path
+
+
+class TestBuild:
+    def test_writes_hashed_copies_and_manifest(self, static_dir):
+        assets = build(str(static_dir))
+        assert set(assets) == {"css/style.css", "js/app.js", "img/tiny.png"}
+        target = assets["css/style.css"]
+        assert target.startswith("dist/css/style.") and target.endswith(".css")
+        assert (static_dir / target).read_bytes() == CSS
+        assert load_manifest(str(static_dir)) == assets
+        assert manifest_version(str(static_dir))
+
+    def test_precompresses_text_assets_only(self, static_dir):
+        assets = build(str(static_dir))
+        css = static_dir / assets["css/style.css"]
+        assert gzip.decompress((static_dir / (assets["css/style.css"] + ".gz")).read_bytes()) == CSS
+        if build_assets.brotli is not None:
+            assert build_assets.brotli.decompress(css.with_name(css.name + ".br").read_bytes()) == CSS
+        assert not (static_dir / (assets["img/tiny.png"] + ".gz")).exists()
+
+    def test_hash_follows_content(self, static_dir):
+        first = build(str(static_dir))
+        assert build(str(static_dir)) == first
+        _write(static_dir / "css" / "style.css", CSS + b"a { color: red; }\n")
+        second = build(str(static_dir))
+        assert second["css/style.css"] != first["css/style.css"]
+        assert second["js/app.js"] == first["js/app.js"]
+
+    def test_keeps_only_the_previous_build(self, static_dir):
+        first = build(str(static_dir))["css/style.css"]
+        _write(static_dir / "css" / "style.css", CSS + b"/* 2 */\n")
+        second = build(str(static_dir))["css/style.css"]
+        assert (static_dir / first).exists()
+        assert (static_dir / (first + ".gz")).exists()
+        _write(static_dir / "css" / "style.css", CSS + b"/* 3 */\n")
+        build(str(static_dir))
+        assert not (static_dir / first).exists()
+        assert not (static_dir / (first + ".gz")).exists()
+        assert (static_dir / second).exists()
+
+    def test_missing_or_broken_manifest(self, tmp_path):
+        assert load_manifest(str(tmp_path)) == {}
+        _write(tmp_path / "dist" / "manifest.json", b"{not json")
+        assert load_manifest(str(tmp_path)) == {}
+        assert manifest_version(str(tmp_path)) is None
+
+
+class TestFingerprintedStatic:
+    @pytest.fixture
+    def built(self, app, static_dir, monkeypatch):
+        assets = build(str(static_dir))
+        monkeypatch.setattr(app, "static_folder", str(static_dir))
+        monkeypatch.setattr(app_module, "asset_manifest", assets)
+        return assets
+
+    def test_url_for_uses_hashed_names(self, app, built):
+        with app.test_request_context():
+            assert app_module.url_for("static", filename="css/style.css") == "/static/" + built["css/style.css"]
+            assert app_module.url_for("static", filename="other.css") == "/static/other.css"
+
+    def test_pages_link_hashed_assets(self, client, built):
+        html = client.get("/login").get_data(as_text=True)
+        assert "/static/" + built["css/style.css"] in html
+        assert "/static/" + built["js/app.js"] in html
+
+    def test_serves_precompressed_variant(self, client, built):
+        response = client.get("/static/" + built["css/style.css"], headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.mimetype == "text/css"
+        assert gzip.decompress(response.data) == CSS
+        assert "immutable" in response.headers["Cache-Control"]
+        assert "Accept-Encoding" in response.headers["Vary"]
+
+    def test_serves_identity_without_accept_encoding(self, client, built):
+        response = client.get("/static/" + built["css/style.css"], headers={"Accept-Encoding": "identity"})
+        assert "Content-Encoding" not in response.headers
+        assert response.data == CSS
+
+    def test_plain_static_files_are_not_immutable(self, client, built):
+        response = client.get("/static/css/style.css")
+        assert response.status_code == 200
+        assert "immutable" not in response.headers.get("Cache-Control", "")
+
+    def test_manifest_is_valid_json(self, built, static_dir):
+        manifest = json.loads((static_dir / "dist" / "manifest.json").read_text())
+        assert manifest["assets"] == built
+        assert os.path.isfile(static_dir / manifest["assets"]["js/app.js"])
@@ -0,0 +1,159 @@
+"""Tests for compression.py and the response compression hook in app.py."""
+import gzip
+from unittest.mock import patch
+
+import pytest
+from flask import Flask, Response, jsonify
+
+import app as app_module
+import compression as compression_module
+from compression import Compressor, compression
+
+BIG = "garage door " * 200
+
+
+@pytest.fixture
+def small_app():
+    flask_app = Flask(__name__)
+    compressor = Compressor(min_size=100)
+    flask_app.after_request(compressor.after_request)
+
+    @flask_app.route("/big")
+    def big():
+        return BIG
+
+    @flask_app.route("/small")
+    def small():
+        return "tiny"
+
+    @flask_app.route("/json")
+    def json_body():
+        return jsonify({"text": BIG})
+
+    @flask_app.route("/binary")
+    def binary():
+        return Response(BIG, mimetype="application/octet-stream")
+
+    @flask_app.route("/stream")
+    def stream():
+        return Response((chunk for chunk in [BIG]), mimetype="text/plain")
+
+    @flask_app.route("/no-transform")
+    def no_transform():
+        response = Response(BIG)
+        response.cache_control.no_transform = True
+        return response
+
+    @flask_app.route("/error")
+    def error():
+        return BIG, 500
+
+    @flask_app.route("/exempt")
+    @compression(enabled=False)
+    def exempt():
+        return BIG
+
+    @flask_app.route("/low-threshold")
+    @compression(min_size=1)
+    def low_threshold():
+        return "tiny tiny tiny tiny tiny tiny tiny tiny"
+
+    @flask_app.route("/etag")
+    def etag():
+        response = Response(BIG)
+        response.set_etag("page-1")
+        return response.make_conditional(app_module.request)
+
+    flask_app.compressor = compressor
+    return flask_app
+
+
+def _get(flask_app, path, encoding="gzip"):
+    with flask_app.test_client() as c:
+        return c.get(path, headers={"Accept-Encoding": encoding})
+
+
+class TestCompressor:
+    def test_compresses_html_and_json_for_gzip_clients(self, small_app):
+        for path in ("/big", "/json"):
+            response = _get(small_app, path)
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert "Accept-Encoding" in response.headers["Vary"]
+            assert int(response.headers["Content-Length"]) == len(response.data)
+        assert gzip.decompress(_get(small_app, "/big").data).decode() == BIG
+
+    @pytest.mark.skipif(compression_module.brotli is None, reason="brotli not installed")
+    def test_prefers_brotli(self, small_app):
+        response = _get(small_app, "/big", "gzip, br")
+        assert response.headers["Content-Encoding"] == "br"
+        assert compression_module.brotli.decompress(response.data).decode() == BIG
+        assert _get(small_app, "/big", "gzip;q=1, br;q=0.5").headers["Content-Encoding"] == "gzip"
+
+    def test_clients_without_gzip_get_identity(self, small_app):
+        response = _get(small_app, "/big", "identity")
+        assert "Content-Encoding" not in response.headers
+        assert response.data.decode() == BIG
+        assert "Accept-Encoding" in response.headers["Vary"]
+
+    @pytest.mark.parametrize("path", ["/small", "/binary", "/stream", "/no-transform", "/error", "/exempt"])
+    def test_ineligible_responses_are_left_alone(self, small_app, path):
+        assert "Content-Encoding" not in _get(small_app, path).headers
+
+    def test_route_threshold_override(self, small_app):
+        assert _get(small_app, "/low-threshold").headers["Content-Encoding"] == "gzip"
+
+    def test_strong_etag_becomes_weak_and_variant_is_reused(self, small_app):
+        first = _get(small_app, "/etag")
+        assert first.headers["ETag"] == 'W/"page-1"'
+        second = _get(small_app, "/etag")
+        assert second.data == first.data
+        stats = small_app.compressor.stats()
+        assert (stats["compressed"], stats["cached_variants"], stats["variant_hits"]) == (2, 1, 1)
+        assert stats["ratio"] < 0.5
+
+    def test_weak_etag_revalidates(self, small_app):
+        with small_app.test_client() as c:
+            response = c.get("/etag", headers={"Accept-Encoding": "gzip", "If-None-Match": 'W/"page-1"'})
+        assert response.status_code == 304
+
+    def test_variant_cache_is_bounded(self):
+        compressor = Compressor(variant_cache_size=2)
+        for n in range(3):
+            compressor._store_variant((f"tag-{n}", "gzip"), b"x")
+        assert compressor._cached_variant(("tag-0", "gzip")) is None
+        assert compressor._cached_variant(("tag-2", "gzip")) == b"x"
+
+
+class TestAppCompression:
+    @pytest.fixture
+    def compressor(self):
+        compressor = Compressor(min_size=500)
+        with patch.object(app_module, "compressor", compressor):
+            yield compressor
+
+    def test_disabled_by_default(self, client):
+        assert app_module.compressor is None
+        assert "Content-Encoding" not in client.get("/login", headers={"Accept-Encoding": "gzip"}).headers
+
+    def test_cached_page_is_compressed_once(self, client, compressor):
+        plain = client.get("/privacy-policy", headers={"Accept-Encoding": "identity"})
+        first = client.get("/privacy-policy", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/privacy-policy", headers={"Accept-Encoding": "gzip"})
+        assert first.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(second.data) == plain.data
+        assert compressor.stats()["variant_hits"] == 1
+        # The weak tag from the compressed copy still revalidates
+        response = client.get("/privacy-policy", headers={"Accept-Encoding": "gzip",
+                                                          "If-None-Match": first.headers["ETag"]})
+        assert response.status_code == 304
+
+    def test_stream_route_is_exempt(self, app, compressor):
+        view = app.view_functions["api_door_status_stream"]
+        assert view.compression == {"enabled": False, "min_size": None}
+
+    def test_admin_stats(self, admin_client, compressor):
+        data = admin_client.get("/admin/compression").get_json()
+        assert data["enabled"] is True
+        assert data["min_size"] == 500
+        with patch.object(app_module, "compressor", None):
+            assert admin_client.get("/admin/compression").get_json() == {"enabled": False}
@@ -322,6 +322,29 @@ class TestUpdateUserProfile:
             assert db.update_user_profile("alice") is False
 
 
+class TestUpdateOpenAlerts:
+    def test_thresholds_passed_to_cursor(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(rowcount=1)
+        listener = MagicMock()
+        db._user_listeners = (listener,)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.update_open_alerts("alice", 15, 30) is True
+        assert cursor.execute.call_args[0][1] == (15, 30, "alice")
+        listener.assert_called_once_with("alice")
+
+    def test_user_not_found_returns_false(self):
+        db = _make_db()
+        conn, _ = _make_mock_connection(rowcount=0)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.update_open_alerts("ghost", None, None) is False
+
+    def test_db_exception_returns_false(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.update_open_alerts("alice", 15) is False
+
+
 # ---------------------------------------------------------------------------
 # deactivate_user
 # ---------------------------------------------------------------------------
@@ -462,3 +485,277 @@ class TestUpdateUserPasswordByAdmin:
         db = _make_db()
         with patch.object(db, "get_connection", side_effect=Exception("DB down")):
             assert db.update_user_password_by_admin("alice", "newpass") is False
+
+
+# ---------------------------------------------------------------------------
+# Leadership leases
+# ---------------------------------------------------------------------------
+
+
+class TestAcquireLease:
+    def test_renewal_of_own_or_expired_lease_returns_true(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(rowcount=1)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.acquire_lease("door_poller", "host-a:1", 15) is True
+        # Only the UPDATE ran; no INSERT was needed
+        assert cursor.execute.call_count == 1
+        params = cursor.execute.call_args[0][1]
+        assert params == ("host-a:1", "host-a:1", 15_000_000, "door_poller", "host-a:1")
+
+    def test_inserts_when_no_lease_row_exists(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection()
+        type(cursor).rowcount = property(MagicMock(side_effect=[0, 1]))
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.acquire_lease("door_poller", "host-a:1", 15) is True
+        assert "INSERT IGNORE" in cursor.execute.call_args[0][0]
+
+    def test_lease_held_by_other_process_returns_false(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(rowcount=0)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.acquire_lease("door_poller", "host-a:1", 15) is False
+
+    def test_returns_none_on_db_exception(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.acquire_lease("door_poller", "host-a:1", 15) is None
+
+
+class TestReleaseLease:
+    def test_releases_own_lease(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(rowcount=1)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.release_lease("door_poller", "host-a:1") is True
+        assert cursor.execute.call_args[0][1] == ("door_poller", "host-a:1")
+
+    def test_returns_false_on_exception(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.release_lease("door_poller", "host-a:1") is False
+
+
+class TestGetLease:
+    def test_returns_lease_row(self):
+        db = _make_db()
+        row = {"name": "door_poller", "holder": "host-a:1", "lease_age_seconds": 3.5}
+        conn, _ = _make_mock_connection(fetchone=row)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.get_lease("door_poller") == row
+
+    def test_returns_none_on_exception(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.get_lease("door_poller") is None
+
+
+# ---------------------------------------------------------------------------
+# Doors
+# ---------------------------------------------------------------------------
+
+
+class TestGetDoors:
+    def test_returns_active_doors(self):
+        db = _make_db()
+        rows = [{"id": 1, "name": "Left Bay", "input_channel": "one", "relay_channel": "one"}]
+        conn, cursor = _make_mock_connection(fetchall=rows)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.get_doors() == rows
+        assert "is_active = TRUE" in cursor.execute.call_args[0][0]
+
+    def test_returns_empty_list_on_exception(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.get_doors() == []
+
+
+class TestCreateDoor:
+    def test_returns_new_door_id(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection()
+        cursor.lastrowid = 2
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.create_door("Middle Bay", "two", "two") == 2
+        assert cursor.execute.call_args[0][1] == ("Middle Bay", "two", "two")
+
+    def test_input_channel_already_used_returns_none(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection()
+        cursor.execute.side_effect = pymysql.IntegrityError("Duplicate entry")
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.create_door("Again", "one", "one") is None
+
+    def test_returns_none_on_exception(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.create_door("Middle Bay", "two", "two") is None
+
+
+class TestDeactivateDoor:
+    def test_deactivates_door(self):
+        db = _make_db()
+        conn, _ = _make_mock_connection(rowcount=1)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.deactivate_door(2) is True
+
+    def test_unknown_door_returns_false(self):
+        db = _make_db()
+        conn, _ = _make_mock_connection(rowcount=0)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.deactivate_door(9) is False
+
+
+# ---------------------------------------------------------------------------
+# Notifications
+# ---------------------------------------------------------------------------
+
+
+class TestGetSmsRecipients:
+    def test_returns_opted_in_users_with_phones(self):
+        db = _make_db()
+        rows = [{"username": "alice", "phone": "+15550001"}]
+        conn, cursor = _make_mock_connection(fetchall=rows)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.get_sms_recipients() == rows
+        sql = cursor.execute.call_args[0][0]
+        assert "sms_notifications_enabled = TRUE" in sql
+        assert "is_active = TRUE" in sql
+
+    def test_raises_on_exception(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            with pytest.raises(Exception, match="DB down"):
+                db.get_sms_recipients()
+
+
+class TestDeadLetters:
+    def test_add_dead_letter_stores_event_as_json(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection()
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.add_dead_letter("sms", "http", "alice", "+15550001", "Door is open", 5, "503",
+                                      {"seq": 3}) is True
+        params = cursor.execute.call_args[0][1]
+        assert params[:7] == ("sms", "http", "alice", "+15550001", "Door is open", 5, "503")
+        assert params[7] == '{"seq": 3}'
+
+    def test_add_dead_letter_returns_false_on_exception(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.add_dead_letter("sms", "http", None, "+15550001", "x", 1, None) is False
+
+    def test_get_dead_letters_newest_first(self):
+        db = _make_db()
+        rows = [{"id": 2}, {"id": 1}]
+        conn, cursor = _make_mock_connection(fetchall=rows)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.get_dead_letters(limit=2) == rows
+        assert "ORDER BY id DESC" in cursor.execute.call_args[0][0]
+        assert cursor.execute.call_args[0][1] == (2,)
+
+
+class TestUserChangeListeners:
+    @pytest.mark.parametrize("call", [
+        lambda db: db.create_user("alice", "pw"),
+        lambda db: db.update_user_profile("alice", phone="+15550001", sms_notifications_enabled=True),
+        lambda db: db.deactivate_user("alice"),
+        lambda db: db.delete_user("alice"),
+    ])
+    def test_successful_changes_are_announced(self, call):
+        db = _make_db()
+        listener = MagicMock()
+        db.subscribe_user_changes(listener)
+        conn, _ = _make_mock_connection(fetchone={"count": 2, "role": UserRole.REGULAR.value}, rowcount=1)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert call(db) is True
+        listener.assert_called_once_with("alice")
+
+    def test_failed_changes_are_not_announced(self):
+        db = _make_db()
+        listener = MagicMock()
+        db.subscribe_user_changes(listener)
+        conn, _ = _make_mock_connection(rowcount=0)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.update_user_profile("ghost") is False
+        listener.assert_not_called()
+
+    def test_listener_errors_do_not_fail_the_change(self):
+        db = _make_db()
+        db.subscribe_user_changes(MagicMock(side_effect=RuntimeError("boom")))
+        conn, _ = _make_mock_connection(rowcount=1)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.deactivate_user("alice") is True
+
+    def test_get_sms_recipients_for_one_user(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(fetchall=[{"username": "alice", "phone": "+1"}])
+        with patch.object(db, "get_connection", return_value=conn):
+            db.get_sms_recipients("alice")
+        assert cursor.execute.call_args[0][0].endswith("AND username = %s")
+        assert cursor.execute.call_args[0][1] == ("alice",)
+
+
+# ---------------------------------------------------------------------------
+# webhooks
+# ---------------------------------------------------------------------------
+
+
+class TestWebhooks:
+    def test_create_returns_the_id(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection()
+        cursor.lastrowid = 7
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.create_webhook("alice", "https://example.com/hook", "secret", 3) == 7
+        assert cursor.execute.call_args[0][1] == ("alice", "https://example.com/hook", "secret", 3)
+
+    def test_get_webhooks_leaves_out_secrets(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(fetchall=[{"id": 7}])
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.get_webhooks("alice") == [{"id": 7}]
+        query, params = cursor.execute.call_args[0]
+        assert "secret" not in query
+        assert params == ("alice",)
+
+    def test_delete_is_scoped_to_the_owner(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(rowcount=0)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.delete_webhook(7, "mallory") is False
+        assert cursor.execute.call_args[0][1] == (7, "mallory")
+
+    def test_enqueue_queues_one_delivery_per_enabled_webhook(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(rowcount=2)
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.enqueue_webhook_deliveries("door.transition", {"id": "e-1"}) == 2
+        query, params = cursor.execute.call_args[0]
+        assert "w.enabled = TRUE" in query and "u.is_active = TRUE" in query
+        assert params[:2] == ("door.transition", '{"id": "e-1"}')
+
+    def test_due_deliveries_leave_out_saturated_endpoints(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(fetchall=[])
+        with patch.object(db, "get_connection", return_value=conn):
+            db.get_due_webhook_deliveries(limit=16, exclude_webhooks=[3, 5])
+        query, params = cursor.execute.call_args[0]
+        assert "d.webhook_id NOT IN (%s, %s)" in query
+        assert params[1:] == (3, 5, 16)
+
+    def test_failure_returns_the_consecutive_failures(self):
+        db = _make_db()
+        conn, cursor = _make_mock_connection(fetchone={"consecutive_failures": 4})
+        with patch.object(db, "get_connection", return_value=conn):
+            assert db.fail_webhook_delivery(1, 7, 3, None, "HTTP 500", 500) == 4
+        # No next attempt: the delivery is given up
+        assert cursor.execute.call_args_list[0][0][1][:2] == (3, "failed")
+
+    def test_errors_are_logged_not_raised(self):
+        db = _make_db()
+        with patch.object(db, "get_connection", side_effect=Exception("DB down")):
+            assert db.enqueue_webhook_deliveries("door.transition", {}) == 0
+            assert db.get_due_webhook_deliveries() == []
+            assert db.fail_webhook_delivery(1, 7, 1, 0.0, "x") == 0
@@ -0,0 +1,234 @@
+"""
+Tests for the sequenced door event log (door_events.py) and the Socket.IO
+resume-on-reconnect protocol in app.py.
+"""
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+from door_events import SNAPSHOT, TRANSITION, DoorEventLog
+
+socketio = app_module.socketio
+
+
+def _transition(log, status, old_status=None):
+    return log.append(TRANSITION, {"door_id": 1, "status": status, "oldStatus": old_status})
+
+
+def _updates(sio):
+    return [msg["args"][0] for msg in sio.get_received() if msg["name"] == "door_status_update"]
+
+
+class TestDoorEventLog:
+    def test_capacity_must_be_positive(self):
+        with pytest.raises(ValueError):
+            DoorEventLog(capacity=0)
+
+    def test_events_get_increasing_sequence_numbers_and_server_timestamps(self):
+        log = DoorEventLog()
+        first = _transition(log, "closed")
+        second = log.append(TRANSITION, {"status": "open"}, timestamp=1234.5)
+        assert (first["seq"], second["seq"]) == (1, 2)
+        assert first["epoch"] == log.epoch
+        assert first["timestamp"] > 0
+        assert second["timestamp"] == 1234.5
+        assert log.last_seq == 2
+
+    def test_snapshot_reflects_latest_transition(self):
+        log = DoorEventLog()
+        assert log.snapshot(1) is None
+        _transition(log, "closed")
+        _transition(log, "open", "closed")
+        snapshot = log.snapshot(1)
+        assert snapshot["type"] == SNAPSHOT
+        assert snapshot["status"] == "open"
+        assert snapshot["seq"] == 2
+        assert snapshot["oldStatus"] is None
+
+    def test_snapshots_are_kept_per_door(self):
+        log = DoorEventLog()
+        log.append(TRANSITION, {"door_id": 2, "status": "open", "oldStatus": None})
+        _transition(log, "closed")
+        assert [(s["door_id"], s["status"]) for s in log.snapshots()] == [(2, "open"), (1, "closed")]
+        assert log.snapshot(2)["seq"] == 1
+
+    def test_a_failing_listener_does_not_stop_the_others(self):
+        log = DoorEventLog()
+        failing, received = MagicMock(side_effect=RuntimeError("boom")), []
+        log.subscribe(failing)
+        log.subscribe(received.append)
+        event = _transition(log, "closed")
+        failing.assert_called_once_with(event)
+        assert received == [event]
+        assert log.snapshot(1)["status"] == "closed"
+
+    def test_clear_states_keeps_the_sequence(self):
+        log = DoorEventLog()
+        _transition(log, "closed")
+        _transition(log, "open", "closed")
+        log.clear_states()
+        assert log.snapshots() == [] and log.snapshot(1) is None
+        assert log.last_seq == 2
+        assert [event["seq"] for event in log.since(0, log.epoch)] == [1, 2]
+
+    def test_since_returns_only_missed_events(self):
+        log = DoorEventLog()
+        for status in ("closed", "open", "closed"):
+            _transition(log, status)
+        missed = log.since(1, log.epoch)
+        assert [event["seq"] for event in missed] == [2, 3]
+        assert log.since(3, log.epoch) == []
+
+    def test_since_requires_snapshot_when_replay_impossible(self):
+        log = DoorEventLog(capacity=2)
+        for status in ("closed", "open", "closed", "open"):
+            _transition(log, status)
+        # Events 2 and earlier have been evicted
+        assert log.since(1, log.epoch) is None
+        assert [event["seq"] for event in log.since(2, log.epoch)] == [3, 4]
+        # Unknown client position, another server run, or a sequence from the future
+        assert log.since(None, log.epoch) is None
+        assert log.since(3, "other-epoch") is None
+        assert log.since(9, log.epoch) is None
+
+    def test_each_log_has_its_own_epoch(self):
+        assert DoorEventLog().epoch != DoorEventLog().epoch
+
+
+@pytest.fixture
+def events():
+    log = DoorEventLog()
+    with patch.object(app_module, "door_events", log), \
+            patch.object(app_module, "door_state_segment", None):
+        yield log
+
+
+class TestResumeOnReconnect:
+    def test_poller_emits_sequenced_transition(self, events):
+        with patch.dict(app_module.last_door_states, {1: "closed"}, clear=True), \
+                patch.object(socketio, "emit") as mock_emit, \
+                patch("subprocess.run") as mock_run:
+            mock_run.return_value.stdout = "one: Door Opened\n"
+            app_module.check_door_status_and_notify()
+        payload = mock_emit.call_args.args[1]
+        assert payload["type"] == TRANSITION
+        assert payload["seq"] == 1
+        assert payload["epoch"] == events.epoch
+        assert (payload["status"], payload["oldStatus"]) == ("open", "closed")
+        assert payload["timestamp"] is not None
+
+    def test_poller_mirrors_sequence_into_shared_segment(self, events, tmp_path):
+        from shared_state import SharedDoorState
+        segment = SharedDoorState(str(tmp_path / "door-state"))
+        try:
+            _transition(events, "closed")
+            with patch.object(app_module, "door_state_segment", segment), \
+                    patch.dict(app_module.last_door_states, {1: "closed"}, clear=True), \
+                    patch("subprocess.run") as mock_run:
+                mock_run.return_value.stdout = "one: Door Opened\n"
+                app_module.check_door_status_and_notify()
+            assert segment.read().sequence == events.last_seq == 2
+        finally:
+            segment.close()
+
+    def test_fresh_connection_gets_snapshot(self, app, auth_client, events):
+        _transition(events, "closed")
+        sio = socketio.test_client(app, flask_test_client=auth_client)
+        updates = _updates(sio)
+        sio.disconnect()
+        assert len(updates) == 1
+        assert updates[0]["type"] == SNAPSHOT
+        assert updates[0]["status"] == "closed"
+
+    def test_reconnect_replays_only_missed_events(self, app, auth_client, events):
+        _transition(events, "closed")
+        _transition(events, "open", "closed")
+        _transition(events, "closed", "open")
+        sio = socketio.test_client(app, flask_test_client=auth_client,
+                                   auth={"last_seq": 1, "epoch": events.epoch})
+        updates = _updates(sio)
+        sio.disconnect()
+        assert [update["seq"] for update in updates] == [2, 3]
+        assert all(update["type"] == TRANSITION for update in updates)
+
+    def test_up_to_date_reconnect_gets_nothing(self, app, auth_client, events):
+        _transition(events, "closed")
+        sio = socketio.test_client(app, flask_test_client=auth_client,
+                                   auth={"last_seq": 1, "epoch": events.epoch})
+        assert _updates(sio) == []
+        sio.disconnect()
+
+    def test_reconnect_after_server_restart_gets_snapshot(self, app, auth_client, events):
+        _transition(events, "open")
+        sio = socketio.test_client(app, flask_test_client=auth_client,
+                                   auth={"last_seq": 40, "epoch": "previous-run"})
+        updates = _updates(sio)
+        sio.disconnect()
+        assert [update["type"] for update in updates] == [SNAPSHOT]
+
+    def test_malformed_resume_position_gets_snapshot(self, app, auth_client, events):
+        _transition(events, "open")
+        sio = socketio.test_client(app, flask_test_client=auth_client,
+                                   auth={"last_seq": "1", "epoch": events.epoch})
+        assert [update["type"] for update in _updates(sio)] == [SNAPSHOT]
+        sio.disconnect()
+
+    def test_request_status_resumes_from_position(self, app, auth_client, events):
+        _transition(events, "closed")
+        sio = socketio.test_client(app, flask_test_client=auth_client)
+        sio.get_received()
+        _transition(events, "open", "closed")
+        sio.emit("request_status", {"last_seq": 1, "epoch": events.epoch})
+        updates = _updates(sio)
+        sio.disconnect()
+        assert [(update["type"], update["seq"]) for update in updates] == [(TRANSITION, 2)]
+
+
+def _initial_state(html):
+    marker = '<script id="initialDoorState" type="application/json">'
+    start = html.index(marker) + len(marker)
+    return json.loads(html[start:html.index("</script>", start)])
+
+
+class TestDashboardInitialState:
+    def test_dashboard_renders_current_state(self, auth_client, events):
+        _transition(events, "closed")
+        events.append(TRANSITION, {"door_id": 1, "status": "open", "oldStatus": "closed",
+                                   "state": "opening", "oldState": "closed"})
+        html = auth_client.get("/").get_data(as_text=True)
+        assert "OPENING" in html
+        assert "CLOSED" not in html
+        state = _initial_state(html)
+        assert (state["epoch"], state["last_seq"]) == (events.epoch, 2)
+        assert [(door["door_id"], door["state"]) for door in state["doors"]] == [(1, "opening")]
+
+    def test_dashboard_before_first_reading(self, auth_client, events):
+        html = auth_client.get("/").get_data(as_text=True)
+        assert "UNKNOWN" in html
+        assert _initial_state(html) == {"epoch": events.epoch, "last_seq": 0, "doors": []}
+
+    def test_socket_resumes_from_rendered_position(self, app, auth_client, events):
+        _transition(events, "closed")
+        state = _initial_state(auth_client.get("/").get_data(as_text=True))
+        _transition(events, "open", "closed")
+        sio = socketio.test_client(app, flask_test_client=auth_client,
+                                   auth={"last_seq": state["last_seq"], "epoch": state["epoch"]})
+        updates = _updates(sio)
+        sio.disconnect()
+        assert [(update["type"], update["seq"]) for update in updates] == [(TRANSITION, 2)]
+
+    def test_shared_segment_state_needs_a_snapshot_to_resume(self, auth_client, events, tmp_path):
+        from shared_state import SharedDoorState
+        segment = SharedDoorState(str(tmp_path / "door-state"))
+        try:
+            segment.publish_status("open", sequence=7, door_id=1)
+            with patch.object(app_module, "door_state_segment", segment):
+                html = auth_client.get("/").get_data(as_text=True)
+        finally:
+            segment.close()
+        assert "OPEN" in html
+        state = _initial_state(html)
+        assert (state["epoch"], state["last_seq"]) == (None, None)
+        assert state["doors"][0]["seq"] == 7
@@ -0,0 +1,233 @@
+"""
+Tests for the door state machine (door_state.py) and how the poller in
+app.py feeds it actuations and readings.
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+from door_events import ACTUATION, DoorEventLog
+from door_state import (CLOSED, CLOSING, DID_NOT_CLOSE, DID_NOT_OPEN, OPEN, OPENING, STUCK, UNKNOWN,
+                        DoorStateMachine, TravelTimeStats)
+from shared_state import SharedDoorState
+
+
+def _machine(sensor, at=1000.0, travel_time=10.0, margin=5.0):
+    machine = DoorStateMachine(travel_time=travel_time, margin=margin)
+    machine.observe(sensor, at)
+    return machine
+
+
+class TestTravelTimeStats:
+    def test_first_sample_replaces_the_default(self):
+        stats = TravelTimeStats(15.0)
+        stats.add(12.0)
+        assert stats.mean == 12.0
+        assert stats.samples == 1
+
+    def test_mean_follows_samples_and_variance_shrinks(self):
+        stats = TravelTimeStats(15.0)
+        for _ in range(30):
+            stats.add(12.0)
+        assert stats.mean == pytest.approx(12.0)
+        assert stats.stddev < 0.5
+        assert stats.timeout(margin=5.0) == pytest.approx(17.0, abs=1.5)
+
+    def test_outlier_widens_the_timeout(self):
+        stats = TravelTimeStats(12.0)
+        stats.add(12.0)
+        steady = stats.timeout(margin=0)
+        stats.add(20.0)
+        assert stats.timeout(margin=0) > steady
+
+
+class TestDoorStateMachine:
+    def test_first_reading_sets_the_state(self):
+        assert _machine(CLOSED).state == CLOSED
+        assert _machine(OPEN).state == OPEN
+        assert _machine("unknown").state == UNKNOWN
+
+    def test_actuation_from_closed_opens_then_completes_after_travel_time(self):
+        machine = _machine(CLOSED)
+        assert machine.actuate(1001.0) == OPENING
+        assert machine.moving
+        # The sensor has not left closed yet: still opening
+        assert machine.observe(CLOSED, 1002.0) == OPENING
+        assert machine.observe(OPEN, 1005.0) == OPENING
+        assert machine.observe(OPEN, 1011.0) == OPEN
+        assert not machine.moving
+
+    def test_actuation_from_open_closes_and_learns_travel_time(self):
+        machine = _machine(OPEN)
+        assert machine.actuate(1001.0) == CLOSING
+        assert machine.observe(OPEN, 1005.0) == CLOSING
+        assert machine.observe(CLOSED, 1013.0) == CLOSED
+        assert machine.travel.samples == 1
+        assert machine.travel.mean == 12.0
+
+    def test_door_that_never_leaves_closed_is_stuck(self):
+        machine = _machine(CLOSED)
+        machine.actuate(1001.0)
+        timeout = machine.travel.timeout(machine.margin)
+        assert machine.observe(CLOSED, 1001.0 + timeout - 1) == OPENING
+        assert machine.observe(CLOSED, 1001.0 + timeout + 1) == STUCK
+        assert machine.stuck_reason == DID_NOT_OPEN
+        # Stays stuck while nothing changes; the sensor leaving closed starts the opening
+        assert machine.observe(CLOSED, 1100.0) == STUCK
+        assert machine.observe(OPEN, 1101.0) == OPENING
+
+    def test_door_that_never_reaches_closed_is_obstructed(self):
+        machine = _machine(OPEN)
+        machine.actuate(1001.0)
+        timeout = machine.travel.timeout(machine.margin)
+        assert machine.observe(OPEN, 1001.0 + timeout + 1) == STUCK
+        assert machine.stuck_reason == DID_NOT_CLOSE
+        assert machine.observe(OPEN, 1100.0) == STUCK
+        # A late close is not learned as a travel time
+        assert machine.observe(CLOSED, 1101.0) == CLOSED
+        assert machine.stuck_reason is None
+        assert machine.travel.samples == 0
+
+    def test_opened_by_remote_goes_through_opening(self):
+        machine = _machine(CLOSED, at=1000.0)
+        # Left closed some time after the previous reading
+        assert machine.observe(OPEN, 1005.0) == OPENING
+        assert machine.observe(OPEN, 1010.0) == OPEN
+
+    def test_closed_by_remote_is_closed_at_once(self):
+        machine = _machine(OPEN)
+        assert machine.observe(CLOSED, 1005.0) == CLOSED
+        assert machine.travel.samples == 0
+
+    def test_second_press_stops_the_door(self):
+        machine = _machine(OPEN)
+        machine.actuate(1001.0)
+        assert machine.actuate(1003.0) == OPEN
+        assert not machine.moving
+
+    def test_actuation_is_applied_once(self):
+        machine = _machine(OPEN)
+        machine.actuate(1001.0)
+        assert machine.actuate(1001.0) == CLOSING
+
+    def test_actuation_before_any_reading_is_ignored(self):
+        machine = DoorStateMachine()
+        assert machine.actuate(1001.0) == UNKNOWN
+        machine.observe(OPEN, 1002.0)
+        assert machine.actuate(1001.0) == OPEN
+
+    def test_reset_keeps_travel_times_and_applied_actuations(self):
+        machine = _machine(OPEN)
+        machine.actuate(1001.0)
+        machine.observe(CLOSED, 1011.0)
+        machine.reset()
+        assert machine.state == UNKNOWN
+        assert machine.travel.samples == 1
+        machine.observe(CLOSED, 1020.0)
+        assert machine.actuate(1001.0) == CLOSED
+
+
+@pytest.fixture
+def poller(tmp_path):
+    segment = SharedDoorState(str(tmp_path / "door-state"))
+    with patch.object(app_module, "door_events", DoorEventLog()), \
+            patch.object(app_module, "door_state_segment", segment), \
+            patch.dict(app_module.last_door_states, clear=True), \
+            patch.dict(app_module.door_machines, clear=True), \
+            patch.dict(app_module.logged_actuations, clear=True):
+        yield segment
+    segment.close()
+
+
+def _poll(reading, now):
+    with patch("subprocess.run") as mock_run, patch.object(app_module.socketio, "emit") as mock_emit, \
+            patch("time.time", return_value=now):
+        mock_run.return_value.stdout = f"one: {reading}\n"
+        app_module.check_door_status_and_notify()
+    return [call.args[1] for call in mock_emit.call_args_list]
+
+
+class TestPollerStateMachine:
+    def test_transitions_carry_the_inferred_state(self, poller):
+        _poll("Door Opened", 1000.0)
+        with patch("time.time", return_value=1001.0):
+            app_module._record_actuation(True, 1)
+        events = _poll("Door Opened", 1002.0)
+        assert len(events) == 1
+        assert events[0]["status"] == "open"
+        assert events[0]["oldStatus"] == "open"
+        assert events[0]["state"] == CLOSING
+        assert events[0]["oldState"] == OPEN
+
+        events = _poll("Door Closed", 1013.0)
+        assert events[0]["state"] == CLOSED
+        assert app_module.door_machines[1].travel.mean == 12.0
+
+    def test_shared_segment_publishes_the_state(self, poller):
+        _poll("Door Closed", 1000.0)
+        app_module.door_machines[1].actuate(1001.0)
+        _poll("Door Closed", 1002.0)
+        snapshot = poller.read(1)
+        assert snapshot.status == "closed"
+        assert snapshot.state == OPENING
+
+    def test_actuations_from_other_workers_come_from_the_segment(self, poller):
+        _poll("Door Opened", 1000.0)
+        poller.publish_actuation(True, timestamp=1001.0, door_id=1)
+        events = _poll("Door Opened", 1002.0)
+        assert events[0]["state"] == CLOSING
+
+    def test_other_workers_actuations_are_logged_once(self, poller):
+        _poll("Door Opened", 1000.0)
+        poller.publish_actuation(False, timestamp=1001.0, door_id=1)
+        _poll("Door Opened", 1002.0)
+        _poll("Door Opened", 1003.0)
+        actuations = [event for event in app_module.door_events.since(0, app_module.door_events.epoch)
+                      if event["type"] == ACTUATION]
+        assert [(event["result"], event["timestamp"]) for event in actuations] == [("failure", 1001.0)]
+
+    def test_own_actuations_are_not_relayed_again(self, poller):
+        _poll("Door Opened", 1000.0)
+        with patch("time.time", return_value=1001.0):
+            app_module._record_actuation(True, 1)
+        _poll("Door Opened", 1002.0)
+        events = app_module.door_events.since(0, app_module.door_events.epoch)
+        assert [event["type"] for event in events].count(ACTUATION) == 1
+
+    def test_new_leader_does_not_relay_earlier_actuations(self, poller):
+        poller.publish_status("closed", timestamp=980.0, door_id=1)
+        poller.publish_actuation(True, timestamp=990.0, door_id=1)
+        with patch.object(app_module, "scheduler", MagicMock()):
+            app_module.start_leader_jobs()
+        _poll("Door Closed", 1000.0)
+        events = app_module.door_events.since(0, app_module.door_events.epoch)
+        assert ACTUATION not in [event["type"] for event in events]
+
+    def test_failed_actuation_starts_no_motion(self, poller):
+        _poll("Door Opened", 1000.0)
+        poller.publish_actuation(False, timestamp=1001.0, door_id=1)
+        assert _poll("Door Opened", 1002.0) == []
+
+    def test_first_reading_after_reelection_infers_nothing(self, poller):
+        _poll("Door Closed", 1000.0)
+        app_module.last_door_states.clear()
+        events = _poll("Door Opened", 1005.0)
+        assert events[0]["state"] == OPEN
+        assert events[0]["oldState"] is None
+
+    def test_poller_speeds_up_while_a_door_moves(self, poller, monkeypatch):
+        monkeypatch.setenv("DOOR_MOTION_POLL_INTERVAL", "1")
+        monkeypatch.setenv("DOOR_STATUS_REFRESH_INTERVAL", "10")
+        scheduler = MagicMock()
+        with patch.object(app_module, "scheduler", scheduler), patch.object(app_module, "poll_interval", 10):
+            _poll("Door Closed", 1000.0)
+            scheduler.reschedule_job.assert_not_called()
+
+            app_module.door_machines[1].actuate(1001.0)
+            _poll("Door Closed", 1002.0)
+            assert scheduler.reschedule_job.call_args.kwargs["trigger"].interval.total_seconds() == 1
+
+            _poll("Door Opened", 1020.0)
+            assert scheduler.reschedule_job.call_args.kwargs["trigger"].interval.total_seconds() == 10
+            assert scheduler.reschedule_job.call_count == 2
@@ -0,0 +1,181 @@
+"""
+Tests for the Server-Sent Events door stream (/api/door_status/stream in
+app.py) and the blocking reads of the door event log it is built on.
+"""
+import json
+import secrets
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+from door_events import ACTUATION, SNAPSHOT, TRANSITION, DoorEventLog
+from user_roles import UserRole
+
+
+def _transition(log, status, old_status=None):
+    return log.append(TRANSITION, {"door_id": 1, "status": status, "oldStatus": old_status})
+
+
+def _parse(message):
+    """Turn one SSE message into a dict of its fields, with data decoded from JSON."""
+    fields = {}
+    for line in message.strip().splitlines():
+        name, _, value = line.partition(": ")
+        fields[name] = value
+    if "data" in fields:
+        fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+@pytest.fixture
+def events():
+    log = DoorEventLog()
+    with patch.object(app_module, "door_events", log), \
+            patch.object(app_module, "door_state_segment", None):
+        yield log
+
+
+class TestWaitForEvents:
+    def test_returns_immediately_when_behind(self):
+        log = DoorEventLog()
+        _transition(log, "open")
+        assert [event["seq"] for event in log.wait_for_events(0, timeout=5)] == [1]
+
+    def test_times_out_with_no_events(self):
+        log = DoorEventLog()
+        start = time.monotonic()
+        assert log.wait_for_events(0, timeout=0.05) == []
+        assert time.monotonic() - start >= 0.05
+
+    def test_wakes_up_on_append(self):
+        log = DoorEventLog()
+        timer = threading.Timer(0.05, _transition, args=(log, "closed"))
+        timer.start()
+        try:
+            events = log.wait_for_events(0, timeout=5)
+        finally:
+            timer.join()
+        assert [event["status"] for event in events] == ["closed"]
+
+
+class TestEventStream:
+    def test_fresh_client_gets_retry_then_snapshot(self, events):
+        _transition(events, "closed")
+        stream = app_module._door_event_stream(None, heartbeat=5)
+        assert next(stream) == "retry: 5000\n\n"
+        message = _parse(next(stream))
+        assert message["event"] == SNAPSHOT
+        assert message["id"] == f"{events.epoch}:1"
+        assert message["data"]["status"] == "closed"
+
+    def test_live_transitions_and_actuations_follow(self, events):
+        _transition(events, "closed")
+        stream = app_module._door_event_stream(None, heartbeat=5)
+        next(stream), next(stream)
+        events.append(ACTUATION, {"door_id": 1, "result": "success"})
+        _transition(events, "open", "closed")
+        assert _parse(next(stream))["event"] == ACTUATION
+        message = _parse(next(stream))
+        assert message["event"] == TRANSITION
+        assert message["id"] == f"{events.epoch}:3"
+
+    def test_last_event_id_resumes_without_snapshot(self, events):
+        for status in ("closed", "open", "closed"):
+            _transition(events, status)
+        stream = app_module._door_event_stream(f"{events.epoch}:1", heartbeat=5)
+        next(stream)
+        assert [_parse(next(stream))["id"] for _ in range(2)] == [f"{events.epoch}:2", f"{events.epoch}:3"]
+
+    @pytest.mark.parametrize("last_event_id", ["old-epoch:7", "garbage", ""])
+    def test_unusable_last_event_id_gets_snapshot(self, events, last_event_id):
+        _transition(events, "open")
+        stream = app_module._door_event_stream(last_event_id, heartbeat=5)
+        next(stream)
+        assert _parse(next(stream))["event"] == SNAPSHOT
+
+    def test_heartbeat_when_idle(self, events):
+        stream = app_module._door_event_stream(None, heartbeat=0.05)
+        next(stream)
+        assert next(stream) == ": heartbeat\n\n"
+
+    def test_standby_worker_follows_shared_segment(self, events):
+        segment = MagicMock()
+        segment.read_all.return_value = [MagicMock(status="open", state="open", stuck_reason=None, sequence=7, updated_at=1000.0, door_id=1)]
+        with patch.object(app_module, "door_state_segment", segment):
+            stream = app_module._door_event_stream(None, heartbeat=0.2)
+            next(stream)
+            first = _parse(next(stream))
+            segment.read_all.return_value = [MagicMock(status="closed", state="closed", stuck_reason=None, sequence=8, updated_at=1010.0, door_id=1)]
+            second = _parse(next(stream))
+        assert "id" not in first
+        assert (first["data"]["status"], first["data"]["seq"]) == ("open", 7)
+        assert (second["data"]["status"], second["data"]["seq"]) == ("closed", 8)
+
+    def test_demoted_leader_follows_shared_segment(self, events):
+        _transition(events, "open")
+        segment = MagicMock()
+        segment.read_all.return_value = [MagicMock(status="closed", state="closed", stuck_reason=None, sequence=8, updated_at=1000.0, door_id=1)]
+        with patch.object(app_module, "door_state_segment", segment), \
+                patch.object(app_module, "scheduler", MagicMock()):
+            app_module.stop_leader_jobs()
+            stream = app_module._door_event_stream(None, heartbeat=0.2)
+            next(stream)
+            first = _parse(next(stream))
+            segment.read_all.return_value = [MagicMock(status="open", state="open", stuck_reason=None, sequence=9, updated_at=1010.0, door_id=1)]
+            second = _parse(next(stream))
+        # The new leader's state, not this process's last reading
+        assert (first["data"]["status"], first["data"]["seq"]) == ("closed", 8)
+        assert (second["data"]["status"], second["data"]["seq"]) == ("open", 9)
+
+
+class TestStreamEndpoint:
+    def _api_user(self, mock_db):
+        mock_db.get_user_by_api_key.return_value = {
+            "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+        }
+
+    def test_requires_api_key(self, client):
+        assert client.get("/api/door_status/stream").status_code == 401
+
+    def test_streams_event_stream(self, client, mock_db, events):
+        self._api_user(mock_db)
+        _transition(events, "closed")
+        response = client.get("/api/door_status/stream", headers={
+            "X-API-Key": secrets.token_hex(32),
+            "Last-Event-ID": f"{events.epoch}:0",
+        })
+        try:
+            assert response.status_code == 200
+            assert response.mimetype == "text/event-stream"
+            assert response.headers["X-Accel-Buffering"] == "no"
+            chunks = response.iter_encoded()
+            next(chunks)
+            message = _parse(next(chunks).decode())
+        finally:
+            response.close()
+        # Authenticated once for the whole stream
+        assert mock_db.get_user_by_api_key.call_count == 1
+        assert message["event"] == TRANSITION
+        assert message["data"]["status"] == "closed"
+
+    def test_actuation_recorded_in_stream(self, auth_client, events):
+        with patch("subprocess.run") as mock_run:
+            mock_run.return_value.returncode = 1
+            mock_run.return_value.stdout = ""
+            mock_run.return_value.stderr = "relay error"
+            auth_client.post("/run_script")
+        (event,) = events.since(0, events.epoch)
+        assert (event["type"], event["result"]) == (ACTUATION, "failure")
+
+    def test_socket_replay_skips_actuations(self, app, auth_client, events):
+        _transition(events, "closed")
+        events.append(ACTUATION, {"door_id": 1, "result": "success"})
+        _transition(events, "open", "closed")
+        sio = app_module.socketio.test_client(app, flask_test_client=auth_client,
+                                              auth={"last_seq": 1, "epoch": events.epoch})
+        updates = [msg["args"][0] for msg in sio.get_received() if msg["name"] == "door_status_update"]
+        sio.disconnect()
+        assert [update["seq"] for update in updates] == [3]
@@ -0,0 +1,225 @@
+"""
+Tests for multi-door support in app.py: the doors configuration, the
+batched sampler, per-door state, rooms and endpoints.
+
+Every test runs against three doors on inputs/relays one to three and its
+own shared door segment under tmp_path.
+"""
+import secrets
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+from door_events import DoorEventLog, TRANSITION
+from shared_state import SharedDoorState
+from user_roles import UserRole
+
+DOORS = [
+    {"id": 1, "name": "Left Bay", "input_channel": "one", "relay_channel": "one"},
+    {"id": 2, "name": "Middle Bay", "input_channel": "two", "relay_channel": "two"},
+    {"id": 5, "name": "Right Bay", "input_channel": "three", "relay_channel": "three"},
+]
+
+
+@pytest.fixture
+def doors(tmp_path):
+    segment = SharedDoorState(str(tmp_path / "door-state"))
+    with patch.object(app_module, "doors", DOORS), \
+            patch.object(app_module, "door_events", DoorEventLog()), \
+            patch.object(app_module, "door_state_segment", segment), \
+            patch.dict(app_module.last_door_states, clear=True), \
+            patch.dict(app_module.door_machines, clear=True):
+        yield segment
+    segment.close()
+
+
+def _sample(stdout):
+    with patch("subprocess.run") as mock_run, patch.object(app_module.socketio, "emit") as mock_emit:
+        mock_run.return_value.stdout = stdout
+        app_module.check_door_status_and_notify()
+    return mock_run, mock_emit
+
+
+def _api_headers(mock_db):
+    mock_db.get_user_by_api_key.return_value = {
+        "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+    }
+    return {"X-API-Key": secrets.token_hex(32)}
+
+
+class TestLoadDoors:
+    def test_doors_come_from_database(self, mock_db):
+        mock_db.get_doors.return_value = DOORS
+        with patch.object(app_module, "doors", []):
+            app_module.load_doors()
+            assert app_module.doors == DOORS
+
+    def test_falls_back_to_single_default_door(self, mock_db):
+        mock_db.get_doors.return_value = []
+        with patch.object(app_module, "doors", []):
+            app_module.load_doors()
+            assert [door["input_channel"] for door in app_module.doors] == ["one"]
+
+    def test_lookup_accepts_numeric_strings(self, doors):
+        assert app_module._get_door("2")["name"] == "Middle Bay"
+        assert app_module._get_door("x") is None
+        assert app_module._get_door(3) is None
+
+
+class TestBatchedSampler:
+    def test_all_inputs_read_in_one_subprocess(self, doors):
+        mock_run, _ = _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        mock_run.assert_called_once()
+        assert mock_run.call_args.args[0][-3:] == ["one", "two", "three"]
+
+    def test_each_door_gets_its_own_state_and_room(self, doors):
+        _, mock_emit = _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        rooms = {call.kwargs["to"]: call.args[1]["status"] for call in mock_emit.call_args_list}
+        assert rooms == {"door:1": "closed", "door:2": "open", "door:5": "closed"}
+        assert [(s.door_id, s.status) for s in doors.read_all()] == [(1, "closed"), (2, "open"), (5, "closed")]
+
+    def test_only_changed_doors_are_emitted(self, doors):
+        _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        _, mock_emit = _sample("one: Door Closed\ntwo: Door Closed\nthree: Door Closed\n")
+        mock_emit.assert_called_once()
+        assert mock_emit.call_args.args[1]["door_id"] == 2
+        assert mock_emit.call_args.args[1]["oldStatus"] == "open"
+
+    def test_unreadable_input_is_unknown(self, doors):
+        _sample("one: Door Closed\nthree: Door Opened\n")
+        assert doors.read(2).status == "unknown"
+
+    def test_segment_sequence_is_the_doors_last_transition(self, doors):
+        _sample("one: Door Closed\ntwo: Door Closed\nthree: Door Closed\n")
+        _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        assert doors.read(1).sequence == 1
+        assert doors.read(2).sequence == 4
+
+    def test_adding_a_door_adds_no_polling_job(self, doors):
+        scheduler = MagicMock()
+        with patch.object(app_module, "scheduler", scheduler):
+            app_module.start_leader_jobs()
+        scheduler.add_job.assert_called_once()
+
+
+class TestDoorEndpoints:
+    def test_api_doors_lists_doors_with_state(self, client, mock_db, doors):
+        _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        response = client.get("/api/doors", headers=_api_headers(mock_db))
+        listed = response.get_json()["doors"]
+        assert [door["name"] for door in listed] == ["Left Bay", "Middle Bay", "Right Bay"]
+        assert listed[1]["relay_channel"] == "two"
+        assert listed[1]["state"]["status"] == "open"
+
+    def test_api_doors_state_is_none_before_first_reading(self, client, mock_db, doors):
+        response = client.get("/api/doors", headers=_api_headers(mock_db))
+        assert all(door["state"] is None for door in response.get_json()["doors"])
+
+    def test_api_doors_requires_api_key(self, client):
+        assert client.get("/api/doors").status_code == 401
+
+    def test_door_status_by_door_id(self, auth_client, doors):
+        _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        data = auth_client.get("/door_status?door_id=2").get_json()
+        assert (data["door_id"], data["status"]) == (2, "open")
+
+    def test_door_status_defaults_to_first_door(self, auth_client, doors):
+        _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        assert auth_client.get("/door_status").get_json()["door_id"] == 1
+
+    def test_unknown_door_is_404(self, auth_client, doors):
+        assert auth_client.get("/door_status?door_id=9").status_code == 404
+
+    def test_live_read_uses_the_doors_input(self, auth_client, doors):
+        with patch("subprocess.run") as mock_run:
+            mock_run.return_value.stdout = "three: Door Opened\n"
+            mock_run.return_value.stderr = ""
+            data = auth_client.get("/door_status?door_id=5").get_json()
+        assert mock_run.call_args.args[0][-1] == "three"
+        assert (data["door_id"], data["status"]) == (5, "open")
+
+    def test_run_script_pulses_the_doors_relay(self, auth_client, doors):
+        with patch("subprocess.run") as mock_run:
+            mock_run.return_value.returncode = 0
+            mock_run.return_value.stdout = ""
+            mock_run.return_value.stderr = ""
+            response = auth_client.post("/run_script", json={"door_id": 5})
+        assert response.get_json()["success"] is True
+        assert mock_run.call_args.args[0][-1] == "three"
+        assert doors.read_all() == []  # actuation recorded, but no reading yet
+        (event,) = app_module.door_events.since(0, app_module.door_events.epoch)
+        assert event["door_id"] == 5
+
+    def test_run_script_unknown_door(self, auth_client, doors):
+        with patch("subprocess.run") as mock_run:
+            response = auth_client.post("/run_script", json={"door_id": 9})
+        assert response.status_code == 404
+        mock_run.assert_not_called()
+
+    def test_dashboard_renders_every_door(self, auth_client, doors):
+        html = auth_client.get("/").data.decode()
+        for door in DOORS:
+            assert f'data-door-id="{door["id"]}"' in html
+            assert door["name"] in html
+
+
+class TestAdminDoors:
+    def test_lists_doors_and_channels(self, admin_client, mock_db):
+        mock_db.get_doors.return_value = DOORS
+        data = admin_client.get("/admin/doors").get_json()
+        assert data == {"doors": DOORS, "channels": ["one", "two", "three"]}
+
+    def test_creates_door(self, admin_client, mock_db):
+        mock_db.create_door.return_value = 4
+        response = admin_client.post("/admin/doors", json={"name": " Right Bay ", "input_channel": "two",
+                                                            "relay_channel": "three"})
+        assert response.status_code == 201
+        assert response.get_json()["door"] == {"id": 4, "name": "Right Bay", "input_channel": "two",
+                                               "relay_channel": "three"}
+        mock_db.create_door.assert_called_once_with("Right Bay", "two", "three")
+
+    @pytest.mark.parametrize("body,error", [
+        ({"input_channel": "two", "relay_channel": "two"}, "name"),
+        ({"name": "Bay", "input_channel": "four", "relay_channel": "two"}, "input_channel"),
+        ({"name": "Bay", "input_channel": "2", "relay_channel": "two"}, "input_channel"),
+        ({"name": "Bay", "input_channel": "two"}, "relay_channel"),
+    ])
+    def test_unsupported_channels_are_refused(self, admin_client, mock_db, body, error):
+        response = admin_client.post("/admin/doors", json=body)
+        assert response.status_code == 400
+        assert error in response.get_json()["error"]
+        mock_db.create_door.assert_not_called()
+
+    def test_channel_already_assigned(self, admin_client, mock_db):
+        mock_db.create_door.return_value = None
+        response = admin_client.post("/admin/doors", json={"name": "Again", "input_channel": "one",
+                                                            "relay_channel": "one"})
+        assert response.status_code == 500
+        assert response.get_json()["success"] is False
+
+    def test_deactivates_door(self, admin_client, mock_db):
+        mock_db.deactivate_door.return_value = True
+        assert admin_client.post("/admin/doors/2/deactivate").get_json() == {"success": True}
+        mock_db.deactivate_door.assert_called_once_with(2)
+        mock_db.deactivate_door.return_value = False
+        assert admin_client.post("/admin/doors/9/deactivate").status_code == 404
+
+    def test_requires_admin(self, auth_client, mock_db):
+        assert auth_client.post("/admin/doors", json={"name": "Bay", "input_channel": "two",
+                                                      "relay_channel": "two"}).status_code == 302
+        assert auth_client.post("/admin/doors/1/deactivate").status_code == 302
+        mock_db.create_door.assert_not_called()
+        mock_db.deactivate_door.assert_not_called()
+
+
+class TestDoorRooms:
+    def test_socket_joins_every_door_room_and_gets_each_state(self, app, auth_client, doors):
+        _sample("one: Door Closed\ntwo: Door Opened\nthree: Door Closed\n")
+        sio = app_module.socketio.test_client(app, flask_test_client=auth_client)
+        sid = app_module.socketio.server.manager.sid_from_eio_sid(sio.eio_sid, "/")
+        rooms = set(app_module.socketio.server.manager.get_rooms(sid, "/"))
+        updates = [msg["args"][0] for msg in sio.get_received() if msg["name"] == "door_status_update"]
+        sio.disconnect()
+        assert {"door:1", "door:2", "door:5"} <= rooms
+        assert sorted((u["door_id"], u["status"]) for u in updates) == [(1, "closed"), (2, "open"), (5, "closed")]
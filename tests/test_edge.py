@@ -0,0 +1,448 @@
+"""
+Tests for edge agent mode and central aggregation (edge.py) and their wiring
+in app.py.
+
+TestTwoProcesses runs a central instance in a child process and pushes to it
+from an edge agent in the test process.
+"""
+import gzip
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask
+
+import app as app_module
+from door_events import ACTUATION, DoorEventLog, TRANSITION
+from shared_state import SharedDoorState
+from edge import EdgeAgent, EventSpool, SiteRegistry, create_ingest_blueprint, snapshot_payload
+from user_roles import UserRole
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "edge-test-token"
+
+CENTRAL_SCRIPT = """
+import sys
+from flask import Flask, jsonify
+from werkzeug.serving import WSGIRequestHandler
+from edge import SiteRegistry, create_ingest_blueprint
+
+port, token = int(sys.argv[1]), sys.argv[2]
+registry = SiteRegistry()
+app = Flask(__name__)
+app.register_blueprint(create_ingest_blueprint(registry, token))
+
+@app.route('/sites')
+def sites():
+    return jsonify(registry.sites())
+
+# Keep-alive, like the production server behind nginx
+WSGIRequestHandler.protocol_version = 'HTTP/1.1'
+app.run(host='127.0.0.1', port=port)
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _event(seq, status="open", epoch="e1", door_id=1, event_type=TRANSITION, timestamp=None):
+    return {"type": event_type, "seq": seq, "epoch": epoch, "timestamp": timestamp or 1000.0 + seq,
+            "door_id": door_id, "status": status, "state": status}
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = EventSpool(str(tmp_path / "spool.db"))
+    yield spool
+    spool.close()
+
+
+class TestEventSpool:
+    def test_fifo_until_acknowledged(self, spool):
+        for seq in (1, 2, 3):
+            spool.put(_event(seq))
+        batch = spool.peek(2)
+        assert [event["seq"] for _, event in batch] == [1, 2]
+        spool.ack(batch[-1][0])
+        assert [event["seq"] for _, event in spool.peek(10)] == [3]
+        assert len(spool) == 1
+
+    def test_survives_reopening(self, tmp_path):
+        path = str(tmp_path / "spool.db")
+        first = EventSpool(path)
+        first.put(_event(1))
+        first.close()
+        second = EventSpool(path)
+        assert [event["seq"] for _, event in second.peek(10)] == [1]
+        second.close()
+
+    def test_oldest_events_dropped_beyond_cap(self, tmp_path):
+        spool = EventSpool(str(tmp_path / "spool.db"), max_events=3)
+        for seq in range(1, 6):
+            spool.put(_event(seq))
+        assert [event["seq"] for _, event in spool.peek(10)] == [3, 4, 5]
+        assert spool.dropped == 2
+        spool.close()
+
+
+class TestSiteRegistry:
+    def _batch(self, *events, snapshots=None, site="north"):
+        payload = {"site": {"id": site, "name": site.title()}, "events": list(events)}
+        if snapshots is not None:
+            payload["snapshots"] = snapshots
+        return payload
+
+    def test_transitions_set_door_state(self):
+        registry = SiteRegistry()
+        assert registry.ingest(self._batch(_event(1, "closed"), _event(2, "open"))) == 2
+        site = registry.sites()[0]
+        assert site["name"] == "North"
+        assert site["online"] is True
+        assert [(door["door_id"], door["status"]) for door in site["doors"]] == [(1, "open")]
+        assert len(site["events"]) == 2
+
+    def test_redelivered_events_are_ignored(self):
+        registry = SiteRegistry()
+        registry.ingest(self._batch(_event(1), _event(2)))
+        assert registry.ingest(self._batch(_event(2), _event(3, "closed"))) == 1
+        assert registry.sites()[0]["received"] == 3
+
+    def test_new_epoch_is_not_a_duplicate(self):
+        registry = SiteRegistry()
+        registry.ingest(self._batch(_event(5, "open", timestamp=1000.0)))
+        assert registry.ingest(self._batch(_event(1, "closed", epoch="e2", timestamp=2000.0))) == 1
+        assert registry.sites()[0]["doors"][0]["status"] == "closed"
+
+    def test_actuations_are_recent_events_not_state(self):
+        registry = SiteRegistry()
+        registry.ingest(self._batch(_event(1, "closed"), {**_event(2), "type": ACTUATION, "result": "success"}))
+        site = registry.sites()[0]
+        assert site["doors"][0]["status"] == "closed"
+        assert site["events"][-1]["type"] == ACTUATION
+
+    def test_snapshots_restore_state_with_door_names(self):
+        registry = SiteRegistry()
+        snapshot = {**_event(7, "open"), "type": "snapshot", "door_name": "Left Bay"}
+        registry.ingest(self._batch(snapshots=[snapshot]))
+        door = registry.sites()[0]["doors"][0]
+        assert (door["name"], door["status"], door["seq"]) == ("Left Bay", "open", 7)
+
+    def test_older_snapshot_does_not_overwrite_newer_transition(self):
+        registry = SiteRegistry()
+        registry.ingest(self._batch(_event(8, "closed")))
+        registry.ingest(self._batch(snapshots=[_event(7, "open")]))
+        assert registry.sites()[0]["doors"][0]["status"] == "closed"
+
+    def test_on_update_receives_the_site(self):
+        updates = []
+        registry = SiteRegistry(on_update=updates.append)
+        registry.ingest(self._batch(_event(1)))
+        assert updates[0]["id"] == "north"
+
+    @pytest.mark.parametrize("payload", [
+        {}, {"site": {}}, {"site": {"id": ""}}, {"site": {"id": "x" * 65}},
+        {"site": {"id": "north"}, "events": "nope"},
+    ])
+    def test_malformed_batches_are_rejected(self, payload):
+        with pytest.raises(ValueError):
+            SiteRegistry().ingest(payload)
+
+
+@pytest.fixture
+def central():
+    registry = SiteRegistry()
+    central_app = Flask(__name__)
+    central_app.register_blueprint(create_ingest_blueprint(registry, TOKEN, max_body=4096))
+    return registry, central_app.test_client()
+
+
+def _post(client, payload, token=TOKEN, compress=True, body=None):
+    data = body if body is not None else json.dumps(payload).encode()
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    if compress:
+        data = gzip.compress(data) if body is None else data
+        headers["Content-Encoding"] = "gzip"
+    return client.post("/api/edge/ingest", data=data, headers=headers)
+
+
+class TestIngestEndpoint:
+    def test_gzip_batch_is_applied(self, central):
+        registry, client = central
+        response = _post(client, {"site": {"id": "north"}, "events": [_event(1)]})
+        assert response.status_code == 200
+        assert response.get_json() == {"success": True, "applied": 1}
+        assert registry.sites()[0]["id"] == "north"
+
+    def test_uncompressed_batch_is_accepted(self, central):
+        _, client = central
+        assert _post(client, {"site": {"id": "north"}}, compress=False).status_code == 200
+
+    def test_wrong_token_is_rejected(self, central):
+        registry, client = central
+        assert _post(client, {"site": {"id": "north"}}, token="wrong").status_code == 401
+        assert registry.sites() == []
+
+    def test_invalid_gzip_is_rejected(self, central):
+        _, client = central
+        assert _post(client, None, body=b"not gzip").status_code == 400
+
+    def test_decompressed_size_is_bounded(self, central):
+        _, client = central
+        bomb = gzip.compress(b" " * 100000)
+        assert len(bomb) < 4096
+        assert _post(client, None, body=bomb).status_code == 413
+
+    def test_malformed_batch_is_400(self, central):
+        _, client = central
+        assert _post(client, {"events": []}).status_code == 400
+
+
+class TestEdgeAgent:
+    def _agent(self, spool, **kwargs):
+        return EdgeAgent("http://central.example:8080/base", "north", TOKEN, spool, **kwargs)
+
+    def _response(self, status=200, body=b'{"success": true}'):
+        response = MagicMock(status=status)
+        response.read.return_value = body
+        return response
+
+    def test_batch_is_compressed_and_acknowledged(self, spool):
+        agent = self._agent(spool, batch_size=2)
+        for seq in (1, 2, 3):
+            spool.put(_event(seq))
+        with patch("http.client.HTTPConnection") as connection_class:
+            connection = connection_class.return_value
+            connection.getresponse.return_value = self._response()
+            assert agent.flush() is True
+            assert agent.flush() is True
+        connection_class.assert_called_once_with("central.example", 8080, timeout=10.0)
+        method, path = connection.request.call_args_list[0].args
+        assert (method, path) == ("POST", "/base/api/edge/ingest")
+        kwargs = connection.request.call_args_list[0].kwargs
+        assert kwargs["headers"]["Content-Encoding"] == "gzip"
+        assert kwargs["headers"]["Authorization"] == f"Bearer {TOKEN}"
+        payload = json.loads(gzip.decompress(kwargs["body"]))
+        assert [event["seq"] for event in payload["events"]] == [1, 2]
+        assert payload["site"] == {"id": "north", "name": "north"}
+        assert len(spool) == 0
+        assert agent.stats()["sent_events"] == 3
+
+    def test_failed_delivery_keeps_events_spooled(self, spool):
+        agent = self._agent(spool)
+        spool.put(_event(1))
+        with patch("http.client.HTTPConnection") as connection_class:
+            connection_class.return_value.request.side_effect = ConnectionRefusedError("refused")
+            assert agent.flush() is False
+        assert len(spool) == 1
+        assert "refused" in agent.stats()["last_error"]
+
+    def test_rejected_token_keeps_events_spooled(self, spool):
+        agent = self._agent(spool)
+        spool.put(_event(1))
+        with patch("http.client.HTTPConnection") as connection_class:
+            connection_class.return_value.getresponse.return_value = self._response(401)
+            assert agent.flush() is False
+        assert len(spool) == 1
+
+    def test_rejected_batch_is_dropped(self, spool):
+        agent = self._agent(spool)
+        spool.put(_event(1))
+        with patch("http.client.HTTPConnection") as connection_class:
+            connection_class.return_value.getresponse.return_value = self._response(400, b'{"error": "bad"}')
+            assert agent.flush() is True
+        assert len(spool) == 0
+
+    def test_snapshots_are_sent_when_due(self, spool):
+        snapshots = MagicMock(return_value=[{"door_id": 1, "status": "open"}])
+        agent = self._agent(spool, snapshots=snapshots, snapshot_interval=60)
+        with patch("http.client.HTTPConnection") as connection_class:
+            connection = connection_class.return_value
+            connection.getresponse.return_value = self._response()
+            assert agent.flush() is True
+            # Nothing spooled and the next snapshot is not due: no request
+            assert agent.flush() is True
+        assert connection.request.call_count == 1
+        payload = json.loads(gzip.decompress(connection.request.call_args.kwargs["body"]))
+        assert payload["snapshots"] == [{"door_id": 1, "status": "open"}]
+
+    def test_only_the_running_sender_spools(self, spool):
+        agent = self._agent(spool)
+        agent.enqueue(_event(1))
+        assert len(spool) == 0
+        # "Running" without the thread
+        agent._thread = MagicMock()
+        agent.enqueue(_event(2))
+        assert [event["seq"] for _, event in spool.peek(10)] == [2]
+
+    def test_invalid_central_url(self, spool):
+        with pytest.raises(ValueError):
+            EdgeAgent("ftp://central", "north", TOKEN, spool)
+
+    def test_snapshot_payload_names_doors(self):
+        snapshots = snapshot_payload([{"door_id": 2, "status": "open"}], [{"id": 2, "name": "Right Bay"}])
+        assert snapshots == [{"door_id": 2, "status": "open", "type": "snapshot", "door_name": "Right Bay"}]
+
+
+class TestTwoProcesses:
+    def _wait_for_site(self, port, predicate, timeout=10):
+        deadline = time.time() + timeout
+        sites = []
+        while time.time() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/sites", timeout=2) as response:
+                    sites = json.loads(response.read())
+            except OSError:
+                # Central still starting
+                time.sleep(0.1)
+                continue
+            if predicate(sites):
+                return sites
+            time.sleep(0.1)
+        raise AssertionError(f"central never reached the expected state: {sites}")
+
+    def test_events_spooled_offline_reach_central_once_it_is_up(self, tmp_path, spool):
+        script = tmp_path / "central.py"
+        script.write_text(CENTRAL_SCRIPT)
+        port = _free_port()
+        log = DoorEventLog()
+        agent = EdgeAgent(f"http://127.0.0.1:{port}", "north", TOKEN, spool, site_name="North Site",
+                          linger=0.05, max_backoff=0.5,
+                          snapshots=lambda: snapshot_payload(log.snapshots(), [{"id": 1, "name": "Left Bay"}]))
+        log.subscribe(agent.enqueue)
+        agent.start()
+        central = None
+        try:
+            # Central is down: events stay in the spool
+            log.append(TRANSITION, {"door_id": 1, "status": "closed", "oldStatus": None})
+            log.append(TRANSITION, {"door_id": 1, "status": "open", "oldStatus": "closed"})
+            time.sleep(0.3)
+            assert len(spool) == 2
+
+            central = subprocess.Popen(
+                [sys.executable, str(script), str(port), TOKEN],
+                env=dict(os.environ, PYTHONPATH=PROJECT_ROOT),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            sites = self._wait_for_site(port, lambda sites: sites and sites[0]["received"] == 2)
+            assert sites[0]["name"] == "North Site"
+            assert sites[0]["doors"][0]["name"] == "Left Bay"
+            assert sites[0]["doors"][0]["status"] == "open"
+
+            # Live events follow over the same agent
+            log.append(TRANSITION, {"door_id": 1, "status": "closed", "oldStatus": "open"})
+            sites = self._wait_for_site(port, lambda sites: sites[0]["doors"][0]["status"] == "closed")
+            assert sites[0]["received"] == 3
+            assert len(spool) == 0
+        finally:
+            agent.stop()
+            if central:
+                central.terminate()
+                central.wait(timeout=10)
+
+
+def _api_headers(mock_db):
+    mock_db.get_user_by_api_key.return_value = {
+        "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+    }
+    return {"X-API-Key": secrets.token_hex(32)}
+
+
+class TestAppWiring:
+    def test_central_api_disabled_by_default(self, client, mock_db):
+        assert client.get("/api/sites", headers=_api_headers(mock_db)).status_code == 404
+
+    def test_central_dashboard_disabled_by_default(self, auth_client):
+        assert auth_client.get("/central").status_code == 302
+
+    def _registry(self):
+        registry = SiteRegistry()
+        registry.ingest({"site": {"id": "north", "name": "North Site"}, "events": [_event(1, "open")]})
+        return registry
+
+    def test_central_dashboard(self, auth_client):
+        with patch.object(app_module, "central_sites", self._registry()):
+            page = auth_client.get("/central")
+        assert page.status_code == 200
+        assert b"North Site" in page.data
+        assert b'data-site-id="north"' in page.data
+
+    def test_central_api(self, client, mock_db):
+        with patch.object(app_module, "central_sites", self._registry()):
+            sites = client.get("/api/sites", headers=_api_headers(mock_db)).get_json()["sites"]
+        assert sites[0]["doors"][0]["status"] == "open"
+
+    def test_edge_agent_spools_door_events(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("EDGE_CENTRAL_URL", "http://central.example")
+        monkeypatch.setenv("EDGE_SITE_ID", "north")
+        monkeypatch.setenv("EDGE_SPOOL_PATH", str(tmp_path / "spool.db"))
+        log = DoorEventLog()
+        with patch.object(app_module, "door_events", log), patch.object(app_module, "edge_agent", None):
+            app_module.start_edge_agent()
+            agent = app_module.edge_agent
+            try:
+                # The sender only runs in the leader; other processes spool nothing
+                log.append(TRANSITION, {"door_id": 1, "status": "closed", "oldStatus": None})
+                assert len(agent.spool) == 0
+                assert agent.stats()["running"] is False
+                assert agent.site["id"] == "north"
+                with patch.object(agent, "start") as start, patch.object(app_module, "scheduler", MagicMock()):
+                    app_module.start_leader_jobs()
+                start.assert_called_once()
+                agent._thread = MagicMock()
+                log.append(TRANSITION, {"door_id": 1, "status": "open", "oldStatus": "closed"})
+                assert [event["status"] for _, event in agent.spool.peek(10)] == ["open"]
+                agent._thread = None
+            finally:
+                app_module.stop_edge_agent()
+        assert app_module.edge_agent is None
+
+    def test_actuation_on_a_standby_worker_is_spooled_once(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("EDGE_CENTRAL_URL", "http://central.example")
+        monkeypatch.setenv("EDGE_SPOOL_PATH", str(tmp_path / "spool.db"))
+        segment = SharedDoorState(str(tmp_path / "door-state"))
+        segment.publish_status("closed", timestamp=1000.0)
+        # The standby worker handles the request: its own log and a spool it does not send from
+        standby_log = DoorEventLog()
+        standby = EdgeAgent("http://central.example", "north", TOKEN, EventSpool(str(tmp_path / "spool.db")))
+        standby_log.subscribe(standby.enqueue)
+        standby_log.append(ACTUATION, {"door_id": 1, "result": "success"}, timestamp=1001.0)
+        segment.publish_actuation(True, timestamp=1001.0)
+
+        log = DoorEventLog()
+        with patch.object(app_module, "door_events", log), patch.object(app_module, "edge_agent", None), \
+                patch.object(app_module, "door_state_segment", segment), \
+                patch.dict(app_module.logged_actuations, clear=True), patch.dict(app_module.door_machines, clear=True):
+            app_module.start_edge_agent()
+            agent = app_module.edge_agent
+            agent._thread = MagicMock()
+            try:
+                # The leader's poller relays it from the shared segment
+                app_module._apply_shared_actuations()
+                app_module._apply_shared_actuations()
+                spooled = [event for _, event in agent.spool.peek(10)]
+            finally:
+                agent._thread = None
+                app_module.stop_edge_agent()
+        standby.spool.close()
+        segment.close()
+        assert [(event["type"], event["epoch"], event["timestamp"]) for event in spooled] == [
+            (ACTUATION, log.epoch, 1001.0)]
+
+    def test_no_agent_without_central_url(self, monkeypatch):
+        monkeypatch.delenv("EDGE_CENTRAL_URL", raising=False)
+        with patch.object(app_module, "edge_agent", None):
+            app_module.start_edge_agent()
+            assert app_module.edge_agent is None
+
+    def test_admin_edge_status(self, admin_client):
+        assert admin_client.get("/admin/edge").get_json() == {"enabled": False}
@@ -0,0 +1,146 @@
+"""
+Tests for leader election (leader.py) and the /api/leader endpoint.
+
+The DatabaseManager lease methods are replaced by a MagicMock so the
+election logic can be driven step by step without MySQL.
+"""
+import secrets
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+from leader import LeaderElector
+from user_roles import UserRole
+
+
+def _make_elector(acquire_results, **kwargs):
+    db = MagicMock()
+    db.acquire_lease.side_effect = list(acquire_results)
+    elected, revoked = MagicMock(), MagicMock()
+    elector = LeaderElector(
+        db, identity="host-a:1", ttl=15, renew_interval=5,
+        on_elected=elected, on_revoked=revoked, **kwargs
+    )
+    return elector, db, elected, revoked
+
+
+class TestLeaderElector:
+    def test_renew_interval_must_be_shorter_than_ttl(self):
+        with pytest.raises(ValueError):
+            LeaderElector(MagicMock(), ttl=5, renew_interval=5)
+
+    def test_acquiring_lease_runs_on_elected_once(self):
+        elector, db, elected, revoked = _make_elector([True, True])
+        assert elector.run_once() is True
+        assert elector.run_once() is True
+        elected.assert_called_once()
+        revoked.assert_not_called()
+        db.acquire_lease.assert_called_with("door_poller", "host-a:1", 15)
+
+    def test_standby_does_not_start_jobs(self):
+        elector, _, elected, _ = _make_elector([False])
+        assert elector.run_once() is False
+        assert elector.holds_lease() is False
+        elected.assert_not_called()
+
+    def test_losing_lease_to_another_process_steps_down(self):
+        elector, _, elected, revoked = _make_elector([True, False])
+        elector.run_once()
+        assert elector.run_once() is False
+        revoked.assert_called_once()
+
+    def test_database_outage_keeps_leadership_until_lease_expires(self):
+        elector, _, _, revoked = _make_elector([True, None, None])
+        with patch("leader.time.monotonic", return_value=100.0):
+            elector.run_once()
+        with patch("leader.time.monotonic", return_value=110.0):
+            assert elector.run_once() is True
+            assert elector.holds_lease() is True
+        revoked.assert_not_called()
+        with patch("leader.time.monotonic", return_value=116.0):
+            assert elector.run_once() is False
+        revoked.assert_called_once()
+
+    def test_holds_lease_false_once_local_deadline_passes(self):
+        elector, _, _, _ = _make_elector([True])
+        with patch("leader.time.monotonic", return_value=100.0):
+            elector.run_once()
+        with patch("leader.time.monotonic", return_value=115.5):
+            assert elector.is_leader is True
+            assert elector.holds_lease() is False
+
+    def test_stop_releases_lease(self):
+        elector, db, _, revoked = _make_elector([True])
+        elector.run_once()
+        elector.stop()
+        db.release_lease.assert_called_once_with("door_poller", "host-a:1")
+        revoked.assert_called_once()
+        assert elector.is_leader is False
+
+    def test_stop_as_standby_does_not_touch_lease(self):
+        elector, db, _, _ = _make_elector([False])
+        elector.run_once()
+        elector.stop()
+        db.release_lease.assert_not_called()
+
+    def test_callback_errors_do_not_break_election(self):
+        elector, _, elected, _ = _make_elector([True])
+        elected.side_effect = RuntimeError("boom")
+        assert elector.run_once() is True
+
+    def test_status_reports_leader_and_lease_age(self):
+        elector, db, _, _ = _make_elector([True])
+        elector.run_once()
+        db.get_lease.return_value = {
+            "holder": "host-a:1",
+            "lease_age_seconds": 42.5,
+            "expires_in_seconds": 12.0,
+        }
+        status = elector.status()
+        assert status["leader"] == "host-a:1"
+        assert status["is_leader"] is True
+        assert status["lease_age_seconds"] == 42.5
+        assert status["failover_bound_seconds"] == 20
+
+    def test_start_schedules_renewal_job(self):
+        elector, _, _, _ = _make_elector([False])
+        scheduler = MagicMock()
+        elector.start(scheduler)
+        assert scheduler.add_job.call_args.kwargs["id"] == "leader_election_door_poller"
+
+
+class TestPollerGuard:
+    def test_poller_skips_when_lease_not_held(self):
+        elector = MagicMock()
+        elector.holds_lease.return_value = False
+        with patch.object(app_module, "leader_elector", elector), patch("subprocess.run") as mock_run:
+            app_module.check_door_status_and_notify()
+        mock_run.assert_not_called()
+
+
+class TestLeaderEndpoint:
+    def _api_user(self, mock_db):
+        mock_db.get_user_by_api_key.return_value = {
+            "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+        }
+
+    def test_requires_api_key(self, client):
+        assert client.get("/api/leader").status_code == 401
+
+    def test_reports_disabled_election(self, client, mock_db):
+        self._api_user(mock_db)
+        with patch.object(app_module, "leader_elector", None):
+            response = client.get("/api/leader", headers={"X-API-Key": secrets.token_hex(32)})
+        assert response.status_code == 200
+        assert response.get_json()["enabled"] is False
+
+    def test_reports_elector_status(self, client, mock_db):
+        self._api_user(mock_db)
+        elector = MagicMock()
+        elector.status.return_value = {"leader": "host-b:7", "lease_age_seconds": 3.0}
+        with patch.object(app_module, "leader_elector", elector):
+            response = client.get("/api/leader", headers={"X-API-Key": secrets.token_hex(32)})
+        data = response.get_json()
+        assert data["enabled"] is True
+        assert data["leader"] == "host-b:7"
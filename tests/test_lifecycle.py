@@ -0,0 +1,110 @@
+"""
+Tests for the application lifecycle manager (lifecycle.py) and the
+services app.py registers with it.
+"""
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+import app as app_module
+from door_events import DoorEventLog
+from lifecycle import AppLifecycle
+
+
+class TestAppLifecycle:
+    def test_services_start_in_order_and_stop_in_reverse(self):
+        events = MagicMock()
+        lifecycle = AppLifecycle()
+        lifecycle.register("first", events.start_first, events.stop_first)
+        lifecycle.register("second", events.start_second, events.stop_second)
+
+        lifecycle.start()
+        assert lifecycle.running is True
+        lifecycle.stop()
+
+        assert events.mock_calls == [
+            call.start_first(),
+            call.start_second(),
+            call.stop_second(),
+            call.stop_first(),
+        ]
+        assert lifecycle.running is False
+
+    def test_start_is_idempotent(self):
+        start = MagicMock()
+        lifecycle = AppLifecycle()
+        lifecycle.register("svc", start)
+        lifecycle.start()
+        lifecycle.start()
+        start.assert_called_once()
+
+    def test_stop_is_idempotent(self):
+        stop = MagicMock()
+        lifecycle = AppLifecycle()
+        lifecycle.register("svc", MagicMock(), stop)
+        lifecycle.start()
+        lifecycle.stop()
+        lifecycle.stop()
+        stop.assert_called_once()
+
+    def test_failed_start_rolls_back_started_services(self):
+        stop_first = MagicMock()
+        lifecycle = AppLifecycle()
+        lifecycle.register("first", MagicMock(), stop_first)
+        lifecycle.register("broken", MagicMock(side_effect=RuntimeError("no hardware")))
+        with pytest.raises(RuntimeError):
+            lifecycle.start()
+        stop_first.assert_called_once()
+        assert lifecycle.running is False
+
+    def test_stop_error_does_not_prevent_other_stops(self):
+        stop_first = MagicMock()
+        lifecycle = AppLifecycle()
+        lifecycle.register("first", MagicMock(), stop_first)
+        lifecycle.register("second", MagicMock(), MagicMock(side_effect=RuntimeError("boom")))
+        lifecycle.start()
+        lifecycle.stop()
+        stop_first.assert_called_once()
+
+    def test_register_after_start_rejected(self):
+        lifecycle = AppLifecycle()
+        lifecycle.start()
+        with pytest.raises(RuntimeError):
+            lifecycle.register("late", MagicMock())
+
+
+class TestAppServices:
+    def test_scheduler_registered_before_snapshot_warmup(self):
+        names = [name for name, _, _ in app_module.lifecycle._services]
+        assert names.index("scheduler") < names.index("door snapshot")
+
+    def test_warmup_polls_door_when_election_disabled(self):
+        with patch.object(app_module, "leader_elector", None), \
+                patch.object(app_module, "check_door_status_and_notify") as mock_check:
+            app_module.warm_door_snapshot()
+        mock_check.assert_called_once()
+
+    def test_standby_worker_skips_warmup_poll(self):
+        elector = MagicMock()
+        elector.holds_lease.return_value = False
+        with patch.object(app_module, "leader_elector", elector), \
+                patch.object(app_module, "check_door_status_and_notify") as mock_check:
+            app_module.warm_door_snapshot()
+        mock_check.assert_not_called()
+
+    def test_socket_connect_does_not_start_scheduler(self, app, auth_client):
+        with patch.object(app_module, "initialize_scheduler") as mock_init:
+            client = app_module.socketio.test_client(app, flask_test_client=auth_client)
+            client.disconnect()
+        mock_init.assert_not_called()
+
+    def test_socket_connect_sends_state_from_shared_segment(self, app, auth_client):
+        segment = MagicMock()
+        segment.read_all.return_value = [MagicMock(status="open", state="open", stuck_reason=None, sequence=4, updated_at=1000.0, door_id=1)]
+        with patch.object(app_module, "door_events", DoorEventLog()), \
+                patch.object(app_module, "door_state_segment", segment):
+            client = app_module.socketio.test_client(app, flask_test_client=auth_client)
+            received = client.get_received()
+            client.disconnect()
+        updates = [msg for msg in received if msg["name"] == "door_status_update"]
+        assert updates and updates[0]["args"][0]["status"] == "open"
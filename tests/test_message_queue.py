@@ -0,0 +1,158 @@
+"""
+Tests for the cross-process Socket.IO message queue (message_queue.py).
+
+The integration test starts the local broker in this process and two
+Flask-SocketIO worker processes attached to it, then checks that an emit
+made on one worker reaches a Socket.IO client connected to the other.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from message_queue import (
+    LocalBroker,
+    LocalBrokerManager,
+    parse_local_url,
+    socketio_queue_options,
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_SCRIPT = """
+import sys
+from flask import Flask
+from flask_socketio import SocketIO
+from message_queue import LocalBrokerManager
+
+broker_url, port = sys.argv[1], int(sys.argv[2])
+app = Flask(__name__)
+socketio = SocketIO(app, async_mode='threading', client_manager=LocalBrokerManager(broker_url))
+
+@app.route('/emit')
+def emit():
+    socketio.emit('door_status_update', {'status': 'open', 'oldStatus': 'closed'})
+    return 'ok'
+
+socketio.run(app, host='127.0.0.1', port=port, allow_unsafe_werkzeug=True)
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_http(url, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"{url} did not come up")
+
+
+@pytest.fixture
+def broker():
+    server = LocalBroker(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestQueueOptions:
+    def test_no_url_means_no_queue(self):
+        assert socketio_queue_options(None) == {}
+        assert socketio_queue_options("") == {}
+
+    def test_redis_url_passed_to_flask_socketio(self):
+        options = socketio_queue_options("redis://localhost:6379/0")
+        assert options == {"message_queue": "redis://localhost:6379/0", "channel": "flask-socketio"}
+
+    def test_local_url_builds_client_manager(self):
+        options = socketio_queue_options("local://127.0.0.1:6390")
+        assert isinstance(options["client_manager"], LocalBrokerManager)
+        assert options["client_manager"].address == ("127.0.0.1", 6390)
+
+    def test_local_url_requires_port(self):
+        with pytest.raises(ValueError):
+            parse_local_url("local://127.0.0.1")
+
+
+class TestLocalBroker:
+    def _subscribe(self, port, channel=b"flask-socketio"):
+        sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        sock.sendall(b"SUB " + channel + b"\n")
+        return sock
+
+    def test_frames_reach_all_subscribers_of_channel(self, broker):
+        port = broker.server_address[1]
+        subscribers = [self._subscribe(port), self._subscribe(port)]
+        other = self._subscribe(port, b"other")
+        manager = LocalBrokerManager(f"local://127.0.0.1:{port}")
+        try:
+            # Wait until the broker has registered every subscriber
+            deadline = time.time() + 5
+            while len(broker._subscribers.get(b"flask-socketio", ())) < 2 and time.time() < deadline:
+                time.sleep(0.01)
+
+            manager._publish({"method": "emit", "event": "door_status_update"})
+            for sock in subscribers:
+                line = sock.makefile("rb").readline()
+                assert b"door_status_update" in line
+
+            other.settimeout(0.2)
+            with pytest.raises(socket.timeout):
+                other.recv(1)
+        finally:
+            for sock in subscribers + [other]:
+                sock.close()
+
+
+class TestTwoWorkerFanOut:
+    def test_emit_on_one_worker_reaches_client_on_other(self, broker, tmp_path):
+        socketio = pytest.importorskip("socketio")
+        pytest.importorskip("requests")
+
+        script = tmp_path / "worker.py"
+        script.write_text(WORKER_SCRIPT)
+        broker_url = f"local://127.0.0.1:{broker.server_address[1]}"
+        env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+        ports = [_free_port(), _free_port()]
+        workers = [
+            subprocess.Popen(
+                [sys.executable, str(script), broker_url, str(port)],
+                env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            for port in ports
+        ]
+        client = socketio.Client()
+        received = threading.Event()
+        client.on("door_status_update", lambda data: received.set() if data["status"] == "open" else None)
+        try:
+            for port in ports:
+                _wait_for_http(f"http://127.0.0.1:{port}/emit")
+            received.clear()
+
+            client.connect(f"http://127.0.0.1:{ports[1]}", wait_timeout=10)
+            # Emit from the *other* worker until its queue subscriber is live
+            deadline = time.time() + 10
+            while not received.is_set() and time.time() < deadline:
+                urllib.request.urlopen(f"http://127.0.0.1:{ports[0]}/emit", timeout=2)
+                received.wait(0.5)
+            assert received.is_set()
+        finally:
+            client.disconnect()
+            for worker in workers:
+                worker.terminate()
+                worker.wait(timeout=10)
@@ -0,0 +1,393 @@
+"""
+Tests for the MQTT bridge (mqtt_bridge.py) against an embedded MQTT 3.1.1
+broker, and its wiring into the app.
+"""
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+mqtt = pytest.importorskip("paho.mqtt.client")
+
+import app as app_module
+from door_events import ACTUATION, TRANSITION
+from mqtt_bridge import MqttBridge
+
+
+def _read_string(data, offset):
+    length, = struct.unpack_from("!H", data, offset)
+    return data[offset + 2:offset + 2 + length], offset + 2 + length
+
+
+def _packet(kind, body):
+    header = bytearray([kind])
+    length = len(body)
+    while True:
+        byte, length = length % 128, length // 128
+        header.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(header) + body
+
+
+def _matches(pattern, topic):
+    pattern, topic = pattern.split("/"), topic.split("/")
+    for i, level in enumerate(pattern):
+        if level == "#":
+            return True
+        if i >= len(topic) or level not in ("+", topic[i]):
+            return False
+    return len(pattern) == len(topic)
+
+
+class Broker(socketserver.ThreadingTCPServer):
+    """Just enough of an MQTT 3.1.1 broker: QoS 0/1, retained messages, wildcards and wills."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), BrokerSession)
+        self.port = self.server_address[1]
+        self.retained = {}
+        self.wills = {}
+        self.sessions = set()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def route(self, topic, payload, qos, retain):
+        with self.lock:
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            sessions = list(self.sessions)
+        for session in sessions:
+            session.deliver(topic, payload, qos, retain=False)
+
+    def crash(self):
+        """Stop abruptly, dropping every client connection without a goodbye."""
+        self.shutdown()
+        self.server_close()
+        for session in list(self.sessions):
+            session.request.shutdown(socket.SHUT_RDWR)
+
+
+class BrokerSession(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.subscriptions = {}
+        self.will = None
+        self.packet_id = 0
+        self.send_lock = threading.Lock()
+
+    def send(self, data):
+        with self.send_lock:
+            self.request.sendall(data)
+
+    def deliver(self, topic, payload, qos, retain):
+        granted = [sub_qos for pattern, sub_qos in self.subscriptions.items() if _matches(pattern, topic)]
+        if not granted:
+            return
+        qos = min(qos, max(granted))
+        body = struct.pack("!H", len(topic)) + topic.encode()
+        if qos:
+            self.packet_id = self.packet_id % 65535 + 1
+            body += struct.pack("!H", self.packet_id)
+        try:
+            self.send(_packet(0x30 | (qos << 1) | int(retain), body + payload))
+        except OSError:
+            pass
+
+    def _read_packet(self):
+        header = self._recv(1)
+        length, shift = 0, 0
+        while True:
+            byte = self._recv(1)[0]
+            length += (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return header[0], self._recv(length)
+
+    def _recv(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("closed")
+            data += chunk
+        return data
+
+    def handle(self):
+        clean = False
+        try:
+            while True:
+                kind, body = self._read_packet()
+                packet_type = kind >> 4
+                if packet_type == 1:  # CONNECT
+                    _, offset = _read_string(body, 0)
+                    flags = body[offset + 1]
+                    client_id, offset = _read_string(body, offset + 4)
+                    if flags & 0x04:
+                        will_topic, offset = _read_string(body, offset)
+                        will_payload, offset = _read_string(body, offset)
+                        self.will = (will_topic.decode(), will_payload, (flags >> 3) & 3, bool(flags & 0x20))
+                        self.server.wills[client_id.decode()] = self.will
+                    with self.server.lock:
+                        self.server.sessions.add(self)
+                    self.send(b"\x20\x02\x00\x00")
+                elif packet_type == 3:  # PUBLISH
+                    qos = (kind >> 1) & 3
+                    topic, offset = _read_string(body, 0)
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        self.send(b"\x40\x02" + packet_id)
+                    self.server.route(topic.decode(), body[offset:], qos, bool(kind & 1))
+                elif packet_type == 8:  # SUBSCRIBE
+                    packet_id, offset, granted = body[:2], 2, b""
+                    topics = []
+                    while offset < len(body):
+                        pattern, offset = _read_string(body, offset)
+                        self.subscriptions[pattern.decode()] = min(body[offset], 1)
+                        granted += bytes([min(body[offset], 1)])
+                        topics.append(pattern.decode())
+                        offset += 1
+                    self.send(_packet(0x90, packet_id + granted))
+                    with self.server.lock:
+                        retained = list(self.server.retained.items())
+                    for topic, payload in retained:
+                        if any(_matches(pattern, topic) for pattern in topics):
+                            self.deliver(topic, payload, 1, retain=True)
+                elif packet_type == 12:  # PINGREQ
+                    self.send(b"\xd0\x00")
+                elif packet_type == 14:  # DISCONNECT
+                    clean = True
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with self.server.lock:
+                self.server.sessions.discard(self)
+            if self.will and not clean:
+                self.server.route(*self.will)
+
+
+@pytest.fixture
+def broker():
+    server = Broker()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _transition(door_id=1, status="open", state="opening", seq=1):
+    return {"type": TRANSITION, "seq": seq, "epoch": "e", "timestamp": 1000.0, "door_id": door_id,
+            "status": status, "oldStatus": "closed", "state": state, "oldState": "closed", "stuck_reason": None}
+
+
+def _subscribe(broker, pattern="garage/#"):
+    """Connect a separate client and collect what it receives, retained messages first."""
+    received = {}
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    client.on_connect = lambda c, *args: c.subscribe(pattern, qos=1)
+    client.on_message = lambda c, u, message: received.__setitem__(message.topic, (message.payload, message.retain))
+    client.connect("127.0.0.1", broker.port)
+    client.loop_start()
+    return client, received
+
+
+@pytest.fixture
+def bridge_factory(broker):
+    bridges = []
+
+    def make(**kwargs):
+        kwargs.setdefault("on_command", MagicMock())
+        bridge = MqttBridge("127.0.0.1", port=broker.port, client_id=f"test-{len(bridges)}", **kwargs)
+        bridges.append(bridge)
+        bridge.start()
+        assert bridge.wait_until_connected(10)
+        return bridge
+
+    yield make
+    for bridge in bridges:
+        bridge.stop()
+
+
+class TestMqttBridge:
+    def test_state_is_retained_for_late_subscribers(self, broker, bridge_factory):
+        bridge = bridge_factory()
+        bridge.publish_event(_transition(door_id=2))
+        assert _wait_for(lambda: "garage/door/2/state" in broker.retained)
+
+        subscriber, received = _subscribe(broker)
+        try:
+            assert _wait_for(lambda: "garage/door/2/state" in received and "garage/status" in received)
+        finally:
+            subscriber.loop_stop()
+            subscriber.disconnect()
+        payload, retained = received["garage/door/2/state"]
+        assert retained
+        assert json.loads(payload) == {"door_id": 2, "status": "open", "state": "opening",
+                                       "stuck_reason": None, "seq": 1, "timestamp": 1000.0}
+        assert received["garage/status"] == (b"online", True)
+
+    def test_actuation_results_are_published(self, broker, bridge_factory):
+        bridge = bridge_factory(prefix="home/garage/")
+        bridge.publish_event({"type": ACTUATION, "seq": 2, "epoch": "e", "timestamp": 5.0,
+                              "door_id": 1, "result": "failure"})
+        assert _wait_for(lambda: "home/garage/door/1/actuation" in broker.retained)
+        assert json.loads(broker.retained["home/garage/door/1/actuation"]) == {
+            "door_id": 1, "result": "failure", "timestamp": 5.0}
+
+    def test_commands_are_queued_in_order(self, broker, bridge_factory):
+        on_command = MagicMock()
+        bridge_factory(on_command=on_command)
+        # Messages published before the broker registered the subscription are not delivered
+        assert _wait_for(lambda: any(session.subscriptions for session in list(broker.sessions)))
+        publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        publisher.connect("127.0.0.1", broker.port)
+        publisher.loop_start()
+        try:
+            for topic, payload in [("garage/door/2/command", "OPEN"), ("garage/door/x/command", "open"),
+                                   ("garage/door/1/command", "explode"), ("garage/door/1/command", "toggle")]:
+                publisher.publish(topic, payload, qos=1).wait_for_publish(5)
+            assert _wait_for(lambda: on_command.call_count == 2)
+        finally:
+            publisher.loop_stop()
+            publisher.disconnect()
+        assert [call.args for call in on_command.call_args_list] == [(2, "open"), (1, "toggle")]
+
+    def test_retained_commands_are_ignored(self, broker, bridge_factory):
+        publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        publisher.connect("127.0.0.1", broker.port)
+        publisher.loop_start()
+        try:
+            # Left on the broker before the bridge subscribes: redelivered with the retain flag
+            publisher.publish("garage/door/1/command", "open", qos=1, retain=True).wait_for_publish(5)
+            on_command = MagicMock()
+            bridge_factory(on_command=on_command)
+            assert _wait_for(lambda: any(session.subscriptions for session in list(broker.sessions)))
+            publisher.publish("garage/door/2/command", "toggle", qos=1).wait_for_publish(5)
+            assert _wait_for(lambda: on_command.call_count == 1)
+        finally:
+            publisher.loop_stop()
+            publisher.disconnect()
+        assert [call.args for call in on_command.call_args_list] == [(2, "toggle")]
+
+    def test_commands_disabled_without_handler(self, broker, bridge_factory):
+        bridge = bridge_factory(on_command=None)
+        assert bridge.connected
+        assert not any(session.subscriptions for session in broker.sessions)
+
+    def test_reconnects_and_republishes_after_broker_restart(self, broker, bridge_factory):
+        bridge = bridge_factory(snapshots=lambda: [_transition(state="open", seq=7)], max_backoff=1)
+        assert _wait_for(lambda: "garage/door/1/state" in broker.retained)
+
+        broker.crash()
+        assert _wait_for(lambda: not bridge.connected)
+        restarted = Broker(broker.port)
+        try:
+            assert bridge.wait_until_connected(15)
+            # The new broker starts empty; the bridge restores availability and state
+            assert _wait_for(lambda: "garage/door/1/state" in restarted.retained)
+            assert json.loads(restarted.retained["garage/door/1/state"])["seq"] == 7
+            assert restarted.retained["garage/status"] == b"online"
+        finally:
+            bridge.stop()
+            restarted.shutdown()
+            restarted.server_close()
+
+    def test_will_and_clean_stop_mark_offline(self, broker, bridge_factory):
+        bridge = bridge_factory()
+        assert broker.wills["test-0"] == ("garage/status", b"offline", 1, True)
+        bridge.stop()
+        assert broker.retained["garage/status"] == b"offline"
+        # Not running: events are ignored
+        bridge.publish_event(_transition())
+        assert "garage/door/1/state" not in broker.retained
+
+
+class TestAppWiring:
+    @pytest.fixture
+    def actuate(self):
+        with patch.object(app_module, "_actuate_door") as actuate:
+            yield actuate
+
+    def _snapshots(self, state):
+        return patch.object(app_module, "_current_door_snapshots",
+                            return_value=[_transition(door_id=1, status="open", state=state)])
+
+    def test_toggle_always_actuates(self, actuate):
+        with self._snapshots("open"):
+            app_module._handle_mqtt_command(1, "toggle")
+        actuate.assert_called_once()
+        assert actuate.call_args.args[0]["id"] == 1
+
+    def test_open_and_close_only_move_the_door_that_way(self, actuate):
+        with self._snapshots("open"):
+            app_module._handle_mqtt_command(1, "open")
+            actuate.assert_not_called()
+            app_module._handle_mqtt_command(1, "close")
+        actuate.assert_called_once()
+
+    def test_open_ignored_while_moving(self, actuate):
+        with self._snapshots("closing"):
+            app_module._handle_mqtt_command(1, "open")
+        actuate.assert_not_called()
+
+    def test_unknown_door_is_ignored(self, actuate):
+        app_module._handle_mqtt_command(99, "toggle")
+        actuate.assert_not_called()
+
+    def test_disabled_without_broker(self, monkeypatch):
+        monkeypatch.delenv("MQTT_BROKER_HOST", raising=False)
+        with patch.object(app_module, "MqttBridge") as bridge_class:
+            app_module.create_mqtt_bridge()
+        bridge_class.assert_not_called()
+        assert app_module.mqtt_bridge is None
+
+    def test_commands_are_opt_in(self, monkeypatch):
+        monkeypatch.setenv("MQTT_BROKER_HOST", "broker.local")
+        monkeypatch.delenv("MQTT_COMMANDS_ENABLED", raising=False)
+        with patch.object(app_module, "MqttBridge") as bridge_class, \
+                patch.object(app_module, "door_events", MagicMock()):
+            app_module.create_mqtt_bridge()
+            assert bridge_class.call_args.kwargs["on_command"] is None
+            app_module.stop_mqtt_bridge()
+
+    def test_runs_with_the_leader_jobs(self, monkeypatch):
+        monkeypatch.setenv("MQTT_BROKER_HOST", "broker.local")
+        monkeypatch.setenv("MQTT_COMMANDS_ENABLED", "false")
+        with patch.object(app_module, "MqttBridge") as bridge_class, \
+                patch.object(app_module, "door_events", MagicMock()) as events, \
+                patch.object(app_module, "scheduler", MagicMock()):
+            app_module.create_mqtt_bridge()
+            bridge = bridge_class.return_value
+            events.subscribe.assert_called_once_with(bridge.publish_event)
+            assert bridge_class.call_args.kwargs["on_command"] is None
+            app_module.start_leader_jobs()
+            bridge.start.assert_called_once()
+            app_module.stop_leader_jobs()
+            bridge.stop.assert_called_once()
+            app_module.stop_mqtt_bridge()
+        assert app_module.mqtt_bridge is None
+
+    def test_run_script_response_unchanged(self, auth_client):
+        with patch("subprocess.run") as mock_run:
+            mock_run.return_value = MagicMock(returncode=0, stdout="ok", stderr="")
+            response = auth_client.post("/run_script", json={"door_id": 1})
+        assert response.get_json() == {"success": True, "output": "ok", "error": ""}
@@ -0,0 +1,661 @@
+"""
+Tests for the door event notification dispatcher (notifications.py) against
+a local HTTP stub SMS gateway, and its wiring into the app.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+from door_events import ACTUATION, TRANSITION
+from notifications import (
+    HttpSmsProvider,
+    NotificationDispatcher,
+    NotificationError,
+    NotificationThrottle,
+    OpenDoorAlerts,
+    RecipientIndex,
+    TokenBucket,
+    TwilioSmsProvider,
+    door_event_message,
+)
+from timer_wheel import TimerWheel
+
+
+class StubGateway(ThreadingHTTPServer):
+    """SMS gateway stand-in: records requests and answers with the queued status codes, then 200."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubGatewayHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/sms"
+        self.requests = []
+        self.statuses = []
+        self.delay = 0.0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.requests.append({"body": body, "authorization": self.headers.get("Authorization")})
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def gateway():
+    server = StubGateway()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _transition(state="open", old_state="opening", status="open", old_status="closed", stuck_reason=None):
+    return {"type": TRANSITION, "seq": 3, "epoch": "e", "timestamp": time.time(), "door_id": 1,
+            "status": status, "oldStatus": old_status, "state": state, "oldState": old_state,
+            "stuck_reason": stuck_reason}
+
+
+RECIPIENTS = [{"username": "alice", "phone": "+15550001"}, {"username": "bob", "phone": "+15550002"}]
+
+
+@pytest.fixture
+def dispatchers():
+    started = []
+
+    def make(provider, recipients=RECIPIENTS, **kwargs):
+        options = dict(message=lambda event: "Garage Door is open", base_backoff=0.01, max_backoff=0.05,
+                       rate_limit=1000, burst=100)
+        options.update(kwargs)
+        dispatcher = NotificationDispatcher(provider, recipients=lambda door_id, channel: recipients, **options)
+        started.append(dispatcher)
+        dispatcher.start()
+        return dispatcher
+
+    yield make
+    for dispatcher in started:
+        dispatcher.stop()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestProviders:
+    def test_http_provider_posts_json_with_token(self, gateway):
+        HttpSmsProvider(gateway.url, token="secret").send("+15550001", "hello")
+        assert gateway.requests == [{"body": {"to": "+15550001", "body": "hello"},
+                                     "authorization": "Bearer secret"}]
+
+    @pytest.mark.parametrize("status,retryable", [(503, True), (429, True), (400, False)])
+    def test_http_errors_are_classified(self, gateway, status, retryable):
+        gateway.statuses = [status]
+        with pytest.raises(NotificationError) as error:
+            HttpSmsProvider(gateway.url).send("+15550001", "hello")
+        assert error.value.retryable is retryable
+
+    def test_unreachable_gateway_is_retryable(self):
+        with pytest.raises(NotificationError) as error:
+            HttpSmsProvider("http://127.0.0.1:9/sms", timeout=1).send("+15550001", "hello")
+        assert error.value.retryable
+
+    def test_twilio_provider_posts_form_with_basic_auth(self):
+        provider = TwilioSmsProvider("AC123", "token", "+15559999")
+        with patch("urllib.request.urlopen") as urlopen:
+            provider.send("+15550001", "hello")
+        request = urlopen.call_args.args[0]
+        assert request.full_url == "https://api.twilio.com/2010-04-01/Accounts/AC123/Messages.json"
+        assert request.data == b"From=%2B15559999&To=%2B15550001&Body=hello"
+        assert request.headers["Authorization"].startswith("Basic ")
+
+    def test_missing_configuration(self):
+        with pytest.raises(ValueError):
+            HttpSmsProvider("")
+        with pytest.raises(ValueError):
+            TwilioSmsProvider("AC123", "", "+15559999")
+
+
+class TestDoorEventMessage:
+    def test_settled_states_are_announced(self):
+        assert door_event_message(_transition(), "Garage Door").startswith("Garage Door is open (")
+        assert door_event_message(_transition("closed", "closing", "closed", "open"), "Garage Door") \
+            .startswith("Garage Door is closed (")
+
+    def test_stuck_door_names_the_reason(self):
+        message = door_event_message(_transition("stuck", "closing", stuck_reason="did_not_close"), "Left Bay")
+        assert message.startswith("Left Bay did not finish closing (")
+
+    @pytest.mark.parametrize("event", [
+        _transition("opening", "closed"),
+        _transition(old_status=None, old_state=None),
+        _transition("open", "open"),
+        {"type": ACTUATION, "seq": 1, "epoch": "e", "timestamp": 0.0, "door_id": 1, "result": "success"},
+    ])
+    def test_other_events_are_not_announced(self, event):
+        assert door_event_message(event, "Garage Door") is None
+
+
+class TestTokenBucket:
+    def test_limits_rate_after_the_burst(self):
+        bucket = TokenBucket(rate=50, burst=2)
+        stopping = threading.Event()
+        start = time.monotonic()
+        for _ in range(7):
+            assert bucket.acquire(stopping)
+        # Two from the burst, five at 50/s
+        assert time.monotonic() - start >= 0.09
+
+    def test_stop_interrupts_the_wait(self):
+        bucket = TokenBucket(rate=0.01, burst=1)
+        stopping = threading.Event()
+        assert bucket.acquire(stopping)
+        stopping.set()
+        assert bucket.acquire(stopping) is False
+
+
+class TestNotificationDispatcher:
+    def test_delivers_to_every_recipient(self, gateway, dispatchers):
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url))
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: dispatcher.sent == 2)
+        assert sorted(request["body"]["to"] for request in gateway.requests) == ["+15550001", "+15550002"]
+
+    def test_notify_never_waits_for_the_provider(self, gateway, dispatchers):
+        gateway.delay = 0.5
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url), workers=1)
+        start = time.monotonic()
+        for _ in range(5):
+            dispatcher.notify(_transition())
+        assert time.monotonic() - start < 0.1
+
+    def test_events_without_a_message_send_nothing(self, gateway, dispatchers):
+        recipients = MagicMock(return_value=RECIPIENTS)
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url), message=lambda event: None)
+        dispatcher.recipients = recipients
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: dispatcher.stats()["queued"] == 0)
+        time.sleep(0.05)
+        assert gateway.requests == []
+        recipients.assert_not_called()
+
+    def test_transient_failures_are_retried(self, gateway, dispatchers):
+        gateway.statuses = [503, 429]
+        dead_letter = MagicMock()
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url), recipients=RECIPIENTS[:1],
+                                 dead_letter=dead_letter)
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: dispatcher.sent == 1)
+        assert dispatcher.retries == 2
+        assert len(gateway.requests) == 3
+        dead_letter.assert_not_called()
+
+    def test_rejected_message_goes_to_dead_letters_at_once(self, gateway, dispatchers):
+        gateway.statuses = [400]
+        dead_letter = MagicMock()
+        event = _transition()
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url), recipients=RECIPIENTS[:1],
+                                 dead_letter=dead_letter)
+        dispatcher.notify(event)
+        assert _wait_for(lambda: dead_letter.called)
+        channel, provider, username, recipient, body, attempts, error, dead_event = dead_letter.call_args.args
+        assert (channel, provider, username, recipient, attempts) == ("sms", "http", "alice", "+15550001", 1)
+        assert body == "Garage Door is open"
+        assert "400" in error
+        assert dead_event is event
+        assert dispatcher.failed == 1
+
+    def test_exhausted_retries_go_to_dead_letters(self, gateway, dispatchers):
+        gateway.statuses = [503] * 3
+        dead_letter = MagicMock()
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url), recipients=RECIPIENTS[:1],
+                                 max_attempts=3, dead_letter=dead_letter)
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: dead_letter.called)
+        assert dead_letter.call_args.args[5] == 3
+        assert len(gateway.requests) == 3
+
+    def test_full_queue_drops_instead_of_blocking(self, gateway):
+        dispatcher = NotificationDispatcher(HttpSmsProvider(gateway.url), recipients=lambda *key: RECIPIENTS,
+                                            message=lambda event: "x", queue_size=2)
+        # Workers "running" but not consuming: the queue fills up
+        dispatcher._threads = [MagicMock()]
+        for _ in range(4):
+            dispatcher.notify(_transition())
+        assert dispatcher.stats()["queued"] == 2
+        assert dispatcher.dropped == 2
+
+    def test_ignored_unless_started(self, gateway):
+        dispatcher = NotificationDispatcher(HttpSmsProvider(gateway.url), recipients=lambda *key: RECIPIENTS,
+                                            message=lambda event: "x")
+        dispatcher.notify(_transition())
+        assert dispatcher.stats()["queued"] == 0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+ALICE = RECIPIENTS[0]
+
+
+class TestNotificationThrottle:
+    def test_burst_is_merged_into_one_digest(self):
+        clock = FakeClock()
+        throttle = NotificationThrottle(window=60, clock=clock)
+        assert throttle.offer("alice", ALICE, "Door is open (07:58).", {"n": 1}) == "Door is open (07:58)."
+        for n, body in enumerate(["Door is closed (07:58).", "Door is open (07:59).", "Door is closed (07:59)."], 2):
+            assert throttle.offer("alice", ALICE, body, {"n": n}) is None
+        assert throttle.due() == []
+        clock.now += 60
+        [(recipient, body, event)] = throttle.due()
+        assert recipient is ALICE
+        assert body == "3 door updates: Door is closed (07:58). Door is open (07:59). Door is closed (07:59)."
+        assert event == {"n": 4}
+        stats = throttle.stats()
+        assert (stats["merged"], stats["digests"], stats["held"]) == (3, 1, 0)
+
+    def test_long_digests_quote_the_latest_messages(self):
+        clock = FakeClock()
+        throttle = NotificationThrottle(window=60, clock=clock)
+        throttle.offer("alice", ALICE, "m0", {})
+        for n in range(1, 6):
+            throttle.offer("alice", ALICE, f"m{n}", {})
+        clock.now += 60
+        assert throttle.due()[0][1] == "5 door updates: m3 m4 m5 (+2 earlier)"
+
+    def test_quiet_recipient_gets_messages_at_once(self):
+        clock = FakeClock()
+        throttle = NotificationThrottle(window=60, clock=clock)
+        assert throttle.offer("alice", ALICE, "first", {}) == "first"
+        # Windows are per recipient
+        assert throttle.offer("bob", RECIPIENTS[1], "first", {}) == "first"
+        clock.now += 61
+        assert throttle.due() == []
+        assert throttle.stats()["open_windows"] == 0
+        assert throttle.offer("alice", ALICE, "second", {}) == "second"
+
+    def test_continuous_cycling_sends_one_digest_per_window(self):
+        clock = FakeClock()
+        throttle = NotificationThrottle(window=60, clock=clock)
+        throttle.offer("alice", ALICE, "m0", {})
+        sent = 1
+        for _ in range(10):
+            clock.now += 30
+            throttle.offer("alice", ALICE, "cycle", {})
+            sent += len(throttle.due())
+        assert sent == 6
+
+    def test_zero_window_sends_everything(self):
+        throttle = NotificationThrottle(window=0)
+        assert [throttle.offer("alice", ALICE, "m", {}) for _ in range(3)] == ["m"] * 3
+        assert throttle.due() == []
+
+    def test_recipient_budget_suppresses_and_recovers(self):
+        clock = FakeClock()
+        throttle = NotificationThrottle(window=0, recipient_budget=2, period=3600, clock=clock)
+        assert [throttle.offer("alice", ALICE, "m", {}) for _ in range(3)] == ["m", "m", None]
+        assert throttle.offer("bob", RECIPIENTS[1], "m", {}) == "m"
+        stats = throttle.stats()
+        assert stats["suppressed"] == 1
+        assert stats["suppressed_by_recipient"] == {"alice": 1}
+        clock.now += 3600
+        assert throttle.offer("alice", ALICE, "m", {}) == "m"
+
+    def test_global_budget_covers_everyone(self):
+        throttle = NotificationThrottle(window=0, global_budget=2)
+        assert throttle.offer("alice", ALICE, "m", {}) == "m"
+        assert throttle.offer("bob", RECIPIENTS[1], "m", {}) == "m"
+        assert throttle.offer("carol", {"username": "carol"}, "m", {}) is None
+        assert throttle.stats()["suppressed_by_recipient"] == {"carol": 1}
+
+    def test_digests_spend_from_the_budget(self):
+        clock = FakeClock()
+        throttle = NotificationThrottle(window=60, recipient_budget=1, clock=clock)
+        throttle.offer("alice", ALICE, "m0", {})
+        throttle.offer("alice", ALICE, "m1", {})
+        clock.now += 60
+        assert throttle.due() == []
+        assert throttle.suppressed == 1
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            NotificationThrottle(window=-1)
+        with pytest.raises(ValueError):
+            NotificationThrottle(period=0)
+
+
+class TestThrottledDispatcher:
+    def test_burst_sends_first_message_then_a_digest(self, gateway, dispatchers):
+        clock = FakeClock()
+        bodies = iter(["Door is open.", "Door is closed.", "Door is open."])
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url), recipients=RECIPIENTS[:1],
+                                 message=lambda event: next(bodies),
+                                 throttle=NotificationThrottle(window=60, clock=clock))
+        for _ in range(3):
+            dispatcher.notify(_transition())
+        assert _wait_for(lambda: dispatcher.stats()["throttle"]["merged"] == 2)
+        assert dispatcher.sent == 1
+        clock.now += 60
+        assert _wait_for(lambda: dispatcher.sent == 2)
+        assert [request["body"]["body"] for request in gateway.requests] == [
+            "Door is open.", "2 door updates: Door is closed. Door is open."]
+
+    def test_held_messages_are_dropped_for_users_who_opted_out(self, gateway, dispatchers):
+        clock = FakeClock()
+        recipients = list(RECIPIENTS[:1])
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url), recipients=recipients,
+                                 throttle=NotificationThrottle(window=60, clock=clock))
+        dispatcher.notify(_transition())
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: dispatcher.stats()["throttle"]["merged"] == 1)
+        recipients.clear()
+        clock.now += 60
+        assert _wait_for(lambda: dispatcher.stats()["throttle"]["held"] == 0)
+        time.sleep(0.05)
+        assert dispatcher.sent == 1
+        assert len(gateway.requests) == 1
+
+
+class TestOpenDoorAlerts:
+    @pytest.fixture
+    def alerts(self):
+        clock = FakeClock()
+        users = [{"username": "alice", "phone": "+15550001", "open_alert_minutes": 15,
+                  "open_alert_repeat_minutes": None},
+                 {"username": "bob", "phone": "+15550002", "open_alert_minutes": 5,
+                  "open_alert_repeat_minutes": 10},
+                 {"username": "carol", "phone": "+15550003", "open_alert_minutes": None,
+                  "open_alert_repeat_minutes": None}]
+        alerts = OpenDoorAlerts(recipients=lambda door_id, channel: users, send=MagicMock(),
+                                door_name=lambda door_id: "Garage Door", wheel=TimerWheel(clock=clock))
+        # Running without the ticker thread; the tests advance the wheel themselves
+        alerts._thread = MagicMock()
+        alerts.clock, alerts.users = clock, users
+        return alerts
+
+    def _minutes(self, alerts, minutes):
+        sent = []
+        seen = len(alerts.send.call_args_list)
+        for minute in range(1, minutes + 1):
+            alerts.clock.now += 60
+            alerts.wheel.advance()
+            sent.extend((minute, c.args[0]["username"]) for c in alerts.send.call_args_list[seen:])
+            seen = len(alerts.send.call_args_list)
+        return sent
+
+    def test_each_user_is_alerted_at_their_threshold_and_repeats(self, alerts):
+        alerts.on_event(_transition(state="open"))
+        assert alerts.stats()["armed"] == 2
+        assert self._minutes(alerts, 30) == [(5, "bob"), (15, "alice"), (15, "bob"), (25, "bob")]
+        recipient, body, event = alerts.send.call_args_list[1].args
+        assert recipient["username"] == "alice"
+        assert body.startswith("Garage Door has been open for 15 minutes (since ")
+        assert event["state"] == "open"
+
+    def test_closing_cancels_the_alerts(self, alerts):
+        alerts.on_event(_transition(state="open"))
+        assert self._minutes(alerts, 6) == [(5, "bob")]
+        alerts.on_event(_transition(state="closed", old_state="closing", status="closed", old_status="open"))
+        assert alerts.stats() == {"open_doors": 0, "armed": 0, "fired": 1, "sent": 1}
+        assert self._minutes(alerts, 30) == []
+
+    def test_open_events_while_open_keep_the_first_deadline(self, alerts):
+        alerts.on_event(_transition(state="open"))
+        self._minutes(alerts, 3)
+        # A close that reversed before reaching closed
+        alerts.on_event(_transition(state="closing", old_state="open", status="closed", old_status="open"))
+        alerts.on_event(_transition(state="open", old_state="closing"))
+        assert self._minutes(alerts, 2) == [(2, "bob")]
+
+    def test_users_who_turn_alerts_off_are_skipped(self, alerts):
+        alerts.on_event(_transition(state="open"))
+        alerts.users[1] = dict(alerts.users[1], open_alert_minutes=None)
+        assert self._minutes(alerts, 20) == [(15, "alice")]
+        assert alerts.stats()["armed"] == 0
+
+    def test_stop_cancels_everything(self, alerts):
+        alerts.on_event(_transition(state="open"))
+        alerts._thread = None
+        alerts.start()
+        alerts.stop()
+        assert alerts.stats()["armed"] == 0
+        assert not alerts.running
+        alerts.on_event(_transition(state="open"))
+        assert alerts.stats()["open_doors"] == 0
+
+    def test_arming_reads_the_index_and_the_ticker_syncs_it(self):
+        clock = FakeClock()
+        users = FakeUsers({"username": "alice", "phone": "+1", "open_alert_minutes": 5})
+        index = RecipientIndex(users.load_all, users.load_user, door_ids=lambda: [1])
+        index.build()
+        alerts = OpenDoorAlerts(recipients=index.lookup, sync=index.sync, send=MagicMock(),
+                                door_name=lambda door_id: "Garage Door", wheel=TimerWheel(clock=clock))
+        alerts._thread = MagicMock()
+        users.rows["bob"] = {"username": "bob", "phone": "+2", "open_alert_minutes": 5}
+        index.invalidate("bob")
+        # On the poller thread: no database query
+        alerts.on_event(_transition(state="open"))
+        assert users.queries == 1
+        assert alerts.stats()["armed"] == 1
+        clock.now += 60
+        alerts._tick()
+        assert users.queries == 2
+        assert [user["username"] for user in index.lookup(1, "sms")] == ["alice", "bob"]
+
+    def test_alerts_go_through_the_dispatcher(self, gateway, dispatchers):
+        dispatcher = dispatchers(HttpSmsProvider(gateway.url))
+        dispatcher.notify_recipient(RECIPIENTS[1], "Garage Door has been open for 5 minutes.", _transition())
+        assert _wait_for(lambda: dispatcher.sent == 1)
+        assert gateway.requests[0]["body"] == {"to": "+15550002", "body": "Garage Door has been open for 5 minutes."}
+
+
+class FakeUsers:
+    """The users table as far as the recipient index is concerned, counting queries."""
+
+    def __init__(self, *rows):
+        self.rows = {row["username"]: row for row in rows}
+        self.queries = 0
+
+    def load_all(self):
+        self.queries += 1
+        return [row for row in self.rows.values() if row.get("enabled", True) and row.get("phone")]
+
+    def load_user(self, username):
+        self.queries += 1
+        row = self.rows.get(username)
+        return row if row and row.get("enabled", True) and row.get("phone") else None
+
+
+class TestRecipientIndex:
+    def _index(self, users, changes=None, doors=(1, 2)):
+        index = RecipientIndex(users.load_all, users.load_user, door_ids=lambda: doors, changes=changes)
+        index.build()
+        return index
+
+    def test_lookups_never_query_the_database(self):
+        users = FakeUsers({"username": "bob", "phone": "+2"}, {"username": "alice", "phone": "+1"})
+        index = self._index(users)
+        for _ in range(100):
+            recipients = index.recipients(1, "sms")
+        assert [user["username"] for user in recipients] == ["alice", "bob"]
+        assert index.recipients(2, "sms") is recipients
+        assert index.recipients(3, "sms") == ()
+        assert index.recipients(1, "email") == ()
+        assert users.queries == 1
+
+    def test_invalidated_user_is_reloaded_alone(self):
+        users = FakeUsers({"username": "alice", "phone": "+1"}, {"username": "bob", "phone": "+2"})
+        index = self._index(users)
+        users.rows["alice"]["enabled"] = False
+        users.rows["carol"] = {"username": "carol", "phone": "+3"}
+        index.invalidate("alice")
+        index.invalidate("carol")
+        assert [user["username"] for user in index.recipients(1, "sms")] == ["bob", "carol"]
+        assert users.queries == 3
+        assert index.stats() == {"users": 2, "builds": 1, "reloads": 2}
+
+    def test_changes_from_other_workers_arrive_through_the_segment(self, tmp_path):
+        from shared_state import SharedDoorState
+        leader = SharedDoorState(str(tmp_path / "door-state"))
+        worker = SharedDoorState(str(tmp_path / "door-state"))
+        try:
+            users = FakeUsers({"username": "alice", "phone": "+1"})
+            index = self._index(users, changes=leader)
+            users.rows["bob"] = {"username": "bob", "phone": "+2"}
+            worker.publish_user_change("bob")
+            assert [user["username"] for user in index.recipients(1, "sms")] == ["alice", "bob"]
+            assert users.queries == 2
+            # Nothing new: no query
+            index.recipients(1, "sms")
+            assert users.queries == 2
+        finally:
+            leader.close()
+            worker.close()
+
+    def test_missed_changes_rebuild_the_index(self, tmp_path):
+        from shared_state import USER_CHANGE_SLOTS, SharedDoorState
+        segment = SharedDoorState(str(tmp_path / "door-state"))
+        try:
+            users = FakeUsers({"username": "alice", "phone": "+1"})
+            index = self._index(users, changes=segment)
+            for i in range(USER_CHANGE_SLOTS + 1):
+                segment.publish_user_change(f"user{i}")
+            index.recipients(1, "sms")
+            assert index.builds == 2
+        finally:
+            segment.close()
+
+
+    def test_failed_reload_keeps_the_user_until_the_database_answers(self):
+        users = FakeUsers({"username": "alice", "phone": "+1"}, {"username": "bob", "phone": "+2"})
+        index = self._index(users)
+        index.load_user = MagicMock(side_effect=RuntimeError("DB down"))
+        index.invalidate("alice")
+        assert [user["username"] for user in index.recipients(1, "sms")] == ["alice", "bob"]
+        assert index.load_user.call_count == 1
+        # Still stale: retried on the next lookup
+        index.load_user = MagicMock(return_value=None)
+        assert [user["username"] for user in index.recipients(1, "sms")] == ["bob"]
+        index.load_user.assert_called_once_with("alice")
+
+    def test_failed_build_keeps_every_recipient(self):
+        users = FakeUsers({"username": "alice", "phone": "+1"})
+        index = self._index(users)
+        load_all = users.load_all
+        index.load_all = MagicMock(side_effect=RuntimeError("DB down"))
+        index.build()
+        assert [user["username"] for user in index.recipients(1, "sms")] == ["alice"]
+        assert index.builds == 1
+        # The next lookup rebuilds once the database answers
+        users.rows["bob"] = {"username": "bob", "phone": "+2"}
+        index.load_all = load_all
+        assert [user["username"] for user in index.recipients(1, "sms")] == ["alice", "bob"]
+        assert index.builds == 2
+
+
+class TestAppWiring:
+    def test_disabled_by_default(self, monkeypatch):
+        monkeypatch.delenv("SMS_PROVIDER", raising=False)
+        with patch.object(app_module, "NotificationDispatcher") as dispatcher_class:
+            app_module.create_notifier()
+        dispatcher_class.assert_not_called()
+        assert app_module.notifier is None
+
+    def test_unknown_or_misconfigured_provider_is_logged(self, monkeypatch):
+        for provider in ("carrier-pigeon", "http"):
+            monkeypatch.setenv("SMS_PROVIDER", provider)
+            monkeypatch.delenv("SMS_HTTP_URL", raising=False)
+            app_module.create_notifier()
+            assert app_module.notifier is None
+
+    def test_runs_with_the_leader_jobs(self, monkeypatch, mock_db):
+        monkeypatch.setenv("SMS_PROVIDER", "http")
+        monkeypatch.setenv("SMS_HTTP_URL", "http://sms.local/send")
+        with patch.object(app_module, "NotificationDispatcher") as dispatcher_class, \
+                patch.object(app_module, "RecipientIndex") as index_class, \
+                patch.object(app_module, "OpenDoorAlerts") as alerts_class, \
+                patch.object(app_module, "door_events", MagicMock()) as events, \
+                patch.object(app_module, "scheduler", MagicMock()):
+            app_module.create_notifier()
+            dispatcher = dispatcher_class.return_value
+            alerts = alerts_class.return_value
+            assert [c.args for c in events.subscribe.call_args_list] == [(dispatcher.notify,), (alerts.on_event,)]
+            assert alerts_class.call_args.kwargs["send"] == dispatcher.notify_recipient
+            assert alerts_class.call_args.kwargs["recipients"] == index_class.return_value.lookup
+            assert alerts_class.call_args.kwargs["sync"] == index_class.return_value.sync
+            index_class.return_value.build.assert_called_once()
+            assert app_module.recipient_index is index_class.return_value
+            assert app_module.open_door_alerts is alerts
+            kwargs = dispatcher_class.call_args.kwargs
+            assert kwargs["recipients"] == index_class.return_value.recipients
+            assert kwargs["dead_letter"] == mock_db.add_dead_letter
+            assert kwargs["throttle"].window == 60
+            assert kwargs["throttle"].recipient_budget == 20
+            app_module.start_leader_jobs()
+            dispatcher.start.assert_called_once()
+            alerts.start.assert_called_once()
+            app_module.stop_leader_jobs()
+            dispatcher.stop.assert_called_once()
+            alerts.stop.assert_called_once()
+            app_module.stop_notifier()
+        assert app_module.notifier is None
+        assert app_module.open_door_alerts is None
+
+    def test_user_changes_reach_every_worker_through_the_segment(self):
+        segment, index = MagicMock(), MagicMock()
+        with patch.object(app_module, "door_state_segment", segment), \
+                patch.object(app_module, "recipient_index", index):
+            app_module._user_changed("alice")
+        segment.publish_user_change.assert_called_once_with("alice")
+        index.invalidate.assert_not_called()
+        with patch.object(app_module, "door_state_segment", None), \
+                patch.object(app_module, "recipient_index", index):
+            app_module._user_changed("alice")
+        index.invalidate.assert_called_once_with("alice")
+
+    def test_message_uses_the_door_name(self):
+        assert app_module._door_notification(_transition()).startswith("Garage Door is open")
+
+    def test_admin_notifications(self, admin_client, mock_db):
+        assert admin_client.get("/admin/notifications").get_json() == {"enabled": False}
+        mock_db.get_dead_letters.return_value = [{"id": 1, "recipient": "+15550001"}]
+        dispatcher = NotificationDispatcher(HttpSmsProvider("http://sms.local"), recipients=MagicMock(),
+                                            message=lambda event: None)
+        index = RecipientIndex(load_all=list, load_user=MagicMock(), door_ids=list)
+        alerts = OpenDoorAlerts(recipients=index.lookup, sync=index.sync, send=dispatcher.notify_recipient,
+                                door_name=str)
+        with patch.object(app_module, "notifier", dispatcher), patch.object(app_module, "recipient_index", index), \
+                patch.object(app_module, "open_door_alerts", alerts):
+            data = admin_client.get("/admin/notifications").get_json()
+        assert data["enabled"] is True
+        assert data["provider"] == "http"
+        assert data["dead_letters"] == [{"id": 1, "recipient": "+15550001"}]
+        assert data["recipients"] == {"users": 0, "builds": 0, "reloads": 0}
+        assert data["open_door_alerts"] == {"open_doors": 0, "armed": 0, "fired": 0, "sent": 0}
+
+    def test_admin_notifications_requires_admin(self, auth_client):
+        assert auth_client.get("/admin/notifications").status_code == 302
@@ -0,0 +1,99 @@
+"""Tests for the web manifest and the service worker serving the app shell offline."""
+import json
+import os
+import re
+from unittest.mock import patch
+
+import app as app_module
+from build_assets import build, source_version
+from user_roles import UserRole
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestServiceWorker:
+    def test_served_from_the_root_uncached(self, client):
+        response = client.get("/service-worker.js")
+        assert response.status_code == 200
+        assert response.mimetype == "application/javascript"
+        assert response.headers["Cache-Control"] == "no-cache"
+
+    def test_caches_are_named_after_the_asset_version(self, client):
+        body = client.get("/service-worker.js").get_data(as_text=True)
+        assert f"const VERSION = {json.dumps(app_module.asset_version)};" in body
+        assert 'const DASHBOARD = "/";' in body
+
+    def test_precaches_shell_assets_by_their_served_urls(self, client):
+        with patch.dict(app_module.asset_manifest, {"js/app.js": "dist/js/app.0123456789ab.js"}):
+            body = client.get("/service-worker.js").get_data(as_text=True)
+        assets = json.loads(re.search(r"const SHELL_ASSETS = (\[.*?\]);", body).group(1))
+        assert "/static/dist/js/app.0123456789ab.js" in assets
+        assert "/static/css/style.css" in assets
+        assert set(app_module.SHELL_CDN_ASSETS) <= set(assets)
+
+    def test_cdn_assets_match_base_template(self):
+        with open(os.path.join(ROOT, "templates", "base.html")) as f:
+            cdn_urls = set(re.findall(r'(?:href|src)="(https://[^"]+)"', f.read()))
+        assert cdn_urls == set(app_module.SHELL_CDN_ASSETS)
+
+    def test_only_the_user_independent_shell_is_cached(self, client):
+        body = client.get("/service-worker.js").get_data(as_text=True)
+        assert 'const OFFLINE = "/offline";' in body
+        # The dashboard is answered from the network and never stored
+        assert "cache.put(DASHBOARD" not in body
+        assert "PAGE_CACHE" not in body
+        assert "credentials: 'omit'" in body
+
+    def test_disabled_worker_removes_itself(self, client):
+        with patch.object(app_module, "PWA_ENABLED", False):
+            body = client.get("/service-worker.js").get_data(as_text=True)
+        assert "unregister()" in body
+        assert "SHELL_CACHE" not in body
+
+
+class TestPages:
+    def test_pages_link_manifest_and_register_worker(self, client):
+        html = client.get("/login").get_data(as_text=True)
+        assert '<link rel="manifest" href="/static/manifest.webmanifest">' in html
+        assert 'data-service-worker="/service-worker.js"' in html
+
+    def test_disabled_pages_do_not_register_worker(self, client):
+        with patch.object(app_module, "PWA_ENABLED", False), patch.object(app_module, "render_cache", None):
+            html = client.get("/login").get_data(as_text=True)
+        assert "data-service-worker" not in html
+
+    def test_offline_page_is_the_same_for_every_user(self, client, mock_db):
+        anonymous = client.get("/offline")
+        assert anonymous.status_code == 200
+        html = anonymous.get_data(as_text=True)
+        assert 'id="offlineNotice" data-dashboard="/"' in html
+        mock_db.get_user_by_username.return_value = {
+            "id": 1, "username": "testuser", "password_hash": "x", "role": UserRole.REGULAR.value, "is_active": True
+        }
+        with client.session_transaction() as session:
+            session["_user_id"] = "testuser"
+        signed_in = client.get("/offline").get_data(as_text=True)
+        assert signed_in == html
+        assert "testuser" not in signed_in
+
+    def test_web_manifest(self, client):
+        response = client.get("/static/manifest.webmanifest")
+        assert response.mimetype == "application/manifest+json"
+        manifest = json.loads(response.data)
+        assert manifest["start_url"] == "/"
+        assert manifest["display"] == "standalone"
+        icon = manifest["icons"][0]["src"]
+        assert client.get(icon).status_code == 200
+
+
+class TestAssetVersion:
+    def test_source_version_matches_the_build(self, tmp_path):
+        (tmp_path / "app.js").write_text("console.log(1);")
+        before = source_version(str(tmp_path))
+        build(str(tmp_path))
+        with open(tmp_path / "dist" / "manifest.json") as f:
+            assert json.load(f)["version"] == before
+        # The build output itself does not count
+        assert source_version(str(tmp_path)) == before
+        (tmp_path / "app.js").write_text("console.log(2);")
+        assert source_version(str(tmp_path)) != before
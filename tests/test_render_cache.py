@@ -0,0 +1,144 @@
+"""Tests for render_cache.py and the cached pages in app.py."""
+import os
+from unittest.mock import patch
+
+import pytest
+
+import app as app_module
+from render_cache import RenderCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def templates(tmp_path):
+    (tmp_path / "page.html").write_text("<p>one</p>")
+    return tmp_path
+
+
+def _touch(path, content):
+    stat = os.stat(path) if os.path.exists(path) else None
+    path.write_text(content)
+    if stat:
+        # Filesystems with coarse timestamps may not move the mtime on a quick rewrite
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestRenderCache:
+    def test_get_put_and_counters(self, templates):
+        cache = RenderCache([str(templates)])
+        assert cache.get("page") is None
+        page = cache.put("page", b"<p>one</p>")
+        assert cache.get("page") is page
+        assert page.etag and page.mimetype == "text/html"
+        assert cache.stats() == {"entries": 1, "bytes": 10, "hits": 1, "misses": 1,
+                                 "bypassed": 0, "invalidations": 0}
+
+    def test_etag_follows_content(self, templates):
+        cache = RenderCache([str(templates)])
+        assert cache.put("a", b"x").etag == cache.put("b", b"x").etag
+        assert cache.put("c", b"y").etag != cache.put("a", b"x").etag
+
+    def test_template_change_invalidates_after_check_interval(self, templates):
+        clock = FakeClock()
+        cache = RenderCache([str(templates)], check_interval=2, clock=clock)
+        cache.put("page", b"<p>one</p>")
+        _touch(templates / "page.html", "<p>two</p>")
+        clock.now += 1
+        assert cache.get("page") is not None
+        clock.now += 2
+        assert cache.get("page") is None
+        assert cache.stats()["invalidations"] == 1
+
+    @pytest.mark.parametrize("change", ["add", "remove"])
+    def test_added_or_removed_template_invalidates(self, templates, change):
+        clock = FakeClock()
+        (templates / "other.html").write_text("x")
+        cache = RenderCache([str(templates)], check_interval=0, clock=clock)
+        cache.put("page", b"<p>one</p>")
+        if change == "add":
+            (templates / "sub").mkdir()
+            (templates / "sub" / "new.html").write_text("x")
+        else:
+            os.utime(templates / "page.html", ns=(0, os.stat(templates / "other.html").st_mtime_ns))
+            cache = RenderCache([str(templates)], check_interval=0, clock=clock)
+            cache.put("page", b"<p>one</p>")
+            (templates / "page.html").unlink()
+        assert cache.get("page") is None
+
+    def test_unchanged_templates_keep_entries(self, templates):
+        clock = FakeClock()
+        cache = RenderCache([str(templates)], check_interval=0, clock=clock)
+        cache.put("page", b"<p>one</p>")
+        clock.now += 60
+        assert cache.get("page") is not None
+
+
+class TestCachedPages:
+    @pytest.mark.parametrize("path", ["/privacy-policy", "/terms-and-conditions", "/login"])
+    def test_second_request_is_served_from_cache(self, client, path):
+        first = client.get(path)
+        with patch.object(app_module, "render_template") as render:
+            second = client.get(path)
+        render.assert_not_called()
+        assert second.status_code == 200
+        assert second.data == first.data
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert second.headers["Cache-Control"] == "no-cache"
+
+    def test_conditional_request_gets_304(self, client):
+        etag = client.get("/privacy-policy").headers["ETag"]
+        response = client.get("/privacy-policy", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
+    def test_logged_in_visitors_get_their_own_variant(self, auth_client):
+        app_module.render_cache.put(("privacy_policy", False), b"anonymous page")
+        response = auth_client.get("/privacy-policy")
+        assert b"Logout" in response.data
+        assert app_module.render_cache.stats()["entries"] == 2
+
+    def test_anonymous_visitors_get_their_own_variant(self, client):
+        app_module.render_cache.put(("privacy_policy", True), b"logged in page")
+        response = client.get("/privacy-policy")
+        assert b"Logout" not in response.data
+        assert app_module.render_cache.stats()["entries"] == 2
+
+    def test_flashed_messages_bypass_the_cache(self, client, mock_db):
+        client.get("/login")
+        mock_db.verify_password.return_value = False
+        with client.session_transaction() as sess:
+            sess["_flashes"] = [("message", "Please log in again")]
+        response = client.get("/login")
+        assert b"Please log in again" in response.data
+        assert "ETag" not in response.headers
+        assert app_module.render_cache.stats()["bypassed"] == 1
+        # The message was consumed, so the next request is cached again
+        assert b"Please log in again" not in client.get("/login").data
+
+    def test_login_post_is_never_cached(self, client, mock_db):
+        mock_db.verify_password.return_value = False
+        client.get("/login")
+        response = client.post("/login", data={"username": "x", "password": "y"})
+        assert b"Invalid username or password" in response.data
+        assert b"Invalid username or password" not in client.get("/login").data
+
+    def test_disabled_cache_renders_every_time(self, client):
+        with patch.object(app_module, "render_cache", None):
+            response = client.get("/privacy-policy")
+        assert response.status_code == 200
+        assert "ETag" not in response.headers
+
+    def test_admin_stats(self, admin_client):
+        admin_client.get("/privacy-policy")
+        data = admin_client.get("/admin/render_cache").get_json()
+        assert data["enabled"] is True
+        assert data["entries"] == 1
+        with patch.object(app_module, "render_cache", None):
+            assert admin_client.get("/admin/render_cache").get_json() == {"enabled": False}
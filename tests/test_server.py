@@ -0,0 +1,95 @@
+"""
+Tests for the production entry point (server.py).
+
+Only configuration handling is exercised here; no web server is started and
+no monkey patching is applied to the test process.
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def server_env(monkeypatch):
+    """Start every test from a clean set of server-related env-vars."""
+    for name in (
+        "APP_ENV",
+        "FLASK_DEBUG",
+        "SERVER_ASYNC_MODE",
+        "SERVER_MAX_CONNECTIONS",
+        "SERVER_BACKLOG",
+        "SERVER_THREADS",
+        "SERVER_KEEPALIVE",
+        "SERVER_ACCESS_LOG",
+    ):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+
+class TestResolveDebug:
+    def test_debug_defaults_to_off(self, server_env):
+        assert server.resolve_debug() is False
+
+    def test_debug_allowed_in_development(self, server_env):
+        server_env.setenv("FLASK_DEBUG", "True")
+        assert server.resolve_debug() is True
+
+    def test_debug_refused_in_production(self, server_env):
+        server_env.setenv("APP_ENV", "production")
+        server_env.setenv("FLASK_DEBUG", "true")
+        with pytest.raises(RuntimeError):
+            server.resolve_debug()
+
+    def test_production_without_debug_is_fine(self, server_env):
+        server_env.setenv("APP_ENV", "Production")
+        server_env.setenv("FLASK_DEBUG", "False")
+        assert server.resolve_debug() is False
+
+
+class TestServerConfig:
+    def test_defaults(self, server_env):
+        config = server.get_server_config()
+        assert config["async_mode"] == "gevent"
+        assert config["debug"] is False
+        assert config["max_connections"] == 1000
+        assert config["threads"] == 100
+        assert config["access_log"] is False
+
+    @pytest.mark.parametrize("mode", server.ASYNC_MODES)
+    def test_supported_async_modes(self, server_env, mode):
+        server_env.setenv("SERVER_ASYNC_MODE", mode.upper())
+        assert server.get_server_config()["async_mode"] == mode
+
+    def test_invalid_async_mode_rejected(self, server_env):
+        server_env.setenv("SERVER_ASYNC_MODE", "asyncio")
+        with pytest.raises(ValueError):
+            server.get_server_config()
+
+    def test_tuning_values_read_from_env(self, server_env):
+        server_env.setenv("SERVER_MAX_CONNECTIONS", "250")
+        server_env.setenv("SERVER_BACKLOG", "64")
+        server_env.setenv("SERVER_THREADS", "16")
+        config = server.get_server_config()
+        assert config["max_connections"] == 250
+        assert config["backlog"] == 64
+        assert config["threads"] == 16
+
+
+class TestMain:
+    def test_production_debug_refused_before_patching(self, server_env):
+        server_env.setenv("APP_ENV", "production")
+        server_env.setenv("FLASK_DEBUG", "True")
+        with patch("server.load_dotenv"), patch("server.patch_for_async_mode") as mock_patch:
+            with pytest.raises(RuntimeError):
+                server.main()
+        mock_patch.assert_not_called()
+
+    def test_dispatches_to_configured_server(self, server_env):
+        server_env.setenv("SERVER_ASYNC_MODE", "threading")
+        mock_serve = MagicMock()
+        with patch("server.load_dotenv"), patch.dict(server.SERVERS, {"threading": mock_serve}):
+            server.main()
+        mock_serve.assert_called_once()
+        assert mock_serve.call_args[0][0]["async_mode"] == "threading"
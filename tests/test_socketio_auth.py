@@ -0,0 +1,79 @@
+"""
+Tests for Socket.IO connection authentication and room-scoped broadcasts (app.py).
+
+Uses Flask-SocketIO's test client; the login session is carried over from
+the Flask test client fixtures in conftest.py.
+"""
+import secrets
+from unittest.mock import patch
+
+import pytest
+
+import app as app_module
+from user_roles import UserRole
+
+socketio = app_module.socketio
+
+
+def _rooms_of(client):
+    """Return the rooms the test client's session has joined in the root namespace."""
+    sid = client.eio_sid and socketio.server.manager.sid_from_eio_sid(client.eio_sid, "/")
+    return set(socketio.server.manager.get_rooms(sid, "/"))
+
+
+class TestConnectAuthentication:
+    def test_anonymous_socket_rejected(self, app, client):
+        sio = socketio.test_client(app, flask_test_client=client)
+        assert sio.is_connected() is False
+
+    def test_anonymous_socket_gets_no_door_state(self, app, client):
+        with patch.dict(app_module.last_door_states, {1: "open"}, clear=True):
+            sio = socketio.test_client(app, flask_test_client=client)
+        assert sio.is_connected() is False
+
+    def test_logged_in_user_accepted(self, app, auth_client):
+        sio = socketio.test_client(app, flask_test_client=auth_client)
+        assert sio.is_connected() is True
+        sio.disconnect()
+
+    def test_valid_api_key_in_auth_payload_accepted(self, app, client, mock_db):
+        mock_db.get_user_by_api_key.return_value = {
+            "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+        }
+        key = secrets.token_hex(32)
+        sio = socketio.test_client(app, flask_test_client=client, auth={"api_key": key})
+        assert sio.is_connected() is True
+        mock_db.get_user_by_api_key.assert_called_with(key)
+        sio.disconnect()
+
+    def test_valid_api_key_header_accepted(self, app, client, mock_db):
+        mock_db.get_user_by_api_key.return_value = {
+            "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+        }
+        sio = socketio.test_client(app, flask_test_client=client, headers={"X-API-Key": "k"})
+        assert sio.is_connected() is True
+        sio.disconnect()
+
+    def test_invalid_api_key_rejected(self, app, client, mock_db):
+        mock_db.get_user_by_api_key.return_value = None
+        sio = socketio.test_client(app, flask_test_client=client, auth={"api_key": "bad"})
+        assert sio.is_connected() is False
+
+
+class TestRooms:
+    def test_user_joins_the_door_rooms(self, app, auth_client):
+        sio = socketio.test_client(app, flask_test_client=auth_client)
+        rooms = _rooms_of(sio)
+        sio.disconnect()
+        assert app_module.door_room(app_module.DEFAULT_DOOR_ID) in rooms
+        # Nothing is broadcast by role, so there are no role rooms to join
+        assert not any(str(room).startswith("role:") for room in rooms)
+
+    def test_door_update_emitted_to_door_room(self):
+        with patch.dict(app_module.last_door_states, {1: "closed"}, clear=True), \
+                patch.object(app_module, "door_state_segment", None), \
+                patch.object(socketio, "emit") as mock_emit, \
+                patch("subprocess.run") as mock_run:
+            mock_run.return_value.stdout = "one: Door Opened\n"
+            app_module.check_door_status_and_notify()
+        assert mock_emit.call_args.kwargs["to"] == app_module.door_room(app_module.DEFAULT_DOOR_ID)
@@ -0,0 +1,198 @@
+"""
+Tests for ETags, conditional GETs and the ?wait=N long-poll on the door
+status endpoints (app.py).
+
+Each test publishes into its own shared door segment under tmp_path, except
+those for a single process without one, which read the sensor live.
+"""
+import secrets
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import app as app_module
+from door_events import DoorEventLog, TRANSITION
+from shared_state import SharedDoorState
+from user_roles import UserRole
+
+
+@pytest.fixture
+def segment(tmp_path):
+    seg = SharedDoorState(str(tmp_path / "door-state"))
+    with patch.object(app_module, "door_state_segment", seg), \
+            patch.object(app_module, "door_events", DoorEventLog()):
+        yield seg
+    seg.close()
+
+
+@pytest.fixture
+def live():
+    """A single process without a shared segment: the status is a live sensor read."""
+    with patch.object(app_module, "door_state_segment", None), \
+            patch.object(app_module, "door_events", DoorEventLog()), \
+            patch.object(app_module, "_get_door_status") as read:
+        read.return_value = {"success": True, "status": "closed"}
+        yield read
+
+
+def _change_later(segment, status, delay=0.1):
+    timer = threading.Timer(delay, segment.publish_status, args=(status,))
+    timer.start()
+    return timer
+
+
+class TestETag:
+    def test_response_carries_weak_etag_from_sequence(self, auth_client, segment):
+        segment.publish_status("open", sequence=12)
+        response = auth_client.get("/door_status")
+        assert response.status_code == 200
+        etag, weak = response.get_etag()
+        assert weak is True
+        assert etag.startswith("12-open-")
+        assert response.headers["Cache-Control"] == "no-cache"
+
+    def test_matching_if_none_match_returns_304(self, auth_client, segment):
+        segment.publish_status("closed")
+        etag = auth_client.get("/door_status").headers["ETag"]
+        response = auth_client.get("/door_status", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
+    def test_new_reading_of_same_state_keeps_etag(self, auth_client, segment):
+        segment.publish_status("closed", timestamp=time.time() - 5)
+        etag = auth_client.get("/door_status").headers["ETag"]
+        segment.publish_status("closed")
+        assert auth_client.get("/door_status", headers={"If-None-Match": etag}).status_code == 304
+
+    def test_state_change_invalidates_etag(self, auth_client, segment):
+        segment.publish_status("closed")
+        etag = auth_client.get("/door_status").headers["ETag"]
+        segment.publish_status("open")
+        response = auth_client.get("/door_status", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.get_json()["status"] == "open"
+
+    def test_actuation_invalidates_etag(self, auth_client, segment):
+        segment.publish_status("closed")
+        etag = auth_client.get("/door_status").headers["ETag"]
+        segment.publish_actuation(True)
+        assert auth_client.get("/door_status", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_failed_live_read_has_no_etag(self, auth_client, live):
+        live.return_value = {"success": False, "error": "Door status check timed out"}
+        response = auth_client.get("/door_status")
+        assert "ETag" not in response.headers
+
+    def test_api_endpoint_supports_conditional_get(self, client, mock_db, segment):
+        mock_db.get_user_by_api_key.return_value = {
+            "id": 1, "username": "apiuser", "role": UserRole.REGULAR.value, "is_active": True,
+        }
+        headers = {"X-API-Key": secrets.token_hex(32)}
+        segment.publish_status("open")
+        etag = client.get("/api/door_status", headers=headers).headers["ETag"]
+        response = client.get("/api/door_status", headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+
+
+class TestSingleProcess:
+    def test_live_read_is_tagged_with_the_event_log_position(self, auth_client, live):
+        response = auth_client.get("/door_status")
+        etag, weak = response.get_etag()
+        assert weak is True
+        assert etag.startswith(f"{app_module.door_events.epoch}.0-closed-")
+        assert auth_client.get("/door_status", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+    def test_event_invalidates_etag(self, auth_client, live):
+        etag = auth_client.get("/door_status").headers["ETag"]
+        app_module.door_events.append(TRANSITION, {"door_id": 1, "status": "closed", "oldStatus": "closed"})
+        assert auth_client.get("/door_status", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_wait_returns_on_the_next_transition(self, auth_client, live):
+        etag = auth_client.get("/door_status").headers["ETag"]
+        reads = live.call_count
+
+        def poll_transition():
+            live.return_value = {"success": True, "status": "open"}
+            app_module.door_events.append(TRANSITION, {"door_id": 1, "status": "open", "oldStatus": "closed"})
+
+        timer = threading.Timer(0.5, poll_transition)
+        timer.start()
+        start = time.monotonic()
+        try:
+            response = auth_client.get("/door_status?wait=5", headers={"If-None-Match": etag})
+        finally:
+            timer.join()
+        assert time.monotonic() - start < 2
+        assert response.get_json()["status"] == "open"
+        # The sensor is read again only after the event, not on every wake-up
+        assert live.call_count - reads == 2
+
+
+class TestLongPoll:
+    def test_wait_returns_when_state_changes(self, auth_client, segment):
+        segment.publish_status("closed")
+        etag = auth_client.get("/door_status").headers["ETag"]
+        timer = _change_later(segment, "open")
+        start = time.monotonic()
+        try:
+            response = auth_client.get("/door_status?wait=5", headers={"If-None-Match": etag})
+        finally:
+            timer.join()
+        assert time.monotonic() - start < 2
+        assert response.status_code == 200
+        assert response.get_json()["status"] == "open"
+
+    def test_wait_times_out_with_304(self, auth_client, segment):
+        segment.publish_status("closed")
+        etag = auth_client.get("/door_status").headers["ETag"]
+        start = time.monotonic()
+        response = auth_client.get("/door_status?wait=0.3", headers={"If-None-Match": etag})
+        assert time.monotonic() - start >= 0.3
+        assert response.status_code == 304
+
+    def test_wait_without_etag_waits_for_next_change(self, auth_client, segment):
+        segment.publish_status("closed")
+        timer = _change_later(segment, "open")
+        try:
+            response = auth_client.get("/door_status?wait=5")
+        finally:
+            timer.join()
+        assert response.get_json()["status"] == "open"
+
+    def test_stale_if_none_match_answers_immediately(self, auth_client, segment):
+        segment.publish_status("open")
+        start = time.monotonic()
+        response = auth_client.get("/door_status?wait=5", headers={"If-None-Match": 'W/"1-closed-0"'})
+        assert time.monotonic() - start < 1
+        assert response.status_code == 200
+
+    def test_wait_wakes_on_in_process_event(self, auth_client, segment):
+        segment.publish_status("closed", sequence=1)
+        etag = auth_client.get("/door_status").headers["ETag"]
+
+        def poll_transition():
+            app_module.door_events.append(TRANSITION, {"door_id": 1, "status": "open", "oldStatus": "closed"})
+            segment.publish_status("open", sequence=app_module.door_events.last_seq)
+
+        timer = threading.Timer(0.1, poll_transition)
+        timer.start()
+        try:
+            response = auth_client.get("/door_status?wait=5", headers={"If-None-Match": etag})
+        finally:
+            timer.join()
+        assert response.get_json()["status"] == "open"
+
+    def test_wait_is_capped(self, auth_client, segment):
+        segment.publish_status("closed")
+        etag = auth_client.get("/door_status").headers["ETag"]
+        with patch.dict("os.environ", {"LONG_POLL_MAX_WAIT": "0.2"}):
+            start = time.monotonic()
+            response = auth_client.get("/door_status?wait=600", headers={"If-None-Match": etag})
+        assert time.monotonic() - start < 2
+        assert response.status_code == 304
+
+    def test_invalid_wait_is_ignored(self, auth_client, segment):
+        segment.publish_status("closed")
+        assert auth_client.get("/door_status?wait=soon").status_code == 200
@@ -0,0 +1,118 @@
+"""Tests for timer_wheel.py."""
+import pytest
+
+from timer_wheel import TimerWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 500.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run(wheel, clock, seconds, step=1.0):
+    """Advance the clock a step at a time, returning (time offset, fired count) for ticks that fired."""
+    fired = []
+    elapsed = 0.0
+    while elapsed < seconds:
+        clock.now += step
+        elapsed += step
+        count = wheel.advance()
+        if count:
+            fired.append((elapsed, count))
+    return fired
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class TestTimerWheel:
+    def test_fires_once_at_the_deadline(self, clock):
+        wheel = TimerWheel(clock=clock)
+        calls = []
+        wheel.schedule(5, calls.append, "a")
+        assert _run(wheel, clock, 10) == [(5.0, 1)]
+        assert calls == ["a"]
+        assert len(wheel) == 0
+        assert wheel.fired == 1
+
+    @pytest.mark.parametrize("delay", [1, 3, 4, 5, 15, 16, 17, 63, 64, 65, 100, 255, 256, 300])
+    def test_deadlines_across_levels_are_exact(self, clock, delay):
+        # 4 slots per level: 100 s cascades through three levels
+        wheel = TimerWheel(slots=4, levels=4, clock=clock)
+        clock.now += 7  # start off a level boundary
+        wheel.advance()
+        timer = wheel.schedule(delay, lambda: None)
+        assert _run(wheel, clock, delay + 5) == [(float(delay), 1)]
+        assert not timer.pending
+
+    def test_deadlines_beyond_the_top_level_wait_there(self, clock):
+        wheel = TimerWheel(slots=4, levels=2, clock=clock)
+        wheel.schedule(50, lambda: None)
+        assert _run(wheel, clock, 60) == [(50.0, 1)]
+
+    def test_cancel(self, clock):
+        wheel = TimerWheel(clock=clock)
+        calls = []
+        timer = wheel.schedule(5, calls.append, "a")
+        wheel.schedule(5, calls.append, "b")
+        assert wheel.cancel(timer) is True
+        assert wheel.cancel(timer) is False
+        assert len(wheel) == 1
+        _run(wheel, clock, 10)
+        assert calls == ["b"]
+
+    def test_cancel_after_cascade(self, clock):
+        wheel = TimerWheel(slots=4, levels=3, clock=clock)
+        calls = []
+        timer = wheel.schedule(40, calls.append, "a")
+        _run(wheel, clock, 33)
+        assert timer.pending
+        wheel.cancel(timer)
+        _run(wheel, clock, 20)
+        assert calls == []
+
+    def test_delays_round_up_to_whole_ticks(self, clock):
+        wheel = TimerWheel(resolution=1.0, clock=clock)
+        clock.now += 0.5
+        wheel.schedule(0, lambda: None)
+        wheel.schedule(1.2, lambda: None)
+        assert _run(wheel, clock, 3, step=0.5) == [(0.5, 1), (1.5, 1)]
+
+    def test_advance_catches_up_on_missed_ticks(self, clock):
+        wheel = TimerWheel(clock=clock)
+        for delay in (1, 2, 30):
+            wheel.schedule(delay, lambda: None)
+        clock.now += 31
+        assert wheel.advance() == 3
+
+    def test_callbacks_may_reschedule(self, clock):
+        wheel = TimerWheel(clock=clock)
+        calls = []
+
+        def repeat():
+            calls.append(clock.now)
+            if len(calls) < 3:
+                wheel.schedule(10, repeat)
+
+        wheel.schedule(10, repeat)
+        _run(wheel, clock, 40)
+        assert [t - 500 for t in calls] == [10, 20, 30]
+
+    def test_failing_callback_does_not_stop_the_others(self, clock):
+        wheel = TimerWheel(clock=clock)
+        calls = []
+        wheel.schedule(1, lambda: 1 / 0)
+        wheel.schedule(1, calls.append, "b")
+        assert _run(wheel, clock, 2) == [(1.0, 2)]
+        assert calls == ["b"]
+
+    def test_invalid_settings(self):
+        with pytest.raises(ValueError):
+            TimerWheel(slots=10)
+        with pytest.raises(ValueError):
+            TimerWheel(resolution=0)
@@ -0,0 +1,526 @@
+"""Tests for webhooks.py and the webhook API routes."""
+import ipaddress
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import app as app_module
+from door_events import ACTUATION, SNAPSHOT, TRANSITION
+from user_roles import UserRole
+from webhooks import (
+    SIGNATURE_HEADER,
+    ConnectionPool,
+    WebhookDispatcher,
+    event_payload,
+    parse_allowlist,
+    sign,
+    validate_url,
+    verify,
+)
+
+SECRET = "s3cret"
+# The test endpoints listen on loopback, which webhooks may only reach when allowed
+LOOPBACK = parse_allowlist("127.0.0.0/8")
+
+
+class Endpoint(ThreadingHTTPServer):
+    """Webhook receiver: records requests and answers with the queued status codes, then 200."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), EndpointHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/hook"
+        self.requests = []
+        self.statuses = []
+        self.delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+
+class EndpointHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client's connection pool can reuse connections
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        time.sleep(self.server.delay)
+        with self.server.lock:
+            self.server.active -= 1
+            self.server.requests.append({"body": body, "headers": dict(self.headers),
+                                         "client_port": self.client_address[1]})
+            status = self.server.statuses.pop(0) if self.server.statuses else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    server = Endpoint()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class MemoryStore:
+    """The DatabaseManager webhook methods over in-memory tables."""
+
+    def __init__(self):
+        self.webhooks = {}
+        self.deliveries = {}
+        self._ids = iter(range(1, 10000))
+        self.lock = threading.Lock()
+
+    def add_webhook(self, url, max_concurrency=2, secret=SECRET):
+        webhook_id = len(self.webhooks) + 1
+        self.webhooks[webhook_id] = {"id": webhook_id, "url": url, "secret": secret, "enabled": True,
+                                     "max_concurrency": max_concurrency, "consecutive_failures": 0,
+                                     "disabled_reason": None}
+        return webhook_id
+
+    def enqueue_webhook_deliveries(self, event_type, payload):
+        with self.lock:
+            count = 0
+            for webhook in self.webhooks.values():
+                if webhook["enabled"]:
+                    delivery_id = next(self._ids)
+                    self.deliveries[delivery_id] = {"id": delivery_id, "webhook_id": webhook["id"],
+                                                    "event_type": event_type, "payload": json.dumps(payload),
+                                                    "status": "pending", "attempts": 0,
+                                                    "next_attempt_at": time.time(), "last_error": None}
+                    count += 1
+            return count
+
+    def get_due_webhook_deliveries(self, limit=100, exclude_webhooks=None):
+        with self.lock:
+            due = []
+            for delivery in sorted(self.deliveries.values(), key=lambda d: d["id"]):
+                webhook = self.webhooks[delivery["webhook_id"]]
+                if delivery["status"] == "pending" and delivery["next_attempt_at"] <= time.time() \
+                        and webhook["enabled"] and webhook["id"] not in (exclude_webhooks or ()):
+                    due.append(dict(delivery, url=webhook["url"], secret=webhook["secret"],
+                                    max_concurrency=webhook["max_concurrency"]))
+            return due[:limit]
+
+    def complete_webhook_delivery(self, delivery_id, webhook_id, status):
+        with self.lock:
+            del self.deliveries[delivery_id]
+            self.webhooks[webhook_id]["consecutive_failures"] = 0
+            return True
+
+    def fail_webhook_delivery(self, delivery_id, webhook_id, attempts, next_attempt_at, error, status=None):
+        with self.lock:
+            delivery = self.deliveries[delivery_id]
+            delivery.update(attempts=attempts, last_error=error,
+                            status="pending" if next_attempt_at is not None else "failed")
+            if next_attempt_at is not None:
+                delivery["next_attempt_at"] = next_attempt_at
+            self.webhooks[webhook_id]["consecutive_failures"] += 1
+            return self.webhooks[webhook_id]["consecutive_failures"]
+
+    def set_webhook_enabled(self, webhook_id, enabled, reason=None, username=None):
+        with self.lock:
+            self.webhooks[webhook_id].update(enabled=enabled, disabled_reason=None if enabled else reason)
+            return True
+
+
+def _transition(seq=3):
+    return {"type": TRANSITION, "seq": seq, "epoch": "e1", "timestamp": 1700000000.0, "door_id": 1,
+            "status": "open", "oldStatus": "closed", "state": "open", "oldState": "opening",
+            "stuck_reason": None}
+
+
+@pytest.fixture
+def dispatchers():
+    started = []
+
+    def make(store, **kwargs):
+        options = dict(base_backoff=0.01, max_backoff=0.05, poll_interval=0.05, timeout=2, allowed=LOOPBACK)
+        options.update(kwargs)
+        dispatcher = WebhookDispatcher(store, **options)
+        started.append(dispatcher)
+        dispatcher.start()
+        return dispatcher
+
+    yield make
+    for dispatcher in started:
+        dispatcher.stop()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestSignatures:
+    def test_round_trip(self):
+        body = b'{"a": 1}'
+        header = sign(SECRET, int(time.time()), body)
+        assert header.startswith("t=")
+        assert verify(SECRET, header, body)
+
+    def test_tampering_and_wrong_secret_fail(self):
+        now = int(time.time())
+        header = sign(SECRET, now, b"body")
+        assert not verify(SECRET, header, b"bodY")
+        assert not verify("other", header, b"body")
+        assert not verify(SECRET, header.replace(f"t={now}", f"t={now + 1}"), b"body")
+        assert not verify(SECRET, "garbage", b"body")
+
+    def test_old_signatures_are_rejected(self):
+        header = sign(SECRET, 1000, b"body")
+        assert verify(SECRET, header, b"body", now=1100)
+        assert not verify(SECRET, header, b"body", now=2000)
+
+
+class TestEventPayload:
+    def test_transition(self):
+        payload = event_payload(_transition(), "Garage Door")
+        assert payload["id"] == "e1-3"
+        assert payload["type"] == "door.transition"
+        assert payload["created_at"] == 1700000000.0
+        assert payload["data"]["door_name"] == "Garage Door"
+        assert payload["data"]["state"] == "open"
+        assert "type" not in payload["data"]
+
+    def test_actuation(self):
+        event = {"type": ACTUATION, "seq": 4, "epoch": "e1", "timestamp": 1.0, "door_id": 1, "result": "ok"}
+        assert event_payload(event)["type"] == "door.actuation"
+
+    def test_snapshots_are_not_sent(self):
+        assert event_payload({"type": SNAPSHOT, "seq": 1}) is None
+
+    @pytest.mark.parametrize("url", ["ftp://host/x", "/relative", "", None, "http://"])
+    def test_invalid_urls(self, url):
+        with pytest.raises(ValueError):
+            validate_url(url)
+
+    @pytest.mark.parametrize("url", ["http://127.0.0.1/hook", "http://10.0.0.5/hook", "http://192.168.1.2:8123/x",
+                                     "http://169.254.169.254/latest/meta-data", "http://[::1]/hook",
+                                     "http://[::ffff:10.0.0.1]/hook", "http://100.100.100.200/", "http://0.0.0.0/"])
+    def test_internal_addresses_are_refused(self, url):
+        with pytest.raises(ValueError, match="internal address"):
+            validate_url(url)
+
+    def test_host_names_are_resolved(self):
+        with patch("webhooks.resolve_host", return_value=[ipaddress.ip_address("10.1.2.3")]):
+            with pytest.raises(ValueError, match="10.1.2.3"):
+                validate_url("https://sneaky.example.com/hook")
+        with patch("webhooks.resolve_host", return_value=[ipaddress.ip_address("93.184.216.34")]):
+            assert validate_url("https://example.com/hook") == "https://example.com/hook"
+        with patch("webhooks.resolve_host", side_effect=OSError("no such host")):
+            with pytest.raises(ValueError, match="cannot be resolved"):
+                validate_url("https://nowhere.invalid/hook")
+
+    def test_allowlist(self):
+        allowed = parse_allowlist(" ha.local., 192.168.1.0/24 ,,")
+        assert validate_url("http://192.168.1.20:8123/api", allowed)
+        with patch("webhooks.resolve_host", return_value=[ipaddress.ip_address("10.0.0.7")]):
+            assert validate_url("http://HA.local/hook", allowed)
+        with pytest.raises(ValueError):
+            validate_url("http://192.168.2.20/hook", allowed)
+
+
+class TestConnectionPool:
+    def test_connections_are_kept_alive(self, endpoint):
+        pool = ConnectionPool(allowed=LOOPBACK)
+        for _ in range(3):
+            assert pool.post(endpoint.url, b"{}", {"Content-Type": "application/json"}) == (200, "ok")
+        assert pool.stats() == {"created": 1, "reused": 2, "idle": 1}
+        assert len({request["client_port"] for request in endpoint.requests}) == 1
+        pool.close()
+        assert pool.stats()["idle"] == 0
+
+    def test_dead_idle_connection_is_replaced(self, endpoint):
+        pool = ConnectionPool(allowed=LOOPBACK)
+        pool.post(endpoint.url, b"{}", {})
+        # The server (or a proxy) dropped the idle connection
+        next(iter(pool._idle.values()))[0].sock.close()
+        assert pool.post(endpoint.url, b"{}", {}) == (200, "ok")
+        assert pool.stats()["created"] == 2
+        assert len(endpoint.requests) == 2
+
+    def test_unreachable_endpoint_raises(self):
+        pool = ConnectionPool(timeout=1, allowed=LOOPBACK)
+        with pytest.raises(OSError):
+            pool.post("http://127.0.0.1:1/hook", b"{}", {})
+
+    def test_connects_to_the_vetted_address_under_the_host_name(self, endpoint):
+        pool = ConnectionPool(allowed=LOOPBACK)
+        url = endpoint.url.replace("127.0.0.1", "hooks.example.com")
+        with patch("webhooks.resolve_host", return_value=[ipaddress.ip_address("127.0.0.1")]):
+            assert pool.post(url, b"{}", {}) == (200, "ok")
+        assert endpoint.requests[0]["headers"]["Host"] == f"hooks.example.com:{endpoint.server_address[1]}"
+
+    def test_internal_addresses_are_refused(self, endpoint):
+        with pytest.raises(ValueError, match="internal address"):
+            ConnectionPool().post(endpoint.url, b"{}", {})
+        assert endpoint.requests == []
+
+
+class TestWebhookDispatcher:
+    def test_delivers_signed_events(self, endpoint, dispatchers):
+        store = MemoryStore()
+        store.add_webhook(endpoint.url)
+        dispatcher = dispatchers(store)
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: not store.deliveries and endpoint.requests)
+        request = endpoint.requests[0]
+        assert json.loads(request["body"])["type"] == "door.transition"
+        assert request["headers"]["X-Garage-Event"] == "door.transition"
+        assert request["headers"]["X-Garage-Delivery"] == "1"
+        assert verify(SECRET, request["headers"][SIGNATURE_HEADER], request["body"])
+        stats = dispatcher.stats()["endpoints"][1]
+        assert stats["delivered"] == 1
+        assert stats["success_rate"] == 1.0
+        assert stats["latency_ms_avg"] is not None
+
+    def test_every_enabled_endpoint_gets_the_event(self, endpoint, dispatchers):
+        store = MemoryStore()
+        store.add_webhook(endpoint.url)
+        store.add_webhook(endpoint.url + "?second")
+        disabled = store.add_webhook(endpoint.url + "?disabled")
+        store.webhooks[disabled]["enabled"] = False
+        dispatchers(store).notify(_transition())
+        assert _wait_for(lambda: len(endpoint.requests) == 2 and not store.deliveries)
+        time.sleep(0.1)
+        assert len(endpoint.requests) == 2
+
+    def test_transient_failures_are_retried_with_the_same_delivery_id(self, endpoint, dispatchers):
+        endpoint.statuses = [503, 429]
+        store = MemoryStore()
+        store.add_webhook(endpoint.url)
+        dispatcher = dispatchers(store)
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: len(endpoint.requests) == 3 and not store.deliveries)
+        assert [request["headers"]["X-Garage-Delivery"] for request in endpoint.requests] == ["1"] * 3
+        stats = dispatcher.stats()["endpoints"][1]
+        assert (stats["delivered"], stats["failed_attempts"]) == (1, 2)
+        assert store.webhooks[1]["consecutive_failures"] == 0
+
+    def test_rejected_event_fails_at_once(self, endpoint, dispatchers):
+        endpoint.statuses = [400]
+        store = MemoryStore()
+        store.add_webhook(endpoint.url)
+        dispatcher = dispatchers(store)
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: store.deliveries and store.deliveries[1]["status"] == "failed")
+        assert store.deliveries[1]["attempts"] == 1
+        assert "400" in store.deliveries[1]["last_error"]
+        assert dispatcher.stats()["endpoints"][1]["gave_up"] == 1
+
+    def test_gives_up_after_max_attempts(self, dispatchers):
+        store = MemoryStore()
+        store.add_webhook("http://127.0.0.1:1/hook")
+        dispatcher = dispatchers(store, max_attempts=3)
+        dispatcher.notify(_transition())
+        assert _wait_for(lambda: store.deliveries and store.deliveries[1]["status"] == "failed")
+        assert store.deliveries[1]["attempts"] == 3
+
+    def test_persistently_failing_endpoint_is_disabled(self, endpoint, dispatchers):
+        endpoint.statuses = [500] * 10
+        store = MemoryStore()
+        store.add_webhook(endpoint.url)
+        dispatcher = dispatchers(store, disable_after=4)
+        for seq in range(3):
+            dispatcher.notify(_transition(seq))
+        assert _wait_for(lambda: not store.webhooks[1]["enabled"])
+        assert "4 consecutive" in store.webhooks[1]["disabled_reason"]
+        assert dispatcher.stats()["disabled"] == 1
+        sent = len(endpoint.requests)
+        time.sleep(0.2)
+        # Nothing more is sent to a disabled endpoint; its deliveries wait in the table
+        assert len(endpoint.requests) == sent
+        assert all(d["status"] == "pending" for d in store.deliveries.values())
+
+    def test_concurrency_is_limited_per_endpoint(self, endpoint, dispatchers):
+        endpoint.delay = 0.1
+        store = MemoryStore()
+        store.add_webhook(endpoint.url, max_concurrency=2)
+        dispatcher = dispatchers(store, workers=6)
+        for seq in range(6):
+            dispatcher.notify(_transition(seq))
+        assert _wait_for(lambda: len(endpoint.requests) == 6)
+        assert endpoint.max_active == 2
+
+    def test_slow_backlog_does_not_hold_up_other_endpoints(self, endpoint, dispatchers):
+        endpoint.delay = 0.2
+        fast = Endpoint()
+        try:
+            store = MemoryStore()
+            store.add_webhook(endpoint.url, max_concurrency=1)
+            for seq in range(40):
+                store.enqueue_webhook_deliveries("door.transition", event_payload(_transition(seq)))
+            store.add_webhook(fast.url)
+            store.enqueue_webhook_deliveries("door.transition", event_payload(_transition(40)))
+            # The slow endpoint's 41 deliveries are older than the batch the dispatcher reads (16)
+            dispatchers(store, workers=2)
+            assert _wait_for(lambda: len(fast.requests) == 1, timeout=1.0)
+            assert len(endpoint.requests) < 10
+        finally:
+            fast.shutdown()
+            fast.server_close()
+
+    def test_host_re_pointed_at_loopback_after_registration_is_not_sent_to(self, endpoint, dispatchers):
+        url = endpoint.url.replace("127.0.0.1", "hooks.example.com")
+        with patch("webhooks.resolve_host", return_value=[ipaddress.ip_address("93.184.216.34")]):
+            validate_url(url)
+        store = MemoryStore()
+        store.add_webhook(url)
+        # The name now resolves to the Pi itself
+        with patch("webhooks.resolve_host", return_value=[ipaddress.ip_address("127.0.0.1")]):
+            dispatchers(store, allowed=()).notify(_transition())
+            assert _wait_for(lambda: store.deliveries and store.deliveries[1]["status"] == "failed")
+        assert "internal address" in store.deliveries[1]["last_error"]
+        assert endpoint.requests == []
+
+    def test_deliveries_queued_before_a_restart_are_sent(self, endpoint, dispatchers):
+        store = MemoryStore()
+        store.add_webhook(endpoint.url)
+        store.enqueue_webhook_deliveries("door.transition", event_payload(_transition()))
+        dispatchers(store)
+        assert _wait_for(lambda: not store.deliveries)
+        assert len(endpoint.requests) == 1
+
+    def test_notify_never_waits_for_the_store(self, endpoint):
+        store = MagicMock()
+        dispatcher = WebhookDispatcher(store, queue_size=2)
+        # "Running" without the thread: the queue fills up
+        dispatcher._thread = MagicMock()
+        for seq in range(4):
+            dispatcher.notify(_transition(seq))
+        store.enqueue_webhook_deliveries.assert_not_called()
+        assert dispatcher.stats()["queued_events"] == 2
+        assert dispatcher.dropped == 2
+
+    def test_ignored_unless_started(self):
+        dispatcher = WebhookDispatcher(MagicMock())
+        dispatcher.notify(_transition())
+        assert dispatcher.stats()["queued_events"] == 0
+
+
+def _api_headers(mock_db, role=UserRole.REGULAR.value):
+    mock_db.get_user_by_api_key.return_value = {
+        "id": 1, "username": "apiuser", "role": role, "is_active": True,
+    }
+    return {"X-API-Key": "k" * 64}
+
+
+class TestWebhookApi:
+    @pytest.fixture(autouse=True)
+    def public_dns(self):
+        with patch("webhooks.resolve_host", return_value=[ipaddress.ip_address("93.184.216.34")]):
+            yield
+
+    def test_create_returns_the_secret_once(self, client, mock_db):
+        mock_db.create_webhook.return_value = 7
+        response = client.post("/api/webhooks", json={"url": "https://example.com/hook"},
+                               headers=_api_headers(mock_db))
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data["webhook"] == {"id": 7, "url": "https://example.com/hook", "max_concurrency": 2}
+        username, url, secret, max_concurrency = mock_db.create_webhook.call_args.args
+        assert (username, url, max_concurrency) == ("apiuser", "https://example.com/hook", 2)
+        assert data["secret"] == secret and len(secret) == 64
+
+    @pytest.mark.parametrize("body", [{}, {"url": "ftp://example.com"},
+                                      {"url": "https://example.com", "max_concurrency": 0},
+                                      {"url": "https://example.com", "max_concurrency": "x"}])
+    def test_create_validates(self, client, mock_db, body):
+        response = client.post("/api/webhooks", json=body, headers=_api_headers(mock_db))
+        assert response.status_code == 400
+        mock_db.create_webhook.assert_not_called()
+
+    def test_create_refuses_internal_hosts_unless_allowed(self, client, mock_db, monkeypatch):
+        mock_db.create_webhook.return_value = 7
+        monkeypatch.setattr("webhooks.resolve_host", lambda *args: [ipaddress.ip_address("192.168.1.20")])
+        body = {"url": "http://ha.example.com:8123/api/webhook/garage"}
+        response = client.post("/api/webhooks", json=body, headers=_api_headers(mock_db))
+        assert response.status_code == 400
+        assert "internal address" in response.get_json()["error"]
+        monkeypatch.setenv("WEBHOOK_ALLOWED_HOSTS", "192.168.1.0/24")
+        assert client.post("/api/webhooks", json=body, headers=_api_headers(mock_db)).status_code == 201
+
+    def test_users_manage_their_own_webhooks(self, client, mock_db):
+        headers = _api_headers(mock_db)
+        mock_db.get_webhooks.return_value = [{"id": 7}]
+        assert client.get("/api/webhooks", headers=headers).get_json() == {"webhooks": [{"id": 7}]}
+        mock_db.get_webhooks.assert_called_once_with("apiuser")
+        assert client.delete("/api/webhooks/7", headers=headers).status_code == 200
+        mock_db.delete_webhook.assert_called_once_with(7, "apiuser")
+        assert client.post("/api/webhooks/7/enable", headers=headers).status_code == 200
+        mock_db.set_webhook_enabled.assert_called_once_with(7, True, username="apiuser")
+
+    def test_admins_manage_every_webhook(self, client, mock_db):
+        headers = _api_headers(mock_db, UserRole.ADMIN.value)
+        mock_db.get_webhooks.return_value = []
+        client.get("/api/webhooks", headers=headers)
+        mock_db.get_webhooks.assert_called_once_with(None)
+        client.delete("/api/webhooks/7", headers=headers)
+        mock_db.delete_webhook.assert_called_once_with(7, None)
+
+    def test_unknown_webhook(self, client, mock_db):
+        mock_db.delete_webhook.return_value = False
+        mock_db.set_webhook_enabled.return_value = False
+        headers = _api_headers(mock_db)
+        assert client.delete("/api/webhooks/9", headers=headers).status_code == 404
+        assert client.post("/api/webhooks/9/enable", headers=headers).status_code == 404
+
+    def test_requires_api_key(self, client):
+        assert client.get("/api/webhooks").status_code == 401
+
+
+class TestAppWiring:
+    def test_disabled_by_default(self, monkeypatch):
+        monkeypatch.delenv("WEBHOOKS_ENABLED", raising=False)
+        app_module.create_webhooks()
+        assert app_module.webhook_dispatcher is None
+
+    def test_runs_with_the_leader_jobs(self, monkeypatch, mock_db):
+        monkeypatch.setenv("WEBHOOKS_ENABLED", "True")
+        with patch.object(app_module, "WebhookDispatcher") as dispatcher_class, \
+                patch.object(app_module, "door_events", MagicMock()) as events, \
+                patch.object(app_module, "scheduler", MagicMock()):
+            app_module.create_webhooks()
+            dispatcher = dispatcher_class.return_value
+            assert dispatcher_class.call_args.args == (mock_db,)
+            events.subscribe.assert_called_once_with(dispatcher.notify)
+            payload = dispatcher_class.call_args.kwargs["payload"](_transition())
+            assert payload["data"]["door_name"] == "Garage Door"
+            app_module.start_leader_jobs()
+            dispatcher.start.assert_called_once()
+            app_module.stop_leader_jobs()
+            dispatcher.stop.assert_called_once()
+            app_module.stop_webhooks()
+        assert app_module.webhook_dispatcher is None
+
+    def test_admin_webhooks(self, admin_client, mock_db):
+        assert admin_client.get("/admin/webhooks").get_json() == {"enabled": False}
+        mock_db.get_webhooks.return_value = [{"id": 1}]
+        mock_db.get_failed_webhook_deliveries.return_value = []
+        with patch.object(app_module, "webhook_dispatcher", WebhookDispatcher(mock_db)):
+            data = admin_client.get("/admin/webhooks").get_json()
+        assert data["enabled"] is True
+        assert data["webhooks"] == [{"id": 1}]
+        assert data["connections"] == {"created": 0, "reused": 0, "idle": 0}
+
+    def test_admin_webhooks_requires_admin(self, auth_client):
+        assert auth_client.get("/admin/webhooks").status_code == 302
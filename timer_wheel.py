@@ -0,0 +1,138 @@
+"""
+Hierarchical timer wheel for many long, mostly cancelled timers.
+
+Door alerts ("the garage has been open for 15 minutes") arm one timer per
+user and door whenever a door opens and cancel them all when it closes, so
+nearly every timer is cancelled long before it fires.  Scheduler jobs or a
+heap would cost O(log n) per operation and keep cancelled entries around;
+the wheel costs O(1) to arm, cancel and tick.
+
+The wheel has ``levels`` rings of ``slots`` slots each.  Level 0 has one
+slot per tick (``resolution`` seconds); each slot of level L covers a whole
+turn of level L-1.  A timer goes into the lowest level whose span reaches its
+deadline, and is moved one level down ("cascaded") when the wheel reaches its
+slot, so each timer is touched at most ``levels`` times.  With the defaults
+(1 s ticks, 64 slots, 4 levels) deadlines up to about 194 days are exact;
+later ones wait at the top level and are re-placed until they are in range.
+
+Callbacks run on the thread calling ``advance``, outside the wheel's lock, so
+they may arm or cancel timers.
+"""
+import logging
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """A pending callback; pass it to TimerWheel.cancel to drop it."""
+    __slots__ = ('expires', 'callback', 'args', '_slot')
+
+    def __init__(self, expires: int, callback: Callable[..., Any], args: tuple):
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        # The slot holding the timer while it is pending
+        self._slot: Optional[Dict['Timer', None]] = None
+
+    @property
+    def pending(self) -> bool:
+        return self._slot is not None
+
+
+class TimerWheel:
+    """Timers with O(1) arm, cancel and tick, at a resolution of one tick."""
+
+    def __init__(self, resolution: float = 1.0, slots: int = 64, levels: int = 4,
+                 clock: Callable[[], float] = time.monotonic):
+        if resolution <= 0 or levels < 1 or slots < 2 or slots & (slots - 1):
+            raise ValueError('resolution must be positive and slots a power of two')
+        self.resolution = resolution
+        self.clock = clock
+        self.fired = 0
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        self._levels = levels
+        self._span = 1 << (self._bits * levels)
+        # Slots are insertion-ordered dicts used as sets, so timers due on the same tick fire in arming order
+        self._wheels: List[List[Dict[Timer, None]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._origin = clock()
+        self._tick = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args) -> Timer:
+        """Call callback(*args) once delay seconds have passed (rounded up to whole ticks)."""
+        with self._lock:
+            # The current tick has been processed already, so a timer needs at least one more
+            ticks = max(1, math.ceil((self.clock() - self._origin + delay) / self.resolution) - self._tick)
+            timer = Timer(self._tick + ticks, callback, args)
+            self._place(timer)
+            self._count += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> bool:
+        """Drop a pending timer; False if it already fired or was cancelled."""
+        with self._lock:
+            if timer._slot is None:
+                return False
+            del timer._slot[timer]
+            timer._slot = None
+            self._count -= 1
+            return True
+
+    def advance(self) -> int:
+        """Process every tick up to now and run the expired callbacks. Returns how many ran."""
+        expired: List[Timer] = []
+        with self._lock:
+            target = int((self.clock() - self._origin) / self.resolution)
+            while self._tick < target:
+                self._tick += 1
+                self._cascade()
+                slot = self._wheels[0][self._tick & self._mask]
+                for timer in slot:
+                    timer._slot = None
+                expired.extend(slot)
+                self._count -= len(slot)
+                slot.clear()
+        for timer in expired:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.error(f"Timer callback failed: {str(e)}")
+        self.fired += len(expired)
+        return len(expired)
+
+    def _place(self, timer: Timer):
+        delta = timer.expires - self._tick
+        # Past the top level: park in the furthest slot, it is re-placed when reached
+        expires = timer.expires if delta < self._span else self._tick + self._span - 1
+        delta = expires - self._tick
+        level = 0
+        while delta >= 1 << (self._bits * (level + 1)):
+            level += 1
+        slot = self._wheels[level][(expires >> (self._bits * level)) & self._mask]
+        slot[timer] = None
+        timer._slot = slot
+
+    def _cascade(self):
+        # Each level's slot is emptied into the levels below when the wheel reaches it
+        for level in range(self._levels - 1, 0, -1):
+            shift = self._bits * level
+            if self._tick & ((1 << shift) - 1):
+                continue
+            slot = self._wheels[level][(self._tick >> shift) & self._mask]
+            if not slot:
+                continue
+            timers = list(slot)
+            slot.clear()
+            for timer in timers:
+                self._place(timer)
@@ -0,0 +1,496 @@
+"""
+Signed outbound webhooks for door events.
+
+Users register endpoints (``/api/webhooks``); every door transition and
+relay actuation is POSTed to each enabled endpoint as JSON:
+
+    {"id": "<epoch>-<seq>", "type": "door.transition", "created_at": ..., "data": {...}}
+
+Each request carries ``X-Garage-Event``, ``X-Garage-Delivery`` (stable across
+retries, for de-duplication) and ``X-Garage-Signature: t=<unix time>,v1=<hex>``,
+an HMAC-SHA256 of ``"<t>.<body>"`` with the endpoint's secret (``verify``
+checks one).
+
+Delivery is durable and at-least-once.  ``WebhookDispatcher.notify`` only
+puts the event on an in-memory queue; the dispatcher thread writes one row
+per endpoint to the ``webhook_deliveries`` table and then sends whatever is
+due from that table, so deliveries survive restarts and leader changes:
+
+* requests go over a ``ConnectionPool`` of keep-alive connections per origin
+* each endpoint has at most ``max_concurrency`` requests in flight; the rest
+  wait in the table
+* network errors, 408, 429 and 5xx are retried with exponential backoff and
+  jitter up to ``max_attempts``; other responses fail the delivery at once
+* an endpoint failing ``disable_after`` attempts in a row is disabled until
+  its owner re-enables it
+
+Endpoints must resolve to public addresses: ``validate_url`` refuses hosts
+on private, loopback, link-local (cloud metadata) and other non-global
+networks, so a user cannot make the Pi post to its own LAN, unless the host
+or network is in the ``WEBHOOK_ALLOWED_HOSTS`` allowlist the admin sets.
+The check is repeated for every new delivery connection, which then goes to
+the vetted address, so re-pointing the DNS name later does not get around it.
+
+Latency and success counts are kept per endpoint for ``/admin/webhooks``.
+"""
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import queue
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import urlsplit
+
+from door_events import ACTUATION, TRANSITION
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Garage-Signature'
+EVENT_TYPES = {TRANSITION: 'door.transition', ACTUATION: 'door.actuation'}
+
+# Responses worth retrying; any other non-2xx answer means the endpoint refuses the event
+RETRY_STATUSES = (408, 429)
+
+
+AllowlistEntry = Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_allowlist(value: Optional[str]) -> List[AllowlistEntry]:
+    """Parse a comma-separated list of host names and networks (CIDR) exempt from the address check."""
+    entries: List[AllowlistEntry] = []
+    for item in (value or '').split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        try:
+            entries.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            entries.append(item.rstrip('.'))
+    return entries
+
+
+def resolve_host(hostname: str, port: int) -> List[Union[ipaddress.IPv4Address, ipaddress.IPv6Address]]:
+    """The addresses hostname resolves to; raises OSError when it does not resolve."""
+    addresses = []
+    for info in socket.getaddrinfo(hostname, port, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if getattr(address, 'ipv4_mapped', None):
+            address = address.ipv4_mapped
+        addresses.append(address)
+    return addresses
+
+
+def vetted_address(hostname: str, port: int, allowed: Iterable[AllowlistEntry] = ()) -> str:
+    """Resolve hostname and return the address to connect to, or raise ValueError if any is internal.
+
+    Every address the host resolves to must be global: private, loopback,
+    link-local (which includes the cloud metadata address 169.254.169.254),
+    shared and reserved ranges are refused unless the host name or the
+    address is in allowed.  Raises OSError when the host does not resolve.
+    """
+    hostname = hostname.rstrip('.').lower()
+    allowed = list(allowed)
+    addresses = resolve_host(hostname, port)
+    if not addresses:
+        raise OSError(f'Webhook host {hostname} has no address')
+    if hostname in [entry for entry in allowed if isinstance(entry, str)]:
+        return str(addresses[0])
+    networks = [entry for entry in allowed if not isinstance(entry, str)]
+    for address in addresses:
+        if (address.is_global and not address.is_multicast) or any(address in network for network in networks):
+            continue
+        raise ValueError(f'Webhook URL must not point at an internal address ({address})')
+    return str(addresses[0])
+
+
+def validate_url(url: str, allowed: Iterable[AllowlistEntry] = ()) -> str:
+    """Return the URL if it is an absolute http(s) URL to a public host (see vetted_address), else raise ValueError."""
+    parts = urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('Webhook URL must be an absolute http:// or https:// URL')
+    try:
+        vetted_address(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80), allowed)
+    except (OSError, UnicodeError):
+        raise ValueError(f"Webhook host {parts.hostname} cannot be resolved")
+    return url
+
+
+def sign(secret: str, timestamp: int, body: bytes) -> str:
+    """The signature header value for a request body sent at timestamp."""
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify(secret: str, header: str, body: bytes, tolerance: float = 300.0, now: Optional[float] = None) -> bool:
+    """Check a signature header, rejecting ones older than tolerance seconds (replays)."""
+    try:
+        fields = dict(part.split('=', 1) for part in header.split(','))
+        timestamp = int(fields['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs((time.time() if now is None else now) - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(secret, timestamp, body), f"t={timestamp},v1={fields.get('v1', '')}")
+
+
+def event_payload(event: Dict[str, Any], door_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """The webhook body for a door event, or None for events that are not sent."""
+    event_type = EVENT_TYPES.get(event.get('type'))
+    if event_type is None:
+        return None
+    data = {key: value for key, value in event.items() if key not in ('type', 'epoch')}
+    if door_name is not None:
+        data['door_name'] = door_name
+    return {
+        'id': f"{event.get('epoch')}-{event.get('seq')}",
+        'type': event_type,
+        'created_at': event.get('timestamp', time.time()),
+        'data': data,
+    }
+
+
+class _PinnedConnection(http.client.HTTPConnection):
+    """HTTP connection to a vetted address; Host still names the endpoint."""
+
+    def __init__(self, host: str, port: Optional[int], address: str, timeout: float):
+        super().__init__(host, port, timeout=timeout)
+        self._create_connection = lambda target, *args: socket.create_connection((address, target[1]), *args)
+
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection to a vetted address; SNI and the certificate check still use the host name."""
+
+    def __init__(self, host: str, port: Optional[int], address: str, timeout: float):
+        super().__init__(host, port, timeout=timeout)
+        self._create_connection = lambda target, *args: socket.create_connection((address, target[1]), *args)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, reused per origin across requests and threads.
+
+    Each new connection resolves the host again and connects to an address
+    ``vetted_address`` accepts, so a DNS change after an endpoint was
+    registered cannot point deliveries at an internal address.
+    """
+
+    def __init__(self, max_idle: int = 4, timeout: float = 10.0, allowed: Iterable[AllowlistEntry] = ()):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.allowed = list(allowed)
+        self.created = 0
+        self.reused = 0
+        self._idle: Dict[Tuple[str, str, Optional[int]], deque] = {}
+        self._lock = threading.Lock()
+
+    def post(self, url: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, str]:
+        """POST and return (status, start of the response body).
+
+        Raises OSError/HTTPException on failure, and ValueError when the host
+        resolves to an internal address.
+        """
+        parts = urlsplit(url)
+        origin = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        connection, reused = self._acquire(origin)
+        try:
+            connection.request('POST', path, body=body, headers=headers)
+            response = connection.getresponse()
+            # Read the whole body so the connection can be reused
+            detail = response.read().decode('utf-8', errors='replace')[:200]
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            if not reused:
+                raise
+            # The server closed an idle connection; retry once on a fresh one
+            connection, _ = self._acquire(origin, fresh=True)
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                detail = response.read().decode('utf-8', errors='replace')[:200]
+            except Exception:
+                connection.close()
+                raise
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(origin, connection)
+        return response.status, detail
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idle = sum(len(connections) for connections in self._idle.values())
+        return {'created': self.created, 'reused': self.reused, 'idle': idle}
+
+    def _acquire(self, origin, fresh: bool = False):
+        if not fresh:
+            with self._lock:
+                connections = self._idle.get(origin)
+                if connections:
+                    self.reused += 1
+                    return connections.pop(), True
+        scheme, host, port = origin
+        address = vetted_address(host, port or (443 if scheme == 'https' else 80), self.allowed)
+        connection_class = _PinnedHTTPSConnection if scheme == 'https' else _PinnedConnection
+        with self._lock:
+            self.created += 1
+        return connection_class(host, port, address, self.timeout), False
+
+    def _release(self, origin, connection):
+        with self._lock:
+            connections = self._idle.setdefault(origin, deque())
+            if len(connections) < self.max_idle:
+                connections.append(connection)
+                return
+        connection.close()
+
+
+class EndpointStats:
+    """Delivery counts and recent latencies of one endpoint."""
+    __slots__ = ('delivered', 'failed_attempts', 'gave_up', 'latencies')
+
+    def __init__(self, window: int = 100):
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.gave_up = 0
+        self.latencies: deque = deque(maxlen=window)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        attempts = self.delivered + self.failed_attempts
+        return {
+            'delivered': self.delivered,
+            'failed_attempts': self.failed_attempts,
+            'gave_up': self.gave_up,
+            'success_rate': round(self.delivered / attempts, 3) if attempts else None,
+            'latency_ms_avg': round(sum(latencies) / len(latencies), 1) if latencies else None,
+            'latency_ms_p95': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        }
+
+
+class WebhookDispatcher:
+    """Queues door events for every webhook in the database and delivers them, signed, in the background."""
+
+    def __init__(self, store, payload: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]] = event_payload,
+                 workers: int = 4, queue_size: int = 1000, max_attempts: int = 8,
+                 base_backoff: float = 5.0, max_backoff: float = 3600.0, disable_after: int = 20,
+                 poll_interval: float = 5.0, timeout: float = 10.0, pool: Optional[ConnectionPool] = None,
+                 allowed: Iterable[AllowlistEntry] = ()):
+        if workers < 1 or queue_size < 1 or max_attempts < 1 or disable_after < 1:
+            raise ValueError('workers, queue_size, max_attempts and disable_after must be at least 1')
+        self.store = store
+        self.payload = payload
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.disable_after = disable_after
+        self.poll_interval = poll_interval
+        self.pool = pool if pool is not None else ConnectionPool(max_idle=workers, timeout=timeout, allowed=allowed)
+        self.queued = 0
+        self.dropped = 0
+        self.disabled = 0
+        self._events: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._endpoints: Dict[int, EndpointStats] = {}
+        # Delivery ids being sent, and requests in flight per endpoint
+        self._in_flight: Set[int] = set()
+        self._busy: Dict[int, int] = {}
+        # Each endpoint's max_concurrency, as last read from the database
+        self._limits: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def notify(self, event: Dict[str, Any]):
+        """Queue a door event (door_events listener). Never blocks; ignored unless the dispatcher runs here."""
+        if not self.running or event.get('type') not in EVENT_TYPES:
+            return
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning("Webhook event queue full; dropped an event")
+            return
+        self._wake.set()
+
+    def start(self):
+        """Start delivering; deliveries left in the database by an earlier run are picked up."""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='webhook')
+        self._thread = threading.Thread(target=self._run, name='webhooks', daemon=True)
+        self._thread.start()
+        logger.info(f"Webhook delivery started with {self.workers} worker(s)")
+
+    def stop(self, timeout: float = 15.0):
+        """Stop delivering; undelivered events stay queued in the database."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        self.pool.close()
+        with self._events.mutex:
+            self._events.queue.clear()
+        logger.info("Webhook delivery stopped")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {webhook_id: stats.to_dict() for webhook_id, stats in self._endpoints.items()}
+            in_flight = len(self._in_flight)
+        return {
+            'running': self.running,
+            'queued_events': self._events.qsize(),
+            'queued_deliveries': self.queued,
+            'in_flight': in_flight,
+            'dropped': self.dropped,
+            'disabled': self.disabled,
+            'connections': self.pool.stats(),
+            'endpoints': endpoints,
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._store_events()
+                self._dispatch_due()
+            except Exception as e:
+                logger.error(f"Error dispatching webhooks: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _store_events(self):
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                return
+            payload = self.payload(event)
+            if payload is not None:
+                count = self.store.enqueue_webhook_deliveries(payload['type'], payload)
+                with self._lock:
+                    self.queued += count
+
+    def _dispatch_due(self):
+        # Endpoints at their concurrency limit are left out of the query, so the
+        # backlog of one slow endpoint cannot fill the batch and starve the rest
+        limit = self.workers * 8
+        while True:
+            with self._lock:
+                saturated = [webhook_id for webhook_id, busy in self._busy.items()
+                             if busy >= self._limits.get(webhook_id, 1)]
+            batch = self.store.get_due_webhook_deliveries(limit=limit, exclude_webhooks=saturated)
+            filled = False
+            for delivery in batch:
+                webhook_id = delivery['webhook_id']
+                with self._lock:
+                    self._limits[webhook_id] = max(1, delivery['max_concurrency'])
+                    if delivery['id'] in self._in_flight:
+                        continue
+                    if self._busy.get(webhook_id, 0) >= self._limits[webhook_id]:
+                        # Sent when a slot frees up (completion wakes the loop)
+                        filled = True
+                        continue
+                    self._in_flight.add(delivery['id'])
+                    self._busy[webhook_id] = self._busy.get(webhook_id, 0) + 1
+                self._executor.submit(self._deliver, delivery)
+            # A full batch with an endpoint that filled up on the way may hide other endpoints' rows
+            if not filled or len(batch) < limit:
+                return
+
+    def _deliver(self, delivery: Dict[str, Any]):
+        webhook_id = delivery['webhook_id']
+        payload = delivery['payload']
+        body = (payload if isinstance(payload, str) else json.dumps(payload)).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'garage-webhooks/1',
+            'X-Garage-Event': delivery['event_type'],
+            'X-Garage-Delivery': str(delivery['id']),
+            SIGNATURE_HEADER: sign(delivery['secret'], int(time.time()), body),
+        }
+        start = time.monotonic()
+        status = None
+        try:
+            status, detail = self.pool.post(delivery['url'], body, headers)
+            error = None if 200 <= status < 300 else f"HTTP {status}: {detail}"
+            retryable = status in RETRY_STATUSES or status >= 500
+        except (OSError, http.client.HTTPException) as e:
+            error, retryable = f"{type(e).__name__}: {e}", True
+        except ValueError as e:
+            error, retryable = str(e), False
+        latency_ms = (time.monotonic() - start) * 1000
+        try:
+            if error is None:
+                self.store.complete_webhook_delivery(delivery['id'], webhook_id, status)
+                self._record(webhook_id, latency_ms, delivered=True)
+            else:
+                self._failed(delivery, status, error, retryable, latency_ms)
+        finally:
+            with self._lock:
+                self._in_flight.discard(delivery['id'])
+                self._busy[webhook_id] -= 1
+            self._wake.set()
+
+    def _failed(self, delivery, status, error, retryable, latency_ms):
+        webhook_id = delivery['webhook_id']
+        attempts = delivery['attempts'] + 1
+        if retryable and attempts < self.max_attempts:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+            next_attempt_at = time.time() + delay
+            logger.warning(f"Webhook {webhook_id} delivery {delivery['id']} failed (attempt {attempts}), "
+                           f"retrying in {delay:.0f}s: {error}")
+        else:
+            next_attempt_at = None
+            logger.error(f"Webhook {webhook_id} delivery {delivery['id']} failed after {attempts} attempt(s): {error}")
+        failures = self.store.fail_webhook_delivery(delivery['id'], webhook_id, attempts, next_attempt_at,
+                                                    error, status)
+        self._record(webhook_id, latency_ms, delivered=False, gave_up=next_attempt_at is None)
+        if failures >= self.disable_after:
+            reason = f"Disabled after {failures} consecutive failed deliveries; last error: {error}"
+            if self.store.set_webhook_enabled(webhook_id, False, reason=reason):
+                with self._lock:
+                    self.disabled += 1
+                logger.error(f"Webhook {webhook_id} disabled: {reason}")
+
+    def _record(self, webhook_id: int, latency_ms: float, delivered: bool, gave_up: bool = False):
+        with self._lock:
+            stats = self._endpoints.get(webhook_id)
+            if stats is None:
+                stats = self._endpoints[webhook_id] = EndpointStats()
+            stats.latencies.append(round(latency_ms, 1))
+            if delivered:
+                stats.delivered += 1
+            else:
+                stats.failed_attempts += 1
+                stats.gave_up += gave_up